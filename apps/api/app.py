@@ -6,9 +6,11 @@ from flask_migrate import Migrate
 
 from config import config
 from src.models import db
+from src.models.batch_analysis import ensure_batch_queue_columns
 from src.routes import register_routes
 from src.middleware import register_error_handlers
 from src.middleware.performance_monitor import init_performance_monitoring
+from src.middleware.response_encoding import init_response_encoding
 
 def create_app(config_name=None):
     """Create and configure Flask application."""
@@ -30,7 +32,7 @@ def create_app(config_name=None):
     CORS(app, 
          origins=app.config['CORS_ORIGINS'],
          methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-         allow_headers=['Content-Type', 'Authorization'],
+         allow_headers=['Content-Type', 'Authorization', 'X-Request-Timeout', 'Idempotency-Key'],
          supports_credentials=True)
     
     JWTManager(app)
@@ -45,11 +47,16 @@ def create_app(config_name=None):
     # Initialize performance monitoring
     init_performance_monitoring(app)
     
+    # JSON序列化与响应压缩
+    init_response_encoding(app)
+    
     # Note: Static file serving is now handled in products blueprint
     
     # Create database tables
     with app.app_context():
         db.create_all()
+        # 已有数据库的批量文件表补齐持久化队列字段（create_all 不修改已存在的表）
+        ensure_batch_queue_columns(db.engine)
     
     return app
 
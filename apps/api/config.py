@@ -34,6 +34,15 @@ class Config:
     # Server Configuration
     HOST = os.environ.get('HOST', '127.0.0.1')
     PORT = int(os.environ.get('PORT', 5000))
+    
+    # 响应压缩（按 Accept-Encoding 协商 brotli/gzip）
+    RESPONSE_COMPRESSION_ENABLED = os.environ.get('RESPONSE_COMPRESSION_ENABLED', 'true').lower() == 'true'
+    RESPONSE_COMPRESSION_MIN_SIZE = int(os.environ.get('RESPONSE_COMPRESSION_MIN_SIZE', 1024))
+    
+    # 提交接口幂等键（Idempotency-Key）：保留时间、重复提交等待原请求的最长时间、执行中键的接管时间（秒）
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 3600))
+    IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', 180))
+    IDEMPOTENCY_STALE_AFTER = float(os.environ.get('IDEMPOTENCY_STALE_AFTER', 900))
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+批量分析队列工作进程
+从持久化队列（batch_analysis_files 表）租用文件执行分析，可在多个节点上同时运行；
+进程退出或崩溃后，未完成文件的租约到期后由其他工作进程接管。
+文件文本从队列内容目录（BATCH_QUEUE_CONTENT_DIR）读取，多节点运行时该目录需挂载为所有节点共享的存储。
+
+用法（在 apps/api 目录下）:
+    python scripts/batch_worker.py [--concurrency 3] [--worker-id host:1] [--lease-seconds 60]
+"""
+import os
+import sys
+import signal
+import argparse
+import logging
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import create_app
+from src.services.batch_processor import BatchProcessor
+from src.services.batch_queue import (
+    BatchQueue, BatchQueueWorker, BATCH_QUEUE_LEASE_SECONDS, BATCH_QUEUE_MAX_ATTEMPTS, default_worker_id
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量分析队列工作进程')
+    parser.add_argument('--concurrency', type=int, default=3, help='同时分析的文件数')
+    parser.add_argument('--worker-id', default=default_worker_id(), help='工作进程标识（写入租约）')
+    parser.add_argument('--lease-seconds', type=float, default=BATCH_QUEUE_LEASE_SECONDS, help='租约时长（秒）')
+    parser.add_argument('--max-attempts', type=int, default=BATCH_QUEUE_MAX_ATTEMPTS, help='单个文件最多租用次数')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    app = create_app()
+    queue = BatchQueue(lease_seconds=args.lease_seconds, max_attempts=args.max_attempts)
+    processor = BatchProcessor(max_workers=args.concurrency)
+    worker = BatchQueueWorker(app, queue, processor._process_single_file,
+                              concurrency=args.concurrency, worker_id=args.worker_id)
+
+    def shutdown(signum, frame):
+        print(f"🛑 收到信号 {signum}，等待执行中的文件完成后退出...")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    print(f"🚚 批量队列工作进程 {args.worker_id} 启动，并发 {args.concurrency}，租约 {args.lease_seconds}s")
+    worker.start()
+    worker.run_forever()
+
+
+if __name__ == '__main__':
+    main()
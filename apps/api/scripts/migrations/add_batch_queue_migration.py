@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+为批量分析文件表添加持久化任务队列字段（文件内容引用、租用次数、租约）的数据库迁移脚本
+应用启动时（create_app）会自动执行同样的检查，本脚本用于在部署前单独迁移数据库。
+"""
+import os
+import sys
+sys.path.append('.')
+
+# 设置环境变量
+os.environ['FLASK_ENV'] = 'development'
+
+import logging
+from sqlalchemy import create_engine
+
+from src.models.batch_analysis import ensure_batch_queue_columns
+
+logger = logging.getLogger(__name__)
+
+def add_batch_queue_fields():
+    """添加队列字段到 batch_analysis_files 表"""
+    try:
+        # 直接连接数据库
+        database_url = os.environ.get('DATABASE_URL', "sqlite:///cpq_database.db")
+        engine = create_engine(database_url)
+        
+        added = ensure_batch_queue_columns(engine)
+        if not added:
+            print("✅ 队列字段已存在")
+        else:
+            print(f"✅ 成功添加队列字段到 batch_analysis_files 表: {', '.join(added)}")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 添加字段失败: {str(e)}")
+        logger.error(f"Migration failed: {str(e)}")
+        return False
+
+if __name__ == '__main__':
+    add_batch_queue_fields()
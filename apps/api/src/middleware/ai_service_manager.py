@@ -3,17 +3,21 @@
 AI服务管理器
 提供AI服务的连接池管理、请求队列、降级服务和负载均衡功能
 """
+import os
 import time
 import logging
 import threading
 from typing import Dict, Any, Optional, List, Callable
-from queue import Queue, Empty
+from queue import Empty
 from collections import deque
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 from enum import Enum
 import random
 
+from .request_scheduler import FairPriorityQueue
+from ..services.deadline import deadline_stats
+
 logger = logging.getLogger(__name__)
 
 class ServiceStatus(Enum):
@@ -32,7 +36,9 @@ class RequestContext:
     created_at: float
     file_size: int
     file_type: str
-    callback: Optional[Callable] = None
+    callback: Optional[Callable] = None     # 实际处理函数 callback(context) -> bool
+    on_expired: Optional[Callable] = None   # 排队超时或被淘汰而丢弃时调用 on_expired(context)
+    drop_reason: Optional[str] = None       # 被丢弃的原因：timeout / shed
 
 class AIServiceManager:
     """AI服务管理器"""
@@ -41,8 +47,11 @@ class AIServiceManager:
         self.max_concurrent_requests = max_concurrent_requests
         self.queue_size = queue_size
         
-        # 请求队列和处理
-        self.request_queue = Queue(maxsize=queue_size)
+        # 请求队列和处理：按优先级和用户加权公平排队，低优先级请求随等待时间老化
+        self.request_queue = FairPriorityQueue(
+            maxsize=queue_size,
+            aging_interval=float(os.environ.get('AI_QUEUE_AGING_INTERVAL', 15))
+        )
         self.processing_requests = {}  # request_id -> context
         self.completed_requests = deque(maxlen=100)  # 完成的请求历史
         
@@ -60,6 +69,7 @@ class AIServiceManager:
             'failed_requests': 0,
             'queued_requests': 0,
             'dropped_requests': 0,
+            'rejected_requests': 0,
             'avg_processing_time': 0,
             'max_processing_time': 0,
             'min_processing_time': float('inf')
@@ -97,44 +107,37 @@ class AIServiceManager:
         with self._lock:
             self.stats['total_requests'] += 1
             
-            # 检查队列是否已满
-            if self.request_queue.full():
-                # 根据优先级决定是否丢弃请求
-                if context.priority >= 8:  # 高优先级请求
-                    # 尝试丢弃低优先级的请求
-                    if self._try_drop_low_priority_request():
-                        logger.info(f"为高优先级请求 {context.request_id} 腾出队列空间")
-                    else:
-                        logger.warning(f"队列已满，丢弃高优先级请求: {context.request_id}")
-                        self.stats['dropped_requests'] += 1
-                        return False
-                else:
-                    logger.warning(f"队列已满，丢弃请求: {context.request_id}")
-                    self.stats['dropped_requests'] += 1
-                    return False
-            
             # 检查服务状态
             if self.service_status == ServiceStatus.UNAVAILABLE:
                 logger.error(f"AI服务不可用，拒绝请求: {context.request_id}")
                 self.stats['failed_requests'] += 1
                 return False
             
-            # 添加到队列
-            try:
-                self.request_queue.put(context, block=False)
-                self.stats['queued_requests'] += 1
-                logger.info(f"请求已加入队列: {context.request_id}, 优先级: {context.priority}, 队列长度: {self.request_queue.qsize()}")
-                return True
-            except:
-                logger.error(f"添加请求到队列失败: {context.request_id}")
-                self.stats['failed_requests'] += 1
+            # 添加到队列；队列已满时淘汰优先级更低、排队最久的请求
+            queued, shed = self.request_queue.put(context)
+            if not queued:
+                logger.warning(f"队列已满且无更低优先级请求可淘汰，拒绝请求: {context.request_id}, 优先级: {context.priority}")
+                self.stats['rejected_requests'] += 1
                 return False
+            
+            self.stats['queued_requests'] += 1
+            if shed is not None:
+                self.stats['dropped_requests'] += 1
+            logger.info(f"请求已加入队列: {context.request_id}, 优先级: {context.priority}, 队列长度: {self.request_queue.qsize()}")
+        
+        if shed is not None:
+            logger.warning(f"为请求 {context.request_id} 腾出队列空间，淘汰低优先级请求: {shed.request_id} (优先级 {shed.priority})")
+            self._drop_request(shed, 'shed')
+        return True
     
-    def _try_drop_low_priority_request(self) -> bool:
-        """尝试丢弃低优先级请求"""
-        # 这里简化实现，实际可以维护一个优先级队列
-        # 当前只是记录尝试，实际的队列重排需要更复杂的数据结构
-        return False
+    def _drop_request(self, context: RequestContext, reason: str):
+        """丢弃未执行的请求并通知提交方"""
+        context.drop_reason = reason
+        if context.on_expired:
+            try:
+                context.on_expired(context)
+            except Exception as e:
+                logger.error(f"请求 {context.request_id} 丢弃回调失败: {str(e)}")
     
     def get_queue_status(self) -> Dict[str, Any]:
         """获取队列状态"""
@@ -158,6 +161,8 @@ class AIServiceManager:
                     'queue_utilization': round(queue_size / self.queue_size * 100, 1),
                     'processing_utilization': round(processing_count / self.max_concurrent_requests * 100, 1)
                 },
+                'queue_wait_by_priority': self.request_queue.get_wait_stats(),
+                'deadlines': deadline_stats.snapshot(),
                 'last_health_check': datetime.fromtimestamp(self.last_health_check).isoformat(),
                 'consecutive_failures': self.consecutive_failures
             }
@@ -204,6 +209,7 @@ class AIServiceManager:
                 if current_time - context.created_at > context.timeout:
                     logger.warning(f"请求超时，丢弃: {context.request_id}")
                     self.stats['failed_requests'] += 1
+                    self._drop_request(context, 'timeout')
                     continue
                 
                 # 开始处理请求
@@ -213,7 +219,9 @@ class AIServiceManager:
                 logger.info(f"工作线程 {worker_id} 开始处理请求: {context.request_id}")
                 
                 # 实际处理请求（这里需要调用AI分析服务）
+                started_at = time.time()
                 success = self._process_request(context, worker_id)
+                self.request_queue.record_service_time(time.time() - started_at)
                 
                 # 更新统计
                 processing_time = time.time() - context.created_at
@@ -268,6 +276,10 @@ class AIServiceManager:
             bool: 处理是否成功
         """
         try:
+            # 携带处理函数的请求（如异步分析任务）直接执行
+            if context.callback:
+                return bool(context.callback(context))
+            
             # 这里应该调用实际的AI分析服务
             # 为了演示，我们模拟处理时间
             
@@ -418,4 +430,10 @@ class AIServiceManager:
         logger.info("AI服务管理器正在关闭...")
 
 # 全局AI服务管理器实例
-ai_service_manager = AIServiceManager()
\ No newline at end of file
+ai_service_manager = AIServiceManager()
+
+# 异步分析任务专用实例：任务在独立的工作线程中执行，不与同步请求的准入排队共用工作线程
+analysis_job_scheduler = AIServiceManager(
+    max_concurrent_requests=int(os.environ.get('AI_ASYNC_JOB_WORKERS', 3)),
+    queue_size=int(os.environ.get('AI_ASYNC_JOB_QUEUE_SIZE', 50))
+)
\ No newline at end of file
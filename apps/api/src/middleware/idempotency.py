@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+提交接口幂等
+客户端在网关超时后重试提交时携带同一个 Idempotency-Key 请求头：
+- 键 → 执行状态和响应的映射保存在 idempotency_keys 表中（带过期时间，多个工作进程共享）；
+- 已完成的重复提交直接重放保存的响应，不再重新执行分析、不再创建重复记录；
+- 原请求仍在执行时，重复提交等待同一次执行完成后返回其响应（合并并发重复）；
+- 同一个键携带不同的请求内容时返回422。
+
+原请求以5xx或429结束（或抛出异常）时释放键，客户端重试会重新执行。
+"""
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Any, Dict, Optional, Tuple
+
+from flask import request, jsonify, current_app
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from ..models.base import db
+from ..models.idempotency import IdempotencyRecord, IDEMPOTENCY_IN_PROGRESS, IDEMPOTENCY_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# 需要随响应重放的响应头
+REPLAYED_RESPONSE_HEADERS = ('Location', 'Retry-After')
+# 默认配置（可通过应用配置覆盖）
+DEFAULT_TTL = 24 * 3600            # 键的保留时间（秒）
+DEFAULT_WAIT_TIMEOUT = 180.0       # 重复提交等待原请求完成的最长时间（秒），与同步分析超时一致
+DEFAULT_STALE_AFTER = 900.0        # 执行中的键超过该时间未完成视为原进程已退出，可被接管
+PURGE_INTERVAL = 600.0             # 清理过期键的最小间隔（秒）
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# begin() 的结果
+KEY_ACQUIRED = 'acquired'
+KEY_IN_PROGRESS = 'in_progress'
+KEY_COMPLETED = 'completed'
+KEY_MISMATCH = 'mismatch'
+
+
+class IdempotencyStore:
+    """幂等键的登记、完成、等待和统计（需要应用上下文）"""
+
+    def __init__(self, poll_interval: float = 0.25):
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._last_purge = 0.0
+        self.reset_stats()
+
+    def begin(self, scope: str, user_id: str, key: str, fingerprint: str,
+              ttl: float = DEFAULT_TTL, stale_after: float = DEFAULT_STALE_AFTER) -> Tuple[Optional[IdempotencyRecord], str]:
+        """
+        登记幂等键；键已存在时返回已有记录
+
+        过期的键，以及执行中但超过 stale_after 未更新的键会被删除后重新登记。
+
+        Returns:
+            tuple: (记录, KEY_ACQUIRED/KEY_IN_PROGRESS/KEY_COMPLETED/KEY_MISMATCH)
+        """
+        self._maybe_purge()
+        for _ in range(3):
+            now = datetime.utcnow()
+            record = IdempotencyRecord(
+                scope=scope, user_id=user_id, idempotency_key=key, request_fingerprint=fingerprint,
+                status=IDEMPOTENCY_IN_PROGRESS, replay_count=0, expires_at=now + timedelta(seconds=ttl)
+            )
+            try:
+                db.session.add(record)
+                db.session.commit()
+                return record, KEY_ACQUIRED
+            except IntegrityError:
+                db.session.rollback()
+
+            existing = self._find(scope, user_id, key)
+            if existing is None:
+                continue  # 已被删除（原请求释放了键），重新登记
+            stale = (existing.status == IDEMPOTENCY_IN_PROGRESS and
+                     existing.updated_at is not None and
+                     existing.updated_at.replace(tzinfo=None) <= now - timedelta(seconds=stale_after))
+            if existing.is_expired(now) or stale:
+                self._delete(existing)
+                continue
+            if existing.request_fingerprint != fingerprint:
+                return existing, KEY_MISMATCH
+            return existing, KEY_COMPLETED if existing.completed else KEY_IN_PROGRESS
+        raise RuntimeError(f'无法登记幂等键 {scope}:{key}')
+
+    def complete(self, record: IdempotencyRecord, status_code: int, body: Any, headers: Dict[str, str] = None):
+        """保存响应；5xx/429 等可重试的结果不保存，释放键以便重试重新执行"""
+        if status_code >= 500 or status_code == 429 or body is None:
+            self.release(record)
+            return
+        try:
+            record.status = IDEMPOTENCY_COMPLETED
+            record.status_code = status_code
+            record.response_body = body
+            record.response_headers = headers or {}
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"⚠️ 保存幂等键 {record.idempotency_key} 的响应失败: {str(e)}")
+        self._notify()
+
+    def release(self, record: IdempotencyRecord):
+        """释放执行失败的键"""
+        self._delete(record)
+        self._notify()
+
+    def wait_for_completion(self, scope: str, user_id: str, key: str,
+                            timeout: float) -> Optional[IdempotencyRecord]:
+        """
+        等待执行中的键完成，最多等待 timeout 秒
+
+        同一进程内的完成通过条件变量立即唤醒，其他进程按轮询间隔读取数据库。
+
+        Returns:
+            Optional[IdempotencyRecord]: 最新的记录；键已被释放时返回None
+        """
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            db.session.expire_all()
+            record = self._find(scope, user_id, key)
+            if record is None or record.completed:
+                return record
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return record
+            # 等待期间不占用数据库连接（记录的字段已加载，可在会话关闭后读取）
+            db.session.close()
+            with self._condition:
+                self._condition.wait(min(self.poll_interval, remaining))
+
+    def record_replay(self, record: IdempotencyRecord, outcome: str):
+        """记录一次被吸收的重复提交（outcome: replayed/coalesced/mismatched/conflicted）"""
+        with self._stats_lock:
+            self.stats[outcome] += 1
+            by_scope = self.stats['by_scope'].setdefault(record.scope, {})
+            by_scope[outcome] = by_scope.get(outcome, 0) + 1
+        if outcome not in ('replayed', 'coalesced'):
+            return
+        try:
+            IdempotencyRecord.query.filter_by(id=record.id).update(
+                {IdempotencyRecord.replay_count: IdempotencyRecord.replay_count + 1},
+                synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"⚠️ 更新幂等键重放次数失败: {str(e)}")
+
+    def record_executed(self, scope: str):
+        with self._stats_lock:
+            self.stats['executed'] += 1
+            by_scope = self.stats['by_scope'].setdefault(scope, {})
+            by_scope['executed'] = by_scope.get('executed', 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """被吸收的重复提交统计：本进程的分类计数，以及数据库中未过期键累计的重放次数（所有进程）"""
+        with self._stats_lock:
+            process = {key: value for key, value in self.stats.items() if key != 'by_scope'}
+            process['by_scope'] = {scope: dict(counts) for scope, counts in self.stats['by_scope'].items()}
+        rows = db.session.query(
+            IdempotencyRecord.scope,
+            func.count(IdempotencyRecord.id),
+            func.coalesce(func.sum(IdempotencyRecord.replay_count), 0)
+        ).filter(IdempotencyRecord.expires_at > datetime.utcnow()).group_by(IdempotencyRecord.scope).all()
+        return {
+            'duplicates_absorbed': sum(int(absorbed) for _, _, absorbed in rows),
+            'by_scope': {scope: {'active_keys': count, 'duplicates_absorbed': int(absorbed)}
+                         for scope, count, absorbed in rows},
+            'process': process
+        }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.stats = {'executed': 0, 'replayed': 0, 'coalesced': 0,
+                          'mismatched': 0, 'conflicted': 0, 'by_scope': {}}
+
+    def purge_expired(self) -> int:
+        """删除过期的键，返回删除数量"""
+        try:
+            deleted = IdempotencyRecord.query.filter(
+                IdempotencyRecord.expires_at <= datetime.utcnow()).delete(synchronize_session=False)
+            db.session.commit()
+            return deleted
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"⚠️ 清理过期幂等键失败: {str(e)}")
+            return 0
+
+    def _maybe_purge(self):
+        now = time.monotonic()
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        deleted = self.purge_expired()
+        if deleted:
+            logger.info(f"🧹 清理过期幂等键 {deleted} 个")
+
+    @staticmethod
+    def _find(scope: str, user_id: str, key: str) -> Optional[IdempotencyRecord]:
+        return IdempotencyRecord.query.filter_by(scope=scope, user_id=user_id, idempotency_key=key).first()
+
+    @staticmethod
+    def _delete(record: IdempotencyRecord):
+        try:
+            IdempotencyRecord.query.filter_by(id=record.id).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"⚠️ 删除幂等键 {record.idempotency_key} 失败: {str(e)}")
+
+    def _notify(self):
+        with self._condition:
+            self._condition.notify_all()
+
+
+def request_fingerprint() -> str:
+    """请求内容指纹：方法、路径、查询参数、表单字段和上传文件内容（或原始请求体）"""
+    hasher = hashlib.sha256()
+    hasher.update(f"{request.method} {request.path}\n".encode('utf-8'))
+    for name, value in sorted(request.args.items(multi=True)):
+        hasher.update(f"?{name}={value}\n".encode('utf-8'))
+
+    if request.files or request.form:
+        for name, value in sorted(request.form.items(multi=True)):
+            hasher.update(f"{name}={value}\n".encode('utf-8'))
+        for name, file in sorted(request.files.items(multi=True), key=lambda item: (item[0], item[1].filename or '')):
+            hasher.update(f"{name}:{file.filename}\n".encode('utf-8'))
+            stream = file.stream
+            stream.seek(0)
+            while True:
+                chunk = stream.read(HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+            stream.seek(0)
+    else:
+        hasher.update(request.get_data(cache=True))
+    return hasher.hexdigest()
+
+
+def _replay(record: IdempotencyRecord):
+    response = jsonify(record.response_body)
+    response.status_code = record.status_code
+    for name, value in (record.response_headers or {}).items():
+        response.headers[name] = value
+    response.headers[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(scope: str):
+    """
+    提交接口幂等装饰器（放在认证装饰器之后）
+
+    未携带 Idempotency-Key 请求头时按原样执行。
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = (request.headers.get(IDEMPOTENCY_HEADER) or '').strip()
+            if not key:
+                return f(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+            config = current_app.config
+            ttl = config.get('IDEMPOTENCY_KEY_TTL', DEFAULT_TTL)
+            wait_timeout = config.get('IDEMPOTENCY_WAIT_TIMEOUT', DEFAULT_WAIT_TIMEOUT)
+            stale_after = config.get('IDEMPOTENCY_STALE_AFTER', DEFAULT_STALE_AFTER)
+            user_id = str(get_jwt_identity())
+            fingerprint = request_fingerprint()
+            wait_deadline = time.monotonic() + wait_timeout
+
+            while True:
+                record, state = idempotency_store.begin(scope, user_id, key, fingerprint, ttl, stale_after)
+                if state == KEY_ACQUIRED:
+                    break
+                if state == KEY_MISMATCH:
+                    idempotency_store.record_replay(record, 'mismatched')
+                    return jsonify({
+                        'error': f'{IDEMPOTENCY_HEADER} was already used with a different request',
+                        'error_code': 'IDEMPOTENCY_KEY_REUSED'
+                    }), 422
+                if state == KEY_COMPLETED:
+                    idempotency_store.record_replay(record, 'replayed')
+                    logger.info(f"♻️ 重放幂等提交 {scope}:{key}")
+                    return _replay(record)
+
+                # 原请求仍在执行：等待同一次执行的结果
+                record = idempotency_store.wait_for_completion(
+                    scope, user_id, key, wait_deadline - time.monotonic())
+                if record is None:
+                    continue  # 原请求失败并释放了键，由本次请求重新执行
+                if record.completed:
+                    idempotency_store.record_replay(record, 'coalesced')
+                    logger.info(f"🔗 合并并发的幂等提交 {scope}:{key}")
+                    return _replay(record)
+                idempotency_store.record_replay(record, 'conflicted')
+                response = jsonify({
+                    'error': 'A request with this Idempotency-Key is still being processed',
+                    'error_code': 'IDEMPOTENCY_KEY_IN_PROGRESS'
+                })
+                response.status_code = 409
+                response.headers['Retry-After'] = '5'
+                return response
+
+            idempotency_store.record_executed(scope)
+            try:
+                response = current_app.make_response(f(*args, **kwargs))
+            except Exception:
+                idempotency_store.release(record)
+                raise
+            headers = {name: response.headers[name] for name in REPLAYED_RESPONSE_HEADERS if name in response.headers}
+            idempotency_store.complete(record, response.status_code,
+                                       response.get_json(silent=True) if response.is_json else None, headers)
+            return response
+        return decorated_function
+    return decorator
+
+
+# 全局幂等键存储实例
+idempotency_store = IdempotencyStore()
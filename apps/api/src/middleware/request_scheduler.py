@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+AI请求调度队列
+按优先级和用户加权公平排队的有界队列，替代先进先出的 Queue：
+
+- 排序键 = 用户虚拟开始时间 - 优先级 × 老化间隔。
+  每高一级优先级相当于提前 aging_interval 秒排队，低优先级请求等待足够久后
+  自然排到新来的高优先级请求之前（老化），不会被无限饿死；
+- 同一用户的请求按预估处理耗时 / 用户权重 推进该用户的虚拟时钟（加权公平排队），
+  单个用户一次提交大量请求时，其他用户的请求会穿插在其中，而不是排在全部之后；
+- 队列已满时淘汰优先级最低、排队最久的请求，为更高优先级的新请求腾出位置；
+  没有可淘汰的请求时拒绝新请求。淘汰（shed）和拒绝（rejected）分别计数；
+- 按优先级记录出队时的排队等待时间直方图。
+"""
+import heapq
+import itertools
+import threading
+import time
+from queue import Empty
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..services.analysis_tracing import LatencyHistogram
+
+MIN_PRIORITY = 1
+MAX_PRIORITY = 10
+
+
+class FairPriorityQueue:
+    """带老化和按用户加权公平排队的有界优先级队列（线程安全）"""
+
+    def __init__(self, maxsize: int = 50, aging_interval: float = 15.0,
+                 default_service_time: float = 10.0):
+        """
+        Args:
+            maxsize: 队列容量
+            aging_interval: 每一级优先级折算的排队秒数
+            default_service_time: 尚无完成记录时的单请求预估处理耗时（秒）
+        """
+        self.maxsize = maxsize
+        self.aging_interval = aging_interval
+        self.service_time_estimate = default_service_time
+        self.user_weights: Dict[Any, float] = {}
+
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._user_finish: Dict[Any, float] = {}
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self.wait_histograms: Dict[int, LatencyHistogram] = {}
+        self.shed_counts: Dict[int, int] = {}      # 已入队后被挤出的请求
+        self.rejected_counts: Dict[int, int] = {}  # 队列已满时未能入队的请求
+
+    # ---- 入队 / 出队 ----
+
+    def put(self, context) -> Tuple[bool, Optional[Any]]:
+        """
+        请求入队
+
+        Returns:
+            tuple: (是否入队, 为腾出位置被淘汰的请求)。队列已满且没有比新请求
+            优先级更低的请求时，新请求不入队。
+        """
+        priority = self.normalize_priority(context.priority)
+        with self._condition:
+            shed = None
+            if len(self._heap) >= self.maxsize:
+                shed = self._pop_shed_candidate(below=priority)
+                if shed is None:
+                    self.rejected_counts[priority] = self.rejected_counts.get(priority, 0) + 1
+                    return False, None
+
+            now = time.time()
+            arrival = min(context.created_at or now, now)
+            cost = self.estimate_cost(context.file_size) / self.user_weights.get(context.user_id, 1.0)
+            start = max(arrival, self._user_finish.get(context.user_id, 0.0))
+            self._user_finish[context.user_id] = start + cost
+            self._prune_user_clocks(now)
+
+            key = start - priority * self.aging_interval
+            heapq.heappush(self._heap, (key, next(self._seq), context))
+            self._condition.notify()
+            return True, shed
+
+    def get(self, timeout: float = None):
+        """取出排序键最小的请求；超时仍为空时抛出 queue.Empty"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            while not self._heap:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise Empty
+                self._condition.wait(remaining)
+            _, _, context = heapq.heappop(self._heap)
+            self._record_wait(context)
+            return context
+
+    def qsize(self) -> int:
+        with self._condition:
+            return len(self._heap)
+
+    def full(self) -> bool:
+        return self.qsize() >= self.maxsize
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    # ---- 调度参数 ----
+
+    @staticmethod
+    def normalize_priority(priority) -> int:
+        try:
+            return min(MAX_PRIORITY, max(MIN_PRIORITY, int(priority)))
+        except (TypeError, ValueError):
+            return MIN_PRIORITY
+
+    def set_user_weight(self, user_id, weight: float):
+        """设置用户权重（默认1.0），权重越大单位时间内获得的处理份额越多"""
+        with self._condition:
+            if weight and weight > 0:
+                self.user_weights[user_id] = float(weight)
+            else:
+                self.user_weights.pop(user_id, None)
+
+    def estimate_cost(self, file_size: int) -> float:
+        """预估请求处理耗时：平均处理耗时按文件大小放大（每10MB增加一倍）"""
+        return self.service_time_estimate * (1 + (file_size or 0) / (10 * 1024 * 1024))
+
+    def record_service_time(self, seconds: float):
+        """用实际处理耗时更新预估（指数移动平均）"""
+        with self._condition:
+            self.service_time_estimate = 0.8 * self.service_time_estimate + 0.2 * max(0.0, seconds)
+
+    # ---- 统计 ----
+
+    def get_wait_stats(self) -> Dict[str, Any]:
+        """按优先级返回排队等待时间的分位数、淘汰数、拒绝数和当前排队数"""
+        with self._condition:
+            queued: Dict[int, int] = {}
+            for _, _, context in self._heap:
+                priority = self.normalize_priority(context.priority)
+                queued[priority] = queued.get(priority, 0) + 1
+            priorities = sorted(set(self.wait_histograms) | set(self.shed_counts) | set(self.rejected_counts)
+                                | set(queued), reverse=True)
+            return {
+                str(priority): {
+                    **(self.wait_histograms[priority].snapshot() if priority in self.wait_histograms
+                       else LatencyHistogram().snapshot()),
+                    'shed': self.shed_counts.get(priority, 0),
+                    'rejected': self.rejected_counts.get(priority, 0),
+                    'queued': queued.get(priority, 0)
+                }
+                for priority in priorities
+            }
+
+    # ---- 内部方法 ----
+
+    def _pop_shed_candidate(self, below: int):
+        """移除优先级低于 below 的请求中优先级最低、排队最久的一个"""
+        candidates = [
+            (self.normalize_priority(context.priority), context.created_at, index)
+            for index, (_, _, context) in enumerate(self._heap)
+            if self.normalize_priority(context.priority) < below
+        ]
+        if not candidates:
+            return None
+        priority, _, index = min(candidates)
+        _, _, context = self._heap[index]
+        self._heap[index] = self._heap[-1]
+        self._heap.pop()
+        heapq.heapify(self._heap)
+        self.shed_counts[priority] = self.shed_counts.get(priority, 0) + 1
+        return context
+
+    def _record_wait(self, context):
+        priority = self.normalize_priority(context.priority)
+        histogram = self.wait_histograms.get(priority)
+        if histogram is None:
+            histogram = self.wait_histograms[priority] = LatencyHistogram()
+        histogram.observe(time.time() - context.created_at)
+
+    def _prune_user_clocks(self, now: float):
+        """清理已落后于当前时间的用户虚拟时钟（这些用户下次入队时从当前时间开始）"""
+        if len(self._user_finish) > 4 * self.maxsize:
+            self._user_finish = {user: finish for user, finish in self._user_finish.items() if finish > now}
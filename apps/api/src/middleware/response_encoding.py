@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+响应编码
+- JSON序列化：安装了 orjson 时用它替代标准库 json 编码器（输出UTF-8原文，不做 \\uXXXX 转义），
+  遇到 orjson 不支持的值时回退到 Flask 默认编码器；
+- 响应压缩：按 Accept-Encoding 协商对较大的 JSON 响应做 brotli（需安装 brotli）或 gzip 压缩。
+"""
+import gzip
+import logging
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIMETYPES = ('application/json',)
+DEFAULT_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """基于 orjson 的 JSON 提供者，行为与 DefaultJSONProvider 保持一致（键排序、日期格式、Decimal等）"""
+
+    def dumps(self, obj, **kwargs):
+        # 带格式化参数（调试模式缩进等）时交给标准库处理
+        if not ORJSON_AVAILABLE or kwargs.get('indent') is not None or kwargs.get('cls') is not None:
+            return super().dumps(obj, **kwargs)
+
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+        except (TypeError, orjson.JSONEncodeError):
+            # 超出64位的整数等 orjson 不支持的值
+            return super().dumps(obj, **kwargs)
+
+
+def negotiate_encoding(accept_encodings) -> str:
+    """根据 Accept-Encoding 选择压缩算法，优先 brotli；都不接受时返回 None"""
+    offered = ['br', 'gzip'] if BROTLI_AVAILABLE else ['gzip']
+    for encoding in offered:
+        if accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def compress_response(response, min_size: int = DEFAULT_MIN_SIZE):
+    """按请求的 Accept-Encoding 压缩响应体（原地修改并返回响应）"""
+    if (response.direct_passthrough or response.is_streamed or
+            response.status_code < 200 or response.status_code in (204, 206, 304) or
+            response.mimetype not in COMPRESSIBLE_MIMETYPES or
+            'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_response_encoding(app):
+    """注册 JSON 提供者和响应压缩"""
+    if ORJSON_AVAILABLE:
+        app.json = FastJSONProvider(app)
+    else:
+        logger.info("ℹ️ orjson 未安装，使用标准库 JSON 编码器")
+
+    min_size = app.config.get('RESPONSE_COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)
+
+    @app.after_request
+    def compress(response):
+        if not app.config.get('RESPONSE_COMPRESSION_ENABLED', True):
+            return response
+        return compress_response(response, min_size)
@@ -7,6 +7,8 @@ from .multi_quote import MultiQuote, MultiQuoteItem, MultiQuoteStatus
 from .settings import SystemSettings
 from .search import SearchLog, PopularSearch, SearchSuggestion, SearchAnalytics
 from .ai_analysis import AIAnalysisRecord, AIAnalysisSettings
+from .analysis_job import AnalysisJob
+from .idempotency import IdempotencyRecord
 from .learning_pattern import LearningPattern, LearningFeedback
 from .batch_analysis import BatchAnalysisJob, BatchAnalysisFile, BatchProcessingSummary
 from .document_comparison import (
@@ -18,7 +20,7 @@ __all__ = [
     'Quote', 'QuoteStatus', 
     'MultiQuote', 'MultiQuoteItem', 'MultiQuoteStatus', 'SystemSettings',
     'SearchLog', 'PopularSearch', 'SearchSuggestion', 'SearchAnalytics',
-    'AIAnalysisRecord', 'AIAnalysisSettings', 'LearningPattern', 'LearningFeedback',
+    'AIAnalysisRecord', 'AIAnalysisSettings', 'AnalysisJob', 'IdempotencyRecord', 'LearningPattern', 'LearningFeedback',
     'BatchAnalysisJob', 'BatchAnalysisFile', 'BatchProcessingSummary',
     'DocumentComparison', 'ComparisonDocument', 'ComparisonResult', 'ComparisonTemplate'
 ]
\ No newline at end of file
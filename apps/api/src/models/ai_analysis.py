@@ -148,9 +148,25 @@ class AIAnalysisRecord(BaseModel):
         else:
             return 'very_poor'
     
-    def to_dict(self):
-        """转换为字典"""
+    # 按需返回的大字段分组（?include=debug,text），列表等默认精简的响应中不返回
+    OPTIONAL_FIELD_GROUPS = {
+        'debug': ('quality_validation_report',),
+        'text': ('original_text',),
+    }
+    
+    def to_dict(self, include=None):
+        """
+        转换为字典
+        
+        Args:
+            include: 需要返回的可选字段分组（见 OPTIONAL_FIELD_GROUPS），None 表示返回全部字段
+        """
         data = super().to_dict()
+        excluded = set()
+        if include is not None:
+            for group, fields in self.OPTIONAL_FIELD_GROUPS.items():
+                if group not in include:
+                    excluded.update(fields)
         
         # 添加计算字段
         data['extracted_data'] = self.get_extracted_data()
@@ -164,6 +180,9 @@ class AIAnalysisRecord(BaseModel):
         data['quality_validation_report'] = self.get_quality_validation_report()
         data['data_quality_summary'] = self.get_data_quality_summary()
         
+        for field_name in excluded:
+            data.pop(field_name, None)
+        
         # 添加关联产品信息
         if self.created_product:
             data['created_product'] = {
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+单文档异步分析任务模型
+记录异步分析任务的状态、阶段进度事件、中间结果和最终结果，多个工作进程共享
+"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, JSON
+from .base import BaseModel
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+JOB_FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+# 每个任务保留的进度事件上限
+MAX_JOB_EVENTS = 200
+
+
+class AnalysisJob(BaseModel):
+    """单文档异步分析任务"""
+    __tablename__ = 'analysis_jobs'
+
+    job_id = Column(String(64), unique=True, nullable=False, index=True, comment='任务ID')
+    user_id = Column(String(100), nullable=True, index=True, comment='提交用户（JWT身份）')
+    filename = Column(String(255), comment='文件名')
+    file_size = Column(Integer, default=0, comment='文件大小(字节)')
+
+    status = Column(String(20), default=JOB_QUEUED, nullable=False, index=True, comment='任务状态')
+    current_stage = Column(String(50), comment='当前阶段')
+    progress = Column(Float, default=0.0, comment='进度百分比')
+    events = Column(JSON, comment='阶段进度事件')
+    partial_result = Column(JSON, comment='中间结果快照（按分区）')
+
+    analysis_id = Column(Integer, nullable=True, comment='分析记录ID')
+    status_code = Column(Integer, comment='同步模式下对应的HTTP状态码')
+    result = Column(JSON, comment='与同步接口一致的响应内容')
+    error_message = Column(Text, comment='错误信息')
+
+    started_at = Column(DateTime, comment='开始处理时间')
+    finished_at = Column(DateTime, comment='结束时间')
+
+    def __repr__(self):
+        return f'<AnalysisJob {self.job_id}: {self.status}>'
+
+    @property
+    def finished(self) -> bool:
+        return self.status in JOB_FINISHED_STATES
+
+    def get_events(self, since: int = 0) -> list:
+        """返回序号大于 since 的进度事件"""
+        return [event for event in (self.events or []) if event.get('seq', 0) > since]
+
+    def event_payload(self, event: dict) -> dict:
+        """推送用的事件内容：中间结果事件附带该分区的最新快照（事件本身不保存快照）"""
+        if event.get('type') != 'partial_result':
+            return event
+        return {**event, 'data': (self.partial_result or {}).get(event.get('section'))}
+
+    def to_dict(self, since: int = 0, include_result: bool = True):
+        """转换为字典；since 用于只返回新事件，成功结束前附带已得到的中间结果"""
+        data = {
+            'job_id': self.job_id,
+            'user_id': self.user_id,
+            'filename': self.filename,
+            'file_size': self.file_size,
+            'status': self.status,
+            'current_stage': self.current_stage,
+            'progress': round(self.progress or 0.0, 1),
+            'events': self.get_events(since),
+            'analysis_id': self.analysis_id,
+            'error_message': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if self.status != JOB_SUCCEEDED:
+            data['partial_result'] = self.partial_result or {}
+        if include_result and self.finished:
+            data['status_code'] = self.status_code
+            data['result'] = self.result
+        return data
+
+    def mark_running(self):
+        self.status = JOB_RUNNING
+        self.started_at = datetime.utcnow()
+        return self
+
+    def mark_cancelled(self, reason: str = None):
+        self.status = JOB_CANCELLED
+        self.error_message = reason or '分析任务已取消'
+        self.finished_at = datetime.utcnow()
+        return self
+
+    def mark_finished(self, result: dict, status_code: int):
+        self.status = JOB_SUCCEEDED if result.get('success') else JOB_FAILED
+        self.result = result
+        self.status_code = status_code
+        self.analysis_id = result.get('analysis_id')
+        self.error_message = result.get('error')
+        self.progress = 100.0 if self.status == JOB_SUCCEEDED else self.progress
+        self.finished_at = datetime.utcnow()
+        return self
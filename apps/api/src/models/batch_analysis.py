@@ -4,7 +4,8 @@
 存储批量处理任务和结果
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Boolean, ForeignKey, JSON, Enum
+from typing import List
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Boolean, ForeignKey, JSON, Enum, inspect, text
 from sqlalchemy.orm import relationship
 from .base import BaseModel
 import enum
@@ -236,6 +237,13 @@ class BatchAnalysisFile(BaseModel):
     confidence_score = Column(Float, comment='置信度分数')
     error_message = Column(Text, comment='错误信息')
     
+    # 持久化任务队列（见 services/batch_queue.py）：待分析的文本保存在队列内容目录，租约由工作进程持有
+    content_ref = Column(String(64), comment='待分析文本在队列内容目录中的引用（SHA-256）')
+    attempts = Column(Integer, default=0, comment='已租用次数')
+    lease_owner = Column(String(100), comment='持有租约的工作进程')
+    lease_token = Column(String(36), comment='租约令牌')
+    lease_expires_at = Column(DateTime, index=True, comment='租约到期时间')
+    
     # 元数据
     created_at = Column(DateTime, default=datetime.utcnow, comment='创建时间')
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment='更新时间')
@@ -261,6 +269,8 @@ class BatchAnalysisFile(BaseModel):
             'processing_duration': self.processing_duration,
             'confidence_score': self.confidence_score,
             'error_message': self.error_message,
+            'attempts': self.attempts or 0,
+            'lease_owner': self.lease_owner,
             'has_result': self.analysis_result is not None,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
@@ -500,4 +510,47 @@ class BatchProcessingSummary(BaseModel):
             # 简单错误统计（实际实现可以更复杂）
             summary.common_errors = list(set(error_messages))[:10]  # 前10个不重复错误
         
-        return summary
\ No newline at end of file
+        return summary
+
+# 持久化任务队列字段：在 batch_analysis_files 表创建之后加入，db.create_all() 不会为已有的表补齐
+QUEUE_COLUMNS = ('content_ref', 'attempts', 'lease_owner', 'lease_token', 'lease_expires_at')
+
+
+def ensure_batch_queue_columns(engine) -> List[str]:
+    """
+    为已有的 batch_analysis_files 表补齐持久化队列字段和租约到期索引（幂等，应用启动时执行）
+
+    多个进程同时启动时可能并发执行，字段已被其他进程添加导致的失败会被忽略。
+
+    Returns:
+        List[str]: 本次新增的字段
+    """
+    table = BatchAnalysisFile.__table__
+    inspector = inspect(engine)
+    if not inspector.has_table(table.name):
+        return []
+
+    def existing_columns():
+        return {column['name'] for column in inspect(engine).get_columns(table.name)}
+
+    missing = [name for name in QUEUE_COLUMNS if name not in existing_columns()]
+    for name in missing:
+        ddl = f"{name} {table.c[name].type.compile(dialect=engine.dialect)}"
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                if name == 'attempts':
+                    conn.execute(text(f"UPDATE {table.name} SET attempts = 0"))
+        except Exception:
+            if name not in existing_columns():
+                raise
+
+    index_names = {index['name'] for index in inspect(engine).get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in index_names and any(column.name in QUEUE_COLUMNS for column in index.columns):
+            try:
+                index.create(bind=engine)
+            except Exception:
+                if index.name not in {i['name'] for i in inspect(engine).get_indexes(table.name)}:
+                    raise
+    return missing
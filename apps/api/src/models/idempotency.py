@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+幂等键模型
+记录提交接口的 Idempotency-Key → 执行状态和响应的映射（带过期时间），多个工作进程共享
+"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, JSON, UniqueConstraint
+from .base import BaseModel
+
+# 幂等键状态
+IDEMPOTENCY_IN_PROGRESS = 'in_progress'
+IDEMPOTENCY_COMPLETED = 'completed'
+
+
+class IdempotencyRecord(BaseModel):
+    """提交接口的幂等键"""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        UniqueConstraint('scope', 'user_id', 'idempotency_key', name='uq_idempotency_scope_user_key'),
+    )
+
+    scope = Column(String(100), nullable=False, comment='接口范围（如 ai_analysis.analyze_document）')
+    user_id = Column(String(100), nullable=False, comment='提交用户（JWT身份）')
+    idempotency_key = Column(String(255), nullable=False, comment='客户端提供的幂等键')
+    request_fingerprint = Column(String(64), nullable=False, comment='请求内容指纹（SHA-256）')
+
+    status = Column(String(20), default=IDEMPOTENCY_IN_PROGRESS, nullable=False, comment='执行状态')
+    status_code = Column(Integer, comment='响应状态码')
+    response_body = Column(JSON, comment='响应内容')
+    response_headers = Column(JSON, comment='需要重放的响应头（如 Location）')
+    replay_count = Column(Integer, default=0, nullable=False, comment='被吸收的重复提交次数')
+
+    expires_at = Column(DateTime, nullable=False, index=True, comment='过期时间')
+
+    def __repr__(self):
+        return f'<IdempotencyRecord {self.scope}:{self.idempotency_key} {self.status}>'
+
+    @property
+    def completed(self) -> bool:
+        return self.status == IDEMPOTENCY_COMPLETED
+
+    def is_expired(self, now: datetime = None) -> bool:
+        return self.expires_at <= (now or datetime.utcnow())
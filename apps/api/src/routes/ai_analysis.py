@@ -4,18 +4,30 @@ AI分析路由
 提供AI文档分析和产品信息提取的API端点
 """
 import os
+import json
 import logging
 import time
 import uuid
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from marshmallow import Schema, fields, ValidationError, validate
 
 from src.models import db, Product, AIAnalysisRecord
 from src.utils.decorators import require_role, require_auth, get_current_user
 from src.services.ai_analyzer import AIAnalyzer
+from src.services.extraction_cache import extraction_cache
+from src.services.near_duplicate_index import near_duplicate_index
+from src.services.analysis_tracing import analysis_tracer, file_type_of
+from src.services.analysis_jobs import analysis_job_manager
+from src.services.deadline import Deadline, deadline_scope
+from src.services.cancellation import (
+    CancellationToken, cancellation_scope, cancellation_registry, cancellation_stats
+)
+from src.services.memory_accounting import get_memory_report
+from src.utils.spooled_upload import SpooledUpload, UploadTooLargeError
 from src.middleware.performance_monitor import performance_monitor, monitor_performance
-from src.middleware.ai_service_manager import ai_service_manager, RequestContext
+from src.middleware.ai_service_manager import ai_service_manager, analysis_job_scheduler, RequestContext
+from src.middleware.idempotency import idempotent, idempotency_store
 
 logger = logging.getLogger(__name__)
 ai_analysis_bp = Blueprint('ai_analysis', __name__)
@@ -23,6 +35,17 @@ ai_analysis_bp = Blueprint('ai_analysis', __name__)
 # 初始化AI分析器
 ai_analyzer = AIAnalyzer()
 
+# 异步任务在任务调度队列中的最长等待时间（秒）；客户端不阻塞，可比同步请求更长
+ASYNC_JOB_QUEUE_TIMEOUT = float(os.environ.get('AI_ASYNC_JOB_QUEUE_TIMEOUT', 600))
+# 异步任务开始执行后的分析预算（秒）
+ASYNC_JOB_ANALYSIS_TIMEOUT = float(os.environ.get('AI_ASYNC_JOB_ANALYSIS_TIMEOUT', 300))
+# 长轮询单次最长等待、SSE单次连接最长时长（秒），超过后客户端重新请求
+JOB_LONG_POLL_MAX_WAIT = 30.0
+JOB_EVENT_STREAM_MAX_DURATION = 300.0
+JOB_EVENT_KEEPALIVE = 15.0
+# 可按需返回的响应字段分组（?include=debug,text），默认返回精简结果
+RESPONSE_INCLUDE_GROUPS = ('debug', 'text')
+
 def safe_string_conversion(value, default=''):
     """
     安全地将任意值转换为字符串
@@ -305,11 +328,18 @@ def get_supported_formats():
 @ai_analysis_bp.route('/analyze-document', methods=['POST'])
 @jwt_required()
 @require_role('engineer', 'admin', 'manager')
+@idempotent('ai_analysis.analyze_document')
 @monitor_performance
 def analyze_document():
-    """分析产品文档，提取产品信息 - 增强版本"""
+    """
+    分析产品文档，提取产品信息 - 增强版本
+    
+    默认返回精简结果，?include=debug 附带调试信息和质量验证报告，?include=text 附带文本预览
+    携带 Idempotency-Key 请求头时，网关超时后的重试返回同一次分析（或异步任务）的结果
+    """
     request_id = str(uuid.uuid4())
     start_time = time.time()
+    upload = None
     
     try:
         # 检查是否有文件上传
@@ -323,9 +353,17 @@ def analyze_document():
         # 获取当前用户
         current_user_id = get_jwt_identity()
         
-        # 获取文件信息
-        file_size = len(file.read())
-        file.seek(0)  # 重置文件指针
+        # 获取文件信息：流式读取一次，同时计算内容哈希和检查大小，
+        # 之后各阶段共享同一个只读缓冲区（大文件为临时文件mmap）
+        try:
+            upload = SpooledUpload.from_file_storage(
+                file, max_size=ai_analyzer.document_processor.max_file_size
+            )
+        except UploadTooLargeError as e:
+            return jsonify({'success': False, 'error': str(e)}), 413
+        file_size = upload.size
+        content_hash = upload.content_hash
+        file = upload.as_file_storage()
         file_type = file.content_type or 'unknown'
         
         logger.info(f"🚀 AI分析请求 {request_id}: 文件={file.filename}, 大小={file_size}bytes, 用户={current_user_id}")
@@ -370,6 +408,14 @@ def analyze_document():
                     'recommendations': ai_service_manager.get_service_recommendations()
                 }), 429
         
+        # 🕓 异步模式：登记任务后立即返回202，分析在异步任务调度器的工作线程中执行
+        if _wants_async():
+            response, handed_off = _submit_analysis_job(upload, context, service_status, start_time,
+                                                        include=_requested_includes())
+            if handed_off:
+                upload = None  # 上传缓冲区由任务负责释放
+            return response
+        
         # 🎯 提交到AI服务管理器队列
         queued = ai_service_manager.submit_analysis_request(context)
         if not queued:
@@ -381,64 +427,17 @@ def analyze_document():
                 'recommendations': ai_service_manager.get_service_recommendations()
             }), 429
         
-        # ⚡ 直接处理（在实际实现中，这里应该是异步处理）
-        # 为了保持API兼容性，我们仍然同步处理
+        # ⚡ 同步模式：在当前请求中直接处理（可使用异步模式避免长时间占用工作线程）
+        # 截止时间从收到请求起算，各阶段按剩余预算确定超时，客户端放弃后不再继续占用工作线程
         logger.info(f"🔄 开始处理AI分析请求 {request_id}")
-        
-        # 使用AI分析器处理文档（包含用户ID以获得个性化分析）
-        analysis_result = ai_analyzer.analyze_product_document(file, user_id=current_user_id)
-        
-        # 📝 保存分析记录到数据库
-        analysis_record = AIAnalysisRecord.create_from_analysis(
-            analysis_result,
-            user_id=current_user_id
-        )
-        analysis_record.save()
-        
-        # ✅ 验证分析结果
-        validation = ai_analyzer.validate_analysis_result(analysis_result)
-        
-        # 📋 生成分析摘要
-        summary = ai_analyzer.generate_analysis_summary(analysis_result)
-        
-        # 📊 记录性能指标
-        processing_time = time.time() - start_time
-        performance_monitor.record_request(
-            endpoint='/ai-analysis/analyze-document',
-            method='POST',
-            duration=processing_time,
-            status_code=200 if analysis_result.get('success') else 400
+        response_data, status_code = _execute_analysis(
+            file, current_user_id, content_hash, file_size, request_id, start_time, service_status,
+            include=_requested_includes(),
+            deadline=Deadline(_request_budget(context.timeout), started_at=start_time)
         )
-        
-        # 📤 构建响应
-        response_data = {
-            'success': analysis_result.get('success', False),
-            'request_id': request_id,
-            'analysis_id': analysis_record.id,
-            'document_info': analysis_result.get('document_info', {}),
-            'extracted_data': analysis_result.get('extracted_data', {}),
-            'confidence_scores': analysis_result.get('confidence_scores', {}),
-            'personalized_hints': analysis_result.get('personalized_hints', []),
-            'predicted_modifications': analysis_result.get('predicted_modifications', {}),
-            'validation': validation,
-            'summary': summary,
-            'text_preview': analysis_result.get('text_preview', ''),
-            'analysis_timestamp': analysis_result.get('analysis_timestamp'),
-            'processing_time': round(processing_time, 2),
-            'service_status': service_status,
-            'queue_info': {
-                'queue_size': ai_service_manager.get_queue_status()['queue_size'],
-                'processing_count': len(ai_service_manager.get_processing_requests())
-            }
-        }
-        
-        if not analysis_result.get('success'):
-            response_data['error'] = analysis_result.get('error')
-            logger.warning(f"⚠️ AI分析失败 {request_id}: {analysis_result.get('error')}")
-            return jsonify(response_data), 400
-        
-        logger.info(f"✅ AI分析成功完成 {request_id}: 记录ID={analysis_record.id}, 耗时={processing_time:.2f}s")
-        return jsonify(response_data), 200
+        if response_data.get('retry_after'):
+            return jsonify(response_data), status_code, {'Retry-After': str(response_data['retry_after'])}
+        return jsonify(response_data), status_code
         
     except Exception as e:
         processing_time = time.time() - start_time
@@ -462,6 +461,355 @@ def analyze_document():
             'processing_time': round(processing_time, 2),
             'service_status': ai_service_manager.get_queue_status()['service_status']
         }), 500
+    finally:
+        if upload is not None:
+            upload.close()
+
+def _requested_includes() -> frozenset:
+    """解析 ?include=debug,text（或表单字段 include），all 表示全部分组；未知分组忽略"""
+    raw = request.args.get('include') or request.form.get('include') or ''
+    requested = {item.strip().lower() for item in raw.split(',') if item.strip()}
+    if 'all' in requested:
+        return frozenset(RESPONSE_INCLUDE_GROUPS)
+    return frozenset(requested & set(RESPONSE_INCLUDE_GROUPS))
+
+def _request_budget(default: float) -> float:
+    """同步请求的处理预算：默认为请求超时，客户端可用 X-Request-Timeout 请求头（秒）进一步缩短"""
+    try:
+        requested = float(request.headers.get('X-Request-Timeout', ''))
+    except ValueError:
+        return default
+    return min(default, requested) if requested > 0 else default
+
+def _wants_async() -> bool:
+    """是否使用异步模式：?async=true、表单字段 async=true 或请求头 Prefer: respond-async"""
+    flag = (request.args.get('async') or request.form.get('async') or '').lower()
+    return flag in ('1', 'true', 'yes') or 'respond-async' in request.headers.get('Prefer', '').lower()
+
+def _execute_analysis(file, user_id, content_hash, file_size, request_id, start_time, service_status,
+                      progress_callback=None, include=frozenset(), deadline=None, cancellation=None):
+    """
+    执行文档分析并保存分析记录（同步请求和异步任务共用）
+    
+    Args:
+        include: 响应中需要附带的可选分组（debug: 调试信息和质量验证报告，text: 文本预览）
+        deadline: 请求截止时间，传递给分析各阶段、文档处理和大模型调用
+        cancellation: 取消令牌（异步任务），默认新建一个只用于统计大模型用量的令牌
+    
+    Returns:
+        tuple: (响应内容, HTTP状态码)；被取消时不保存分析记录
+    """
+    # 整个请求作为追踪根span，分析各阶段和数据库写入都挂在其下
+    with analysis_tracer.span('analyze_request', file_type=file_type_of(file.filename),
+                              request_id=request_id, file_size=file_size):
+        # 使用AI分析器处理文档（包含用户ID以获得个性化分析）
+        with deadline_scope(deadline), cancellation_scope(cancellation or CancellationToken('analysis')):
+            analysis_result = ai_analyzer.analyze_product_document(
+                file, user_id=user_id, content_hash=content_hash,
+                progress_callback=progress_callback
+            )
+        
+        if analysis_result.get('error_type') == 'cancelled':
+            logger.info(f"🛑 AI分析已取消 {request_id}")
+            return {
+                'success': False,
+                'request_id': request_id,
+                'error': analysis_result.get('error'),
+                'error_type': 'cancelled',
+                'processing_time': round(time.time() - start_time, 2)
+            }, 409
+        
+        if analysis_result.get('error_type') == 'memory_limit':
+            # 内存准入拒绝：文档尚未处理，不保存分析记录，客户端按 retry_after 重试
+            logger.warning(f"🧠 AI分析因内存上限被拒绝 {request_id}")
+            return {
+                'success': False,
+                'request_id': request_id,
+                'error': analysis_result.get('error'),
+                'error_type': 'memory_limit',
+                'error_details': analysis_result.get('error_details', []),
+                'retry_after': analysis_result.get('retry_after'),
+                'processing_time': round(time.time() - start_time, 2)
+            }, 503
+        
+        near_duplicate = analysis_result.pop('near_duplicate', None) or {}
+        
+        # 📝 保存分析记录到数据库
+        with analysis_tracer.span('db_write', target='ai_analysis_records'):
+            analysis_record = AIAnalysisRecord.create_from_analysis(
+                analysis_result,
+                user_id=user_id
+            )
+            analysis_record.save()
+        
+        # 🔍 登记文档指纹，后续近重复文档可复用本次结果
+        if analysis_result.get('success') and near_duplicate.get('fingerprint'):
+            with analysis_tracer.span('db_write', target='near_duplicate_index'):
+                near_duplicate_index.add(analysis_record.id, near_duplicate['fingerprint'], user_id=user_id)
+    
+    # ✅ 验证分析结果
+    validation = ai_analyzer.validate_analysis_result(analysis_result)
+    
+    # 📋 生成分析摘要
+    summary = ai_analyzer.generate_analysis_summary(analysis_result)
+    
+    # 📊 记录性能指标
+    processing_time = time.time() - start_time
+    performance_monitor.record_request(
+        endpoint='/ai-analysis/analyze-document',
+        method='POST',
+        duration=processing_time,
+        status_code=200 if analysis_result.get('success') else 400
+    )
+    
+    # 📤 构建响应
+    response_data = {
+        'success': analysis_result.get('success', False),
+        'request_id': request_id,
+        'analysis_id': analysis_record.id,
+        'document_info': analysis_result.get('document_info', {}),
+        'extracted_data': analysis_result.get('extracted_data', {}),
+        'confidence_scores': analysis_result.get('confidence_scores', {}),
+        'personalized_hints': analysis_result.get('personalized_hints', []),
+        'predicted_modifications': analysis_result.get('predicted_modifications', {}),
+        'validation': validation,
+        'summary': summary,
+        'analysis_timestamp': analysis_result.get('analysis_timestamp'),
+        'near_duplicate': {
+            key: value for key, value in near_duplicate.items() if key != 'fingerprint'
+        },
+        'processing_time': round(processing_time, 2),
+        'service_status': service_status,
+        'queue_info': {
+            'queue_size': ai_service_manager.get_queue_status()['queue_size'],
+            'processing_count': len(ai_service_manager.get_processing_requests())
+        }
+    }
+    if 'text' in include:
+        response_data['text_preview'] = analysis_result.get('text_preview', '')
+    if 'debug' in include:
+        response_data['debug_info'] = analysis_result.get('debug_info', {})
+        response_data['validation_report'] = analysis_result.get('validation_report', {})
+    
+    if not analysis_result.get('success'):
+        response_data['error'] = analysis_result.get('error')
+        logger.warning(f"⚠️ AI分析失败 {request_id}: {analysis_result.get('error')}")
+        # 超过请求截止时间而提前终止
+        if analysis_result.get('error_type') == 'deadline_exceeded':
+            response_data['error_type'] = 'deadline_exceeded'
+            return response_data, 504
+        return response_data, 400
+    
+    logger.info(f"✅ AI分析成功完成 {request_id}: 记录ID={analysis_record.id}, 耗时={processing_time:.2f}s")
+    return response_data, 200
+
+def _submit_analysis_job(upload, context, service_status, start_time, include=frozenset()):
+    """
+    登记异步分析任务并提交到异步任务调度器
+    
+    任务使用独立的工作线程，不与同步请求占用的AI服务管理器工作线程共用。
+    提交成功后上传缓冲区的所有权转交给任务，由任务结束（或排队超时）时释放。
+    
+    Returns:
+        tuple: (响应, 上传缓冲区是否已转交给任务)
+    """
+    job = analysis_job_manager.create_job(context.user_id, upload.filename, upload.size)
+    job_id = job.job_id
+    app = current_app._get_current_object()
+    
+    def run(ctx):
+        with app.app_context():
+            # 取消接口通过任务ID找到令牌，中断正在进行的大模型调用
+            token = cancellation_registry.register('analysis', job_id, CancellationToken('analysis'))
+            try:
+                if not analysis_job_manager.mark_running(job_id):
+                    logger.info(f"🛑 异步AI分析任务 {job_id} 在排队期间已取消，不再执行")
+                    return True
+                response_data, status_code = _execute_analysis(
+                    upload.as_file_storage(), ctx.user_id, upload.content_hash, upload.size,
+                    ctx.request_id, start_time, service_status,
+                    progress_callback=analysis_job_manager.progress_listener(app, job_id),
+                    include=include,
+                    deadline=Deadline(ASYNC_JOB_ANALYSIS_TIMEOUT),
+                    cancellation=token
+                )
+                if response_data.get('error_type') != 'cancelled':
+                    analysis_job_manager.finish(job_id, response_data, status_code)
+                # 文档本身无法分析（4xx）不计为调度器的处理失败，避免调度器因连续失败拒绝新任务
+                return status_code < 500
+            except Exception as e:
+                logger.error(f"💥 异步AI分析任务异常 {job_id}: {str(e)}")
+                analysis_job_manager.finish(job_id, {
+                    'success': False,
+                    'request_id': ctx.request_id,
+                    'error': f'AI分析失败: {str(e)}'
+                }, 500)
+                return False
+            finally:
+                cancellation_registry.unregister('analysis', job_id, token)
+                upload.close()
+    
+    def expired(ctx):
+        reason = '队列已满，被更高优先级的请求挤出' if ctx.drop_reason == 'shed' else '排队超时'
+        with app.app_context():
+            analysis_job_manager.fail(job_id, f'AI分析任务{reason}，请稍后重试')
+        upload.close()
+    
+    context.callback = run
+    context.on_expired = expired
+    context.timeout = ASYNC_JOB_QUEUE_TIMEOUT
+    
+    if not analysis_job_scheduler.submit_analysis_request(context):
+        analysis_job_manager.fail(job_id, 'AI分析队列已满，请稍后重试')
+        response = jsonify({
+            'success': False,
+            'error': 'AI分析队列已满，请稍后重试',
+            'job_id': job_id,
+            'recommendations': ai_service_manager.get_service_recommendations()
+        })
+        response.status_code = 429
+        return response, False
+    
+    logger.info(f"📨 异步AI分析任务已提交 {job_id} (请求 {context.request_id})")
+    
+    status_url = url_for('ai_analysis.get_analysis_job', job_id=job_id)
+    response = jsonify({
+        'success': True,
+        'job_id': job_id,
+        'request_id': context.request_id,
+        'status': job.status,
+        'status_url': status_url,
+        'events_url': f"{status_url}/events",
+        'service_status': service_status,
+        'queue_info': {
+            'queue_size': analysis_job_scheduler.get_queue_status()['queue_size'],
+            'processing_count': len(analysis_job_scheduler.get_processing_requests())
+        }
+    })
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response, True
+
+def _get_accessible_job(job_id):
+    """读取任务并检查访问权限：提交者本人，或管理员/经理"""
+    job = analysis_job_manager.get_job(job_id)
+    if job is None:
+        return None, (jsonify({'error': 'Analysis job not found'}), 404)
+    if job.user_id != str(get_jwt_identity()):
+        user = get_current_user()
+        if not user or user.role not in ('admin', 'manager'):
+            return None, (jsonify({'error': 'Access denied'}), 403)
+    return job, None
+
+@ai_analysis_bp.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+@require_auth
+def get_analysis_job(job_id):
+    """
+    查询异步分析任务状态
+    
+    Query:
+        since: 只返回序号大于该值的进度事件
+        wait: 长轮询等待秒数（最多30秒），有新事件或任务结束时立即返回
+    
+    任务成功结束前，partial_result 字段包含已得到的中间结果（按分区）。
+    """
+    try:
+        job, error_response = _get_accessible_job(job_id)
+        if error_response:
+            return error_response
+        
+        since = request.args.get('since', 0, type=int)
+        wait = min(max(request.args.get('wait', 0, type=float), 0.0), JOB_LONG_POLL_MAX_WAIT)
+        if wait and not job.finished and not job.get_events(since):
+            job = analysis_job_manager.wait_for_update(job_id, since, wait)
+        
+        return jsonify({
+            'success': True,
+            'job': job.to_dict(since=since)
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting analysis job {job_id}: {str(e)}")
+        return jsonify({'error': 'Failed to get analysis job'}), 500
+
+@ai_analysis_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+@jwt_required()
+@require_auth
+def cancel_analysis_job(job_id):
+    """
+    取消异步分析任务
+    
+    排队中的任务不再执行；执行中的任务不再提交后续阶段，正在进行的大模型调用连接被关闭，
+    不保存分析记录。已结束的任务返回409。
+    """
+    try:
+        job, error_response = _get_accessible_job(job_id)
+        if error_response:
+            return error_response
+        
+        data = request.get_json(silent=True) or {}
+        reason = data.get('reason') or '用户取消'
+        if not analysis_job_manager.cancel(job_id, reason):
+            return jsonify({
+                'success': False,
+                'error': f'Analysis job already {job.status}'
+            }), 409
+        
+        logger.info(f"🛑 异步AI分析任务已取消 {job_id}: {reason}")
+        return jsonify({
+            'success': True,
+            'job': analysis_job_manager.get_job(job_id).to_dict(include_result=False)
+        })
+        
+    except Exception as e:
+        logger.error(f"Error cancelling analysis job {job_id}: {str(e)}")
+        return jsonify({'error': 'Failed to cancel analysis job'}), 500
+
+@ai_analysis_bp.route('/jobs/<job_id>/events', methods=['GET'])
+@jwt_required()
+@require_auth
+def stream_analysis_job_events(job_id):
+    """
+    以 Server-Sent Events 推送异步分析任务的阶段进度
+    
+    每个事件的 id 为事件序号，断线重连时通过 Last-Event-ID（或 ?since=）续传；
+    partial_result 事件附带该分区的中间结果快照（基础信息、表格规格、完整规格、质量评分）；
+    任务结束时发送 done 事件（内容同任务查询接口）后关闭连接。
+    """
+    job, error_response = _get_accessible_job(job_id)
+    if error_response:
+        return error_response
+    
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', 0, type=int)
+    
+    def generate(since):
+        deadline = time.monotonic() + JOB_EVENT_STREAM_MAX_DURATION
+        last_sent = time.monotonic()
+        while True:
+            job = analysis_job_manager.wait_for_update(job_id, since, JOB_EVENT_KEEPALIVE)
+            if job is None:
+                return
+            for event in job.get_events(since):
+                since = event['seq']
+                yield (f"id: {since}\nevent: {event.get('type', 'message')}\n"
+                       f"data: {json.dumps(job.event_payload(event), ensure_ascii=False)}\n\n")
+                last_sent = time.monotonic()
+            if job.finished:
+                yield f"event: done\ndata: {json.dumps(job.to_dict(since=since), ensure_ascii=False)}\n\n"
+                return
+            if time.monotonic() >= deadline:
+                return
+            if time.monotonic() - last_sent >= JOB_EVENT_KEEPALIVE:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+    
+    response = Response(stream_with_context(generate(since)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @ai_analysis_bp.route('/analysis/<int:analysis_id>', methods=['GET'])
 @jwt_required()
@@ -473,7 +821,7 @@ def get_analysis_result(analysis_id):
         
         return jsonify({
             'success': True,
-            'analysis': analysis_record.to_dict()
+            'analysis': analysis_record.to_dict(include=_requested_includes())
         })
         
     except Exception as e:
@@ -758,7 +1106,7 @@ def create_product_from_analysis():
 @jwt_required()
 @require_auth
 def get_analysis_history():
-    """获取AI分析历史记录"""
+    """获取AI分析历史记录（默认不含原始文本和质量验证报告，?include=text,debug 按需返回）"""
     try:
         current_user_id = get_jwt_identity()
         
@@ -785,7 +1133,7 @@ def get_analysis_history():
         
         return jsonify({
             'success': True,
-            'records': [record.to_dict() for record in records.items],
+            'records': [record.to_dict(include=_requested_includes()) for record in records.items],
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -832,7 +1180,10 @@ def get_analysis_statistics():
                 'success_rate': success_rate,
                 'average_confidence': avg_confidence,
                 'processing_count': processing_count,
-                'period_days': days
+                'period_days': days,
+                'extraction_cache': extraction_cache.get_stats(),
+                'near_duplicate_index': near_duplicate_index.get_stats(),
+                'doc_extraction_strategies': ai_analyzer.document_processor.get_doc_strategy_stats()
             }
         })
         
@@ -840,6 +1191,101 @@ def get_analysis_statistics():
         logger.error(f"Error getting analysis statistics: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@ai_analysis_bp.route('/performance/latency', methods=['GET'])
+@jwt_required()
+@require_role('admin', 'manager')
+def get_stage_latency():
+    """按阶段和文件类型获取分析延迟分位数（p50/p95/p99，单位秒）"""
+    try:
+        report = analysis_tracer.get_latency_report(
+            stage=request.args.get('stage') or None,
+            file_type=request.args.get('file_type') or None,
+            include_buckets=request.args.get('buckets', 'false').lower() == 'true'
+        )
+        return jsonify({
+            'success': True,
+            'unit': 'seconds',
+            'latency': report
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting stage latency: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@ai_analysis_bp.route('/performance/idempotency', methods=['GET'])
+@jwt_required()
+@require_role('admin', 'manager')
+def get_idempotency_stats():
+    """获取携带幂等键的重复提交统计（被重放或合并的重复提交数）"""
+    try:
+        return jsonify({
+            'success': True,
+            'idempotency': idempotency_store.get_stats()
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting idempotency stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@ai_analysis_bp.route('/performance/cancellation', methods=['GET'])
+@jwt_required()
+@require_role('admin', 'manager')
+def get_cancellation_stats():
+    """获取取消统计：中断的大模型调用、取消的待执行任务，以及估算节省的大模型秒数和token数"""
+    try:
+        return jsonify({
+            'success': True,
+            'cancellation': cancellation_stats.snapshot()
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting cancellation stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@ai_analysis_bp.route('/performance/memory', methods=['GET'])
+@jwt_required()
+@require_role('admin', 'manager')
+def get_memory_stats():
+    """获取内存核算：按文件类型和阶段的峰值内存、准入上限、等待和拒绝次数"""
+    try:
+        return jsonify({
+            'success': True,
+            'memory': get_memory_report()
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting memory stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@ai_analysis_bp.route('/performance/traces', methods=['GET'])
+@jwt_required()
+@require_role('admin', 'manager')
+def get_recent_traces():
+    """获取最近的分析追踪（span列表）"""
+    try:
+        limit = min(int(request.args.get('limit', 20)), 200)
+        return jsonify({
+            'success': True,
+            'traces': analysis_tracer.get_recent_traces(limit)
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting recent traces: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@ai_analysis_bp.route('/performance/traces/dump', methods=['POST'])
+@jwt_required()
+@require_role('admin')
+def dump_analysis_traces():
+    """将最近的分析追踪导出为本地 Chrome Trace Event 文件（instance/traces 目录）"""
+    try:
+        result = analysis_tracer.dump_traces()
+        return jsonify({'success': True, **result})
+        
+    except Exception as e:
+        logger.error(f"Error dumping traces: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @ai_analysis_bp.route('/analysis/<int:analysis_id>', methods=['DELETE'])
 @jwt_required()
 @require_role('admin', 'manager')
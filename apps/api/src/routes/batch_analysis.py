@@ -16,7 +16,9 @@ from src.models import db, BatchAnalysisJob, BatchAnalysisFile, BatchProcessingS
 from src.models.batch_analysis import BatchStatus, FileStatus
 from src.utils.decorators import require_role, require_auth, get_current_user
 from src.services.batch_processor import BatchProcessor
+from src.services.batch_queue import BatchQueue, BATCH_QUEUE_BACKEND
 from src.services.ai_analyzer import AIAnalyzer
+from src.middleware.idempotency import idempotent
 
 logger = logging.getLogger(__name__)
 batch_analysis_bp = Blueprint('batch_analysis', __name__)
@@ -26,7 +28,10 @@ is_test_environment = os.environ.get('FLASK_ENV') == 'testing'
 max_workers = 5 if is_test_environment else 3
 max_concurrent_batches = 5 if is_test_environment else 2
 
-batch_processor = BatchProcessor(max_workers=max_workers, max_concurrent_batches=max_concurrent_batches)
+# database 后端：任务写入持久化队列，由任意节点的工作进程租用执行（见 scripts/batch_worker.py）
+batch_queue = BatchQueue() if BATCH_QUEUE_BACKEND == 'database' else None
+batch_processor = BatchProcessor(max_workers=max_workers, max_concurrent_batches=max_concurrent_batches,
+                                 queue=batch_queue)
 
 # Schemas for request validation
 class BatchAnalysisSchema(Schema):
@@ -42,8 +47,9 @@ class BatchJobActionSchema(Schema):
 @batch_analysis_bp.route('/submit', methods=['POST'])
 @jwt_required()
 @require_role('engineer', 'admin', 'manager')
+@idempotent('batch_analysis.submit')
 def submit_batch_analysis():
-    """提交批量分析任务"""
+    """提交批量分析任务（支持 Idempotency-Key 请求头，重试不会创建重复任务）"""
     try:
         # 验证请求数据
         schema = BatchAnalysisSchema()
@@ -133,8 +139,9 @@ def submit_batch_analysis():
         
         db_job.save()
         
-        # 保存文件记录
+        # 保存文件记录（持久化队列的工作进程按文件记录中的内容引用读取文本）
         batch_status = batch_processor.get_batch_status(job_id)
+        content_refs = batch_processor.store_queue_contents(job_id) if batch_processor.durable else {}
         for i, file_info in enumerate(batch_status['files_status']):
             db_file = BatchAnalysisFile()
             db_file.job_id = job_id
@@ -143,7 +150,9 @@ def submit_batch_analysis():
             db_file.original_filename = files[i].filename
             db_file.file_size = files[i].content_length or 0
             db_file.file_type = os.path.splitext(files[i].filename)[1].lower().lstrip('.')
+            db_file.file_hash = file_info.get('content_hash')
             db_file.priority = request_data.get('priority', 0)
+            db_file.content_ref = content_refs.get(file_info['file_id'])
             db_file.save()
         
         logger.info(f"Batch analysis job submitted: {job_id} with {len(files)} files by user {current_user_id}")
@@ -174,7 +183,9 @@ def submit_batch_analysis():
                 success = batch_processor.start_batch_processing(job_id, progress_callback)
                 
                 if success:
-                    db_job.start_processing()
+                    # 入队时队列已在数据库中更新任务状态
+                    if not batch_processor.durable:
+                        db_job.start_processing()
                     logger.info(f"Batch processing auto-started for job: {job_id}")
                 else:
                     logger.warning(f"Failed to auto-start batch processing for job: {job_id}")
@@ -253,9 +264,10 @@ def start_batch_job(job_id):
         success = batch_processor.start_batch_processing(job_id, progress_callback)
         
         if success:
-            # 更新数据库状态
-            db_job.start_processing()
-            db_job.save()
+            # 更新数据库状态（入队时队列已更新）
+            if not batch_processor.durable:
+                db_job.start_processing()
+                db_job.save()
             
             return jsonify({
                 'success': True,
@@ -352,9 +364,12 @@ def cancel_batch_job(job_id):
         success = batch_processor.cancel_batch_job(job_id)
         
         if success:
-            # 更新数据库状态
-            db_job.cancel_processing()
-            db_job.save()
+            # 更新数据库状态（已入队的任务由队列更新）
+            if batch_processor.durable and db_job.status.value == 'processing':
+                db.session.refresh(db_job)
+            else:
+                db_job.cancel_processing()
+                db_job.save()
             
             return jsonify({
                 'success': True,
@@ -510,6 +525,31 @@ def get_batch_statistics():
         logger.error(f"Error getting batch statistics: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@batch_analysis_bp.route('/queue/status', methods=['GET'])
+@jwt_required()
+@require_role('admin', 'manager')
+def get_batch_queue_status():
+    """获取持久化任务队列状态（租约、重新租用和丢弃的确认次数）"""
+    try:
+        if not batch_processor.durable:
+            return jsonify({
+                'success': True,
+                'queue': {'backend': 'memory'}
+            })
+
+        queue_stats = batch_queue.get_stats()
+        queue_stats['embedded_worker_running'] = bool(
+            batch_processor.queue_worker and batch_processor.queue_worker.running
+        )
+        return jsonify({
+            'success': True,
+            'queue': queue_stats
+        })
+
+    except Exception as e:
+        logger.error(f"Error getting batch queue status: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @batch_analysis_bp.route('/settings', methods=['GET'])
 @jwt_required()
 @require_auth
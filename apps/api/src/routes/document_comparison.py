@@ -12,6 +12,7 @@ from src.models import db
 from src.models.document_comparison import DocumentComparison, ComparisonDocument, ComparisonResult, ComparisonTemplate
 from src.utils.decorators import require_role, require_auth, get_current_user
 from src.services.document_comparison_service import DocumentComparisonService, DocumentInfo, ComparisonConfig
+from src.middleware.idempotency import idempotent
 
 logger = logging.getLogger(__name__)
 document_comparison_bp = Blueprint('document_comparison', __name__)
@@ -63,8 +64,9 @@ class ComparisonTemplateSchema(Schema):
 @document_comparison_bp.route('/create', methods=['POST'])
 @jwt_required()
 @require_role('engineer', 'admin', 'manager')
+@idempotent('document_comparison.create')
 def create_comparison():
-    """创建文档对比分析"""
+    """创建文档对比分析（支持 Idempotency-Key 请求头，重试不会创建重复对比）"""
     try:
         # 验证请求数据
         schema = CreateComparisonSchema()
@@ -3,10 +3,15 @@
 AI分析服务
 整合文档处理和OpenAI分析，提供完整的AI产品分析功能
 """
+import copy
+import re
 import logging
 import time
 import json
-from typing import Dict, Any, Optional, Tuple, List
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Any, Optional, Tuple, List
+from flask import current_app, has_app_context
 from werkzeug.datastructures import FileStorage
 from datetime import datetime
 
@@ -15,9 +20,120 @@ from .zhipuai_client import ZhipuAIClient
 from .learning_engine import LearningEngine
 from .table_parser import TableParser
 from .confidence_scorer import ConfidenceScorer
+from .near_duplicate_index import near_duplicate_index, compute_fingerprint, DocumentFingerprint
+from .stage_graph import Stage, StageGraph, StageTimeoutError
+from .deadline import DeadlineExceeded, current_deadline
+from .cancellation import OperationCancelled, current_cancellation
+from .analysis_tracing import analysis_tracer, file_type_of
+from .partial_results import partial_result_scope
+from .memory_accounting import (
+    MemoryAdmissionRejected, memory_admission, memory_sampler, memory_scope, memory_stats, MB
+)
 
 logger = logging.getLogger(__name__)
 
+# 基本产品信息（不应作为技术规格）的名称模式，按顺序匹配
+BASIC_INFO_SPEC_PATTERNS = [
+    r'^产品名称$', r'^产品代码$', r'^制造商$', r'^厂商$',
+    r'^产品类别$', r'^产品分类$', r'^类别$', r'^分类$',
+    r'^概述$', r'^简介$', r'^描述$', r'^说明$',
+    r'^附录[A-Z]?[:：]?.*', r'^表[0-9]+[:：]?.*', r'^图[0-9]+[:：]?.*',
+    r'.*技术规格.*表.*', r'.*参数表.*', r'.*规格表.*',
+    r'^第[0-9一二三四五六七八九十]+章', r'^[0-9]+\.[0-9]+\s',
+    r'说明书$', r'手册$', r'指南$'
+]
+# 产品型号没有具体值时也按基本信息过滤
+MODEL_NUMBER_SPEC_PATTERN = r'^产品型号$'
+
+# 过于通用或描述性的规格名称
+GENERIC_SPEC_PATTERNS = [
+    r'^主要功能$', r'^特点$', r'^特色$', r'^优势$',
+    r'^应用$', r'^用途$', r'^适用$', r'^范围$',
+    r'^注意事项$', r'^安全$', r'^警告$', r'^须知$'
+]
+
+# .doc 解析产生的乱码字符
+DOC_GARBAGE_PATTERNS = [
+    # 常见的.doc解析产生的乱码字符
+    r'[潗摲楍牣獯景煅慵楴湯畱瑡潩卍潗摲潄吀瑩敬牁慩袈霡蠈袢]',
+    # 十六进制显示形式的乱码
+    r'[㸳㠴㔷㤸㜹㈰㐱㠲㌳㘴㔵㘶㠷㤸㠹]',
+    # Word文档结构字符泄漏
+    r'[屜屝屬屭屨屪屢屣層履屦屧屨屩屲]',
+    # OLE对象标识符字符
+    r'[▉▊▋▌▍▎▏█▄▀■□▲△▼▽◆◇○●◎☆★]',
+]
+
+# 编码错误特征
+ENCODING_ERROR_PATTERNS = [
+    # 问号或替代字符（通常是编码失败的标志）
+    r'[�\?]{2,}',
+    # 明显的字节序标记泄漏
+    r'[﻿￾]',
+    # null字符或其他控制字符
+    r'[\x00\x01\x02\x03\x04\x05\x06\x07\x08\x0e-\x1f]',
+]
+
+# 用户反馈的具体垃圾字符串
+KNOWN_GARBAGE_STRINGS = frozenset([
+    'ToC509006008', 'ToC509006048',  # 异常长的ToC变体
+    '3.2 D', '5.2.14 I-t',          # 数字+字母的无意义组合
+    'D', 'I', 'RS',                 # 单独的字母
+    '/λspec_table中提取',            # 格式标记泄漏
+])
+
+_PRIVATE_USE_RE = re.compile('[-]')
+_CONTROL_CHAR_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')  # 除 \t \n \r 外的控制字符
+_HIGH_ASCII_TABLE = dict.fromkeys(range(128, 256))              # 删除 Latin-1 扩展字符的 translate 表
+_READABLE_RE = re.compile(r'[一-鿿a-zA-Z0-9.,;:!?()\/\-+=%]')
+_CJK_RE = re.compile(r'[一-鿿]')
+_NON_STANDARD_RE = re.compile('[^\x20-\x7f]')                   # ord > 127 或 < 32
+_TECH_HINT_RE = re.compile(r'\d|[电压流功率频温度精量]|[VvAaWwHh℃℉%]')
+_TOC_VARIANT_RE = re.compile(r'^ToC\d+$', re.IGNORECASE)
+
+# OCR智能修正
+_WIRE_RS_RE = re.compile(r'WIRE\d+.*?RS\d+')
+_WIRE_RS_SUB_RE = re.compile(r'WIRE\d+\s*(\d*)RS(\d+)')
+_DIGIT_RS_RE = re.compile(r'\d+RS\d+')
+_DIGIT_RS_SUB_RE = re.compile(r'\d*RS(\d+)')
+_OCR_DIGIT_RE = re.compile(r'\d+[OlS]')
+_OCR_L_RE = re.compile(r'l(?=\d|$)')
+_OCR_S_RE = re.compile(r'S(?=\d|$)')
+_TOC_MODEL_RE = re.compile(r'ToC\d+')
+
+
+class PatternRules:
+    """
+    按顺序匹配的一组正则规则
+    
+    所有规则合并为一个预编译的交替模式做一次性判定；只有命中时才逐条定位
+    第一个匹配的规则（用于记录命中的模式），未命中的常见情况只需一次扫描。
+    """
+    
+    def __init__(self, patterns: List[str], flags: int = 0):
+        self.patterns = list(patterns)
+        self._compiled = [re.compile(pattern, flags) for pattern in self.patterns]
+        self._combined = re.compile('|'.join(f'(?:{pattern})' for pattern in self.patterns), flags)
+    
+    def search(self, text: str) -> bool:
+        return self._combined.search(text) is not None
+    
+    def first_match(self, text: str) -> Optional[str]:
+        """返回第一个匹配的规则（原始模式字符串），都不匹配时返回None"""
+        if self._combined.search(text) is None:
+            return None
+        for pattern, compiled in zip(self.patterns, self._compiled):
+            if compiled.search(text):
+                return pattern
+        return None
+
+
+_BASIC_INFO_RULES = PatternRules(BASIC_INFO_SPEC_PATTERNS, re.IGNORECASE)
+_MODEL_NUMBER_RE = re.compile(MODEL_NUMBER_SPEC_PATTERN, re.IGNORECASE)
+_GENERIC_RULES = PatternRules(GENERIC_SPEC_PATTERNS, re.IGNORECASE)
+_DOC_GARBAGE_RULES = PatternRules(DOC_GARBAGE_PATTERNS)
+_ENCODING_ERROR_RULES = PatternRules(ENCODING_ERROR_PATTERNS)
+
 class DataQualityValidator:
     """数据质量验证器 - 专门处理AI分析结果的质量控制"""
     
@@ -94,6 +210,10 @@ class DataQualityValidator:
             r'(?:工作|环境|存储|操作).*?(?:温度|湿度|条件)',  # 环境条件
             r'(?:外形|安装|显示|操作).*?(?:尺寸|方式|屏|界面)',  # 物理特性
         ]
+        
+        # 预编译的规则集（噪声模式命中时需要记录具体模式，按顺序定位）
+        self._noise_rules = PatternRules(self.noise_patterns, re.IGNORECASE)
+        self._valid_tech_rules = PatternRules(self.valid_tech_patterns, re.IGNORECASE)
     
     def validate_extracted_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -158,17 +278,11 @@ class DataQualityValidator:
         }
     
     def _clean_specifications(self, specifications: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
-        """清洁规格参数数据"""
-        import re
-        
+        """清洁规格参数数据（规则均已预编译，每个条目按顺序做一次分类）"""
         cleaned_specs = {}
-        validation_report = {
-            'original_specs_count': len(specifications),
-            'noise_removed_count': 0,
-            'invalid_removed_count': 0,
-            'final_specs_count': 0,
-            'removed_specs': []
-        }
+        removed_specs = []
+        noise_removed_count = 0
+        invalid_removed_count = 0
         
         for spec_name, spec_data in specifications.items():
             if not spec_name or not spec_name.strip():
@@ -185,8 +299,8 @@ class DataQualityValidator:
             
             # 🛡️ 优先检查：二进制垃圾数据检测
             if self._is_binary_garbage(spec_name):
-                validation_report['noise_removed_count'] += 1
-                validation_report['removed_specs'].append({
+                noise_removed_count += 1
+                removed_specs.append({
                     'name': spec_name,
                     'reason': 'binary_garbage_from_doc_parsing',
                     'detection': 'advanced_binary_detection'
@@ -194,93 +308,42 @@ class DataQualityValidator:
                 continue
             
             # 检查是否为格式噪声
-            is_noise = False
-            for pattern in self.noise_patterns:
-                if re.search(pattern, spec_name, re.IGNORECASE):
-                    validation_report['noise_removed_count'] += 1
-                    validation_report['removed_specs'].append({
-                        'name': spec_name,
-                        'reason': 'format_noise',
-                        'pattern': pattern
-                    })
-                    is_noise = True
-                    break
-            
-            if is_noise:
+            noise_pattern = self._noise_rules.first_match(spec_name)
+            if noise_pattern is not None:
+                noise_removed_count += 1
+                removed_specs.append({
+                    'name': spec_name,
+                    'reason': 'format_noise',
+                    'pattern': noise_pattern
+                })
                 continue
             
             # 获取规格值用于后续判断
-            spec_value = ""
             if isinstance(spec_data, dict):
                 spec_value = str(spec_data.get('value', ''))
             else:
                 spec_value = str(spec_data)
             
             # 🚫 检查是否为基本产品信息（不应该作为技术规格）
-            basic_info_patterns = [
-                r'^产品名称$', r'^产品代码$', r'^制造商$', r'^厂商$',
-                r'^产品类别$', r'^产品分类$', r'^类别$', r'^分类$',
-                r'^概述$', r'^简介$', r'^描述$', r'^说明$',
-                r'^附录[A-Z]?[:：]?.*', r'^表[0-9]+[:：]?.*', r'^图[0-9]+[:：]?.*',
-                r'.*技术规格.*表.*', r'.*参数表.*', r'.*规格表.*',
-                r'^第[0-9一二三四五六七八九十]+章', r'^[0-9]+\.[0-9]+\s',
-                r'说明书$', r'手册$', r'指南$'
-            ]
-            
+            basic_info_pattern = _BASIC_INFO_RULES.first_match(spec_name)
             # 🔍 特殊处理：产品型号如果没有具体值，则过滤
-            if re.search(r'^产品型号$', spec_name, re.IGNORECASE):
-                if not (spec_value and spec_value.strip() and len(spec_value.strip()) > 2):
-                    basic_info_patterns.append(r'^产品型号$')
-            
-            is_basic_info = False
-            for pattern in basic_info_patterns:
-                if re.search(pattern, spec_name, re.IGNORECASE):
-                    validation_report['invalid_removed_count'] += 1
-                    validation_report['removed_specs'].append({
-                        'name': spec_name,
-                        'reason': 'basic_info_not_spec',
-                        'pattern': pattern
-                    })
-                    is_basic_info = True
-                    break
+            if (basic_info_pattern is None and _MODEL_NUMBER_RE.search(spec_name) and
+                    not (spec_value and spec_value.strip() and len(spec_value.strip()) > 2)):
+                basic_info_pattern = MODEL_NUMBER_SPEC_PATTERN
             
-            if is_basic_info:
+            if basic_info_pattern is not None:
+                invalid_removed_count += 1
+                removed_specs.append({
+                    'name': spec_name,
+                    'reason': 'basic_info_not_spec',
+                    'pattern': basic_info_pattern
+                })
                 continue
             
-            # 检查是否为有效技术参数
-            is_valid_tech = False
-            
-            combined_text = f"{spec_name} {spec_value}"
-            
-            # 检查技术有效性
-            for pattern in self.valid_tech_patterns:
-                if re.search(pattern, combined_text, re.IGNORECASE):
-                    is_valid_tech = True
-                    break
-            
-            # 如果包含明显的技术信息，则认为有效
-            if (len(spec_name) > 1 and 
-                (re.search(r'\d', combined_text) or  # 包含数字
-                 re.search(r'[电压流功率频温度精量]', combined_text) or  # 包含技术关键词
-                 re.search(r'[VvAaWwHh℃℉%]', combined_text))):  # 包含技术单位
-                is_valid_tech = True
-            
             # 🔍 额外检查：排除过于通用或描述性的内容
-            generic_patterns = [
-                r'^主要功能$', r'^特点$', r'^特色$', r'^优势$', 
-                r'^应用$', r'^用途$', r'^适用$', r'^范围$',
-                r'^注意事项$', r'^安全$', r'^警告$', r'^须知$'
-            ]
-            
-            is_generic = False
-            for pattern in generic_patterns:
-                if re.search(pattern, spec_name, re.IGNORECASE):
-                    is_generic = True
-                    break
-            
-            if is_generic:
-                validation_report['invalid_removed_count'] += 1
-                validation_report['removed_specs'].append({
+            if _GENERIC_RULES.search(spec_name):
+                invalid_removed_count += 1
+                removed_specs.append({
                     'name': spec_name,
                     'reason': 'generic_description',
                     'value': spec_value
@@ -288,27 +351,38 @@ class DataQualityValidator:
                 continue
             
             # 🔍 检查产品型号变体错误：如果规格名称本身就是型号，但与基本信息中的型号不符，则过滤
-            if re.search(r'^ToC\d+$', spec_name, re.IGNORECASE):
+            if _TOC_VARIANT_RE.search(spec_name):
                 # 这可能是错误的型号变体，应该过滤
-                validation_report['invalid_removed_count'] += 1
-                validation_report['removed_specs'].append({
+                invalid_removed_count += 1
+                removed_specs.append({
                     'name': spec_name,
                     'reason': 'product_code_variant',
                     'value': spec_value
                 })
                 continue
             
+            # 检查是否为有效技术参数：匹配技术参数模式，或包含数字、技术关键词、技术单位
+            combined_text = f"{spec_name} {spec_value}"
+            is_valid_tech = (self._valid_tech_rules.search(combined_text) or
+                             (len(spec_name) > 1 and _TECH_HINT_RE.search(combined_text) is not None))
+            
             if is_valid_tech:
                 cleaned_specs[spec_name] = spec_data
             else:
-                validation_report['invalid_removed_count'] += 1
-                validation_report['removed_specs'].append({
+                invalid_removed_count += 1
+                removed_specs.append({
                     'name': spec_name,
                     'reason': 'not_technical',
                     'value': spec_value
                 })
         
-        validation_report['final_specs_count'] = len(cleaned_specs)
+        validation_report = {
+            'original_specs_count': len(specifications),
+            'noise_removed_count': noise_removed_count,
+            'invalid_removed_count': invalid_removed_count,
+            'final_specs_count': len(cleaned_specs),
+            'removed_specs': removed_specs
+        }
         
         return cleaned_specs, validation_report
     
@@ -385,8 +459,6 @@ class DataQualityValidator:
         Returns:
             Tuple[str, Any, bool]: (修正后名称, 修正后数据, 是否进行了修正)
         """
-        import re
-        
         corrected_name = spec_name
         corrected_data = spec_data
         was_corrected = False
@@ -399,22 +471,22 @@ class DataQualityValidator:
         # 智能模式匹配修正
         else:
             # 修正通信接口相关
-            if re.match(r'WIRE\d+.*?RS\d+', spec_name):
-                corrected_name = re.sub(r'WIRE\d+\s*(\d*)RS(\d+)', r'RS\2通信接口', spec_name)
+            if _WIRE_RS_RE.match(spec_name):
+                corrected_name = _WIRE_RS_SUB_RE.sub(r'RS\2通信接口', spec_name)
                 was_corrected = True
-            elif re.match(r'\d+RS\d+', spec_name):
-                corrected_name = re.sub(r'\d*RS(\d+)', r'RS\1', spec_name)
+            elif _DIGIT_RS_RE.match(spec_name):
+                corrected_name = _DIGIT_RS_SUB_RE.sub(r'RS\1', spec_name)
                 was_corrected = True
                 
             # 修正数值中的OCR错误
-            elif re.search(r'\d+[OlS]', spec_name):
-                corrected_name = re.sub(r'O', '0', spec_name)
-                corrected_name = re.sub(r'l(?=\d|$)', '1', corrected_name)  # 只在数字上下文中替换
-                corrected_name = re.sub(r'S(?=\d|$)', '5', corrected_name)
+            elif _OCR_DIGIT_RE.search(spec_name):
+                corrected_name = spec_name.replace('O', '0')
+                corrected_name = _OCR_L_RE.sub('1', corrected_name)  # 只在数字上下文中替换
+                corrected_name = _OCR_S_RE.sub('5', corrected_name)
                 was_corrected = True
                 
             # 修正产品型号格式
-            elif re.match(r'ToC\d+', spec_name):
+            elif _TOC_MODEL_RE.match(spec_name):
                 # 产品型号保持原样，但确保格式正确
                 if not corrected_data or (isinstance(corrected_data, dict) and not corrected_data.get('value')):
                     corrected_data = {
@@ -438,137 +510,93 @@ class DataQualityValidator:
         """
         高级二进制垃圾数据检测 - 专门检测.doc文件解析产生的乱码字符串
         
+        字符类别统计使用预编译的字符类和 translate 表，检测顺序与结果保持不变。
+        
         Args:
             text: 待检测的文本
             
         Returns:
             bool: 是否为二进制垃圾数据
         """
-        import re
-        
         if not text or len(text.strip()) == 0:
             return True
         
         text = text.strip()
+        length = len(text)
         
         # 🔍 检测1：Unicode编码范围异常检测
         # 检查私用区字符（Private Use Area）- 常见于编码错误
-        private_use_count = sum(1 for c in text if 0xE000 <= ord(c) <= 0xF8FF)
-        if private_use_count > 0:
-            logger.debug(f"检测到私用区字符: {text} (count: {private_use_count})")
+        if _PRIVATE_USE_RE.search(text):
+            logger.debug(f"检测到私用区字符: {text} (count: {len(_PRIVATE_USE_RE.findall(text))})")
             return True
             
         # 检查控制字符作为参数名（除了正常的空白字符）
-        control_chars = sum(1 for c in text if ord(c) < 32 and c not in '\t\n\r ')
-        if control_chars > 0:
-            logger.debug(f"检测到控制字符: {text} (count: {control_chars})")
+        if _CONTROL_CHAR_RE.search(text):
+            logger.debug(f"检测到控制字符: {text} (count: {len(_CONTROL_CHAR_RE.findall(text))})")
             return True
             
         # 检查高位扩展ASCII字符（128-255）- Latin-1扩展区域的乱码
-        high_ascii_count = sum(1 for c in text if 128 <= ord(c) <= 255)
-        if high_ascii_count >= len(text) * 0.5:  # 超过50%是高位ASCII
-            logger.debug(f"检测到高频高位ASCII字符: {text} (ratio: {high_ascii_count}/{len(text)})")
+        high_ascii_count = length - len(text.translate(_HIGH_ASCII_TABLE))
+        if high_ascii_count >= length * 0.5:  # 超过50%是高位ASCII
+            logger.debug(f"检测到高频高位ASCII字符: {text} (ratio: {high_ascii_count}/{length})")
             return True
         
         # 🔍 检测2：常见.doc解析乱码字符模式
-        doc_garbage_patterns = [
-            # 常见的.doc解析产生的乱码字符
-            r'[潗摲楍牣獯景煅慵楴湯畱瑡潩卍潗摲潄吀瑩敬牁慩袈霡蠈袢]',
-            # 十六进制显示形式的乱码
-            r'[㸳㠴㔷㤸㜹㈰㐱㠲㌳㘴㔵㘶㠷㤸㠹]',
-            # Word文档结构字符泄漏
-            r'[屜屝屬屭屨屪屢屣層履屦屧屨屩屲]',
-            # OLE对象标识符字符
-            r'[▉▊▋▌▍▎▏█▄▀■□▲△▼▽◆◇○●◎☆★]',
-        ]
-        
-        for pattern in doc_garbage_patterns:
-            if re.search(pattern, text):
-                logger.debug(f"检测到.doc解析乱码模式: {text} (pattern: {pattern})")
-                return True
+        garbage_pattern = _DOC_GARBAGE_RULES.first_match(text)
+        if garbage_pattern is not None:
+            logger.debug(f"检测到.doc解析乱码模式: {text} (pattern: {garbage_pattern})")
+            return True
         
         # 🔍 检测3：字符组合异常检测
-        # 检测连续的异常高频字符（通常出现在编码错误中）
-        char_freq = {}
-        for char in text:
-            char_freq[char] = char_freq.get(char, 0) + 1
-        
         # 如果任何字符出现频率超过50%且字符串长度>2，可能是重复乱码
-        for char, count in char_freq.items():
-            if count > len(text) * 0.5 and len(text) > 2:
-                logger.debug(f"检测到高频重复字符: {text} (char: {char}, freq: {count}/{len(text)})")
+        if length > 2:
+            char, count = Counter(text).most_common(1)[0]
+            if count > length * 0.5:
+                logger.debug(f"检测到高频重复字符: {text} (char: {char}, freq: {count}/{length})")
                 return True
         
-        # 🔍 检测4：可读性检查
-        # 检查是否包含任何可读的中文、英文或数字内容
-        readable_chars = 0
-        
-        # 中文字符
-        readable_chars += len(re.findall(r'[\u4e00-\u9fff]', text))
-        # 英文字母
-        readable_chars += len(re.findall(r'[a-zA-Z]', text))
-        # 数字
-        readable_chars += len(re.findall(r'[0-9]', text))
-        # 常见符号
-        readable_chars += len(re.findall(r'[.,;:!?()\/\-+=%]', text))
-        
-        readable_ratio = readable_chars / len(text)
-        
         # 🔧 特殊处理：对于短的中文技术词汇，降低可读性要求
-        if len(text) <= 3 and len(re.findall(r'[\u4e00-\u9fff]', text)) >= 1:
+        if length <= 3 and _CJK_RE.search(text):
             # 短的中文词汇（如"重量"、"电压"等）应该被保留
             return False
         
-        if readable_ratio < 0.3:  # 可读字符少于30%
-            logger.debug(f"检测到低可读性文本: {text} (readable: {readable_chars}/{len(text)})")
+        # 🔍 检测4：可读性检查 - 中文、英文、数字和常见符号的占比
+        readable_chars = len(_READABLE_RE.findall(text))
+        if readable_chars / length < 0.3:  # 可读字符少于30%
+            logger.debug(f"检测到低可读性文本: {text} (readable: {readable_chars}/{length})")
             return True
         
         # 🔍 检测5：特定长度和模式的异常检测
-        # 检测明显的二进制数据表示
-        if len(text) <= 3:
-            # 短字符串更严格检查
-            # 如果全是非标准字符，可能是乱码
-            non_standard = sum(1 for c in text if ord(c) > 127 or ord(c) < 32)
-            if non_standard > len(text) * 0.5:
-                logger.debug(f"检测到短字符串乱码: {text}")
-                return True
+        # 短字符串更严格检查：如果全是非标准字符，可能是乱码
+        if length <= 3 and len(_NON_STANDARD_RE.findall(text)) > length * 0.5:
+            logger.debug(f"检测到短字符串乱码: {text}")
+            return True
         
         # 🔍 检测6：编码错误特征检测
-        # 尝试检测常见的编码错误模式
-        encoding_error_indicators = [
-            # 问号或替代字符（通常是编码失败的标志）
-            r'[�\?]{2,}',
-            # 明显的字节序标记泄漏
-            r'[\ufeff\ufffe]',
-            # null字符或其他控制字符
-            r'[\x00\x01\x02\x03\x04\x05\x06\x07\x08\x0e-\x1f]',
-        ]
-        
-        for pattern in encoding_error_indicators:
-            if re.search(pattern, text):
-                logger.debug(f"检测到编码错误标识: {text} (pattern: {pattern})")
-                return True
-        
-        # 🔍 检测7：特殊情况 - 用户反馈的具体问题
-        # 检测用户截图中提到的具体问题字符串
-        known_garbage_strings = [
-            'ToC509006008', 'ToC509006048',  # 异常长的ToC变体
-            '3.2 D', '5.2.14 I-t',          # 数字+字母的无意义组合
-            'D', 'I', 'RS',                 # 单独的字母
-            '/λspec_table中提取',            # 格式标记泄漏
-        ]
+        error_pattern = _ENCODING_ERROR_RULES.first_match(text)
+        if error_pattern is not None:
+            logger.debug(f"检测到编码错误标识: {text} (pattern: {error_pattern})")
+            return True
         
-        for garbage_str in known_garbage_strings:
-            if text.strip() == garbage_str:
-                logger.debug(f"检测到已知垃圾字符串: {text}")
-                return True
+        # 🔍 检测7：特殊情况 - 用户反馈的具体问题字符串
+        if text in KNOWN_GARBAGE_STRINGS:
+            logger.debug(f"检测到已知垃圾字符串: {text}")
+            return True
         
         return False
 
 class AnalysisMonitor:
-    """分析过程监控器 - 提供详细的调试信息和性能统计"""
+    """
+    分析过程监控器 - 提供详细的调试信息和性能统计
     
-    def __init__(self):
+    同时把整次分析和各阶段记录为追踪span（见 analysis_tracing），
+    用于进程级的分阶段延迟直方图和离线追踪分析。
+    listener 接收阶段开始/结束事件（如异步任务的进度推送），可能在阶段线程中被调用；
+    中间结果快照以 partial_result 事件通知（见 partial_results）。
+    """
+    
+    def __init__(self, listener: Callable[[Dict[str, Any]], None] = None):
+        self.listener = listener
         self.start_time = None
         self.stages = {}
         self.metrics = {
@@ -577,8 +605,13 @@ class AnalysisMonitor:
             'table_parsing': {},
             'ai_analysis': {},
             'quality_assessment': {},
+            'partial_results': {},
+            'memory': {},
             'overall': {}
         }
+        self.span = None
+        self._span_token = None
+        self._stage_spans = {}
     
     def start_analysis(self, filename: str, file_size: int):
         """开始分析监控"""
@@ -588,11 +621,19 @@ class AnalysisMonitor:
             'file_size': file_size,
             'start_time': datetime.now().isoformat()
         }
+        self.span = analysis_tracer.start_span('analysis', file_type=file_type_of(filename),
+                                               filename=filename, file_size=file_size)
+        self._span_token = analysis_tracer.activate(self.span)
+        self._emit('analysis_start', filename=filename, file_size=file_size)
         logger.info(f"📊 开始分析监控: {filename} ({file_size} bytes)")
     
     def stage_start(self, stage_name: str):
         """阶段开始"""
         self.stages[stage_name] = {'start': time.time()}
+        if self.span is not None:
+            span = analysis_tracer.start_span(stage_name, parent=self.span)
+            self._stage_spans[stage_name] = (span, analysis_tracer.activate(span))
+        self._emit('stage_start', stage=stage_name)
         logger.info(f"🔄 阶段开始: {stage_name}")
     
     def stage_end(self, stage_name: str, **kwargs):
@@ -605,6 +646,41 @@ class AnalysisMonitor:
                 **kwargs
             })
             logger.info(f"✅ 阶段完成: {stage_name} ({duration:.2f}s)")
+            self._emit('stage_end', stage=stage_name, duration=round(duration, 3), **kwargs)
+        if stage_name in self._stage_spans:
+            span, token = self._stage_spans.pop(stage_name)
+            analysis_tracer.deactivate(token)
+            analysis_tracer.finish_span(span, **kwargs)
+    
+    def publish_partial(self, section: str, data: Any):
+        """发布中间结果快照，记录每个分区首次可用时距分析开始的秒数"""
+        elapsed = round(time.time() - self.start_time, 3) if self.start_time else 0.0
+        self.metrics['partial_results'].setdefault(section, elapsed)
+        self.metrics['overall'].setdefault('time_to_first_partial', elapsed)
+        if self.listener is None:
+            return
+        # 快照与后续阶段隔离：合并、清洗阶段会原地修改规格字典
+        self._emit('partial_result', section=section, elapsed=elapsed, data=copy.deepcopy(data))
+        logger.info(f"📤 中间结果可用: {section} ({elapsed:.2f}s)")
+    
+    def finish(self, error: str = None):
+        """结束分析追踪；未正常结束的阶段（异常、超时）标记为失败"""
+        for stage_name, (span, _) in list(self._stage_spans.items()):
+            analysis_tracer.finish_span(span, error=error or 'stage did not complete')
+        self._stage_spans.clear()
+        if self.span is not None:
+            analysis_tracer.deactivate(self._span_token)
+            analysis_tracer.finish_span(self.span, error=error)
+        self._emit('analysis_end', success=error is None, **({'error': error} if error else {}))
+    
+    def _emit(self, event_type: str, **data):
+        """通知监听者；监听者异常不影响分析"""
+        if self.listener is None:
+            return
+        try:
+            self.listener({'type': event_type, 'timestamp': time.time(), **data})
+        except Exception as e:
+            logger.warning(f"⚠️ 分析进度监听器异常: {str(e)}")
     
     def record_metrics(self, category: str, data: Dict[str, Any]):
         """记录详细指标"""
@@ -619,11 +695,32 @@ class AnalysisMonitor:
             'total_duration': round(total_duration, 2),
             'stages': {name: stage.get('duration', 0) for name, stage in self.stages.items()},
             'metrics': self.metrics,
-            'completion_time': datetime.now().isoformat()
+            'completion_time': datetime.now().isoformat(),
+            **({'trace_id': self.span.trace_id} if self.span is not None else {})
         }
 
+@dataclass
+class AnalysisContext:
+    """
+    单次分析的全部可变状态，由 analyze_product_document 创建并传给每个阶段
+    
+    AIAnalyzer 实例本身只持有无状态的组件（文档处理器、大模型客户端、验证器等），
+    可以在多个线程的并发分析之间共享。
+    """
+    file: FileStorage
+    user_id: Optional[int]
+    content_hash: Optional[str]
+    file_size: int
+    monitor: AnalysisMonitor
+    file_type: str = 'unknown'
+    doc_info: Dict[str, Any] = field(default_factory=dict)
+
 class AIAnalyzer:
-    """AI产品分析器 - 集成监控和调试功能"""
+    """
+    AI产品分析器 - 集成监控和调试功能
+    
+    可重入：每次分析的状态都保存在 AnalysisContext 中，同一实例可被多个线程并发使用。
+    """
     
     def __init__(self):
         self.document_processor = DocumentProcessor()
@@ -632,170 +729,88 @@ class AIAnalyzer:
         self.table_parser = TableParser()
         self.confidence_scorer = ConfidenceScorer()
         self.quality_validator = DataQualityValidator()  # 数据质量验证器
-        self.monitor = None  # 动态创建监控器
     
-    def analyze_product_document(self, file: FileStorage, user_id: int = None) -> Dict[str, Any]:
+    # 各阶段超时（秒）；个性化和表格解析为可选阶段，超时后按空结果继续
+    STAGE_TIMEOUTS = {
+        'document_processing': 300,
+        'personalization': 10,
+        'ai_analysis': 300,
+        'table_parsing': 60,
+        'data_quality_validation': 60,
+        'quality_assessment': 60,
+        'data_postprocessing': 60
+    }
+    
+    def analyze_product_document(self, file: FileStorage, user_id: int = None,
+                                 content_hash: str = None,
+                                 progress_callback: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
         """
         分析产品文档，提取产品信息 - 集成详细监控和调试
         
+        各阶段按依赖图执行（见 _build_stage_graph）：文本提取完成后，个性化提示、
+        表格解析与大模型调用并行进行，之后依次完成合并验证、质量评估和后处理。
+        
         Args:
             file: 上传的文件对象
             user_id: 用户ID，用于个性化分析
+            content_hash: 文件内容SHA-256，用于复用文档提取缓存
+            progress_callback: 阶段进度事件回调（见 AnalysisMonitor）
             
         Returns:
             Dict: 完整的分析结果，包含调试信息
         """
-        # 🔧 初始化监控器
-        self.monitor = AnalysisMonitor()
-        file_size = len(file.read())
-        file.seek(0)  # 重置文件指针
-        self.monitor.start_analysis(file.filename, file_size)
+        # 🔧 初始化本次分析的上下文和监控器
+        file_size = self.document_processor._get_file_size(file)  # seek/tell获取大小，不复制内容
+        monitor = AnalysisMonitor(listener=progress_callback)
+        file_type = self.document_processor._detect_file_type(file.mimetype, file.filename)
+        ctx = AnalysisContext(file=file, user_id=user_id, content_hash=content_hash,
+                              file_size=file_size, monitor=monitor, file_type=file_type)
+        monitor.start_analysis(file.filename, file_size)
         
         try:
-            # 🔄 阶段1: 文档处理和文本提取
-            self.monitor.stage_start("document_processing")
-            logger.info(f"📄 开始处理文档: {file.filename} ({file_size} bytes)")
-            
-            text_content, doc_info = self.document_processor.process_document(file)
-            
-            # 记录文档处理指标
-            self.monitor.record_metrics('text_extraction', {
-                'text_length': len(text_content),
-                'doc_format': doc_info.get('format', 'unknown'),
-                'pages': doc_info.get('pages', 0),
-                'encoding': doc_info.get('encoding', 'unknown')
-            })
-            
-            if not text_content.strip():
-                raise ValueError("Document contains no readable text content")
-                
-            self.monitor.stage_end("document_processing", 
-                                 text_chars=len(text_content), 
-                                 format=doc_info.get('format', 'unknown'))
-            
-            # 🔍 增强乱码检测 - 使用文档处理器的增强算法
-            if self.document_processor._enhanced_corruption_detection(text_content, doc_info.get('type', '')):
-                error_msg = self._generate_corruption_error_message(file.filename, doc_info)
-                raise ValueError(error_msg)
-            
-            # 🔄 阶段2: 个性化学习引擎
-            personalized_hints = {}
-            if user_id:
-                self.monitor.stage_start("personalization")
-                personalized_hints = self.learning_engine.get_personalized_hints(
-                    user_id=user_id,
-                    document_type=doc_info.get('type', 'unknown'),
-                    extracted_data={}
-                )
-                self.monitor.stage_end("personalization", hints_count=len(personalized_hints))
-            
-            # 🔄 阶段3: AI文档分析（分层分析）
-            self.monitor.stage_start("ai_analysis")
-            logger.info(f"🤖 开始AI分析，文本长度: {len(text_content)} 字符")
-            
-            ai_result = self.ai_client.analyze_product_document(
-                document_content=text_content,
-                document_name=file.filename or "unknown"
-            )
-            
-            # 记录AI分析指标
-            ai_specs_count = len(ai_result.get('specifications', {}))
+            # 🧠 按同类文件的历史预测峰值内存，会超过工作进程内存上限时等待或拒绝
+            with memory_admission.admit(file_type, file_size) as predicted_memory, \
+                    memory_scope('analysis', file_type) as memory_usage:
+                with partial_result_scope(monitor.publish_partial):
+                    run = self._build_stage_graph(ctx).run()
+            if memory_sampler.enabled:
+                memory_stats.record_analysis(file_type, file_size, memory_usage.peak_bytes)
+                monitor.record_metrics('memory', {
+                    'analysis_peak_mb': round(memory_usage.peak_bytes / MB, 2),
+                    **({'predicted_mb': round(predicted_memory / MB, 2)} if predicted_memory else {})
+                })
+            results = run.results
+            
+            document = results['document_processing']
+            text_content = document['text']
+            doc_info = document['doc_info']
+            near_duplicate = document['near_duplicate']
+            personalized_hints = results['personalization'] or {}
+            ai_result = results['ai_analysis']
+            validation = results['data_quality_validation']
+            validation_report = validation['validation_report']
+            data_quality_score = validation['data_quality_score']
+            ai_specs_count = validation['ai_specs_count']
+            enhanced_specs_count = validation['enhanced_specs_count']
             ai_confidence = ai_result.get('confidence', {}).get('overall', 0)
-            self.monitor.record_metrics('ai_analysis', {
-                'specifications_extracted': ai_specs_count,
-                'ai_confidence': ai_confidence,
-                'has_basic_info': bool(ai_result.get('basic_info', {}).get('name', ''))
-            })
-            self.monitor.stage_end("ai_analysis", 
-                                 specs_count=ai_specs_count, 
-                                 confidence=ai_confidence)
+            confidence_scores = results['quality_assessment']
+            enhanced_result, final_specs_count = results['data_postprocessing']
             
-            # 🔄 阶段4: 表格解析增强
-            self.monitor.stage_start("table_parsing")
-            logger.info(f"📊 开始表格解析增强")
-            
-            enhanced_result = self.table_parser.enhance_extraction_with_tables(ai_result, text_content)
-            
-            # 记录表格解析指标
-            enhanced_specs_count = len(enhanced_result.get('specifications', {}))
-            table_info = enhanced_result.get('table_parsing', {})
-            self.monitor.record_metrics('table_parsing', {
-                'tables_found': table_info.get('tables_found', 0),
-                'parsing_confidence': table_info.get('parsing_confidence', 0),
-                'specs_after_enhancement': enhanced_specs_count,
-                'enhancement_gain': enhanced_specs_count - ai_specs_count
+            # 关键路径：并行执行下决定总耗时的阶段链
+            monitor.record_metrics('overall', {
+                'critical_path': run.critical_path,
+                'critical_path_latency': round(run.critical_path_latency, 3)
             })
-            self.monitor.stage_end("table_parsing", 
-                                 tables_found=table_info.get('tables_found', 0),
-                                 final_specs=enhanced_specs_count)
-            
-            # 🔄 阶段5: 数据质量验证和清洁
-            self.monitor.stage_start("data_quality_validation")
-            logger.info("🔍 开始数据质量验证和清洁...")
-            
-            quality_validation = self.quality_validator.validate_extracted_data(enhanced_result)
-            enhanced_result = quality_validation['cleaned_data']
-            validation_report = quality_validation['validation_report']
-            data_quality_score = quality_validation['data_quality_score']
-            
-            # 记录质量验证结果
-            logger.info(f"📊 数据质量验证完成 - 质量评分: {data_quality_score:.2f}")
-            if validation_report['noise_removed_count'] > 0:
-                logger.info(f"🧹 清除格式噪声: {validation_report['noise_removed_count']}项")
-            if validation_report['invalid_removed_count'] > 0:
-                logger.info(f"🗑️ 清除无效参数: {validation_report['invalid_removed_count']}项")
-            logger.info(f"✅ 最终有效规格参数: {validation_report['final_specs_count']}项")
-            
-            self.monitor.stage_end("data_quality_validation", 
-                                 quality_score=data_quality_score,
-                                 noise_removed=validation_report['noise_removed_count'],
-                                 invalid_removed=validation_report['invalid_removed_count'])
-            
-            # 🔄 阶段6: 质量评估和置信度计算
-            self.monitor.stage_start("quality_assessment")
-            confidence_scores = self.confidence_scorer.calculate_comprehensive_confidence(
-                extracted_data=enhanced_result,
-                document_info=doc_info,
-                historical_context=personalized_hints.get('pattern_context') if user_id else None
-            )
-            
-            # 如果数据质量验证器调整了置信度，使用调整后的值
-            if 'confidence_adjustments' in validation_report and validation_report['confidence_adjustments']:
-                confidence_scores = validation_report['confidence_adjustments']
-            
-            self.monitor.stage_end("quality_assessment", confidence=confidence_scores.get('overall', 0))
-            
-            # 🔄 阶段7: 数据后处理和修复
-            self.monitor.stage_start("data_postprocessing")
-            
-            # 智能修复产品名称（如果规格提取成功但名称为空）
-            current_name = enhanced_result.get('basic_info', {}).get('name', '')
-            logger.info(f"🔍 检查产品名称修复 - 当前名称: '{current_name}', 有规格参数: {bool(enhanced_result.get('specifications'))}")
-            
-            if not current_name.strip() and enhanced_result.get('specifications'):
-                logger.info(f"🔧 开始修复缺失的产品名称，文件名: {file.filename}")
-                enhanced_result = self._fix_missing_product_name(enhanced_result, file.filename or "unknown")
-                new_name = enhanced_result.get('basic_info', {}).get('name', '')
-                logger.info(f"✅ 产品名称修复完成: '{new_name}'")
-            
-            # 最终数据清理 - 确保所有规格参数都是有效的
-            final_specs_count = 0
-            if enhanced_result.get('specifications'):
-                cleaned_specs = self.table_parser._clean_specification_data(enhanced_result['specifications'])
-                enhanced_result['specifications'] = cleaned_specs
-                final_specs_count = len(cleaned_specs)
-                logger.info(f"最终规格参数清理完成，保留 {final_specs_count} 项有效参数")
-            
-            self.monitor.stage_end("data_postprocessing", final_specs_count=final_specs_count)
             
             # 🔄 完成分析，获取监控总结
-            monitor_summary = self.monitor.get_summary()
+            monitor.finish()
+            monitor_summary = monitor.get_summary()
             
             # 记录最终质量指标
             final_basic_info = enhanced_result.get('basic_info', {})
             final_specs = enhanced_result.get('specifications', {})
             
-            self.monitor.record_metrics('overall', {
+            monitor.record_metrics('overall', {
                 'final_specs_count': len(final_specs),
                 'has_product_name': bool(final_basic_info.get('name', '').strip()),
                 'has_product_code': bool(final_basic_info.get('code', '').strip()),
@@ -808,6 +823,7 @@ class AIAnalyzer:
             logger.info(f"🕐 总耗时: {monitor_summary['total_duration']}秒")
             for stage, duration in monitor_summary['stages'].items():
                 logger.info(f"   {stage}: {duration:.2f}s")
+            logger.info(f"🧭 关键路径: {' -> '.join(run.critical_path)} ({run.critical_path_latency:.2f}s)")
             logger.info(f"📄 文档信息: {file.filename} ({file_size} bytes)")
             logger.info(f"🤖 AI提取: {len(ai_result.get('specifications', {}))} 项规格")
             logger.info(f"📊 表格增强: +{enhanced_specs_count - ai_specs_count} 项规格")
@@ -832,18 +848,28 @@ class AIAnalyzer:
                 'data_quality_score': data_quality_score,
                 'validation_report': validation_report,
                 
+                # 近重复检测：fingerprint 供路由保存记录后登记到索引
+                'near_duplicate': {
+                    'matched_record_id': near_duplicate['record_id'] if near_duplicate else None,
+                    'similarity': near_duplicate['similarity'] if near_duplicate else None,
+                    'rechecked_lines': len(near_duplicate['added_lines']) if near_duplicate else 0,
+                    'fingerprint': document['fingerprint']
+                },
+                
                 # 🆕 详细的调试和监控信息
                 'debug_info': {
                     'monitor_summary': monitor_summary,
                     'stage_breakdown': monitor_summary['stages'],
                     'performance_metrics': monitor_summary['metrics'],
+                    'stage_graph': run.summary(),
                     'processing_pipeline': [
                         f"文档处理: {doc_info.get('format', 'unknown')} -> {len(text_content)} 字符",
                         f"AI分析: {ai_specs_count} 项规格 (置信度 {ai_confidence:.3f})",
                         f"表格增强: +{enhanced_specs_count - ai_specs_count} 项规格",
                         f"质量验证: 移除 {validation_report.get('noise_removed_count', 0)} 噪声, {validation_report.get('invalid_removed_count', 0)} 无效数据",
                         f"质量评估: 置信度 {confidence_scores.get('overall', 0):.3f}, 质量评分 {data_quality_score:.3f}",
-                        f"数据后处理: 最终 {final_specs_count} 项规格"
+                        f"数据后处理: 最终 {final_specs_count} 项规格",
+                        f"关键路径: {' -> '.join(run.critical_path)} ({run.critical_path_latency:.2f}s)"
                     ]
                 }
             }
@@ -857,13 +883,13 @@ class AIAnalyzer:
             logger.error(f"❌ AI分析失败 - 文件: {file.filename}, 错误: {error_msg}")
             
             # 获取失败时的监控信息
-            if self.monitor:
-                error_monitor_summary = self.monitor.get_summary()
-                logger.error(f"💔 失败阶段分析: {error_monitor_summary}")
+            monitor.finish(error=error_msg)
+            error_monitor_summary = monitor.get_summary()
+            logger.error(f"💔 失败阶段分析: {error_monitor_summary}")
             
             # 🔧 增强错误分类和处理
             error_type = self._classify_error_type(e, error_msg)
-            detailed_error = self._generate_detailed_error_message(e, error_type, file.filename, doc_info if 'doc_info' in locals() else {})
+            detailed_error = self._generate_detailed_error_message(e, error_type, file.filename, ctx.doc_info)
             
             return {
                 'success': False,
@@ -871,19 +897,374 @@ class AIAnalyzer:
                 'error_type': error_type,
                 'error_details': detailed_error['details'],
                 'suggestions': detailed_error['suggestions'],
+                **({'retry_after': e.retry_after} if isinstance(e, MemoryAdmissionRejected) else {}),
                 'document_info': {
                     'filename': file.filename,
-                    'analysis_duration': error_monitor_summary['total_duration'] if self.monitor else 0,
+                    'analysis_duration': error_monitor_summary['total_duration'],
                     'file_type': getattr(file, 'mimetype', 'unknown')
                 },
                 # 🆕 错误调试信息
                 'debug_info': {
-                    'error_monitor_summary': error_monitor_summary if self.monitor else {},
-                    'failed_stage': max(error_monitor_summary['stages'].keys()) if self.monitor and error_monitor_summary['stages'] else 'unknown',
+                    'error_monitor_summary': error_monitor_summary,
+                    'failed_stage': getattr(e, 'stage', None) or getattr(e, 'step', None) or (max(error_monitor_summary['stages'].keys()) if error_monitor_summary['stages'] else 'unknown'),
                     'error_timestamp': datetime.now().isoformat()
                 }
             }
     
+    def _build_stage_graph(self, ctx: AnalysisContext) -> StageGraph:
+        """
+        构建分析阶段依赖图
+        
+        document_processing ─┬─ personalization（可选）──────────────┐
+                             ├─ ai_analysis ──┬─ data_quality_validation ─ quality_assessment ─ data_postprocessing
+                             └─ table_parsing（可选）┘
+        
+        个性化提示和表格解析只依赖提取出的文本，与大模型调用重叠执行；
+        可选阶段失败或超时时使用空结果，不影响主流程。
+        各阶段超时不超过当前请求截止时间的剩余预算（见 deadline.py），任务被取消时不再提交后续阶段
+        （见 cancellation.py）。
+        """
+        timeouts = self.STAGE_TIMEOUTS
+        
+        def stage(name, func, depends_on=(), **kwargs):
+            return Stage(name=name, func=self._bind_app_context(self._track_memory(ctx, name, func)),
+                         depends_on=depends_on, timeout=timeouts.get(name), **kwargs)
+        
+        return StageGraph([
+            stage('document_processing', lambda inputs: self._stage_document_processing(ctx)),
+            stage('personalization',
+                  lambda inputs: self._stage_personalization(ctx, inputs['document_processing']),
+                  ('document_processing',), optional=True, default={}, enabled=bool(ctx.user_id)),
+            stage('ai_analysis',
+                  lambda inputs: self._stage_ai_analysis(ctx, inputs['document_processing']),
+                  ('document_processing',)),
+            stage('table_parsing',
+                  lambda inputs: self._stage_table_parsing(ctx, inputs['document_processing']),
+                  ('document_processing',), optional=True),
+            stage('data_quality_validation',
+                  lambda inputs: self._stage_data_quality_validation(
+                      ctx, inputs['ai_analysis'], inputs['table_parsing'], inputs['document_processing']),
+                  ('ai_analysis', 'table_parsing', 'document_processing')),
+            stage('quality_assessment',
+                  lambda inputs: self._stage_quality_assessment(
+                      ctx, inputs['data_quality_validation'], inputs['personalization'],
+                      inputs['document_processing']),
+                  ('data_quality_validation', 'personalization', 'document_processing')),
+            stage('data_postprocessing',
+                  lambda inputs: self._stage_data_postprocessing(ctx, inputs['data_quality_validation']),
+                  ('quality_assessment', 'data_quality_validation')),
+        ], deadline=current_deadline(), cancellation=current_cancellation())
+    
+    @staticmethod
+    def _track_memory(ctx: AnalysisContext, name: str, func):
+        """记录阶段的峰值内存增量：按文件类型汇总到 memory_stats，本次分析的值记入 metrics['memory']"""
+        if not memory_sampler.enabled:
+            return func
+        
+        def run_with_memory_scope(inputs):
+            try:
+                with memory_scope(name, ctx.file_type) as usage:
+                    return func(inputs)
+            finally:
+                # 作用域退出后峰值才确定；失败的阶段同样记录
+                ctx.monitor.record_metrics('memory', {f'{name}_peak_mb': round(usage.peak_bytes / MB, 2)})
+        
+        return run_with_memory_scope
+    
+    @staticmethod
+    def _bind_app_context(func):
+        """阶段在线程池中执行，需要时为其推入调用方的Flask应用上下文（数据库访问依赖）"""
+        app = current_app._get_current_object() if has_app_context() else None
+        if app is None:
+            return func
+        
+        def run_in_app_context(inputs):
+            with app.app_context():
+                return func(inputs)
+        return run_in_app_context
+    
+    def _stage_document_processing(self, ctx: AnalysisContext) -> Dict[str, Any]:
+        """阶段1: 文档处理和文本提取，附带乱码检测和近重复查找"""
+        file = ctx.file
+        ctx.monitor.stage_start("document_processing")
+        logger.info(f"📄 开始处理文档: {file.filename} ({ctx.file_size} bytes)")
+        
+        text_content, doc_info = self.document_processor.process_document(file, content_hash=ctx.content_hash)
+        ctx.doc_info = doc_info
+        
+        # 结构化表格只供表格解析阶段使用，不随文档信息返回
+        structured_tables = doc_info.pop('structured_tables', None)
+        if structured_tables is not None:
+            doc_info['structured_table_count'] = len(structured_tables.get('tables', []))
+        
+        # 记录文档处理指标
+        ctx.monitor.record_metrics('text_extraction', {
+            'text_length': len(text_content),
+            'doc_format': doc_info.get('format', 'unknown'),
+            'pages': doc_info.get('pages', 0),
+            'encoding': doc_info.get('encoding', 'unknown'),
+            'cache_hit': doc_info.get('cache_hit', False)
+        })
+        
+        if not text_content.strip():
+            raise ValueError("Document contains no readable text content")
+            
+        ctx.monitor.stage_end("document_processing", 
+                             text_chars=len(text_content), 
+                             format=doc_info.get('format', 'unknown'))
+        
+        # 🔍 增强乱码检测 - 使用文档处理器的增强算法
+        if self.document_processor._enhanced_corruption_detection(text_content, doc_info.get('type', '')):
+            error_msg = self._generate_corruption_error_message(file.filename, doc_info)
+            raise ValueError(error_msg)
+        
+        # 🔍 近重复检测：与历史文档只差少量行时复用历史分析结果
+        fingerprint = compute_fingerprint(text_content)
+        near_duplicate = self._find_near_duplicate(fingerprint, ctx.user_id)
+        if near_duplicate:
+            doc_info['near_duplicate_of'] = near_duplicate['record_id']
+            doc_info['near_duplicate_similarity'] = near_duplicate['similarity']
+        
+        return {
+            'text': text_content,
+            'doc_info': doc_info,
+            'structured_tables': structured_tables,
+            'fingerprint': fingerprint,
+            'near_duplicate': near_duplicate
+        }
+    
+    def _stage_personalization(self, ctx: AnalysisContext, document: Dict[str, Any]) -> Dict[str, Any]:
+        """阶段2: 个性化学习引擎（可选）"""
+        ctx.monitor.stage_start("personalization")
+        personalized_hints = self.learning_engine.get_personalized_hints(
+            user_id=ctx.user_id,
+            document_type=document['doc_info'].get('type', 'unknown'),
+            extracted_data={}
+        )
+        ctx.monitor.stage_end("personalization", hints_count=len(personalized_hints))
+        return personalized_hints
+    
+    def _stage_ai_analysis(self, ctx: AnalysisContext, document: Dict[str, Any]) -> Dict[str, Any]:
+        """阶段3: AI文档分析（近重复命中时复用历史结果）"""
+        ctx.monitor.stage_start("ai_analysis")
+        text_content = document['text']
+        near_duplicate = document['near_duplicate']
+        logger.info(f"🤖 开始AI分析，文本长度: {len(text_content)} 字符")
+        
+        if near_duplicate:
+            ai_result = self._recheck_near_duplicate(near_duplicate, document['fingerprint'].lines)
+            near_duplicate_index.record_hit(llm_calls_avoided=1)
+            logger.info(f"♻️ 复用近重复文档的分析结果: 记录 {near_duplicate['record_id']} "
+                        f"(相似度 {near_duplicate['similarity']:.3f}, 复核 {len(near_duplicate['added_lines'])} 行)")
+        else:
+            ai_result = self.ai_client.analyze_product_document(
+                document_content=text_content,
+                document_name=ctx.file.filename or "unknown"
+            )
+        
+        # 记录AI分析指标
+        ai_specs_count = len(ai_result.get('specifications', {}))
+        ai_confidence = ai_result.get('confidence', {}).get('overall', 0)
+        ctx.monitor.record_metrics('ai_analysis', {
+            'specifications_extracted': ai_specs_count,
+            'ai_confidence': ai_confidence,
+            'has_basic_info': bool(ai_result.get('basic_info', {}).get('name', '')),
+            'near_duplicate_reused': bool(near_duplicate),
+            'llm_calls_avoided': 1 if near_duplicate else 0
+        })
+        ctx.monitor.stage_end("ai_analysis", 
+                             specs_count=ai_specs_count, 
+                             confidence=ai_confidence)
+        ctx.monitor.publish_partial('basic_info', ai_result.get('basic_info', {}))
+        ctx.monitor.publish_partial('specifications', ai_result.get('specifications', {}))
+        return ai_result
+    
+    def _stage_table_parsing(self, ctx: AnalysisContext, document: Dict[str, Any]) -> Dict[str, Any]:
+        """阶段4: 表格解析（只依赖文本，与AI分析并行；可选）"""
+        ctx.monitor.stage_start("table_parsing")
+        logger.info(f"📊 开始表格解析")
+        
+        table_results = self.table_parser.parse_document_tables(
+            document['text'], document['structured_tables'])
+        
+        ctx.monitor.record_metrics('table_parsing', {
+            'tables_found': table_results.get('tables_found', 0),
+            'structured_tables': document['doc_info'].get('structured_table_count', 0),
+            'parsing_confidence': table_results.get('parsing_confidence', 0)
+        })
+        ctx.monitor.stage_end("table_parsing", tables_found=table_results.get('tables_found', 0))
+        ctx.monitor.publish_partial('table_specifications', table_results.get('specifications', {}))
+        return table_results
+    
+    def _stage_data_quality_validation(self, ctx: AnalysisContext, ai_result: Dict[str, Any],
+                                       table_results: Optional[Dict[str, Any]],
+                                       document: Dict[str, Any]) -> Dict[str, Any]:
+        """阶段5: 合并表格解析结果，数据质量验证和清洁"""
+        ctx.monitor.stage_start("data_quality_validation")
+        
+        ai_specs_count = len(ai_result.get('specifications', {}))
+        enhanced_result = self.table_parser.merge_table_results(ai_result, table_results)
+        enhanced_specs_count = len(enhanced_result.get('specifications', {}))
+        ctx.monitor.record_metrics('table_parsing', {
+            'specs_after_enhancement': enhanced_specs_count,
+            'enhancement_gain': enhanced_specs_count - ai_specs_count
+        })
+        
+        logger.info("🔍 开始数据质量验证和清洁...")
+        quality_validation = self.quality_validator.validate_extracted_data(enhanced_result)
+        validation_report = quality_validation['validation_report']
+        data_quality_score = quality_validation['data_quality_score']
+        
+        # 记录质量验证结果
+        logger.info(f"📊 数据质量验证完成 - 质量评分: {data_quality_score:.2f}")
+        if validation_report['noise_removed_count'] > 0:
+            logger.info(f"🧹 清除格式噪声: {validation_report['noise_removed_count']}项")
+        if validation_report['invalid_removed_count'] > 0:
+            logger.info(f"🗑️ 清除无效参数: {validation_report['invalid_removed_count']}项")
+        logger.info(f"✅ 最终有效规格参数: {validation_report['final_specs_count']}项")
+        
+        ctx.monitor.stage_end("data_quality_validation", 
+                             quality_score=data_quality_score,
+                             noise_removed=validation_report['noise_removed_count'],
+                             invalid_removed=validation_report['invalid_removed_count'])
+        return {
+            'cleaned_data': quality_validation['cleaned_data'],
+            'validation_report': validation_report,
+            'data_quality_score': data_quality_score,
+            'ai_specs_count': ai_specs_count,
+            'enhanced_specs_count': enhanced_specs_count
+        }
+    
+    def _stage_quality_assessment(self, ctx: AnalysisContext, validation: Dict[str, Any],
+                                  personalized_hints: Dict[str, Any],
+                                  document: Dict[str, Any]) -> Dict[str, Any]:
+        """阶段6: 质量评估和置信度计算"""
+        ctx.monitor.stage_start("quality_assessment")
+        confidence_scores = self.confidence_scorer.calculate_comprehensive_confidence(
+            extracted_data=validation['cleaned_data'],
+            document_info=document['doc_info'],
+            historical_context=(personalized_hints or {}).get('pattern_context') if ctx.user_id else None
+        )
+        
+        # 如果数据质量验证器调整了置信度，使用调整后的值
+        validation_report = validation['validation_report']
+        if 'confidence_adjustments' in validation_report and validation_report['confidence_adjustments']:
+            confidence_scores = validation_report['confidence_adjustments']
+        
+        ctx.monitor.stage_end("quality_assessment", confidence=confidence_scores.get('overall', 0))
+        ctx.monitor.publish_partial('quality', {
+            'confidence_scores': confidence_scores,
+            'data_quality_score': validation['data_quality_score'],
+            'specifications_count': validation_report['final_specs_count']
+        })
+        return confidence_scores
+    
+    def _stage_data_postprocessing(self, ctx: AnalysisContext,
+                                   validation: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        """阶段7: 数据后处理和修复，返回 (最终提取结果, 最终规格数)"""
+        ctx.monitor.stage_start("data_postprocessing")
+        enhanced_result = validation['cleaned_data']
+        filename = ctx.file.filename
+        
+        # 智能修复产品名称（如果规格提取成功但名称为空）
+        current_name = enhanced_result.get('basic_info', {}).get('name', '')
+        logger.info(f"🔍 检查产品名称修复 - 当前名称: '{current_name}', 有规格参数: {bool(enhanced_result.get('specifications'))}")
+        
+        if not current_name.strip() and enhanced_result.get('specifications'):
+            logger.info(f"🔧 开始修复缺失的产品名称，文件名: {filename}")
+            enhanced_result = self._fix_missing_product_name(enhanced_result, filename or "unknown")
+            new_name = enhanced_result.get('basic_info', {}).get('name', '')
+            logger.info(f"✅ 产品名称修复完成: '{new_name}'")
+        
+        # 最终数据清理 - 确保所有规格参数都是有效的
+        final_specs_count = 0
+        if enhanced_result.get('specifications'):
+            cleaned_specs = self.table_parser._clean_specification_data(enhanced_result['specifications'])
+            enhanced_result['specifications'] = cleaned_specs
+            final_specs_count = len(cleaned_specs)
+            logger.info(f"最终规格参数清理完成，保留 {final_specs_count} 项有效参数")
+        
+        ctx.monitor.stage_end("data_postprocessing", final_specs_count=final_specs_count)
+        return enhanced_result, final_specs_count
+    
+
+    def _find_near_duplicate(self, fingerprint: DocumentFingerprint, user_id=None) -> Optional[Dict[str, Any]]:
+        """在当前用户自己的历史分析中查找可复用的近重复文档，附带历史提取结果"""
+        match = near_duplicate_index.find(fingerprint, user_id=user_id)
+        if not match:
+            return None
+        
+        record = self._load_analysis_record(match['record_id'])
+        if not record or not record.success or not record.get_extracted_data():
+            return None
+        if record.user_id is not None and str(record.user_id) != str(user_id):
+            return None
+        
+        match['extracted_data'] = copy.deepcopy(record.get_extracted_data())
+        return match
+    
+    @staticmethod
+    def _load_analysis_record(record_id: int):
+        """加载历史分析记录（需要应用上下文，失败时返回None）"""
+        try:
+            from ..models.ai_analysis import AIAnalysisRecord
+            return AIAnalysisRecord.query.get(record_id)
+        except Exception as e:
+            logger.debug(f"近重复历史记录加载失败: {str(e)}")
+            return None
+    
+    def _recheck_near_duplicate(self, near_duplicate: Dict[str, Any], current_lines: List[str]) -> Dict[str, Any]:
+        """
+        以历史提取结果为基础，只对新文档中的差异行做规则复核
+        
+        新增行里解析出的规格参数覆盖同名旧值（如改了电压等级），不调用大模型；
+        来自已删除行的字段（删除行中解析出的同名参数，或取值只出现在删除行中）从结果中移除。
+        """
+        ai_result = near_duplicate['extracted_data']
+        added_lines = near_duplicate['added_lines']
+        removed_lines = near_duplicate.get('removed_lines', [])
+        if not added_lines and not removed_lines:
+            return ai_result
+        
+        # 差异行通常零散分布，逐行按键值对解析，不依赖连续的表格区域
+        delta_specs = self._parse_line_specs(added_lines)
+        specifications = ai_result.setdefault('specifications', {})
+        
+        if removed_lines:
+            removed_specs = self._parse_line_specs(removed_lines)
+            removed_text = '\n'.join(removed_lines).lower()
+            current_text = '\n'.join(current_lines).lower()
+            
+            def only_in_removed(value) -> bool:
+                value = str(value or '').strip().lower()
+                return len(value) >= 2 and value in removed_text and value not in current_text
+            
+            for spec_name in list(specifications):
+                spec = specifications[spec_name]
+                value = spec.get('value') if isinstance(spec, dict) else spec
+                if spec_name not in delta_specs and (spec_name in removed_specs or only_in_removed(value)):
+                    del specifications[spec_name]
+            basic_info = ai_result.get('basic_info') or {}
+            for field, value in basic_info.items():
+                if isinstance(value, str) and only_in_removed(value):
+                    basic_info[field] = ''
+        
+        for spec_name, spec_value in delta_specs.items():
+            parsed = self.table_parser._parse_value_with_unit(spec_value)
+            specifications[spec_name] = {
+                'value': spec_value,
+                'unit': parsed.get('unit', ''),
+                'description': '近重复文档差异行复核'
+            }
+        return ai_result
+    
+    def _parse_line_specs(self, lines: List[str]) -> Dict[str, Any]:
+        """逐行按键值对解析规格参数并清洗"""
+        if not lines:
+            return {}
+        parsed = self.table_parser._parse_colon_table(lines)
+        return self.table_parser._clean_specification_data(parsed.get('pairs', {}))
+    
     def _fix_missing_product_name(self, extracted_data: Dict[str, Any], filename: str) -> Dict[str, Any]:
         """智能修复缺失的产品名称"""
         try:
@@ -1084,6 +1465,15 @@ class AIAnalyzer:
     
     def _classify_error_type(self, exception: Exception, error_msg: str) -> str:
         """分类错误类型"""
+        if isinstance(exception, DeadlineExceeded):
+            return "deadline_exceeded"
+        if isinstance(exception, OperationCancelled):
+            return "cancelled"
+        if isinstance(exception, MemoryAdmissionRejected):
+            return "memory_limit"
+        if isinstance(exception, StageTimeoutError):
+            return "ai_service_timeout" if exception.stage == 'ai_analysis' else "timeout_error"
+        
         error_msg_lower = error_msg.lower()
         
         # 文档处理相关错误
@@ -1295,6 +1685,44 @@ class AIAnalyzer:
                     "检查网络连接稳定性"
                 ]
             },
+            "deadline_exceeded": {
+                "title": "请求超时",
+                "message": "分析未能在请求时限内完成，已提前终止",
+                "details": [
+                    f"剩余时间不足以完成步骤: {getattr(exception, 'step', 'unknown')}",
+                    "请求排队或前序步骤耗时过长"
+                ],
+                "suggestions": [
+                    "稍后重试",
+                    "使用异步模式提交大文档（?async=true）",
+                    "分段处理复杂文档"
+                ]
+            },
+            "memory_limit": {
+                "title": "内存不足，暂不处理",
+                "message": "预计分析此文档会使服务超过内存上限，已暂缓处理",
+                "details": [
+                    f"预计占用内存: {getattr(exception, 'predicted', 0) / MB:.1f}MB",
+                    f"服务内存上限: {getattr(exception, 'ceiling', 0) / MB:.0f}MB",
+                    "文档过大或当前并发分析较多" if getattr(exception, 'reason', '') == 'deferred_timeout'
+                    else "文档过大，超过单个服务进程的处理能力"
+                ],
+                "suggestions": [
+                    f"{getattr(exception, 'retry_after', 30)}秒后重试",
+                    "拆分或压缩大型文档（如扫描版PDF、含大量图片的PPT）"
+                ]
+            },
+            "cancelled": {
+                "title": "分析已取消",
+                "message": "分析任务已被取消，未完成的步骤不再执行",
+                "details": [
+                    f"取消时的步骤: {getattr(exception, 'step', 'unknown')}",
+                    f"取消原因: {getattr(exception, 'reason', None) or '用户取消'}"
+                ],
+                "suggestions": [
+                    "需要结果时重新提交分析"
+                ]
+            },
             "unknown_error": {
                 "title": "未知错误",
                 "message": f"处理文档 '{filename}' 时发生未知错误",
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+单文档异步分析任务管理
+任务状态、阶段进度事件和中间结果保存在 analysis_jobs 表中（多个工作进程共享）；
+同一进程内的等待者通过条件变量立即唤醒，其他进程按轮询间隔读取数据库。
+取消请求先把任务标记为已取消；执行任务的进程在本进程内直接取消令牌，
+其他进程在写入下一个进度事件时发现任务已取消并取消本地令牌（见 cancellation.py）。
+"""
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from ..models.base import db
+from ..models.analysis_job import (
+    AnalysisJob, JOB_QUEUED, JOB_FAILED, JOB_CANCELLED, MAX_JOB_EVENTS
+)
+from .cancellation import cancellation_registry
+
+logger = logging.getLogger(__name__)
+
+# 各阶段完成时累计的进度权重（百分比），个性化为可选阶段不计入
+STAGE_PROGRESS_WEIGHTS = {
+    'document_processing': 15,
+    'ai_analysis': 55,
+    'table_parsing': 5,
+    'data_quality_validation': 10,
+    'quality_assessment': 5,
+    'data_postprocessing': 5
+}
+# 保存分析记录前的进度上限，剩余部分在任务结束时补齐
+PROGRESS_BEFORE_SAVE = sum(STAGE_PROGRESS_WEIGHTS.values())
+
+
+class AnalysisJobManager:
+    """异步分析任务的创建、进度记录和等待"""
+
+    def __init__(self, poll_interval: float = 0.5):
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()  # 同一任务的多个阶段线程可能同时写事件
+
+    def create_job(self, user_id: str, filename: str, file_size: int) -> AnalysisJob:
+        """创建排队中的任务（需要应用上下文）"""
+        job = AnalysisJob(
+            job_id=uuid.uuid4().hex,
+            user_id=str(user_id) if user_id is not None else None,
+            filename=filename,
+            file_size=file_size,
+            status=JOB_QUEUED,
+            progress=0.0,
+            events=[]
+        )
+        job.save()
+        self._append_event(job.job_id, {'type': 'queued', 'timestamp': time.time()})
+        return job
+
+    def get_job(self, job_id: str) -> Optional[AnalysisJob]:
+        """读取任务的最新状态（丢弃会话中的缓存对象）"""
+        db.session.expire_all()
+        return AnalysisJob.query.filter_by(job_id=job_id).first()
+
+    def progress_listener(self, app, job_id: str) -> Callable[[Dict[str, Any]], None]:
+        """返回 AnalysisMonitor 监听器：把阶段事件写入任务（在阶段线程中执行）"""
+        def listener(event: Dict[str, Any]):
+            with app.app_context():
+                self._append_event(job_id, event)
+        return listener
+
+    def mark_running(self, job_id: str) -> bool:
+        """
+        标记任务开始执行
+
+        Returns:
+            bool: 任务是否仍需执行（排队期间已被取消时为False）
+        """
+        job = self.get_job(job_id)
+        if job is not None and job.status == JOB_CANCELLED:
+            return False
+        self._update(job_id, lambda job: job.status == JOB_CANCELLED or job.mark_running(), {'type': 'running'})
+        return True
+
+    def cancel(self, job_id: str, reason: str = None) -> bool:
+        """
+        取消任务：标记为已取消并取消本进程内正在执行的分析
+
+        Returns:
+            bool: 是否取消成功（任务已结束时为False）
+        """
+        job = self.get_job(job_id)
+        if job is None or job.finished:
+            return False
+        state = {'cancelled': False}
+
+        def apply(job):
+            if not job.finished:
+                job.mark_cancelled(reason)
+                state['cancelled'] = True
+        self._update(job_id, apply, {'type': 'cancelled', 'reason': reason})
+        if state['cancelled']:
+            cancellation_registry.cancel('analysis', job_id, reason)
+        return state['cancelled']
+
+    def finish(self, job_id: str, result: Dict[str, Any], status_code: int):
+        """记录最终结果（与同步接口的响应内容一致）；已取消的任务保持取消状态"""
+        def apply(job):
+            if job.status != JOB_CANCELLED:
+                job.mark_finished(result, status_code)
+        self._update(job_id, apply, {
+            'type': 'finished',
+            'success': bool(result.get('success')),
+            'analysis_id': result.get('analysis_id')
+        })
+
+    def fail(self, job_id: str, error: str):
+        """任务未能执行（如排队超时）"""
+        def apply(job):
+            job.status = JOB_FAILED
+            job.error_message = error
+            job.finished_at = datetime.utcnow()
+        self._update(job_id, apply, {'type': 'finished', 'success': False, 'error': error})
+
+    def wait_for_update(self, job_id: str, since: int, timeout: float) -> Optional[AnalysisJob]:
+        """
+        等待任务出现序号大于 since 的事件或结束，最多等待 timeout 秒
+
+        Returns:
+            Optional[AnalysisJob]: 最新的任务状态；任务不存在时返回None
+        """
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            job = self.get_job(job_id)
+            if job is None or job.finished or job.get_events(since):
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            with self._condition:
+                self._condition.wait(min(self.poll_interval, remaining))
+
+    def _append_event(self, job_id: str, event: Dict[str, Any]):
+        def apply(job):
+            if job.status == JOB_CANCELLED:
+                # 取消请求可能由其他进程处理：在执行任务的进程中取消本地令牌
+                cancellation_registry.cancel('analysis', job_id, job.error_message)
+            stage = event.get('stage')
+            if event.get('type') == 'stage_start' and stage:
+                job.current_stage = stage
+            elif event.get('type') == 'stage_end' and stage in STAGE_PROGRESS_WEIGHTS:
+                job.progress = min(PROGRESS_BEFORE_SAVE, (job.progress or 0.0) + STAGE_PROGRESS_WEIGHTS[stage])
+            elif event.get('type') == 'partial_result' and event.get('section'):
+                # 重新赋值字典，JSON列才会被标记为已修改
+                job.partial_result = {**(job.partial_result or {}), event['section']: event.get('data')}
+        # 快照只保存在中间结果槽位中，事件本身只记录分区和耗时
+        recorded = {key: value for key, value in event.items()
+                    if not (key == 'data' and event.get('type') == 'partial_result')}
+        self._update(job_id, apply, recorded)
+
+    def _update(self, job_id: str, apply: Callable[[AnalysisJob], Any], event: Dict[str, Any] = None):
+        with self._write_lock:
+            try:
+                job = self.get_job(job_id)
+                if job is None:
+                    return
+                apply(job)
+                if event is not None:
+                    events = list(job.events or [])
+                    seq = events[-1]['seq'] + 1 if events else 1
+                    events.append({'seq': seq, 'timestamp': time.time(), **event})
+                    # 重新赋值列表，JSON列才会被标记为已修改
+                    job.events = events[-MAX_JOB_EVENTS:]
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"⚠️ 更新异步分析任务 {job_id} 失败: {str(e)}")
+                return
+        with self._condition:
+            self._condition.notify_all()
+
+
+# 全局任务管理器实例
+analysis_job_manager = AnalysisJobManager()
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+分析流水线追踪
+每个阶段（含每次大模型调用尝试、OCR识别、数据库写入）记录为带父子关系的span，
+按（阶段, 文件类型）维护进程内延迟直方图，并可将追踪导出为 Chrome Trace Event 格式
+（chrome://tracing、Perfetto、speedscope 可直接打开，做火焰图式的离线分析）。
+"""
+import os
+import json
+import time
+import uuid
+import bisect
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_API_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 全部文件类型的汇总键
+ALL_FILE_TYPES = '*'
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('analysis_current_span', default=None)
+
+
+@dataclass
+class Span:
+    """一个计时区间；file_type 未显式给出时继承父span"""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float
+    file_type: str = 'unknown'
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    end: Optional[float] = None
+    status: str = 'ok'
+    error: Optional[str] = None
+    thread_id: int = 0
+    _start_perf: float = 0.0
+    _trace: Optional[List['Span']] = field(default=None, repr=False)
+
+    @property
+    def duration(self) -> float:
+        return (self.end - self.start) if self.end is not None else 0.0
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def fail(self, error: str):
+        """标记为失败（异常在内部处理、未向外抛出时使用）"""
+        self.status = 'error'
+        self.error = error
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start,
+            'duration': round(self.duration, 6),
+            'file_type': self.file_type,
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes
+        }
+
+    def to_chrome_event(self) -> Dict[str, Any]:
+        """Chrome Trace Event（完整事件 ph=X，时间单位微秒）"""
+        return {
+            'name': self.name,
+            'cat': 'analysis',
+            'ph': 'X',
+            'ts': int(self.start * 1e6),
+            'dur': int(self.duration * 1e6),
+            'pid': os.getpid(),
+            'tid': self.thread_id,
+            'args': {
+                'trace_id': self.trace_id,
+                'span_id': self.span_id,
+                'parent_id': self.parent_id,
+                'file_type': self.file_type,
+                'status': self.status,
+                **({'error': self.error} if self.error else {}),
+                **{key: value for key, value in self.attributes.items()
+                   if isinstance(value, (str, int, float, bool)) or value is None}
+            }
+        }
+
+
+def _bucket_bounds(start: float, stop: float, factor: float) -> List[float]:
+    bounds, bound = [], start
+    while bound < stop:
+        bounds.append(round(bound, 6))
+        bound *= factor
+    return bounds
+
+
+class LatencyHistogram:
+    """
+    对数分桶的延迟直方图
+
+    桶边界从1ms开始按1.25倍递增到约30分钟，分位数在桶内线性插值，
+    相对误差不超过一个桶宽（约25%），内存占用固定，可跨进程按桶合并。
+    """
+
+    BOUNDS = _bucket_bounds(0.001, 1800, 1.25)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        seconds = max(0.0, seconds)
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.min = seconds if self.min is None else min(self.min, seconds)
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if not bucket_count:
+                continue
+            if seen + bucket_count >= rank:
+                lower = self.BOUNDS[index - 1] if index > 0 else 0.0
+                upper = self.BOUNDS[index] if index < len(self.BOUNDS) else self.max
+                # 估计值限制在实际观测到的最小/最大值之间
+                lower, upper = max(lower, self.min), min(upper, self.max)
+                fraction = (rank - seen) / bucket_count
+                return lower + (upper - lower) * fraction
+            seen += bucket_count
+        return self.max
+
+    def snapshot(self, include_buckets: bool = False) -> Dict[str, Any]:
+        data = {
+            'count': self.count,
+            'mean': round(self.total / self.count, 4) if self.count else 0.0,
+            'max': round(self.max, 4),
+            'p50': round(self.percentile(50), 4),
+            'p95': round(self.percentile(95), 4),
+            'p99': round(self.percentile(99), 4)
+        }
+        if include_buckets:
+            data['buckets'] = [
+                {'le': self.BOUNDS[i] if i < len(self.BOUNDS) else '+Inf', 'count': c}
+                for i, c in enumerate(self.counts) if c
+            ]
+        return data
+
+
+class AnalysisTracer:
+    """
+    进程内追踪器
+
+    当前span保存在ContextVar中：阶段图在线程池执行时复制调用方上下文，
+    阶段内部创建的span（如大模型调用尝试）自动挂到对应阶段下。
+    根span结束时整条追踪进入最近追踪缓冲区；设置了 trace_file 时同时追加写入文件。
+    """
+
+    def __init__(self, trace_file: str = None, max_traces: int = 200, enabled: bool = None):
+        self.trace_file = trace_file if trace_file is not None else os.environ.get('ANALYSIS_TRACE_FILE', '')
+        self.enabled = enabled if enabled is not None else \
+            os.environ.get('ANALYSIS_TRACING_ENABLED', 'true').lower() == 'true'
+        self.recent_traces = deque(maxlen=max_traces)
+        self.histograms: Dict[tuple, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+
+    # ---- span 生命周期 ----
+
+    def start_span(self, name: str, parent: Optional[Span] = None, file_type: str = None,
+                   **attributes) -> Span:
+        """开始一个span；parent 未给出时使用当前span，没有当前span则开始新的追踪"""
+        parent = parent if parent is not None else _current_span.get()
+        now = time.time()
+        if parent is not None:
+            trace_id, parent_id, trace = parent.trace_id, parent.span_id, parent._trace
+            file_type = file_type or parent.file_type
+        else:
+            trace_id, parent_id, trace = uuid.uuid4().hex, None, []
+        span = Span(name=name, trace_id=trace_id, span_id=uuid.uuid4().hex[:16], parent_id=parent_id,
+                    start=now, file_type=file_type or 'unknown', attributes=attributes,
+                    thread_id=threading.get_ident(), _start_perf=time.perf_counter(), _trace=trace)
+        return span
+
+    def finish_span(self, span: Span, error: str = None, **attributes):
+        """结束span，记录延迟直方图；根span结束时归档整条追踪"""
+        if span.end is not None:
+            return
+        span.end = span.start + (time.perf_counter() - span._start_perf)
+        span.attributes.update(attributes)
+        if error:
+            span.fail(error)
+        if not self.enabled:
+            return
+
+        with self._lock:
+            for file_type in (span.file_type, ALL_FILE_TYPES):
+                key = (span.name, file_type)
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = LatencyHistogram()
+                histogram.observe(span.duration)
+            span._trace.append(span)
+            if span.parent_id is None:
+                self.recent_traces.append(span._trace)
+
+        if span.parent_id is None and self.trace_file:
+            self._append_to_file(self.trace_file, span._trace)
+
+    @staticmethod
+    def activate(span: Span):
+        """将span设为当前span，返回用于 deactivate 的token"""
+        return _current_span.set(span)
+
+    @staticmethod
+    def deactivate(token):
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # token 来自其他上下文（如阶段在不同线程结束），忽略
+            pass
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name: str, file_type: str = None, **attributes):
+        """在上下文内记录一个子span；异常向外抛出时span标记为失败"""
+        span = self.start_span(name, file_type=file_type, **attributes)
+        token = self.activate(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(str(e) or type(e).__name__)
+            raise
+        finally:
+            self.deactivate(token)
+            self.finish_span(span)
+
+    # ---- 查询与导出 ----
+
+    def get_latency_report(self, stage: str = None, file_type: str = None,
+                           include_buckets: bool = False) -> Dict[str, Any]:
+        """按阶段和文件类型返回 p50/p95/p99 等统计，file_type='*' 为全部类型汇总"""
+        report: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for (name, ftype), histogram in sorted(self.histograms.items()):
+                if stage and name != stage:
+                    continue
+                if file_type and ftype != file_type:
+                    continue
+                report.setdefault(name, {})[ftype] = histogram.snapshot(include_buckets)
+        return report
+
+    def get_recent_traces(self, limit: int = 20) -> List[List[Dict[str, Any]]]:
+        with self._lock:
+            traces = list(self.recent_traces)[-limit:] if limit else list(self.recent_traces)
+            return [[span.to_dict() for span in sorted(trace, key=lambda s: s.start)] for trace in traces]
+
+    def dump_traces(self, path: str = None) -> Dict[str, Any]:
+        """将最近的追踪写为 Chrome Trace Event JSON 文件，返回路径和数量"""
+        if not path:
+            trace_dir = os.path.join(_API_ROOT, 'instance', 'traces')
+            path = os.path.join(trace_dir, f"analysis-trace-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            traces = list(self.recent_traces)
+            events = [span.to_chrome_event() for trace in traces for span in trace]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        logger.info(f"🧭 已导出 {len(traces)} 条分析追踪到 {path}")
+        return {'path': path, 'traces': len(traces), 'spans': len(events)}
+
+    def _append_to_file(self, path: str, trace: List[Span]):
+        """
+        追加写入 JSON Array 格式的追踪文件
+
+        Chrome Trace Event 格式允许省略结尾的 ']'，因此可以持续追加而不需要改写文件。
+        """
+        try:
+            with self._file_lock:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+                lines = ''.join(json.dumps(span.to_chrome_event(), ensure_ascii=False) + ',\n'
+                                for span in trace)
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(('[\n' if is_new else '') + lines)
+        except OSError as e:
+            logger.warning(f"⚠️ 追踪文件写入失败: {str(e)}")
+
+    def reset(self):
+        """清空直方图和最近追踪"""
+        with self._lock:
+            self.histograms.clear()
+            self.recent_traces.clear()
+
+
+def file_type_of(filename: str) -> str:
+    """按扩展名得到文件类型（小写，无扩展名时为 unknown）"""
+    if filename and '.' in filename:
+        return filename.rsplit('.', 1)[1].lower()
+    return 'unknown'
+
+
+# 全局追踪器实例
+analysis_tracer = AnalysisTracer()
@@ -9,9 +9,10 @@ import time
 import uuid
 import logging
 import threading
-from typing import Dict, List, Any, Optional, Callable
+from typing import Deque, Dict, List, Any, Optional, Callable
+from collections import deque
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import as_completed, wait
 from werkzeug.datastructures import FileStorage
 from dataclasses import dataclass
 from enum import Enum
@@ -19,9 +20,21 @@ from enum import Enum
 from .ai_analyzer import AIAnalyzer
 from .business_analyzer import BusinessAnalyzer
 from .document_processor import DocumentProcessor
+from .extraction_cache import compute_content_hash
+from .cancellation import (
+    CancellationToken, OperationCancelled, cancellation_scope, cancellation_registry,
+    cancellable_sleep, check_cancelled
+)
+from .batch_scheduler import FairTaskPool
+from .content_spool import content_spool
+from .batch_queue import BatchQueue, BatchQueueWorker, BATCH_QUEUE_EMBEDDED_WORKERS
+from src.utils.encoding_detection import decode_text
 
 logger = logging.getLogger(__name__)
 
+# 进程内保留的已结束批量任务数（结果仍可通过状态/结果接口读取，更早的任务从数据库读取）
+BATCH_JOB_HISTORY_LIMIT = int(os.environ.get('BATCH_JOB_HISTORY_LIMIT', 100))
+
 class BatchStatus(Enum):
     """批量处理状态"""
     PENDING = 'pending'
@@ -46,7 +59,9 @@ class BatchFile:
     original_filename: str
     file_size: int
     file_type: str
-    content: str = None  # 文件内容
+    content: str = None  # 文件内容（已暂存时只在文件任务执行期间加载）
+    content_ref: str = None  # 暂存内容引用（见 content_spool）
+    content_hash: str = None  # 文件内容SHA-256
     status: FileStatus = FileStatus.QUEUED
     analysis_result: Dict[str, Any] = None
     error_message: str = None
@@ -77,7 +92,13 @@ class BatchJob:
 class BatchProcessor:
     """批量文档处理器"""
     
-    def __init__(self, max_workers: int = 3, max_concurrent_batches: int = 5):
+    def __init__(self, max_workers: int = 3, max_concurrent_batches: int = 5, queue: BatchQueue = None):
+        """
+        Args:
+            max_workers: 文件分析并发数
+            max_concurrent_batches: 同时处理的批量任务数（仅进程内执行）
+            queue: 持久化任务队列；设置后任务入队由工作进程执行，状态和结果从数据库读取
+        """
         self.ai_analyzer = AIAnalyzer()
         self.business_analyzer = BusinessAnalyzer()
         self.document_processor = DocumentProcessor()
@@ -88,8 +109,15 @@ class BatchProcessor:
         
         # 批量任务管理
         self.active_jobs: Dict[str, BatchJob] = {}
-        self.job_history: List[BatchJob] = []
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.job_history: Deque[BatchJob] = deque(maxlen=BATCH_JOB_HISTORY_LIMIT)
+        self.spool = content_spool
+        # 所有批量任务共享的文件任务池，按任务轮转调度；批量任务的协调在各自的协调线程中进行，不占用池中线程
+        self.executor = FairTaskPool(max_workers=max_workers, thread_name_prefix='batch-file')
+        self._coordinators: Dict[str, threading.Thread] = {}
+        
+        # 持久化队列与进程内嵌的队列工作线程（首次入队时启动）
+        self.queue = queue
+        self.queue_worker: Optional[BatchQueueWorker] = None
         
         # 进度回调
         self.progress_callbacks: Dict[str, List[Callable]] = {}
@@ -105,6 +133,11 @@ class BatchProcessor:
             'average_file_time': 0.0
         }
     
+    @property
+    def durable(self) -> bool:
+        """任务是否由持久化队列执行"""
+        return self.queue is not None
+    
     def create_batch_job(self, files: List[FileStorage], user_id: int, 
                         settings: Dict[str, Any] = None) -> str:
         """
@@ -168,7 +201,11 @@ class BatchProcessor:
                 
                 if job.status != BatchStatus.PENDING:
                     raise ValueError(f"Batch job {job_id} is not in pending status")
-                
+            
+            if self.durable:
+                return self._enqueue_batch_job(job_id)
+            
+            with self._lock:
                 # 检查并发限制
                 active_count = sum(1 for j in self.active_jobs.values() 
                                  if j.status == BatchStatus.PROCESSING)
@@ -191,8 +228,13 @@ class BatchProcessor:
                 job.status = BatchStatus.PROCESSING
                 job.start_time = datetime.now()
             
-            # 提交处理任务
-            future = self.executor.submit(self._process_batch_job, job)
+            # 提交处理任务；取消接口通过任务ID找到令牌，中断正在处理的文件并取消排队中的文件
+            token = cancellation_registry.register('batch', job_id, CancellationToken('batch'))
+            coordinator = threading.Thread(target=self._process_batch_job, args=(job, token),
+                                           name=f'batch-coordinator-{job_id}', daemon=True)
+            with self._lock:
+                self._coordinators[job_id] = coordinator
+            coordinator.start()
             
             logger.info(f"Batch processing started for job {job_id}")
             return True
@@ -227,6 +269,8 @@ class BatchProcessor:
                         break
                 
                 if not job:
+                    if self.durable:
+                        return self.queue.get_job_status(job_id)
                     raise ValueError(f"Batch job {job_id} not found")
             
             # 计算进度
@@ -265,6 +309,7 @@ class BatchProcessor:
                     {
                         'file_id': f.id,
                         'filename': f.filename,
+                        'content_hash': f.content_hash,
                         'status': f.status.value,
                         'error_message': f.error_message,
                         'processing_duration': f.processing_duration
@@ -286,9 +331,19 @@ class BatchProcessor:
         try:
             with self._lock:
                 job = self.active_jobs.get(job_id)
-                if not job:
+                if not job and not self.durable:
                     raise ValueError(f"Batch job {job_id} not found")
-                
+            
+            if not job:
+                # 已入队的任务：数据库中标记取消，本进程执行中的文件立即中断，其他进程在心跳时中断
+                if not self.queue.cancel(job_id):
+                    raise ValueError(f"Cannot cancel batch job {job_id}")
+                if self.queue_worker:
+                    self.queue_worker.cancel_job(job_id)
+                logger.info(f"Batch job {job_id} cancelled")
+                return True
+            
+            with self._lock:
                 if job.status not in [BatchStatus.PENDING, BatchStatus.PROCESSING]:
                     raise ValueError(f"Cannot cancel job in {job.status.value} status")
                 
@@ -301,6 +356,9 @@ class BatchProcessor:
                     if file_item.status == FileStatus.QUEUED:
                         file_item.status = FileStatus.SKIPPED
             
+            # 中断正在处理的文件（关闭大模型连接、打断重试等待），取消尚未开始的文件任务
+            cancellation_registry.cancel('batch', job_id, 'Batch job cancelled')
+            
             logger.info(f"Batch job {job_id} cancelled")
             return True
             
@@ -328,6 +386,8 @@ class BatchProcessor:
                         break
                 
                 if not job:
+                    if self.durable:
+                        return self.queue.get_job_results(job_id)
                     raise ValueError(f"Batch job {job_id} not found")
             
             results = []
@@ -372,18 +432,11 @@ class BatchProcessor:
                 if (job.status in [BatchStatus.COMPLETED, BatchStatus.FAILED, BatchStatus.CANCELLED] and
                     job.end_time and job.end_time.timestamp() < cutoff_time):
                     
-                    # 移到历史记录
-                    self.job_history.append(job)
-                    jobs_to_remove.append(job_id)
+                    jobs_to_remove.append(job)
             
-            for job_id in jobs_to_remove:
-                del self.active_jobs[job_id]
-                if job_id in self.progress_callbacks:
-                    del self.progress_callbacks[job_id]
-            
-            # 限制历史记录大小
-            if len(self.job_history) > 100:
-                self.job_history = self.job_history[-100:]
+            # 移到历史记录（只保留最近 BATCH_JOB_HISTORY_LIMIT 个）
+            for job in jobs_to_remove:
+                self._archive_job(job)
         
         logger.info(f"Cleaned up {len(jobs_to_remove)} completed batch jobs")
     
@@ -400,9 +453,69 @@ class BatchProcessor:
                 'total_processing_time': round(self.stats['total_processing_time'], 2),
                 'average_file_time': round(self.stats['average_file_time'], 2),
                 'max_workers': self.max_workers,
-                'max_concurrent_batches': self.max_concurrent_batches
+                'max_concurrent_batches': self.max_concurrent_batches,
+                'file_pool': self.executor.snapshot(),
+                'job_history': len(self.job_history),
+                'content_spool': self.spool.get_stats(),
+                'queue_backend': 'database' if self.durable else 'memory',
+                'queue_worker_running': bool(self.queue_worker and self.queue_worker.running)
             }
     
+    def wait_for_batch(self, job_id: str, timeout: float = None) -> bool:
+        """等待进程内批量任务的协调结束（结果、跳过的文件均已记录），返回是否已结束"""
+        with self._lock:
+            coordinator = self._coordinators.get(job_id)
+        if coordinator is not None:
+            coordinator.join(timeout)
+            return not coordinator.is_alive()
+        return True
+    
+    def store_queue_contents(self, job_id: str) -> Dict[str, str]:
+        """
+        把任务中各文件的文本写入队列内容目录，返回文件ID -> 内容引用（提交时随文件记录保存）
+
+        已暂存的文件逐个按文件复制，不把整个任务的文本读入内存。
+        """
+        with self._lock:
+            job = self.active_jobs.get(job_id)
+            if not job:
+                raise ValueError(f"Batch job {job_id} not found")
+            files = list(job.files)
+        refs = {}
+        for f in files:
+            if f.content_ref:
+                refs[f.id] = self.queue.contents.put_file(job_id, f.content_ref, self.spool.path(f.content_ref))
+            elif f.content is not None:
+                refs[f.id] = self.queue.contents.put(job_id, f.content)
+        return refs
+    
+    def start_queue_worker(self, app, concurrency: int = None) -> BatchQueueWorker:
+        """启动进程内嵌的队列工作线程（已启动时直接返回）"""
+        with self._lock:
+            if self.queue_worker is None:
+                self.queue_worker = BatchQueueWorker(
+                    app, self.queue, self._process_single_file,
+                    concurrency=concurrency or self.max_workers
+                )
+            self.queue_worker.start()
+            return self.queue_worker
+    
+    def _enqueue_batch_job(self, job_id: str) -> bool:
+        """任务入队（需要应用上下文）；文件内容已写入队列内容目录，进程内的任务对象随即释放"""
+        from flask import current_app
+        self.queue.enqueue(job_id)
+        with self._lock:
+            job = self.active_jobs.pop(job_id, None)
+        if job:
+            self._release_contents(job)
+        
+        embedded_workers = self.max_workers if BATCH_QUEUE_EMBEDDED_WORKERS is None else int(BATCH_QUEUE_EMBEDDED_WORKERS)
+        if embedded_workers > 0:
+            self.start_queue_worker(current_app._get_current_object(), embedded_workers).notify()
+        
+        logger.info(f"Batch job {job_id} enqueued")
+        return True
+    
     def _validate_batch_files(self, files: List[FileStorage]) -> List[BatchFile]:
         """验证批量文件"""
         validated_files = []
@@ -435,15 +548,19 @@ class BatchProcessor:
                 # 读取文件内容
                 file.seek(0)  # 重置文件指针
                 file_content = file.read()
+                content_hash = compute_content_hash(file_content) if isinstance(file_content, bytes) else \
+                    compute_content_hash(file_content.encode('utf-8'))
                 if isinstance(file_content, bytes):
-                    # 尝试解码为文本
-                    try:
-                        file_content = file_content.decode('utf-8')
-                    except UnicodeDecodeError:
-                        try:
-                            file_content = file_content.decode('gbk')
-                        except UnicodeDecodeError:
-                            file_content = file_content.decode('utf-8', errors='ignore')
+                    # 尝试解码为文本（纯文本文件做采样编码检测，二进制格式只走固定候选）
+                    file_content, _ = decode_text(
+                        file_content,
+                        fallback_encodings=('gbk',),
+                        content_hash=content_hash,
+                        detect=file_ext in ('txt', 'rtf')
+                    )
+                
+                # 内容暂存到磁盘，内存中只保留引用（暂存失败时保留在内存中）
+                content_ref = self.spool.put(file_content)
                 
                 # 创建批量文件对象
                 batch_file = BatchFile(
@@ -452,7 +569,9 @@ class BatchProcessor:
                     original_filename=file.filename,
                     file_size=file_size,
                     file_type=file_ext,
-                    content=file_content,
+                    content=None if content_ref else file_content,
+                    content_ref=content_ref,
+                    content_hash=content_hash,
                     status=FileStatus.QUEUED
                 )
                 
@@ -464,20 +583,24 @@ class BatchProcessor:
         
         return validated_files
     
-    def _process_batch_job(self, job: BatchJob):
-        """处理批量任务"""
+    def _process_batch_job(self, job: BatchJob, token: CancellationToken = None):
+        """协调批量任务（在独立的协调线程中运行）：文件提交到共享的文件任务池，按完成顺序汇总结果"""
+        token = token or CancellationToken('batch')
+        futures = {}
+        file_tokens = {}
         try:
             logger.info(f"Starting batch processing for job {job.job_id}")
             
-            # 为每个文件创建处理任务
-            futures = {}
-            
+            # 为每个文件创建处理任务，每个文件是一个可单独统计用量的工作单元
             for file_item in job.files:
                 if job.status == BatchStatus.CANCELLED:
                     break
                 
-                future = self.executor.submit(self._process_single_file, file_item, job.user_id, job.settings)
+                file_token = file_tokens[file_item.id] = token.child('batch_file')
+                future = self.executor.submit(job.job_id, self._process_file_unit, file_item, job.user_id,
+                                              job.settings, file_token)
                 futures[future] = file_item
+            unbind = token.bind_futures(futures)
             
             # 处理完成的任务
             for future in as_completed(futures):
@@ -488,6 +611,9 @@ class BatchProcessor:
                 
                 try:
                     result = future.result()
+                    if isinstance(result, dict) and result.get('success') is False:
+                        # 分析器把内部异常转换成 success 为 False 的结果，按失败记录
+                        raise ValueError(result.get('error') or result.get('error_message') or 'Analysis failed')
                     file_item.analysis_result = result
                     file_item.status = FileStatus.COMPLETED
                     
@@ -528,6 +654,7 @@ class BatchProcessor:
             
             logger.info(f"Batch processing completed for job {job.job_id}: "
                        f"{job.successful_files} successful, {job.failed_files} failed")
+            unbind()
             
         except Exception as e:
             logger.error(f"Batch processing failed for job {job.job_id}: {str(e)}")
@@ -536,6 +663,40 @@ class BatchProcessor:
                 job.status = BatchStatus.FAILED
                 job.error_message = str(e)
                 job.end_time = datetime.now()
+        finally:
+            # 释放暂存内容前取消尚未开始的文件任务，并等待执行中的文件结束，避免其读取已删除的内容
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            
+            # 被取消而未开始的文件不会进入 _process_file_unit，在这里记录其（节省的）用量
+            for future, file_item in futures.items():
+                if future.cancelled():
+                    file_item.status = FileStatus.SKIPPED
+                    file_tokens[file_item.id].finish()
+            cancellation_registry.unregister('batch', job.job_id, token)
+            self._archive_job(job)
+            with self._lock:
+                self._coordinators.pop(job.job_id, None)
+    
+    def _process_file_unit(self, file_item: BatchFile, user_id: int, settings: Dict[str, Any],
+                           token: CancellationToken) -> Dict[str, Any]:
+        """在文件的取消令牌下处理单个文件；批量任务被取消时文件标记为跳过"""
+        with cancellation_scope(token):
+            try:
+                token.check('batch_file')
+                if file_item.content is None and file_item.content_ref:
+                    file_item.content = self.spool.load(file_item.content_ref)
+                return self._process_single_file(file_item, user_id, settings)
+            except OperationCancelled:
+                file_item.status = FileStatus.SKIPPED
+                file_item.error_message = 'Batch job cancelled'
+                logger.info(f"🛑 File processing cancelled: {file_item.filename}")
+                raise
+            finally:
+                # 已暂存的内容分析结束后立即释放，内存中不再保留文本
+                if file_item.content_ref:
+                    file_item.content = None
     
     def _process_single_file(self, file_item: BatchFile, user_id: int, 
                            settings: Dict[str, Any]) -> Dict[str, Any]:
@@ -570,6 +731,8 @@ class BatchProcessor:
                         analysis_type=analysis_type,
                         business_context=business_context
                     )
+                    # 业务分析器内部会吞掉调用异常：批量任务已取消时丢弃结果
+                    check_cancelled('batch_file')
                     
                     # 添加文档信息
                     analysis_result['document_info'] = {
@@ -581,6 +744,8 @@ class BatchProcessor:
                     
                     return analysis_result
                     
+                except OperationCancelled:
+                    raise
                 except Exception as e:
                     logger.warning(f"Business analyzer failed, falling back to simulation: {str(e)}")
                     # 如果业务分析器失败，回退到模拟
@@ -892,7 +1057,7 @@ class BatchProcessor:
     def _simulate_business_analysis(self, file_item: BatchFile, analysis_type: str, 
                                   business_context: Dict[str, Any]) -> Dict[str, Any]:
         """模拟业务分析结果（演示用）"""
-        time.sleep(1)  # 模拟处理时间
+        cancellable_sleep(1, 'batch_simulation')  # 模拟处理时间（批量任务取消时立即结束）
         
         if analysis_type == 'customer_requirements':
             business_insights = {
@@ -1004,7 +1169,7 @@ class BatchProcessor:
     
     def _simulate_product_analysis(self, file_item: BatchFile) -> Dict[str, Any]:
         """模拟传统产品分析结果"""
-        time.sleep(1)  # 模拟处理时间
+        cancellable_sleep(1, 'batch_simulation')  # 模拟处理时间（批量任务取消时立即结束）
         
         return {
             'success': True,
@@ -1026,6 +1191,21 @@ class BatchProcessor:
             }
         }
     
+    def _archive_job(self, job: BatchJob):
+        """已结束的任务移入历史记录并释放暂存内容"""
+        with self._lock:
+            if self.active_jobs.get(job.job_id) is job:
+                del self.active_jobs[job.job_id]
+                self.job_history.append(job)
+            self.progress_callbacks.pop(job.job_id, None)
+        self._release_contents(job)
+    
+    def _release_contents(self, job: BatchJob):
+        for file_item in job.files:
+            self.spool.release(file_item.content_ref)
+            file_item.content_ref = None
+            file_item.content = None
+    
     def _trigger_progress_callbacks(self, job_id: str, job: BatchJob):
         """触发进度回调 - 在后台线程中安全调用"""
         callbacks = self.progress_callbacks.get(job_id, [])
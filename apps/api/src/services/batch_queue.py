@@ -0,0 +1,598 @@
+# -*- coding: utf-8 -*-
+"""
+持久化批量任务队列
+批量任务和文件保存在 batch_analysis_jobs / batch_analysis_files 表中，每个文件是一个队列任务，
+由任意节点上的工作进程（Web进程内嵌的工作线程或 scripts/batch_worker.py）租用执行：
+
+- 租用：按优先级挑选可用文件（排队中，或租约已过期），以带条件的 UPDATE 原子地写入租约
+  （持有者、令牌、到期时间），只有一个工作进程能租到同一个文件；
+- 心跳：执行期间定期延长租约；租约已被接管或批量任务已取消时心跳失败，工作进程取消本地执行；
+- 确认：完成、失败或跳过时按租约令牌写回结果，令牌不匹配（租约过期后已被其他进程接管）的
+  确认被丢弃；随后由数据库汇总任务进度，最后一个文件结束时任务标记为完成；
+- 可见性超时：工作进程崩溃后租约到期，文件重新可被租用；租用次数达到上限的文件标记为失败，
+  避免反复拖垮工作进程的文件无限重试；
+- 文件内容：文本保存在队列内容目录（按任务分目录、按内容寻址），文件记录只保存内容引用，
+  工作进程执行时按引用读取；任务的所有文件结束后删除该任务的目录。
+
+任何进程都能从数据库读到任务状态，进程重启不会丢失进行中的批量任务。
+"""
+import os
+import time
+import uuid
+import shutil
+import socket
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_, func, select
+
+from ..models.base import db
+from ..models.batch_analysis import BatchAnalysisJob, BatchAnalysisFile, BatchStatus, FileStatus
+from .cancellation import CancellationToken, OperationCancelled, cancellation_scope
+
+logger = logging.getLogger(__name__)
+
+_API_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 队列后端：memory（默认，进程内线程池，仅当前进程可见）或 database（持久化队列，需显式启用；
+# 文件表的租约字段在应用启动时补齐，也可事先执行 scripts/migrations/add_batch_queue_migration.py）
+BATCH_QUEUE_BACKEND = os.environ.get('BATCH_QUEUE_BACKEND', 'memory').lower()
+# 租约时长（秒）：工作进程失联超过该时间后文件重新可被租用
+BATCH_QUEUE_LEASE_SECONDS = float(os.environ.get('BATCH_QUEUE_LEASE_SECONDS', 60))
+# 单个文件最多被租用的次数（含工作进程崩溃后的重新租用）
+BATCH_QUEUE_MAX_ATTEMPTS = int(os.environ.get('BATCH_QUEUE_MAX_ATTEMPTS', 3))
+# Web进程内嵌的工作线程数，0 表示只由独立工作进程执行
+BATCH_QUEUE_EMBEDDED_WORKERS = os.environ.get('BATCH_QUEUE_EMBEDDED_WORKERS')
+# 空闲工作线程轮询数据库的间隔（秒）
+BATCH_QUEUE_POLL_INTERVAL = float(os.environ.get('BATCH_QUEUE_POLL_INTERVAL', 1.0))
+# 队列文件内容目录：多节点部署时需位于所有工作进程都能访问的共享存储上
+BATCH_QUEUE_CONTENT_DIR = os.environ.get('BATCH_QUEUE_CONTENT_DIR',
+                                         os.path.join(_API_ROOT, 'instance', 'batch_queue_content'))
+
+FINISHED_FILE_STATUSES = (FileStatus.COMPLETED, FileStatus.FAILED, FileStatus.SKIPPED)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class QueueContentStore:
+    """队列文件内容存储：<root>/<任务ID>/<文本SHA-256>.txt，任务内相同内容只保存一份（多进程共享）"""
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+
+    def put(self, job_id: str, content: str) -> str:
+        """保存文本，返回内容引用"""
+        data = content.encode('utf-8')
+        ref = hashlib.sha256(data).hexdigest()
+        self._publish(job_id, ref, lambda tmp_path: self._write(tmp_path, data))
+        return ref
+
+    def put_file(self, job_id: str, ref: str, source_path: str) -> str:
+        """按已知引用复制已暂存的文本文件（逐块复制，不读入内存）"""
+        self._publish(job_id, ref, lambda tmp_path: shutil.copyfile(source_path, tmp_path))
+        return ref
+
+    def load(self, job_id: str, ref: str) -> str:
+        """读取文本（内容不存在时抛出 FileNotFoundError）"""
+        with open(self._path(job_id, ref), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def delete_job(self, job_id: str):
+        """删除任务的全部内容"""
+        shutil.rmtree(os.path.join(self.root_dir, job_id), ignore_errors=True)
+
+    def _publish(self, job_id: str, ref: str, write: Callable[[str], Any]):
+        path = self._path(job_id, ref)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)  # 原子发布，其他进程不会读到写了一半的文件
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def _path(self, job_id: str, ref: str) -> str:
+        return os.path.join(self.root_dir, job_id, f"{ref}.txt")
+
+
+@dataclass
+class BatchTaskLease:
+    """工作进程持有的文件租约"""
+    file_pk: int
+    job_id: str
+    file_id: str
+    filename: str
+    original_filename: str
+    file_type: str
+    file_size: int
+    content_hash: Optional[str]
+    content_ref: Optional[str]
+    user_id: int
+    settings: Dict[str, Any]
+    token: str
+    attempts: int
+    leased_at: datetime = field(default_factory=datetime.utcnow)
+
+
+class BatchQueue:
+    """基于批量任务表的持久化任务队列（需要应用上下文，线程安全）"""
+
+    def __init__(self, lease_seconds: float = BATCH_QUEUE_LEASE_SECONDS,
+                 max_attempts: int = BATCH_QUEUE_MAX_ATTEMPTS, candidate_batch: int = 20,
+                 content_dir: str = None):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.candidate_batch = candidate_batch
+        self.contents = QueueContentStore(content_dir or BATCH_QUEUE_CONTENT_DIR)
+        self._stats_lock = threading.Lock()
+        self._last_reap = 0.0
+        self.stats = {
+            'leased': 0, 'reclaimed': 0, 'completed': 0, 'failed': 0, 'skipped': 0,
+            'lost_acks': 0, 'lease_conflicts': 0, 'exhausted': 0
+        }
+
+    # ---- 入队 / 取消 ----
+
+    def enqueue(self, job_id: str) -> bool:
+        """把待处理的批量任务放入队列（文件记录需已保存，内容已写入 contents），之后任意工作进程都可租用其文件"""
+        now = datetime.utcnow()
+        file_count = BatchAnalysisFile.query.filter_by(job_id=job_id).count()
+        if not file_count:
+            raise ValueError(f"Batch job {job_id} not found")
+        updated = BatchAnalysisJob.query.filter(
+            BatchAnalysisJob.job_id == job_id, BatchAnalysisJob.status == BatchStatus.PENDING
+        ).update({
+            'status': BatchStatus.PROCESSING,
+            'start_time': now,
+            'total_files': file_count,
+            'updated_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+        if not updated:
+            raise ValueError(f"Batch job {job_id} is not in pending status")
+        logger.info(f"📥 批量任务入队: {job_id} ({file_count} 个文件)")
+        return True
+
+    def cancel(self, job_id: str, reason: str = 'Batch job cancelled') -> bool:
+        """取消任务：排队中的文件标记为跳过；执行中的文件在下次心跳时由持有租约的工作进程中断"""
+        now = datetime.utcnow()
+        updated = BatchAnalysisJob.query.filter(
+            BatchAnalysisJob.job_id == job_id,
+            BatchAnalysisJob.status.in_([BatchStatus.PENDING, BatchStatus.PROCESSING])
+        ).update({'status': BatchStatus.CANCELLED, 'end_time': now, 'updated_at': now},
+                 synchronize_session=False)
+        if not updated:
+            db.session.rollback()
+            return False
+        BatchAnalysisFile.query.filter(
+            BatchAnalysisFile.job_id == job_id, BatchAnalysisFile.status == FileStatus.QUEUED
+        ).update({'status': FileStatus.SKIPPED, 'error_message': reason, 'updated_at': now},
+                 synchronize_session=False)
+        self._refresh_job(job_id)
+        logger.info(f"🛑 批量任务已取消: {job_id}")
+        return True
+
+    # ---- 租用 / 心跳 / 确认 ----
+
+    def lease(self, worker_id: str) -> Optional[BatchTaskLease]:
+        """租用一个可用文件；没有可用文件时返回None"""
+        self._reap_exhausted()
+        now = datetime.utcnow()
+        candidates = db.session.query(BatchAnalysisFile.id, BatchAnalysisFile.status).join(
+            BatchAnalysisJob, BatchAnalysisJob.job_id == BatchAnalysisFile.job_id
+        ).filter(
+            BatchAnalysisJob.status == BatchStatus.PROCESSING,
+            self._available(now)
+        ).order_by(
+            BatchAnalysisFile.priority.desc(), BatchAnalysisFile.id.asc()
+        ).limit(self.candidate_batch).all()
+        db.session.commit()  # 结束读事务，条件更新在新事务中进行
+
+        for file_pk, status in candidates:
+            token = uuid.uuid4().hex
+            claimed = BatchAnalysisFile.query.filter(
+                BatchAnalysisFile.id == file_pk, self._available(now)
+            ).update({
+                'status': FileStatus.PROCESSING,
+                'lease_owner': worker_id,
+                'lease_token': token,
+                'lease_expires_at': now + timedelta(seconds=self.lease_seconds),
+                'attempts': func.coalesce(BatchAnalysisFile.attempts, 0) + 1,
+                'start_time': now,
+                'updated_at': now
+            }, synchronize_session=False)
+            db.session.commit()
+            if not claimed:
+                self._count('lease_conflicts')  # 被其他工作进程抢先租用
+                continue
+            self._count('leased')
+            if status == FileStatus.PROCESSING:
+                self._count('reclaimed')
+                logger.warning(f"♻️ 租约已过期，重新租用文件 {file_pk}（{worker_id}）")
+            return self._load_lease(file_pk, token, now)
+        return None
+
+    def heartbeat(self, lease: BatchTaskLease) -> bool:
+        """延长租约；租约已被接管或任务不再处理中（已取消）时返回False"""
+        now = datetime.utcnow()
+        processing_jobs = select(BatchAnalysisJob.job_id).where(
+            BatchAnalysisJob.status == BatchStatus.PROCESSING
+        )
+        alive = BatchAnalysisFile.query.filter(
+            BatchAnalysisFile.id == lease.file_pk,
+            BatchAnalysisFile.lease_token == lease.token,
+            BatchAnalysisFile.job_id.in_(processing_jobs)
+        ).update({'lease_expires_at': now + timedelta(seconds=self.lease_seconds)},
+                 synchronize_session=False)
+        db.session.commit()
+        return bool(alive)
+
+    def load_content(self, lease: BatchTaskLease) -> Optional[str]:
+        """按租约中的内容引用读取待分析的文本"""
+        return self.contents.load(lease.job_id, lease.content_ref) if lease.content_ref else None
+
+    def complete(self, lease: BatchTaskLease, result: Dict[str, Any]) -> bool:
+        """确认文件分析完成并保存结果；结果标记为不成功（success 为 False）时按失败确认"""
+        if isinstance(result, dict) and result.get('success') is False:
+            return self.fail(lease, result.get('error') or result.get('error_message') or 'Analysis failed')
+        confidence = (result.get('confidence_scores') or {}).get('overall') if isinstance(result, dict) else None
+        return self._ack(lease, 'completed', {
+            'status': FileStatus.COMPLETED,
+            'analysis_result': result,
+            'confidence_score': confidence,
+            'error_message': None
+        })
+
+    def fail(self, lease: BatchTaskLease, error: str) -> bool:
+        """确认文件分析失败"""
+        return self._ack(lease, 'failed', {'status': FileStatus.FAILED, 'error_message': error})
+
+    def skip(self, lease: BatchTaskLease, reason: str) -> bool:
+        """确认文件被跳过（任务已取消）"""
+        return self._ack(lease, 'skipped', {'status': FileStatus.SKIPPED, 'error_message': reason})
+
+    def _ack(self, lease: BatchTaskLease, outcome: str, values: Dict[str, Any]) -> bool:
+        now = datetime.utcnow()
+        acked = BatchAnalysisFile.query.filter(
+            BatchAnalysisFile.id == lease.file_pk,
+            BatchAnalysisFile.lease_token == lease.token
+        ).update({
+            **values,
+            'end_time': now,
+            'processing_duration': (now - lease.leased_at).total_seconds(),
+            'lease_owner': None,
+            'lease_token': None,
+            'lease_expires_at': None,
+            'updated_at': now
+        }, synchronize_session=False)
+        if not acked:
+            # 租约过期后已被其他工作进程接管，以接管者的结果为准
+            db.session.rollback()
+            self._count('lost_acks')
+            logger.warning(f"⚠️ 租约已失效，丢弃文件 {lease.filename} 的{outcome}确认（{lease.job_id}）")
+            return False
+        self._count(outcome)
+        self._refresh_job(lease.job_id)
+        return True
+
+    # ---- 状态查询 ----
+
+    def get_job_status(self, job_id: str) -> Dict[str, Any]:
+        """从数据库读取任务状态（与 BatchProcessor.get_batch_status 结构相同）"""
+        job = BatchAnalysisJob.query.filter_by(job_id=job_id).first()
+        if not job:
+            raise ValueError(f"Batch job {job_id} not found")
+        files = BatchAnalysisFile.get_job_files(job_id)
+        now = datetime.utcnow()
+        elapsed = ((job.end_time or now) - job.start_time).total_seconds() if job.start_time else 0.0
+        estimated_remaining = 0.0
+        if job.processed_files and job.status == BatchStatus.PROCESSING:
+            estimated_remaining = elapsed / job.processed_files * (job.total_files - job.processed_files)
+        return {
+            'job_id': job.job_id,
+            'user_id': job.user_id,
+            'status': job.status.value,
+            'total_files': job.total_files,
+            'processed_files': job.processed_files,
+            'successful_files': job.successful_files,
+            'failed_files': job.failed_files,
+            'progress_percentage': job.progress_percentage,
+            'elapsed_time': round(elapsed, 2),
+            'estimated_remaining': round(estimated_remaining, 2),
+            'start_time': job.start_time.isoformat() if job.start_time else None,
+            'end_time': job.end_time.isoformat() if job.end_time else None,
+            'error_message': job.error_message,
+            'files_status': [
+                {
+                    'file_id': f.file_id,
+                    'filename': f.filename,
+                    'content_hash': f.file_hash,
+                    'status': f.status.value,
+                    'error_message': f.error_message,
+                    'processing_duration': f.processing_duration or 0.0,
+                    'attempts': f.attempts or 0,
+                    'lease_owner': f.lease_owner
+                }
+                for f in files
+            ]
+        }
+
+    def get_job_results(self, job_id: str) -> Dict[str, Any]:
+        """从数据库读取任务结果（与 BatchProcessor.get_batch_results 结构相同）"""
+        job = BatchAnalysisJob.query.filter_by(job_id=job_id).first()
+        if not job:
+            raise ValueError(f"Batch job {job_id} not found")
+        results = []
+        for f in BatchAnalysisFile.get_job_files(job_id):
+            item = {
+                'file_id': f.file_id,
+                'filename': f.filename,
+                'original_filename': f.original_filename,
+                'status': f.status.value,
+                'processing_duration': f.processing_duration or 0.0,
+                'error_message': f.error_message
+            }
+            if f.analysis_result:
+                item['analysis_result'] = f.analysis_result
+            results.append(item)
+        return {
+            'job_id': job.job_id,
+            'status': job.status.value,
+            'total_files': job.total_files,
+            'successful_files': job.successful_files,
+            'failed_files': job.failed_files,
+            'results': results,
+            'summary': {}
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """本进程的队列操作计数，以及数据库中进行中任务的文件状态分布"""
+        counts = db.session.query(BatchAnalysisFile.status, func.count(BatchAnalysisFile.id)).join(
+            BatchAnalysisJob, BatchAnalysisJob.job_id == BatchAnalysisFile.job_id
+        ).filter(BatchAnalysisJob.status == BatchStatus.PROCESSING).group_by(BatchAnalysisFile.status).all()
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            'backend': 'database',
+            'lease_seconds': self.lease_seconds,
+            'max_attempts': self.max_attempts,
+            'active_files': {status.value: count for status, count in counts},
+            'operations': stats
+        }
+
+    # ---- 内部 ----
+
+    def _available(self, now: datetime):
+        """可租用：排队中，或执行中但租约已过期且未达到租用次数上限"""
+        return or_(
+            BatchAnalysisFile.status == FileStatus.QUEUED,
+            and_(
+                BatchAnalysisFile.status == FileStatus.PROCESSING,
+                BatchAnalysisFile.lease_expires_at < now,
+                func.coalesce(BatchAnalysisFile.attempts, 0) < self.max_attempts
+            )
+        )
+
+    def _load_lease(self, file_pk: int, token: str, now: datetime) -> BatchTaskLease:
+        row = db.session.query(
+            BatchAnalysisFile.job_id, BatchAnalysisFile.file_id, BatchAnalysisFile.filename,
+            BatchAnalysisFile.original_filename, BatchAnalysisFile.file_type, BatchAnalysisFile.file_size,
+            BatchAnalysisFile.file_hash, BatchAnalysisFile.content_ref, BatchAnalysisFile.attempts,
+            BatchAnalysisJob.user_id, BatchAnalysisJob.settings
+        ).join(
+            BatchAnalysisJob, BatchAnalysisJob.job_id == BatchAnalysisFile.job_id
+        ).filter(BatchAnalysisFile.id == file_pk).one()
+        db.session.commit()
+        return BatchTaskLease(
+            file_pk=file_pk, job_id=row.job_id, file_id=row.file_id, filename=row.filename,
+            original_filename=row.original_filename, file_type=row.file_type, file_size=row.file_size or 0,
+            content_hash=row.file_hash, content_ref=row.content_ref, user_id=row.user_id,
+            settings=row.settings or {}, token=token, attempts=row.attempts or 0, leased_at=now
+        )
+
+    def _reap_exhausted(self):
+        """租约过期且租用次数已达上限的文件标记为失败（定期执行）"""
+        if time.monotonic() - self._last_reap < self.lease_seconds / 2:
+            return
+        self._last_reap = time.monotonic()
+        now = datetime.utcnow()
+        expired = and_(
+            BatchAnalysisFile.status == FileStatus.PROCESSING,
+            BatchAnalysisFile.lease_expires_at < now,
+            func.coalesce(BatchAnalysisFile.attempts, 0) >= self.max_attempts
+        )
+        job_ids = [row.job_id for row in db.session.query(BatchAnalysisFile.job_id).filter(expired).distinct()]
+        if not job_ids:
+            db.session.commit()
+            return
+        exhausted = BatchAnalysisFile.query.filter(expired).update({
+            'status': FileStatus.FAILED,
+            'error_message': f'Worker lease expired {self.max_attempts} times',
+            'end_time': now,
+            'lease_owner': None,
+            'lease_token': None,
+            'lease_expires_at': None,
+            'updated_at': now
+        }, synchronize_session=False)
+        for job_id in job_ids:
+            self._refresh_job(job_id)
+        self._count('exhausted', exhausted)
+        logger.error(f"💀 {exhausted} 个文件的租约多次过期，标记为失败")
+
+    def _refresh_job(self, job_id: str):
+        """
+        由文件状态汇总任务进度并提交（与文件状态的更新在同一事务中）；没有排队中或执行中的文件时
+        任务完成，并删除任务的文件内容（已取消的任务在最后一个执行中的文件确认后删除）
+        """
+        def count(*statuses):
+            return select(func.count(BatchAnalysisFile.id)).where(
+                BatchAnalysisFile.job_id == job_id, BatchAnalysisFile.status.in_(statuses)
+            ).scalar_subquery()
+
+        now = datetime.utcnow()
+        BatchAnalysisJob.query.filter(BatchAnalysisJob.job_id == job_id).update({
+            'processed_files': count(*FINISHED_FILE_STATUSES),
+            'successful_files': count(FileStatus.COMPLETED),
+            'failed_files': count(FileStatus.FAILED),
+            'updated_at': now
+        }, synchronize_session=False)
+        unfinished = select(BatchAnalysisFile.id).where(
+            BatchAnalysisFile.job_id == job_id,
+            BatchAnalysisFile.status.in_([FileStatus.QUEUED, FileStatus.PROCESSING])
+        ).exists()
+        completed = BatchAnalysisJob.query.filter(
+            BatchAnalysisJob.job_id == job_id,
+            BatchAnalysisJob.status == BatchStatus.PROCESSING,
+            ~unfinished
+        ).update({'status': BatchStatus.COMPLETED, 'end_time': now}, synchronize_session=False)
+        finished = not db.session.query(unfinished).scalar()
+        db.session.commit()
+        if finished:
+            self.contents.delete_job(job_id)
+        if completed:
+            job = BatchAnalysisJob.query.filter_by(job_id=job_id).first()
+            if job.start_time:
+                job.actual_duration = (job.end_time - job.start_time).total_seconds()
+                db.session.commit()
+            logger.info(f"✅ 批量任务完成: {job_id} ({job.successful_files} 成功, {job.failed_files} 失败)")
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+
+class BatchQueueWorker:
+    """
+    队列工作进程：concurrency 个线程循环租用并执行文件任务，另有一个线程为执行中的租约发送心跳
+
+    process_file(batch_file, user_id, settings) 执行单个文件分析（通常为
+    BatchProcessor._process_single_file）；执行在文件的取消令牌下进行，心跳失败（任务已取消
+    或租约被接管）时取消令牌，中断进行中的大模型调用。
+    """
+
+    def __init__(self, app, queue: BatchQueue, process_file: Callable[..., Dict[str, Any]],
+                 concurrency: int = 3, worker_id: str = None, poll_interval: float = BATCH_QUEUE_POLL_INTERVAL):
+        self.app = app
+        self.queue = queue
+        self.process_file = process_file
+        self.concurrency = concurrency
+        self.worker_id = worker_id or default_worker_id()
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._active: Dict[str, tuple] = {}  # 租约令牌 -> (租约, 取消令牌)
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._work_loop, name=f'batch-queue-worker-{i}', daemon=True)
+            for i in range(self.concurrency)
+        ] + [threading.Thread(target=self._heartbeat_loop, name='batch-queue-heartbeat', daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"🚚 批量队列工作进程启动: {self.worker_id}，并发 {self.concurrency}")
+
+    def stop(self, timeout: float = None):
+        """停止租用新文件，等待执行中的文件结束（超时未结束的文件租约到期后由其他进程接管）"""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        logger.info(f"🚚 批量队列工作进程停止: {self.worker_id}")
+
+    def run_forever(self):
+        """阻塞直到工作进程停止（独立工作进程的主线程调用，期间可响应信号）"""
+        while self.running:
+            time.sleep(0.5)
+
+    def notify(self):
+        """有新任务入队时唤醒空闲线程（同一进程内），不必等待轮询间隔"""
+        self._wakeup.set()
+
+    def cancel_job(self, job_id: str, reason: str = 'Batch job cancelled') -> int:
+        """立即中断本进程内正在执行的该任务的文件（其他进程在下次心跳时发现）"""
+        with self._lock:
+            tokens = [token for lease, token in self._active.values() if lease.job_id == job_id]
+        for token in tokens:
+            token.cancel(reason)
+        return len(tokens)
+
+    def _work_loop(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    lease = self.queue.lease(self.worker_id)
+            except Exception as e:
+                logger.error(f"租用批量文件失败: {str(e)}")
+                lease = None
+            if lease is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._execute(lease)
+
+    def _execute(self, lease: BatchTaskLease):
+        from .batch_processor import BatchFile  # 避免循环导入
+        token = CancellationToken('batch_file')
+        with self._lock:
+            self._active[lease.token] = (lease, token)
+        try:
+            with self.app.app_context():
+                try:
+                    with cancellation_scope(token):
+                        token.check('batch_file')
+                        batch_file = BatchFile(
+                            id=lease.file_id, filename=lease.filename, original_filename=lease.original_filename,
+                            file_size=lease.file_size, file_type=lease.file_type,
+                            content=self.queue.load_content(lease), content_hash=lease.content_hash
+                        )
+                        result = self.process_file(batch_file, lease.user_id, lease.settings)
+                except OperationCancelled:
+                    logger.info(f"🛑 File processing cancelled: {lease.filename}")
+                    self.queue.skip(lease, token.reason or 'Batch job cancelled')
+                except Exception as e:
+                    logger.error(f"File processing failed: {lease.filename} - {str(e)}")
+                    self.queue.fail(lease, str(e))
+                else:
+                    self.queue.complete(lease, result)
+        except Exception as e:
+            # 确认失败（数据库不可用等）：不再重试，租约到期后由其他工作进程重新执行
+            logger.error(f"确认批量文件失败: {lease.filename} - {str(e)}")
+        finally:
+            with self._lock:
+                self._active.pop(lease.token, None)
+
+    def _heartbeat_loop(self):
+        interval = max(0.05, self.queue.lease_seconds / 3)
+        while not self._stop.wait(interval) or self._active:
+            with self._lock:
+                active = list(self._active.values())
+            for lease, token in active:
+                try:
+                    with self.app.app_context():
+                        alive = self.queue.heartbeat(lease)
+                except Exception as e:
+                    logger.warning(f"批量文件心跳失败: {lease.filename} - {str(e)}")
+                    continue
+                if not alive and not token.cancelled:
+                    token.cancel('Batch job cancelled or lease lost')
+            if self._stop.is_set() and not self._active:
+                return
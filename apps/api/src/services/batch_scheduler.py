@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+批量文件任务池
+所有批量任务的文件分析共享一组工作线程，按任务分组排队并在分组之间轮转调度：
+每个工作线程空闲时从下一个有排队文件的任务中取一个文件执行，先提交的大批量任务不会
+让后提交的任务一直等待，每个进行中的批量任务都持续有进展。
+
+批量任务的协调（提交文件、汇总结果）不占用池中的线程，避免协调线程占满线程池后
+等待永远无法开始的文件任务。
+"""
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class FairTaskPool:
+    """
+    按分组轮转调度的共享线程池
+
+    不能直接替换 ThreadPoolExecutor：submit 的第一个参数是分组（批量任务ID），
+    没有 map 和上下文管理器接口；返回的 Future 可以配合 as_completed / wait 使用。
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = 'batch-file'):
+        if max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[Tuple[Future, Callable, tuple, dict, float]]] = {}
+        self._ring: Deque[str] = deque()  # 有排队任务的分组，队首为下一个被调度的分组
+        self._running: Dict[str, int] = {}
+        self._threads: List[threading.Thread] = []
+        self._shutdown = False
+        self.stats = {'submitted': 0, 'completed': 0, 'cancelled': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+
+    def submit(self, group: str, fn: Callable, *args, **kwargs) -> Future:
+        """把任务加入分组的队列，返回可等待/取消的 Future"""
+        future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError('cannot schedule new futures after shutdown')
+            queue = self._queues.get(group)
+            if queue is None:
+                queue = self._queues[group] = deque()
+                self._ring.append(group)
+            queue.append((future, fn, args, kwargs, time.monotonic()))
+            self.stats['submitted'] += 1
+            self._start_workers()
+            self._cond.notify()
+        return future
+
+    def shutdown(self, wait: bool = True):
+        """不再接受新任务；已排队的任务执行完后工作线程退出"""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """各分组排队/执行中的任务数和排队等待时间"""
+        with self._cond:
+            started = self.stats['completed'] + self.stats['cancelled']
+            return {
+                'max_workers': self.max_workers,
+                'queued': {group: len(queue) for group, queue in self._queues.items()},
+                'running': {group: count for group, count in self._running.items() if count},
+                'submitted': self.stats['submitted'],
+                'completed': self.stats['completed'],
+                'cancelled': self.stats['cancelled'],
+                'avg_wait_seconds': round(self.stats['total_wait'] / started, 3) if started else 0.0,
+                'max_wait_seconds': round(self.stats['max_wait'], 3)
+            }
+
+    def _start_workers(self):
+        while len(self._threads) < self.max_workers:
+            thread = threading.Thread(target=self._worker, daemon=True,
+                                      name=f'{self.thread_name_prefix}-{len(self._threads)}')
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_task(self):
+        """取队首分组的下一个任务，该分组移到队尾；没有任务且已关闭时返回None"""
+        with self._cond:
+            while not self._ring:
+                if self._shutdown:
+                    return None
+                self._cond.wait()
+            group = self._ring.popleft()
+            queue = self._queues[group]
+            task = queue.popleft()
+            if queue:
+                self._ring.append(group)
+            else:
+                del self._queues[group]
+            return group, task
+
+    def _worker(self):
+        while True:
+            item = self._next_task()
+            if item is None:
+                return
+            group, (future, fn, args, kwargs, queued_at) = item
+            if not future.set_running_or_notify_cancel():
+                with self._cond:
+                    self.stats['cancelled'] += 1
+                continue
+
+            wait = time.monotonic() - queued_at
+            with self._cond:
+                self._running[group] = self._running.get(group, 0) + 1
+                self.stats['total_wait'] += wait
+                self.stats['max_wait'] = max(self.stats['max_wait'], wait)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                with self._cond:
+                    self._running[group] -= 1
+                    if not self._running[group]:
+                        del self._running[group]
+                    self.stats['completed'] += 1
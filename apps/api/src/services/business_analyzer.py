@@ -42,6 +42,7 @@ class BusinessAnalyzer:
             # 1. 处理文档，提取文本
             logger.info(f"Processing business document: {file.filename}, type: {analysis_type}")
             text_content, doc_info = self.document_processor.process_document(file)
+            doc_info.pop('structured_tables', None)  # 商务分析不使用表格单元格
             
             if not text_content.strip():
                 raise ValueError("Document contains no readable text content")
@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+"""
+协作式取消
+取消接口通过 CancellationToken 通知正在执行的分析：阶段之间、重试退避等待期间检查取消状态，
+取消时立即关闭正在进行的大模型HTTP连接（阻塞中的读取随即返回）并取消尚未开始的任务，
+不再为已被取消的任务消耗大模型调用和工作线程。
+
+令牌经 ContextVar 传递（与请求截止时间相同），阶段图在线程池执行时复制调用方上下文，
+因此阶段内部和大模型客户端通过 current_cancellation() 即可取到。
+
+节省统计：每个工作单元（单文档分析、批量中的单个文件、文档对比）结束时记录其大模型耗时和
+token用量；被取消的单元按同类已完成单元的平均用量扣除取消前已消耗的部分，估算节省的大模型
+秒数和token数。
+"""
+import time
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+_current_token: ContextVar[Optional['CancellationToken']] = ContextVar('cancellation_token', default=None)
+
+
+class OperationCancelled(Exception):
+    """任务已被取消"""
+
+    def __init__(self, step: str, reason: str = None):
+        self.step = step
+        self.reason = reason
+        super().__init__(f"Operation cancelled at '{step}'" + (f": {reason}" if reason else ''))
+
+
+class CancellationStats:
+    """进程内取消统计：按类型的取消次数、中断的大模型调用、关闭的连接、取消的待执行任务和估算的节省"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def record_cancel(self, kind: str):
+        with self._lock:
+            self.cancelled_requests[kind] = self.cancelled_requests.get(kind, 0) + 1
+
+    def record_aborted_call(self, closed_connections: int):
+        with self._lock:
+            self.aborted_llm_calls += 1
+            self.closed_connections += closed_connections
+
+    def record_cancelled_futures(self, count: int):
+        with self._lock:
+            self.cancelled_futures += count
+
+    def record_outcome(self, kind: str, cancelled: bool, llm_seconds: float, llm_tokens: int):
+        """记录工作单元结束：完成的单元计入平均用量，取消的单元按平均用量估算节省"""
+        with self._lock:
+            unit = self._units.setdefault(kind, {
+                'completed': 0, 'llm_seconds': 0.0, 'llm_tokens': 0,
+                'cancelled': 0, 'llm_seconds_spent_before_cancel': 0.0,
+                'llm_seconds_saved': 0.0, 'llm_tokens_saved': 0.0
+            })
+            if not cancelled:
+                unit['completed'] += 1
+                unit['llm_seconds'] += llm_seconds
+                unit['llm_tokens'] += llm_tokens
+                return
+            unit['cancelled'] += 1
+            unit['llm_seconds_spent_before_cancel'] += llm_seconds
+            if unit['completed']:
+                unit['llm_seconds_saved'] += max(0.0, unit['llm_seconds'] / unit['completed'] - llm_seconds)
+                unit['llm_tokens_saved'] += max(0.0, unit['llm_tokens'] / unit['completed'] - llm_tokens)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            by_kind = {}
+            for kind, unit in self._units.items():
+                completed = unit['completed']
+                by_kind[kind] = {
+                    'completed': completed,
+                    'cancelled': unit['cancelled'],
+                    # 节省按同类已完成单元的平均用量估算，尚无完成样本时不计入
+                    'avg_llm_seconds': round(unit['llm_seconds'] / completed, 2) if completed else None,
+                    'avg_llm_tokens': round(unit['llm_tokens'] / completed, 1) if completed else None,
+                    'llm_seconds_spent_before_cancel': round(unit['llm_seconds_spent_before_cancel'], 2),
+                    'llm_seconds_saved': round(unit['llm_seconds_saved'], 2),
+                    'llm_tokens_saved': int(unit['llm_tokens_saved'])
+                }
+            return {
+                'cancelled_requests': dict(self.cancelled_requests),
+                'aborted_llm_calls': self.aborted_llm_calls,
+                'closed_connections': self.closed_connections,
+                'cancelled_futures': self.cancelled_futures,
+                'llm_seconds_saved': round(sum(unit['llm_seconds_saved'] for unit in by_kind.values()), 2),
+                'llm_tokens_saved': sum(unit['llm_tokens_saved'] for unit in by_kind.values()),
+                'by_kind': by_kind
+            }
+
+    def reset(self):
+        with self._lock:
+            self.cancelled_requests: Dict[str, int] = {}
+            self.aborted_llm_calls = 0
+            self.closed_connections = 0
+            self.cancelled_futures = 0
+            self._units: Dict[str, Dict[str, Any]] = {}
+
+
+class CancellationToken:
+    """
+    取消令牌（线程安全，可在多个阶段/线程间共享）
+
+    取消时依次执行登记的回调（关闭连接、取消待执行任务），并级联取消子令牌；
+    工作单元结束时调用 finish()（cancellation_scope 退出时自动调用）记录用量。
+    """
+
+    def __init__(self, kind: str, parent: 'CancellationToken' = None, stats: CancellationStats = None):
+        """
+        Args:
+            kind: 工作单元类型（analysis / batch / batch_file / comparison）
+            parent: 父令牌，父令牌取消时本令牌随之取消
+            stats: 统计对象，默认为全局 cancellation_stats
+        """
+        self.kind = kind
+        self.parent = parent
+        self.stats = stats if stats is not None else (parent.stats if parent else cancellation_stats)
+        self.reason: Optional[str] = None
+        self.llm_seconds = 0.0
+        self.llm_tokens = 0
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self._future: Optional[Future] = None
+        self._finished = False
+        if parent is not None:
+            parent.add_callback(lambda: self.cancel(parent.reason, _cascaded=True))
+
+    @property
+    def cancelled(self) -> bool:
+        # 父令牌取消后、级联回调执行到本令牌之前，本令牌也视为已取消
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def cancel(self, reason: str = None, _cascaded: bool = False) -> bool:
+        """
+        取消令牌（重复取消无效）
+
+        Returns:
+            bool: 本次调用是否执行了取消
+        """
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason or 'cancelled'
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        if not _cascaded:
+            self.stats.record_cancel(self.kind)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"⚠️ 取消回调执行失败: {str(e)}")
+        return True
+
+    def add_callback(self, callback: Callable[[], None], first: bool = False) -> Callable[[], None]:
+        """
+        登记取消时执行的回调；已取消时立即执行
+
+        Args:
+            first: 在已登记的回调之前执行
+
+        Returns:
+            Callable: 注销回调的函数（资源释放后调用）
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.insert(0 if first else len(self._callbacks), callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def _remove_callback(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def check(self, step: str):
+        """已取消时在 step 处中止"""
+        if self.cancelled:
+            raise OperationCancelled(step, self.reason or self.parent.reason)
+
+    def sleep(self, seconds: float, step: str):
+        """可被取消打断的等待（如重试退避）"""
+        if self._event.wait(max(0.0, seconds)):
+            raise OperationCancelled(step, self.reason)
+
+    def as_future(self) -> Future:
+        """取消时完成的 Future，可与其他 Future 一起等待"""
+        with self._lock:
+            if self._future is None:
+                self._future = Future()
+                if self._event.is_set():
+                    self._future.set_result(self.reason)
+                else:
+                    future = self._future
+                    self._callbacks.append(lambda: future.set_result(self.reason))
+            return self._future
+
+    def bind_futures(self, futures: Iterable[Future]) -> Callable[[], None]:
+        """
+        取消时取消其中尚未开始执行的任务；返回注销函数
+
+        先于其他回调执行：否则被打断的任务释放出的工作线程会先取走排队中的任务
+        """
+        futures = list(futures)
+
+        def cancel_pending():
+            cancelled = sum(1 for future in futures if future.cancel())
+            if cancelled:
+                self.stats.record_cancelled_futures(cancelled)
+        return self.add_callback(cancel_pending, first=True)
+
+    def child(self, kind: str) -> 'CancellationToken':
+        return CancellationToken(kind, parent=self)
+
+    def record_llm_call(self, seconds: float, tokens: int = 0):
+        with self._lock:
+            self.llm_seconds += max(0.0, seconds)
+            self.llm_tokens += max(0, int(tokens or 0))
+
+    def finish(self):
+        """工作单元结束，记录用量（只记录一次）"""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        self.stats.record_outcome(self.kind, self.cancelled, self.llm_seconds, self.llm_tokens)
+
+
+class CancellationRegistry:
+    """按（类型, ID）登记正在执行的任务令牌，供取消接口查找"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens: Dict[tuple, CancellationToken] = {}
+
+    def register(self, kind: str, key: str, token: CancellationToken) -> CancellationToken:
+        with self._lock:
+            self._tokens[(kind, key)] = token
+        return token
+
+    def unregister(self, kind: str, key: str, token: CancellationToken = None):
+        with self._lock:
+            if token is None or self._tokens.get((kind, key)) is token:
+                self._tokens.pop((kind, key), None)
+
+    def get(self, kind: str, key: str) -> Optional[CancellationToken]:
+        with self._lock:
+            return self._tokens.get((kind, key))
+
+    def cancel(self, kind: str, key: str, reason: str = None) -> bool:
+        """
+        取消本进程内正在执行的任务
+
+        Returns:
+            bool: 是否找到并取消了任务
+        """
+        token = self.get(kind, key)
+        return token.cancel(reason) if token is not None else False
+
+
+def current_cancellation() -> Optional[CancellationToken]:
+    """当前任务的取消令牌（未设置时为None，即不可取消）"""
+    return _current_token.get()
+
+
+def check_cancelled(step: str):
+    """当前任务已取消时中止"""
+    token = _current_token.get()
+    if token is not None:
+        token.check(step)
+
+
+def cancellable_sleep(seconds: float, step: str):
+    """等待 seconds 秒；当前任务被取消时立即中止"""
+    token = _current_token.get()
+    if token is None:
+        time.sleep(seconds)
+    else:
+        token.sleep(seconds, step)
+
+
+def record_llm_usage(seconds: float, tokens: int = 0):
+    """把一次大模型调用的耗时和token用量计入当前工作单元"""
+    token = _current_token.get()
+    if token is not None:
+        token.record_llm_call(seconds, tokens)
+
+
+@contextmanager
+def cancellation_scope(token: Optional[CancellationToken], finish: bool = True):
+    """在上下文内设置当前任务的取消令牌，退出时记录工作单元用量（finish=False 时不记录）"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+        if finish and token is not None:
+            token.finish()
+
+
+class _ConnectionTrackingAdapter(HTTPAdapter):
+    """记录本会话建立的每个socket，取消时据此关闭正在进行的请求"""
+
+    def __init__(self, on_connect: Callable[[Any], None], **kwargs):
+        self._on_connect = on_connect
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self._track(self.poolmanager)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        tracked = proxy in self.proxy_manager
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if not tracked:
+            self._track(manager)
+        return manager
+
+    def _track(self, manager):
+        on_connect = self._on_connect
+
+        def tracking_pool(pool_cls):
+            class TrackingConnection(pool_cls.ConnectionCls):
+                def connect(self):
+                    super().connect()
+                    on_connect(self.sock)
+            return type(pool_cls.__name__, (pool_cls,), {'ConnectionCls': TrackingConnection})
+
+        # 替换为副本，不影响其他会话共用的默认映射
+        manager.pool_classes_by_scheme = {
+            scheme: tracking_pool(pool_cls) for scheme, pool_cls in manager.pool_classes_by_scheme.items()
+        }
+
+
+def _shutdown_sockets(sockets: List[Any]):
+    for sock in sockets:
+        try:
+            # 直接关闭底层socket（TLS连接也不经过SSL层），阻塞在读取上的线程随即返回
+            socket.socket.shutdown(sock, socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def cancellable_post(url: str, step: str = 'llm_call', **kwargs) -> requests.Response:
+    """
+    可取消的 POST 请求
+
+    当前任务没有取消令牌时等同于 requests.post；有令牌时请求使用独立会话并登记其连接，
+    任务被取消时关闭连接，阻塞中的请求立即以 OperationCancelled 结束。
+    """
+    token = _current_token.get()
+    if token is None:
+        return requests.post(url, **kwargs)
+    token.check(step)
+
+    sockets: List[Any] = []
+    closed = {'count': 0}
+    lock = threading.Lock()
+
+    def on_connect(sock):
+        with lock:
+            sockets.append(sock)
+        if token.cancelled:
+            close_connections()
+
+    def close_connections():
+        # 先计数再关闭：请求线程在连接关闭后立即返回并读取计数
+        with lock:
+            pending = sockets[closed['count']:]
+            closed['count'] = len(sockets)
+        _shutdown_sockets(pending)
+
+    with requests.Session() as session:
+        adapter = _ConnectionTrackingAdapter(on_connect)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        unregister = token.add_callback(close_connections)
+        try:
+            return session.post(url, **kwargs)
+        except requests.exceptions.RequestException:
+            if token.cancelled:
+                # 连接因取消被关闭：报告为取消而不是网络错误，调用方不再重试
+                token.stats.record_aborted_call(closed['count'])
+                raise OperationCancelled(step, token.reason)
+            raise
+        finally:
+            unregister()
+
+
+# 全局实例
+cancellation_stats = CancellationStats()
+cancellation_registry = CancellationRegistry()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+批量文件内容暂存
+批量任务提交时把解码后的文本写入本地按内容寻址的暂存目录，内存中只保留引用（文本的SHA-256）；
+文件任务开始时再读取内容，分析结束后立即释放。相同内容只保存一份，按引用计数在
+最后一个引用释放时删除。
+
+暂存目录按进程隔离（<BATCH_SPOOL_DIR>/<pid>），启动时清理已退出进程遗留的目录。
+"""
+import os
+import shutil
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_API_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 暂存根目录
+BATCH_SPOOL_DIR = os.environ.get('BATCH_SPOOL_DIR', os.path.join(_API_ROOT, 'instance', 'batch_spool'))
+# 是否暂存到磁盘；关闭时内容保留在内存中
+BATCH_SPOOL_ENABLED = os.environ.get('BATCH_SPOOL_ENABLED', 'true').lower() == 'true'
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # 进程存在但无权限发送信号
+    return True
+
+
+class ContentSpool:
+    """按内容寻址、引用计数的文本暂存（线程安全）"""
+
+    def __init__(self, root_dir: str = None, enabled: bool = None):
+        self.root_dir = root_dir or BATCH_SPOOL_DIR
+        self.enabled = enabled if enabled is not None else BATCH_SPOOL_ENABLED
+        self.spool_dir = os.path.join(self.root_dir, str(os.getpid()))
+        self._lock = threading.Lock()
+        self._refs: Dict[str, int] = {}  # 内容引用 -> 引用计数
+        self._sizes: Dict[str, int] = {}
+        self._prepared = False
+        self.stats = {'writes': 0, 'dedup_hits': 0, 'loads': 0, 'deletes': 0, 'errors': 0}
+
+    def put(self, content: str) -> Optional[str]:
+        """
+        暂存文本并增加引用计数
+
+        Returns:
+            Optional[str]: 内容引用；未启用或写入失败时返回None（调用方应把内容保留在内存中）
+        """
+        if not self.enabled or content is None:
+            return None
+
+        data = content.encode('utf-8')
+        ref = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if ref in self._refs:
+                self._refs[ref] += 1
+                self.stats['dedup_hits'] += 1
+                return ref
+            path = self.path(ref)
+            try:
+                self._prepare()
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"⚠️ 暂存批量文件内容失败，保留在内存中: {str(e)}")
+                self.stats['errors'] += 1
+                return None
+            self._refs[ref] = 1
+            self._sizes[ref] = len(data)
+            self.stats['writes'] += 1
+            return ref
+
+    def load(self, ref: str) -> str:
+        """读取暂存的文本（引用不存在时抛出 FileNotFoundError）"""
+        with open(self.path(ref), 'rb') as f:
+            data = f.read()
+        with self._lock:
+            self.stats['loads'] += 1
+        return data.decode('utf-8')
+
+    def release(self, ref: Optional[str]):
+        """释放一个引用，最后一个引用释放时删除暂存文件"""
+        if not ref:
+            return
+        with self._lock:
+            count = self._refs.get(ref)
+            if count is None:
+                return
+            if count > 1:
+                self._refs[ref] = count - 1
+                return
+            del self._refs[ref]
+            self._sizes.pop(ref, None)
+            try:
+                os.remove(self.path(ref))
+                self.stats['deletes'] += 1
+            except OSError:
+                self.stats['errors'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                'enabled': self.enabled,
+                'entries': len(self._refs),
+                'references': sum(self._refs.values()),
+                'total_bytes': sum(self._sizes.values()),
+                'spool_dir': self.spool_dir
+            }
+
+    def path(self, ref: str) -> str:
+        """暂存文件路径（供调用方直接复制文件，不经过内存）"""
+        return os.path.join(self.spool_dir, ref[:2], f"{ref}.txt")
+
+    def _prepare(self):
+        """首次写入时清空本进程目录（进程号可能被复用），删除已退出进程的目录"""
+        if self._prepared:
+            return
+        self._prepared = True
+        if not os.path.isdir(self.root_dir):
+            return
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            if not name.isdigit() or not os.path.isdir(path):
+                continue
+            if int(name) == os.getpid() or not _process_alive(int(name)):
+                shutil.rmtree(path, ignore_errors=True)
+
+
+# 全局批量内容暂存实例
+content_spool = ContentSpool()
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+请求截止时间
+路由层按请求超时创建 Deadline，经 ContextVar 传递到分析各阶段、文档处理、OCR 和大模型调用：
+每一步按剩余预算确定自己的超时，剩余预算不足以完成该步时提前中止（DeadlineExceeded），
+不再为客户端已放弃的请求占用工作线程。
+
+阶段图在线程池执行时复制调用方上下文，因此阶段内部通过 current_deadline() 即可取到。
+"""
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+_current_deadline: ContextVar[Optional['Deadline']] = ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """剩余预算不足以完成某一步"""
+
+    def __init__(self, step: str, remaining: float, required: float = 0.0):
+        self.step = step
+        self.remaining = remaining
+        self.required = required
+        super().__init__(f"Request deadline exceeded at '{step}' "
+                         f"({max(remaining, 0.0):.1f}s left, {required:g}s required)")
+
+
+class DeadlineStats:
+    """进程内截止时间统计：被提前中止的请求数（按中止的步骤）和缩短/免去的等待时间"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def record_cut(self, step: str, skipped: float, first: bool = True):
+        with self._lock:
+            if first:
+                self.cut_short_requests += 1
+                self.cut_short_by_step[step] = self.cut_short_by_step.get(step, 0) + 1
+            self.reclaimed_seconds += max(0.0, skipped)
+
+    def record_clamp(self, step: str, saved: float):
+        with self._lock:
+            self.clamped_waits += 1
+            self.reclaimed_seconds += max(0.0, saved)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'cut_short_requests': self.cut_short_requests,
+                'cut_short_by_step': dict(self.cut_short_by_step),
+                'clamped_waits': self.clamped_waits,
+                # 按各步骤原有超时估算：被截短的超时 + 中止时免去的等待（如未再发起的重试）
+                'reclaimed_seconds': round(self.reclaimed_seconds, 2)
+            }
+
+    def reset(self):
+        with self._lock:
+            self.cut_short_requests = 0
+            self.cut_short_by_step: Dict[str, int] = {}
+            self.clamped_waits = 0
+            self.reclaimed_seconds = 0.0
+
+
+class Deadline:
+    """
+    请求截止时间（线程安全，可在多个阶段间共享）
+
+    同一请求只在第一次中止时计入 cut_short_requests（并行阶段可能各自中止），
+    每次中止免去的等待都计入回收时间。
+    """
+
+    def __init__(self, budget: float, started_at: float = None, stats: DeadlineStats = None):
+        """
+        Args:
+            budget: 总预算（秒）
+            started_at: 预算起点（time.time()），默认为现在；用于把排队等待计入预算
+            stats: 统计对象，默认为全局 deadline_stats
+        """
+        elapsed = max(0.0, time.time() - started_at) if started_at is not None else 0.0
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget - elapsed
+        self.stats = stats if stats is not None else deadline_stats
+        self.exceeded_step: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, step: str, required: float = 0.0, skipped: float = 0.0):
+        """
+        剩余预算少于 required（或已耗尽）时中止
+
+        Args:
+            step: 步骤名称（统计和错误信息用）
+            required: 完成该步骤至少需要的秒数
+            skipped: 中止时免去的等待时间（该步骤原本的超时），计入回收时间
+        """
+        remaining = self.remaining()
+        if remaining > 0 and remaining >= required:
+            return
+        self.abort(step, required, skipped or max(required - max(remaining, 0.0), 0.0))
+
+    def abort(self, step: str, required: float = 0.0, skipped: float = 0.0):
+        """在 step 处按截止时间中止（如等待被剩余预算截短后超时）"""
+        with self._lock:
+            first = self.exceeded_step is None
+            if first:
+                self.exceeded_step = step
+        self.stats.record_cut(step, skipped, first)
+        raise DeadlineExceeded(step, self.remaining(), required)
+
+    def timeout_for(self, step: str, cap: float, required: float = 0.0) -> float:
+        """
+        按剩余预算确定某一步的超时：不超过 cap，预算不足 required 时中止
+
+        Returns:
+            float: 该步骤可使用的超时（秒）
+        """
+        self.check(step, required, skipped=cap)
+        timeout = min(cap, self.remaining())
+        if timeout < cap:
+            self.stats.record_clamp(step, cap - timeout)
+        return max(timeout, 0.0)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """当前请求的截止时间（未设置时为None，即不限时）"""
+    return _current_deadline.get()
+
+
+def check_deadline(step: str, required: float = 0.0):
+    """当前请求有截止时间时检查剩余预算"""
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.check(step, required)
+
+
+def bounded_timeout(step: str, cap: float, required: float = 0.0) -> float:
+    """按当前请求剩余预算截短超时；未设置截止时间时返回 cap"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return cap
+    return deadline.timeout_for(step, cap, required)
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """在上下文内设置当前请求的截止时间（None 表示不限时）"""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+# 全局统计实例
+deadline_stats = DeadlineStats()
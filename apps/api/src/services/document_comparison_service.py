@@ -15,6 +15,9 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from .ai_analyzer import AIAnalyzer
 from .openai_client import OpenAIClient
+from .cancellation import (
+    CancellationToken, OperationCancelled, cancellation_scope, cancellation_registry, check_cancelled
+)
 from src.models.ai_analysis import AIAnalysisRecord
 from src.models.document_comparison import (
     DocumentComparison, ComparisonDocument, ComparisonResult, 
@@ -182,9 +185,10 @@ class DocumentComparisonService:
             comparison.start_processing()
             comparison.save()
             
-            # 在后台线程中处理
+            # 在后台线程中处理；取消接口通过对比ID找到令牌
+            token = cancellation_registry.register('comparison', comparison_id, CancellationToken('comparison'))
             executor = ThreadPoolExecutor(max_workers=1)
-            executor.submit(self._process_comparison, comparison_id)
+            executor.submit(self._run_comparison, comparison_id, token)
             
             logger.info(f"Document comparison started: {comparison_id}")
             return True
@@ -193,8 +197,16 @@ class DocumentComparisonService:
             logger.error(f"Error starting comparison {comparison_id}: {str(e)}")
             return False
     
+    def _run_comparison(self, comparison_id: str, token: CancellationToken):
+        """在对比的取消令牌下处理对比分析"""
+        try:
+            with cancellation_scope(token):
+                self._process_comparison(comparison_id)
+        finally:
+            cancellation_registry.unregister('comparison', comparison_id, token)
+    
     def _process_comparison(self, comparison_id: str):
-        """处理对比分析（后台任务）"""
+        """处理对比分析（后台任务）；取消后不再调用大模型，也不保存结果"""
         try:
             comparison = DocumentComparison.query.filter_by(comparison_id=comparison_id).first()
             if not comparison:
@@ -242,11 +254,13 @@ class DocumentComparisonService:
             settings = comparison.comparison_settings or {}
             
             # 执行对比分析
+            check_cancelled('comparison_analysis')
             comparison_results = self._perform_comparison_analysis(
                 documents_data, template, settings
             )
             
-            # 保存结果
+            # 保存结果（对比已取消时丢弃）
+            check_cancelled('comparison_save')
             self._save_comparison_results(comparison_id, comparison_results)
             
             # 更新对比状态
@@ -255,13 +269,17 @@ class DocumentComparisonService:
             
             logger.info(f"Document comparison completed: {comparison_id}")
             
+        except OperationCancelled as e:
+            # 取消接口已更新对比状态
+            logger.info(f"Document comparison cancelled at {e.step}: {comparison_id}")
+            
         except Exception as e:
             logger.error(f"Error processing comparison {comparison_id}: {str(e)}")
             
             # 更新失败状态
             try:
                 comparison = DocumentComparison.query.filter_by(comparison_id=comparison_id).first()
-                if comparison:
+                if comparison and comparison.status != ComparisonStatus.CANCELLED:
                     comparison.complete_processing(error_message=str(e))
                     comparison.save()
             except:
@@ -575,6 +593,9 @@ class DocumentComparisonService:
             comparison.cancel_processing(reason)
             comparison.save()
             
+            # 中断正在执行的对比分析
+            cancellation_registry.cancel('comparison', comparison_id, reason)
+            
             logger.info(f"Comparison cancelled: {comparison_id}")
             return True
             
@@ -5,8 +5,9 @@
 """
 import os
 import io
+import mmap
 import logging
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple, Union
 from werkzeug.datastructures import FileStorage
 
 # 文档解析库
@@ -49,7 +50,15 @@ except ImportError:
     XLS_AVAILABLE = False
 
 import re
-from collections import Counter
+import time
+import uuid
+import shutil
+import threading
+from collections import Counter, OrderedDict, defaultdict
+import math
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 
 try:
     from pptx import Presentation
@@ -70,8 +79,32 @@ try:
 except ImportError:
     OCR_AVAILABLE = False
 
+from .extraction_cache import extraction_cache
+from .analysis_tracing import analysis_tracer
+from .deadline import DeadlineExceeded, current_deadline, bounded_timeout
+from .memory_accounting import memory_sampler, memory_scope, MB
+from src.utils.keyword_matcher import KeywordMatcher
+from src.utils.encoding_detection import detect_encoding, decode_text
+
 logger = logging.getLogger(__name__)
 
+# 数字+单位（技术规格）检测
+TECH_UNIT_PATTERN = re.compile(r'\d+[A-Za-z]*[\s]*[A-Za-z/Ω%°℃]')
+
+
+def _available_cpus() -> int:
+    """本进程可使用的CPU核数（考虑CPU亲和性限制）"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _extract_pdf_page_range(path: str, start: int, end: int) -> List[str]:
+    """PDF分页并行提取的工作进程入口：返回第 [start, end) 页的文本"""
+    reader = PyPDF2.PdfReader(path)
+    return [reader.pages[idx].extract_text() for idx in range(start, end)]
+
+
 class DocumentContentCleaner:
     """文档内容清洗器 - 专门处理OCR噪声和格式化标记"""
     
@@ -127,6 +160,32 @@ class DocumentContentCleaner:
             r'(?:电|压|流|功|率|频|温|度|精|量)', # 电力技术关键词
             r'\b(?:volt|amp|watt|freq|temp|test|spec)\b', # 英文技术词（单词边界）
         ]
+        
+        self._compile_patterns()
+    
+    def _compile_patterns(self):
+        """
+        预编译清洗模式
+
+        每个模式族合并为一个交替正则，一次search即可判断整族是否命中；
+        族之间仍按 word -> page_nav -> table -> meaningless 的顺序判断，统计口径不变。
+        修改上面的模式列表后需重新调用本方法。
+        """
+        def combine(patterns):
+            # 每个子模式包在非捕获组中；meaningless_patterns[0] 的反向引用 \1
+            # 依赖它是合并后正则里的第一个捕获组，调整顺序时注意
+            return re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE)
+        
+        self._protect_re = combine(self.protect_patterns)
+        self._noise_families = [
+            ('word_noise', combine(self.word_noise_patterns)),
+            ('page_nav', combine(self.page_nav_patterns)),
+            ('table_noise', combine(self.table_noise_patterns)),
+            ('meaningless', combine(self.meaningless_patterns)),
+        ]
+        self._word_noise_re = self._noise_families[0][1]
+        self._word_noise_subs = [re.compile(p, re.IGNORECASE) for p in self.word_noise_patterns]
+        self._whitespace_re = re.compile(r'\s+')
     
     def clean_document_content(self, content: str) -> Dict[str, Any]:
         """
@@ -149,42 +208,31 @@ class DocumentContentCleaner:
             'total_lines': len(original_lines)
         }
         
+        protect_search = self._protect_re.search
+        noise_families = self._noise_families
+        whitespace_sub = self._whitespace_re.sub
+        
         for line in original_lines:
             line = line.strip()
             if not line:
                 continue
                 
             # 检查是否为需要保护的技术内容
-            if self._is_protected_content(line):
+            if protect_search(line):
                 cleaned_lines.append(line)
                 continue
             
-            # 检查各种噪声模式
+            # 按优先级检查各族噪声模式（Word标记 -> 页面导航 -> 表格边框 -> 无意义重复）
             is_noise = False
-            
-            # Word格式化噪声
-            if self._matches_patterns(line, self.word_noise_patterns):
-                noise_stats['word_noise'] += 1
-                is_noise = True
-            
-            # 页面导航元素
-            elif self._matches_patterns(line, self.page_nav_patterns):
-                noise_stats['page_nav'] += 1
-                is_noise = True
-            
-            # 表格格式化噪声
-            elif self._matches_patterns(line, self.table_noise_patterns):
-                noise_stats['table_noise'] += 1
-                is_noise = True
-            
-            # 无意义字符重复
-            elif self._matches_patterns(line, self.meaningless_patterns):
-                noise_stats['meaningless'] += 1
-                is_noise = True
+            for family, pattern in noise_families:
+                if pattern.search(line):
+                    noise_stats[family] += 1
+                    is_noise = True
+                    break
             
             if not is_noise:
-                # 进一步清理有效行中的噪声标记
-                cleaned_line = self._clean_line_noise(line)
+                # 未命中Word噪声族，行内无需再做标记替换，只需规整空白
+                cleaned_line = whitespace_sub(' ', line).strip()
                 if cleaned_line and len(cleaned_line.strip()) > 1:
                     cleaned_lines.append(cleaned_line)
         
@@ -203,7 +251,7 @@ class DocumentContentCleaner:
     
     def _is_protected_content(self, line: str) -> bool:
         """检查是否为需要保护的技术内容"""
-        return any(re.search(pattern, line, re.IGNORECASE) for pattern in self.protect_patterns)
+        return self._protect_re.search(line) is not None
     
     def _matches_patterns(self, text: str, patterns: list) -> bool:
         """检查文本是否匹配任何噪声模式"""
@@ -213,12 +261,13 @@ class DocumentContentCleaner:
         """清理行内的噪声标记"""
         cleaned = line
         
-        # 移除Word格式化标记
-        for pattern in self.word_noise_patterns:
-            cleaned = re.sub(pattern, '', cleaned, flags=re.IGNORECASE)
+        # 移除Word格式化标记（整族都不命中时逐个替换不会改变文本，直接跳过）
+        if self._word_noise_re.search(cleaned):
+            for pattern in self._word_noise_subs:
+                cleaned = pattern.sub('', cleaned)
         
         # 清理多余空格
-        cleaned = re.sub(r'\s+', ' ', cleaned).strip()
+        cleaned = self._whitespace_re.sub(' ', cleaned).strip()
         
         return cleaned
 
@@ -258,11 +307,76 @@ class DocumentProcessor:
         'image/tiff': 'tiff',
     }
     
-    def __init__(self):
+    # 智能截断时用于段落评分的关键词词表（每次出现计10分）
+    DEFAULT_TRUNCATION_KEYWORDS = [
+        # 中文关键词
+        '产品', '型号', '规格', '参数', '技术', '电压', '电流', '功率', '频率', 
+        '测试', '保护', '继电', '装置', '设备', '性能', '精度', '范围', 
+        '温度', '湿度', '环境', '认证', '标准', '质量', '保修', '服务',
+        '配置', '接口', '通信', '控制', '显示', '操作', '安装', '维护',
+        
+        # 英文关键词
+        'product', 'model', 'specification', 'parameter', 'technical', 
+        'voltage', 'current', 'power', 'frequency', 'test', 'protection',
+        'relay', 'device', 'equipment', 'performance', 'accuracy', 'range',
+        'temperature', 'humidity', 'environment', 'certification', 'standard',
+        'quality', 'warranty', 'service', 'configuration', 'interface',
+        'communication', 'control', 'display', 'operation', 'installation'
+    ]
+    TRUNCATION_KEYWORD_WEIGHT = 10
+    
+    # DOC提取策略竞速：达到该质量分即视为胜出并取消其余策略
+    DOC_QUALITY_GATE = 0.8
+    
+    # 单次OCR识别超时；请求剩余预算少于 OCR_MIN_PASS_BUDGET 时不再开始新的识别（秒）
+    OCR_PASS_TIMEOUT = 60
+    OCR_MIN_PASS_BUDGET = 5
+    DOC_SIGNATURE_CACHE_SIZE = 256
+    
+    # DOC提取的进程级共享状态（各服务持有独立的处理器实例）
+    _doc_lock = threading.Lock()
+    _doc_executor = None
+    _doc_temp_dir = None
+    _doc_strategy_winners: 'OrderedDict[str, str]' = OrderedDict()
+    _doc_strategy_stats = defaultdict(lambda: {
+        'attempts': 0, 'wins': 0, 'failures': 0, 'cancelled': 0, 'total_time': 0.0, 'max_time': 0.0
+    })
+    
+    # PDF分页并行提取：页数达到阈值、工作进程数不少于2且可用CPU核数达到阈值时，按页段分发到进程池。
+    # 单核机器上实测并行比顺序慢（0.5-0.75x），多核加速比尚未测量，默认只在4核及以上启用
+    PDF_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 40))
+    PDF_PARALLEL_WORKERS = int(os.environ.get('PDF_PARALLEL_WORKERS', min(4, os.cpu_count() or 1)))
+    PDF_PARALLEL_MIN_CPUS = int(os.environ.get('PDF_PARALLEL_MIN_CPUS', 4))
+    _pdf_executor = None
+    
+    # 提取/清洗逻辑的版本号，作为提取缓存键的一部分；改动提取结果时需同步递增
+    PROCESSOR_VERSION = '2025.08.4'
+    
+    def __init__(self, truncation_keywords: Union[List[str], Dict[str, float]] = None):
         self.max_file_size = 10 * 1024 * 1024  # 10MB
         self.max_text_length = 100000  # 增加到100k字符限制，支持更长的技术文档
         self.min_text_length = 10  # 最小文本长度要求
         self.content_cleaner = DocumentContentCleaner()  # 文档内容清洗器
+        self.extraction_cache = extraction_cache  # 按文件内容哈希共享的提取结果缓存
+        self.set_truncation_keywords(truncation_keywords or self.DEFAULT_TRUNCATION_KEYWORDS)
+    
+    def set_truncation_keywords(self, keywords: Union[List[str], Dict[str, float]]):
+        """
+        配置智能截断的关键词词表
+        
+        Args:
+            keywords: 关键词列表（每次出现计 TRUNCATION_KEYWORD_WEIGHT 分），
+                      或 {关键词: 权重} 字典；匹配不区分大小写
+        """
+        if isinstance(keywords, dict):
+            weighted = {}
+            for keyword, weight in keywords.items():
+                weighted[keyword.lower()] = weighted.get(keyword.lower(), 0) + weight
+        else:
+            weighted = {}
+            for keyword in keywords:
+                weighted[keyword.lower()] = weighted.get(keyword.lower(), 0) + self.TRUNCATION_KEYWORD_WEIGHT
+        self._truncation_matcher = KeywordMatcher(weighted)
     
     def is_supported_format(self, mimetype: str, filename: str = "") -> bool:
         """检查文件格式是否支持"""
@@ -293,12 +407,13 @@ class DocumentProcessor:
             }
         }
     
-    def process_document(self, file: FileStorage) -> Tuple[str, Dict[str, Any]]:
+    def process_document(self, file: FileStorage, content_hash: str = None) -> Tuple[str, Dict[str, Any]]:
         """
         处理上传的文档
         
         Args:
             file: 上传的文件对象
+            content_hash: 文件内容的SHA-256（由路由层计算），提供时启用提取结果缓存
             
         Returns:
             Tuple[str, Dict]: (提取的文本内容, 文档信息)
@@ -316,9 +431,25 @@ class DocumentProcessor:
             'type': self._detect_file_type(file.mimetype, file.filename)
         }
         
+        # 🗄️ 相同内容的文件直接复用已缓存的提取结果
+        if content_hash:
+            doc_info['content_hash'] = content_hash
+            cached = self.extraction_cache.get(content_hash, self.PROCESSOR_VERSION)
+            if cached:
+                cached_info = cached.get('doc_info', {})
+                cached_info.update(doc_info)
+                cached_info['cache_hit'] = True
+                logger.info(f"🗄️ 提取缓存命中: {file.filename} ({content_hash[:12]})")
+                return cached['text'], cached_info
+        
         try:
-            # 根据文件类型提取文本
-            raw_text_content = self._extract_text(file, doc_info['type'])
+            # 根据文件类型提取文本（Office格式同时产出结构化表格），记录提取器的峰值内存
+            with memory_scope('extract', doc_info['type']) as memory_usage:
+                raw_text_content, structured_tables = self._extract_content(file, doc_info['type'])
+            if memory_sampler.enabled:
+                doc_info['extraction_peak_mb'] = round(memory_usage.peak_bytes / MB, 2)
+            if structured_tables is not None:
+                doc_info['structured_tables'] = structured_tables
             
             # 🔧 文档内容清洗 - 移除OCR噪声和格式化标记
             cleaning_result = self.content_cleaner.clean_document_content(raw_text_content)
@@ -344,8 +475,17 @@ class DocumentProcessor:
                 logger.info(f"文档清洗效果显著: 清洗比例{cleaning_result['cleaning_ratio']:.1%}, "
                           f"移除{cleaning_result['noise_statistics']['total_removed']}行噪声")
             
+            if content_hash:
+                doc_info['cache_hit'] = False
+                self.extraction_cache.put(content_hash, self.PROCESSOR_VERSION, {
+                    'text': text_content,
+                    'doc_info': doc_info
+                })
+            
             return text_content, doc_info
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error processing document {file.filename}: {str(e)}")
             raise ValueError(f"Document processing failed: {str(e)}")
@@ -439,19 +579,74 @@ class DocumentProcessor:
         else:
             raise ValueError(f"Unsupported file type for text extraction: {file_type}")
     
+    def _extract_content(self, file: FileStorage, file_type: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        提取文本，DOCX/XLSX/XLS/PPTX 同时返回结构化表格
+        
+        Returns:
+            Tuple[str, Optional[Dict]]: (文本, 结构化表格)
+            结构化表格为 {'tables': [...], 'covers_text': bool}，每个表格为
+            {'origin': 来源位置, 'headers': [表头], 'rows': [[单元格, ...], ...]}；
+            covers_text 为True表示文本全部来自表格（电子表格），无需再做文本表格识别。
+            其他格式返回None。
+        """
+        if file_type == 'docx':
+            file.seek(0)
+            text, tables = self._extract_docx(file)
+            return text, {'tables': tables, 'covers_text': False}
+        if file_type in ('xlsx', 'xls'):
+            file.seek(0)
+            text, sheets = self._extract_spreadsheet(file, file_type)
+            tables = []
+            for sheet in sheets:
+                table = self._build_structured_table(f"{file_type}:{sheet['sheet']}", sheet['rows'])
+                if table:
+                    tables.append(table)
+            return text, {'tables': tables, 'covers_text': True}
+        if file_type in ('pptx', 'ppt'):
+            file.seek(0)
+            text, tables = self._extract_pptx(file)
+            return text, {'tables': tables, 'covers_text': False}
+        return self._extract_text(file, file_type), None
+    
+    @staticmethod
+    def _build_structured_table(origin: str, rows: List[tuple]) -> Optional[Dict[str, Any]]:
+        """把单元格行转换为结构化表格：首个非空行作为表头，单元格统一为去空白的字符串"""
+        cell_rows = []
+        for row in rows:
+            cells = ['' if cell is None else str(cell).strip() for cell in row]
+            if any(cells):
+                cell_rows.append(cells)
+        if len(cell_rows) < 2:
+            return None
+        return {
+            'origin': origin,
+            'headers': cell_rows[0],
+            'rows': cell_rows[1:]
+        }
+    
+    def _binary_stream(self, file: FileStorage):
+        """
+        获取可随机访问的二进制流
+
+        上传流本身可seek（内存缓冲、临时文件或只读mmap）时直接交给解析库，
+        避免再复制一份完整的 bytes；否则退回读入内存。
+        """
+        stream = getattr(file, 'stream', None)
+        try:
+            if isinstance(stream, mmap.mmap) or (stream is not None and stream.seekable()):
+                stream.seek(0)
+                return stream
+        except (AttributeError, OSError, ValueError):
+            pass
+        return io.BytesIO(file.read())
+    
     def _extract_text_from_txt(self, file: FileStorage) -> str:
         """从TXT文件提取文本"""
         try:
             content = file.read()
-            # 尝试不同编码
-            for encoding in ['utf-8', 'gbk', 'gb2312', 'latin1']:
-                try:
-                    return content.decode(encoding)
-                except UnicodeDecodeError:
-                    continue
-            
-            # 如果所有编码都失败，使用错误处理
-            return content.decode('utf-8', errors='ignore')
+            text, _ = decode_text(content, fallback_encodings=('gbk', 'gb2312', 'latin1'))
+            return text
         except Exception as e:
             raise ValueError(f"Failed to read text file: {str(e)}")
     
@@ -461,40 +656,136 @@ class DocumentProcessor:
             raise ValueError("PDF processing not available. Please install PyPDF2.")
         
         try:
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file.read()))
-            text_content = ""
+            pdf_reader = PyPDF2.PdfReader(self._binary_stream(file))
+            page_count = len(pdf_reader.pages)
             
-            for page in pdf_reader.pages:
-                text_content += page.extract_text() + "\n"
+            page_texts = None
+            if self._use_parallel_pdf(page_count):
+                page_texts = self._extract_pdf_pages_parallel(file, page_count)
+            if page_texts is None:
+                # 小文件（或并行不可用）直接在当前线程顺序提取，每页检查请求剩余预算
+                deadline = current_deadline()
+                page_texts = []
+                for page in pdf_reader.pages:
+                    if deadline is not None:
+                        deadline.check('pdf_extraction')
+                    page_texts.append(page.extract_text())
+            
+            text_content = "".join(text + "\n" for text in page_texts)
             
             if not text_content.strip():
                 raise ValueError("No text content found in PDF. The PDF might be image-based.")
             
             return text_content
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             raise ValueError(f"Failed to extract text from PDF: {str(e)}")
     
+    def _use_parallel_pdf(self, page_count: int) -> bool:
+        """页数、工作进程数和本进程可用的CPU核数均达到阈值时才并行提取"""
+        return (self.PDF_PARALLEL_WORKERS >= 2
+                and page_count >= self.PDF_PARALLEL_MIN_PAGES
+                and _available_cpus() >= self.PDF_PARALLEL_MIN_CPUS)
+    
+    def _extract_pdf_pages_parallel(self, file: FileStorage, page_count: int) -> Optional[List[str]]:
+        """
+        按页段在工作进程中并行提取PDF，按页序重组
+        
+        PDF先落到共享临时目录，各进程按路径打开，避免把整份文件序列化给每个进程。
+        进程池不可用或任一页段失败时返回None，由调用方回退到顺序提取。
+        """
+        workers = self.PDF_PARALLEL_WORKERS
+        # 页段数取工作进程数的2倍，减少页面复杂度不均导致的等待
+        chunk = max(1, math.ceil(page_count / (workers * 2)))
+        ranges = [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+        
+        path = None
+        try:
+            stream = self._binary_stream(file)
+            stream.seek(0)
+            with tempfile.NamedTemporaryFile(dir=self._get_doc_temp_dir(), suffix='.pdf', delete=False) as tmp:
+                shutil.copyfileobj(stream, tmp)
+                path = tmp.name
+            
+            start_time = time.time()
+            executor = self._get_pdf_executor()
+            futures = [executor.submit(_extract_pdf_page_range, path, start, end) for start, end in ranges]
+            deadline = current_deadline()
+            page_texts = []
+            try:
+                for future in futures:
+                    page_texts.extend(future.result(timeout=deadline.remaining() if deadline else None))
+            except TimeoutError:
+                for future in futures:
+                    future.cancel()
+                deadline.abort('pdf_extraction')
+            
+            logger.info(f"📑 PDF分页并行提取: {page_count}页, {len(ranges)}个页段, "
+                        f"{workers}个进程, 耗时{time.time() - start_time:.2f}s")
+            return page_texts
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ PDF分页并行提取失败，回退顺序提取: {str(e)}")
+            if isinstance(e, BrokenProcessPool):
+                self._reset_pdf_executor()
+            return None
+        finally:
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    
+    @classmethod
+    def _get_pdf_executor(cls) -> ProcessPoolExecutor:
+        with cls._doc_lock:
+            if cls._pdf_executor is None:
+                # 服务进程是多线程的，不直接fork，使用forkserver（不可用时spawn）启动工作进程
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                cls._pdf_executor = ProcessPoolExecutor(max_workers=cls.PDF_PARALLEL_WORKERS, mp_context=context)
+            return cls._pdf_executor
+    
+    @classmethod
+    def _reset_pdf_executor(cls):
+        """丢弃可能已损坏的进程池，下次使用时重建"""
+        with cls._doc_lock:
+            executor, cls._pdf_executor = cls._pdf_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
     def _extract_text_from_docx(self, file: FileStorage) -> str:
         """从DOCX文件提取文本"""
+        return self._extract_docx(file)[0]
+    
+    def _extract_docx(self, file: FileStorage) -> Tuple[str, List[Dict[str, Any]]]:
+        """从DOCX文件提取文本和结构化表格"""
         if not DOCX_AVAILABLE:
             raise ValueError("DOCX processing not available. Please install python-docx.")
         
         try:
-            doc = Document(io.BytesIO(file.read()))
-            text_content = ""
+            doc = Document(self._binary_stream(file))
+            parts = []
+            tables = []
             
             for paragraph in doc.paragraphs:
-                text_content += paragraph.text + "\n"
+                parts.append(paragraph.text + "\n")
             
             # 提取表格内容
-            for table in doc.tables:
+            for table_idx, table in enumerate(doc.tables):
+                rows = []
                 for row in table.rows:
-                    for cell in row.cells:
-                        text_content += cell.text + "\t"
-                    text_content += "\n"
+                    cells = [cell.text for cell in row.cells]
+                    parts.append("".join(cell + "\t" for cell in cells) + "\n")
+                    rows.append(cells)
+                structured = self._build_structured_table(f"docx:table{table_idx + 1}", rows)
+                if structured:
+                    tables.append(structured)
             
-            return text_content
+            return "".join(parts), tables
             
         except Exception as e:
             raise ValueError(f"Failed to extract text from DOCX: {str(e)}")
@@ -505,7 +796,7 @@ class DocumentProcessor:
             raise ValueError("OCR processing not available. Please install pytesseract and Pillow.")
         
         try:
-            image = Image.open(io.BytesIO(file.read()))
+            image = Image.open(self._binary_stream(file))
             
             # 🔧 增强OCR处理 - 尝试多种OCR配置
             ocr_configs = [
@@ -518,15 +809,23 @@ class DocumentProcessor:
             
             best_text = ""
             best_score = 0
+            deadline = current_deadline()
             
             for config in ocr_configs:
+                # 按请求剩余预算确定本次识别超时；已有结果时预算不足直接使用已有结果
+                if best_text and deadline is not None and deadline.remaining() < self.OCR_MIN_PASS_BUDGET:
+                    logger.info("⏱️ 请求剩余预算不足，跳过其余OCR配置")
+                    break
+                ocr_timeout = bounded_timeout('ocr_pass', self.OCR_PASS_TIMEOUT, required=self.OCR_MIN_PASS_BUDGET)
                 try:
-                    # 使用tesseract进行OCR，支持中英文
-                    text_content = pytesseract.image_to_string(
-                        image, 
-                        lang='chi_sim+eng',  # 中文简体+英文
-                        config=config
-                    )
+                    # 使用tesseract进行OCR，支持中英文；每次识别记录为一个追踪span
+                    with analysis_tracer.span('ocr_pass', lang='chi_sim+eng', config=config):
+                        text_content = pytesseract.image_to_string(
+                            image, 
+                            lang='chi_sim+eng',  # 中文简体+英文
+                            config=config,
+                            timeout=ocr_timeout
+                        )
                     
                     if text_content and text_content.strip():
                         # 评估OCR结果质量
@@ -547,12 +846,15 @@ class DocumentProcessor:
             
             # 如果没有找到任何文本，尝试英文专用OCR
             if not best_text.strip():
+                ocr_timeout = bounded_timeout('ocr_pass', self.OCR_PASS_TIMEOUT, required=self.OCR_MIN_PASS_BUDGET)
                 try:
-                    text_content = pytesseract.image_to_string(
-                        image,
-                        lang='eng',  # 仅英文
-                        config='--psm 6'
-                    )
+                    with analysis_tracer.span('ocr_pass', lang='eng', config='--psm 6'):
+                        text_content = pytesseract.image_to_string(
+                            image,
+                            lang='eng',  # 仅英文
+                            config='--psm 6',
+                            timeout=ocr_timeout
+                        )
                     if text_content and text_content.strip():
                         quality_score = self._evaluate_ocr_quality(text_content)
                         if quality_score > best_score:
@@ -582,6 +884,8 @@ class DocumentProcessor:
                 "• 将图片转换为文档格式（PDF、Word等）"
             )
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             if "无法从图片中提取可读文本" in str(e):
                 raise e
@@ -589,109 +893,209 @@ class DocumentProcessor:
                 raise ValueError(f"图片处理失败: {str(e)}")
     
     def _extract_text_from_doc(self, file: FileStorage) -> str:
-        """从DOC文件提取文本 - 使用多种方法尝试"""
+        """
+        从DOC文件提取文本 - 多种策略并发竞速
+        
+        antiword / docx2txt / OLE流解析 / 编码探测 并发执行，第一个达到质量门槛
+        (DOC_QUALITY_GATE) 的结果胜出并取消其余策略；都未达标时取最高分结果。
+        同一文件特征上次胜出的策略会被优先单独尝试。
+        """
         file_content = file.read()
-        best_text = ""
-        best_score = 0
+        signature = self._doc_signature(file_content)
         extraction_methods = []
-        
-        # 方法1: 尝试使用native antiword工具 (如果存在)
+        best = ("", "", 0)  # (方法名, 文本, 质量分)
+        
+        strategies = self._available_doc_strategies()
+        
+        # 🎯 同特征文件上次胜出的策略先单独尝试，达标则无需竞速
+        with DocumentProcessor._doc_lock:
+            preferred = DocumentProcessor._doc_strategy_winners.get(signature)
+        if preferred in strategies:
+            candidates = self._run_doc_strategy(preferred, strategies.pop(preferred), file_content, threading.Event())
+            extraction_methods.extend(candidates)
+            best = max(candidates, key=lambda c: c[2], default=best)
+            if best[2] >= self.DOC_QUALITY_GATE:
+                return self._finish_doc_extraction(preferred, best, signature, extraction_methods)
+        
+        # 🏁 其余策略并发竞速
+        cancel_event = threading.Event()
+        executor = self._get_doc_executor()
+        futures = {
+            executor.submit(self._run_doc_strategy, name, func, file_content, cancel_event): name
+            for name, func in strategies.items()
+        }
+        winner = preferred if best[2] > 0 else None
+        # 竞速最多等到请求截止时间；超时后已有可用结果则使用，否则中止
+        deadline = current_deadline()
         try:
-            with tempfile.NamedTemporaryFile(suffix='.doc', delete=False) as temp_file:
-                temp_file.write(file_content)
-                temp_file.flush()
-                
-                try:
-                    # 尝试系统级antiword命令
-                    result = subprocess.run(
-                        ['/usr/local/bin/antiword', temp_file.name],
-                        capture_output=True,
-                        text=True,
-                        timeout=30
-                    )
-                    
-                    if result.returncode == 0 and result.stdout.strip():
-                        quality_score = self._evaluate_text_quality(result.stdout)
-                        extraction_methods.append(("native-antiword", result.stdout, quality_score))
-                        logger.info(f"Native antiword extraction quality score: {quality_score}")
-                        if quality_score > best_score:
-                            best_text = result.stdout
-                            best_score = quality_score
-                    else:
-                        logger.debug(f"Native antiword failed with return code {result.returncode}")
-                        
-                except (subprocess.TimeoutExpired, FileNotFoundError) as e:
-                    logger.debug(f"Native antiword command not found: {str(e)}")
-                finally:
-                    # 清理临时文件
-                    try:
-                        os.unlink(temp_file.name)
-                    except:
-                        pass
-                        
-        except Exception as e:
-            logger.debug(f"Native antiword method failed: {str(e)}")
+            for future in as_completed(futures, timeout=deadline.remaining() if deadline else None):
+                name = futures[future]
+                candidates = future.result()
+                extraction_methods.extend(candidates)
+                for candidate in candidates:
+                    if candidate[2] > best[2]:
+                        best = candidate
+                        winner = name
+                if best[2] >= self.DOC_QUALITY_GATE:
+                    logger.info(f"DOC extraction strategy '{winner}' passed quality gate ({best[2]:.2f}), cancelling others")
+                    break
+        except TimeoutError:
+            if not (best[1] and best[2] > 0.1):
+                deadline.abort('doc_extraction')
+            logger.info(f"⏱️ 请求剩余预算耗尽，DOC提取使用当前最佳结果 ({best[2]:.2f})")
+        finally:
+            cancel_event.set()
+            for future in futures:
+                future.cancel()
         
-        # 方法2: 尝试使用docx2txt (适用于一些.doc文件)
-        if DOC_AVAILABLE:
-            try:
-                file.seek(0)
-                text_content = docx2txt.process(io.BytesIO(file_content))
-                if text_content and text_content.strip():
-                    quality_score = self._evaluate_text_quality(text_content)
-                    extraction_methods.append(("docx2txt", text_content, quality_score))
-                    logger.info(f"docx2txt extraction quality score: {quality_score}")
-                    if quality_score > best_score:
-                        best_text = text_content
-                        best_score = quality_score
-            except Exception as e:
-                logger.debug(f"docx2txt failed: {str(e)}")
+        # 记录所有尝试的方法
+        logger.info(f"DOC extraction attempted {len(extraction_methods)} methods, best score: {best[2]}")
         
-        # 方法3: OLE文件结构解析 (新增方法)
+        # 如果找到了可用的文本
+        if best[1] and best[2] > 0.1:  # 最低质量阈值
+            return self._finish_doc_extraction(winner, best, signature, extraction_methods)
+        
+        # 如果所有方法都失败，提供更详细的错误信息和建议
+        error_msg = (
+            "无法从此.doc文件中提取可读文本。可能的原因："
+            "\n1. 文件损坏或格式不标准"
+            "\n2. 文件包含主要是图片或图表"
+            "\n3. 文件受密码保护"
+            "\n4. 文件使用了特殊的编码格式"
+            "\n\n建议解决方案："
+            "\n• 请尝试将文件转换为.docx格式"
+            "\n• 确保文件包含可读的文本内容"
+            "\n• 检查文件是否完整下载"
+            f"\n• 尝试的提取方法数量: {len(extraction_methods)}"
+        )
+        
+        raise ValueError(error_msg)
+    
+    def _finish_doc_extraction(self, strategy: str, best: Tuple[str, str, float],
+                               signature: str, extraction_methods: list) -> str:
+        """记录胜出策略并返回文本"""
+        with DocumentProcessor._doc_lock:
+            DocumentProcessor._doc_strategy_stats[strategy]['wins'] += 1
+            winners = DocumentProcessor._doc_strategy_winners
+            winners[signature] = strategy
+            winners.move_to_end(signature)
+            while len(winners) > self.DOC_SIGNATURE_CACHE_SIZE:
+                winners.popitem(last=False)
+        logger.info(f"Successfully extracted DOC text with quality score {best[2]} "
+                    f"(method={best[0]}, strategy={strategy}, attempts={len(extraction_methods)})")
+        return best[1]
+    
+    def _available_doc_strategies(self) -> Dict[str, Any]:
+        """当前环境可用的DOC提取策略（有序）"""
+        strategies = {}
+        if self._antiword_path():
+            strategies['antiword'] = self._doc_strategy_antiword
+        if DOC_AVAILABLE:
+            strategies['docx2txt'] = self._doc_strategy_docx2txt
+        strategies['ole'] = self._doc_strategy_ole
+        strategies['encoding'] = self._doc_strategy_encoding
+        return strategies
+    
+    def _run_doc_strategy(self, name: str, func, file_content: bytes,
+                          cancel_event: threading.Event) -> List[Tuple[str, str, float]]:
+        """执行单个策略并记录耗时，异常视为无结果"""
+        start = time.time()
         try:
-            import olefile
-            
-            # 检查是否是有效的OLE文件
-            if olefile.isOleFile(io.BytesIO(file_content)):
-                with olefile.OleFileIO(io.BytesIO(file_content)) as ole:
-                    # 尝试读取WordDocument流
-                    try:
-                        # 检查WordDocument流是否存在
-                        ole.openstream('WordDocument')
-                        ole_has_word_stream = True
-                    except:
-                        ole_has_word_stream = False
-                    
-                    if ole_has_word_stream:
-                        try:
-                            word_stream = ole.openstream('WordDocument')
-                            raw_data = word_stream.read()
-                            
-                            # 尝试多种编码解析
-                            encodings_to_try = ['utf-16le', 'utf-16', 'gbk', 'gb2312', 'utf-8', 'latin1']
-                            
-                            for encoding in encodings_to_try:
-                                try:
-                                    decoded_text = raw_data.decode(encoding, errors='ignore')
-                                    clean_text = self._clean_ole_text(decoded_text)
-                                    
-                                    if len(clean_text.strip()) > 100:  # 至少需要100个字符
-                                        quality_score = self._evaluate_text_quality(clean_text)
-                                        extraction_methods.append((f"ole-{encoding}", clean_text, quality_score))
-                                        logger.info(f"OLE {encoding} extraction quality score: {quality_score}")
-                                        if quality_score > best_score:
-                                            best_text = clean_text
-                                            best_score = quality_score
-                                except:
-                                    continue
-                                    
-                        except Exception as e:
-                            logger.debug(f"WordDocument stream extraction failed: {e}")
-                            
+            candidates = func(file_content, cancel_event)
         except Exception as e:
-            logger.debug(f"OLE extraction method failed: {str(e)}")
+            logger.debug(f"DOC strategy {name} failed: {str(e)}")
+            candidates = []
+        elapsed = time.time() - start
+        
+        with DocumentProcessor._doc_lock:
+            stats = DocumentProcessor._doc_strategy_stats[name]
+            stats['attempts'] += 1
+            stats['total_time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+            if cancel_event.is_set():
+                stats['cancelled'] += 1
+            elif not candidates:
+                stats['failures'] += 1
+        return candidates
+    
+    def _doc_strategy_antiword(self, file_content: bytes, cancel_event: threading.Event) -> List[Tuple[str, str, float]]:
+        """方法1: native antiword工具（文件只写入共享临时目录一次）"""
+        doc_path = os.path.join(self._get_doc_temp_dir(), f"{uuid.uuid4().hex}.doc")
+        with open(doc_path, 'wb') as temp_file:
+            temp_file.write(file_content)
         
-        # 方法4: 增强编码检测和转换
+        try:
+            process = subprocess.Popen(
+                [self._antiword_path(), doc_path],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+            deadline = time.time() + 30
+            while True:
+                try:
+                    stdout, _ = process.communicate(timeout=0.2)
+                    break
+                except subprocess.TimeoutExpired:
+                    # 其他策略已胜出或超时：终止子进程
+                    if cancel_event.is_set() or time.time() > deadline:
+                        process.kill()
+                        process.communicate()
+                        logger.debug("Native antiword cancelled or timed out")
+                        return []
+            
+            if process.returncode == 0 and stdout.strip():
+                quality_score = self._evaluate_text_quality(stdout)
+                logger.info(f"Native antiword extraction quality score: {quality_score}")
+                return [("native-antiword", stdout, quality_score)]
+            
+            logger.debug(f"Native antiword failed with return code {process.returncode}")
+            return []
+        finally:
+            try:
+                os.unlink(doc_path)
+            except OSError:
+                pass
+    
+    def _doc_strategy_docx2txt(self, file_content: bytes, cancel_event: threading.Event) -> List[Tuple[str, str, float]]:
+        """方法2: docx2txt (适用于一些.doc文件)"""
+        text_content = docx2txt.process(io.BytesIO(file_content))
+        if text_content and text_content.strip():
+            quality_score = self._evaluate_text_quality(text_content)
+            logger.info(f"docx2txt extraction quality score: {quality_score}")
+            return [("docx2txt", text_content, quality_score)]
+        return []
+    
+    def _doc_strategy_ole(self, file_content: bytes, cancel_event: threading.Event) -> List[Tuple[str, str, float]]:
+        """方法3: OLE文件结构解析，读取WordDocument流"""
+        import olefile
+        
+        candidates = []
+        if not olefile.isOleFile(io.BytesIO(file_content)):
+            return candidates
+        
+        with olefile.OleFileIO(io.BytesIO(file_content)) as ole:
+            if not ole.exists('WordDocument'):
+                return candidates
+            raw_data = ole.openstream('WordDocument').read()
+        
+        # 尝试多种编码解析
+        for encoding in ['utf-16le', 'utf-16', 'gbk', 'gb2312', 'utf-8', 'latin1']:
+            if cancel_event.is_set():
+                break
+            try:
+                decoded_text = raw_data.decode(encoding, errors='ignore')
+                clean_text = self._clean_ole_text(decoded_text)
+                if len(clean_text.strip()) > 100:  # 至少需要100个字符
+                    quality_score = self._evaluate_text_quality(clean_text)
+                    candidates.append((f"ole-{encoding}", clean_text, quality_score))
+                    logger.info(f"OLE {encoding} extraction quality score: {quality_score}")
+            except Exception:
+                continue
+        return candidates
+    
+    def _doc_strategy_encoding(self, file_content: bytes, cancel_event: threading.Event) -> List[Tuple[str, str, float]]:
+        """方法4: 增强编码检测和转换"""
         # 🔧 使用更多编码方式和检测策略
         encodings_to_try = [
             # 中文编码 - 优先尝试
@@ -704,18 +1108,11 @@ class DocumentProcessor:
             'iso-8859-1', 'latin1'
         ]
         
-        # 🔧 增强编码检测 - 先尝试检测最可能的编码
+        # 🔧 增强编码检测 - 先尝试检测最可能的编码（头/中/尾采样，按内容哈希缓存）
         try:
-            import chardet
-            
-            # 检测文件编码
-            file.seek(0)
-            sample = file.read(min(10240, len(file_content)))  # 读取前10KB检测编码
-            encoding_result = chardet.detect(sample)
-            
-            if encoding_result and encoding_result.get('encoding') and encoding_result.get('confidence', 0) > 0.7:
-                detected_encoding = encoding_result['encoding'].lower()
-                logger.info(f"检测到编码: {detected_encoding} (置信度: {encoding_result['confidence']})")
+            detected_encoding = detect_encoding(file_content, min_confidence=0.7)
+            if detected_encoding:
+                logger.info(f"检测到编码: {detected_encoding}")
                 
                 # 将检测到的编码放在列表首位
                 if detected_encoding not in [enc.lower() for enc in encodings_to_try]:
@@ -727,13 +1124,14 @@ class DocumentProcessor:
                             encodings_to_try.insert(0, encodings_to_try.pop(i))
                             break
                             
-        except ImportError:
-            logger.debug("chardet模块未安装，跳过自动编码检测")
         except Exception as e:
             logger.debug(f"编码检测失败: {str(e)}")
         
         # 尝试不同编码
+        candidates = []
         for encoding in encodings_to_try:
+            if cancel_event.is_set():
+                break
             try:
                 text_content = file_content.decode(encoding, errors='replace')  # 使用replace而不是ignore
                 
@@ -746,11 +1144,8 @@ class DocumentProcessor:
                 clean_text = self._clean_extracted_text(text_content)
                 if len(clean_text.strip()) > self.min_text_length:
                     quality_score = self._evaluate_text_quality(clean_text)
-                    extraction_methods.append((f"encoding-{encoding}", clean_text, quality_score))
+                    candidates.append((f"encoding-{encoding}", clean_text, quality_score))
                     logger.debug(f"Encoding {encoding} extraction quality score: {quality_score}")
-                    if quality_score > best_score:
-                        best_text = clean_text
-                        best_score = quality_score
                         
                     # 如果质量分数很高，提前退出
                     if quality_score > 0.8:
@@ -760,111 +1155,226 @@ class DocumentProcessor:
             except Exception as e:
                 logger.debug(f"编码 {encoding} 解码失败: {str(e)}")
                 continue
+        return candidates
+    
+    def _doc_signature(self, file_content: bytes) -> str:
+        """
+        文件特征：文件头魔数 + Word FIB标识/版本/加密标志
         
-        # 记录所有尝试的方法
-        logger.info(f"DOC extraction attempted {len(extraction_methods)} methods, best score: {best_score}")
-        
-        # 如果找到了可用的文本
-        if best_text and best_score > 0.1:  # 最低质量阈值
-            logger.info(f"Successfully extracted DOC text with quality score {best_score}")
-            return best_text
-        
-        # 如果所有方法都失败，提供更详细的错误信息和建议
-        error_msg = (
-            "无法从此.doc文件中提取可读文本。可能的原因："
-            "\n1. 文件损坏或格式不标准"
-            "\n2. 文件包含主要是图片或图表"
-            "\n3. 文件受密码保护"
-            "\n4. 文件使用了特殊的编码格式"
-            "\n\n建议解决方案："
-            "\n• 请尝试将文件转换为.docx格式"
-            "\n• 确保文件包含可读的文本内容"
-            "\n• 检查文件是否完整下载"
-            f"\n• 尝试的提取方法数量: {len(extraction_methods)}"
-        )
-        
-        raise ValueError(error_msg)
+        同一模板、同一工具生成的文件特征相同，适合复用上次胜出的策略。
+        """
+        signature = file_content[:8].hex()
+        try:
+            import olefile
+            if olefile.isOleFile(io.BytesIO(file_content)):
+                with olefile.OleFileIO(io.BytesIO(file_content)) as ole:
+                    if ole.exists('WordDocument'):
+                        fib = ole.openstream('WordDocument').read(12)
+                        w_ident, n_fib = int.from_bytes(fib[0:2], 'little'), int.from_bytes(fib[2:4], 'little')
+                        encrypted = bool(int.from_bytes(fib[10:12], 'little') & 0x0100)
+                        signature += f":fib{w_ident:04x}-{n_fib}{'-enc' if encrypted else ''}"
+                    else:
+                        signature += ":ole"
+        except Exception:
+            pass
+        return signature
+    
+    @staticmethod
+    def _antiword_path() -> Optional[str]:
+        """定位antiword可执行文件"""
+        if not ANTIWORD_AVAILABLE:
+            return None
+        if os.path.exists('/usr/local/bin/antiword'):
+            return '/usr/local/bin/antiword'
+        return shutil.which('antiword')
+    
+    @classmethod
+    def _get_doc_executor(cls) -> ThreadPoolExecutor:
+        with cls._doc_lock:
+            if cls._doc_executor is None:
+                cls._doc_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='doc-extract')
+            return cls._doc_executor
+    
+    @classmethod
+    def _get_doc_temp_dir(cls) -> str:
+        """进程内共享的临时目录，避免每个文件单独创建"""
+        with cls._doc_lock:
+            if cls._doc_temp_dir is None or not os.path.isdir(cls._doc_temp_dir):
+                cls._doc_temp_dir = tempfile.mkdtemp(prefix='cpq_doc_')
+            return cls._doc_temp_dir
+    
+    @classmethod
+    def get_doc_strategy_stats(cls) -> Dict[str, Any]:
+        """DOC提取各策略的耗时与胜率统计"""
+        with cls._doc_lock:
+            total_wins = sum(stats['wins'] for stats in cls._doc_strategy_stats.values())
+            return {
+                name: {
+                    'attempts': stats['attempts'],
+                    'wins': stats['wins'],
+                    'failures': stats['failures'],
+                    'cancelled': stats['cancelled'],
+                    'win_rate': round(stats['wins'] / total_wins, 4) if total_wins else 0.0,
+                    'avg_latency_ms': round(stats['total_time'] / stats['attempts'] * 1000, 2) if stats['attempts'] else 0.0,
+                    'max_latency_ms': round(stats['max_time'] * 1000, 2)
+                }
+                for name, stats in cls._doc_strategy_stats.items()
+            }
     
     def _extract_text_from_xlsx(self, file: FileStorage) -> str:
         """从XLSX文件提取文本"""
-        if not XLSX_AVAILABLE:
+        return self._extract_spreadsheet(file, 'xlsx')[0]
+    
+    def _extract_text_from_xls(self, file: FileStorage) -> str:
+        """从XLS文件提取文本"""
+        return self._extract_spreadsheet(file, 'xls')[0]
+    
+    def _extract_spreadsheet(self, file: FileStorage, file_type: str,
+                             text_budget: int = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        流式提取电子表格
+        
+        逐行读取（只读/仅值模式），跳过空行，累计文本达到预算后立即停止，
+        不再解析剩余行和工作表。
+        
+        Args:
+            file: 上传的文件对象
+            file_type: 'xlsx' 或 'xls'
+            text_budget: 文本字符预算，默认 max_text_length
+            
+        Returns:
+            Tuple[str, List[Dict]]: (文本, 结构化工作表列表)
+            每个工作表为 {'sheet': 名称, 'rows': [行元组, ...], 'truncated': bool}，
+            行元组保留列位置（空单元格为None），全空列已去除
+        """
+        label = file_type.upper()
+        if file_type == 'xlsx' and not XLSX_AVAILABLE:
             raise ValueError("XLSX processing not available. Please install openpyxl.")
+        if file_type == 'xls' and not XLS_AVAILABLE:
+            raise ValueError("XLS processing not available. Please install xlrd.")
         
+        budget = text_budget or self.max_text_length
+        parts = []
+        length = 0
+        sheets = []
+        truncated = False
+        
+        sheet_iter = self._iter_xlsx_sheets(file) if file_type == 'xlsx' else self._iter_xls_sheets(file)
         try:
-            workbook = load_workbook(io.BytesIO(file.read()), read_only=True, data_only=True)
-            text_content = ""
-            
-            for sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                text_content += f"=== Sheet: {sheet_name} ===\n"
+            for sheet_name, rows in sheet_iter:
+                header = f"=== Sheet: {sheet_name} ===\n"
+                parts.append(header)
+                length += len(header)
+                sheet_rows = []
                 
-                for row in sheet.iter_rows(values_only=True):
-                    row_text = []
-                    for cell in row:
-                        if cell is not None:
-                            row_text.append(str(cell))
-                    if row_text:
-                        text_content += "\t".join(row_text) + "\n"
+                for row in rows:
+                    cells = [str(cell) for cell in row if cell is not None]
+                    if not cells:
+                        continue
+                    line = "\t".join(cells) + "\n"
+                    parts.append(line)
+                    length += len(line)
+                    
+                    # 去掉行尾空单元格，保留列位置
+                    end = len(row)
+                    while end and row[end - 1] is None:
+                        end -= 1
+                    sheet_rows.append(tuple(row[:end]))
+                    
+                    if length >= budget:
+                        truncated = True
+                        break
                 
-                text_content += "\n"
-            
-            workbook.close()
-            
-            if not text_content.strip():
-                raise ValueError("No text content found in XLSX file.")
-            
-            return text_content
-            
+                parts.append("\n")
+                length += 1
+                sheets.append({
+                    'sheet': sheet_name,
+                    'rows': self._drop_empty_columns(sheet_rows),
+                    'truncated': truncated
+                })
+                if truncated:
+                    logger.info(f"{label}流式提取达到文本预算({budget}字符)，停止读取剩余行")
+                    break
         except Exception as e:
-            raise ValueError(f"Failed to extract text from XLSX: {str(e)}")
-    
-    def _extract_text_from_xls(self, file: FileStorage) -> str:
-        """从XLS文件提取文本"""
-        if not XLS_AVAILABLE:
-            raise ValueError("XLS processing not available. Please install xlrd.")
+            raise ValueError(f"Failed to extract text from {label}: {str(e)}")
+        finally:
+            sheet_iter.close()
+        
+        text_content = "".join(parts)
+        if not text_content.strip():
+            raise ValueError(f"Failed to extract text from {label}: No text content found in {label} file.")
         
+        return text_content, sheets
+    
+    def _iter_xlsx_sheets(self, file: FileStorage):
+        """逐个工作表、逐行产出XLSX单元格值（只读模式，不构建单元格对象）"""
+        workbook = load_workbook(self._binary_stream(file), read_only=True, data_only=True)
+        try:
+            for sheet_name in workbook.sheetnames:
+                yield sheet_name, workbook[sheet_name].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    
+    def _iter_xls_sheets(self, file: FileStorage):
+        """逐个工作表、逐行产出XLS单元格值（按需加载，处理完即卸载）"""
+        workbook = xlrd.open_workbook(file_contents=file.read(), on_demand=True)
         try:
-            workbook = xlrd.open_workbook(file_contents=file.read())
-            text_content = ""
-            
             for sheet_idx in range(workbook.nsheets):
                 sheet = workbook.sheet_by_index(sheet_idx)
-                text_content += f"=== Sheet: {sheet.name} ===\n"
-                
-                for row_idx in range(sheet.nrows):
-                    row_values = []
-                    for col_idx in range(sheet.ncols):
-                        cell = sheet.cell(row_idx, col_idx)
-                        if cell.value:
-                            row_values.append(str(cell.value))
-                    if row_values:
-                        text_content += "\t".join(row_values) + "\n"
-                
-                text_content += "\n"
-            
-            if not text_content.strip():
-                raise ValueError("No text content found in XLS file.")
-            
-            return text_content
-            
-        except Exception as e:
-            raise ValueError(f"Failed to extract text from XLS: {str(e)}")
+                # 与原实现一致：空值（含0和空串）视为空单元格
+                yield sheet.name, (
+                    tuple(value if value else None for value in sheet.row_values(row_idx))
+                    for row_idx in range(sheet.nrows)
+                )
+                workbook.unload_sheet(sheet_idx)
+        finally:
+            workbook.release_resources()
+    
+    @staticmethod
+    def _drop_empty_columns(rows: List[tuple]) -> List[tuple]:
+        """去除所有行都为空的列"""
+        if not rows:
+            return rows
+        width = max(len(row) for row in rows)
+        used = [False] * width
+        for row in rows:
+            for idx, value in enumerate(row):
+                if value is not None:
+                    used[idx] = True
+        if all(used):
+            return rows
+        keep = [idx for idx, flag in enumerate(used) if flag]
+        return [tuple(row[idx] for idx in keep if idx < len(row)) for row in rows]
     
     def _extract_text_from_pptx(self, file: FileStorage) -> str:
         """从PPTX/PPT文件提取文本"""
+        return self._extract_pptx(file)[0]
+    
+    def _extract_pptx(self, file: FileStorage) -> Tuple[str, List[Dict[str, Any]]]:
+        """从PPTX/PPT文件提取文本和结构化表格"""
         if not PPTX_AVAILABLE:
             raise ValueError("PPTX processing not available. Please install python-pptx.")
         
         try:
-            presentation = Presentation(io.BytesIO(file.read()))
+            presentation = Presentation(self._binary_stream(file))
             text_content = ""
+            tables = []
             
             for slide_idx, slide in enumerate(presentation.slides):
                 text_content += f"=== Slide {slide_idx + 1} ===\n"
                 
                 # 提取幻灯片中的所有文本
                 for shape in slide.shapes:
-                    if hasattr(shape, "text") and shape.text:
+                    if getattr(shape, "has_table", False) and shape.has_table:
+                        # 表格没有text属性，逐单元格读取
+                        rows = [[cell.text for cell in row.cells] for row in shape.table.rows]
+                        for cells in rows:
+                            text_content += "\t".join(cells) + "\n"
+                        structured = self._build_structured_table(
+                            f"pptx:slide{slide_idx + 1}:table{len(tables) + 1}", rows)
+                        if structured:
+                            tables.append(structured)
+                    elif hasattr(shape, "text") and shape.text:
                         text_content += shape.text + "\n"
                     elif hasattr(shape, "text_frame") and shape.text_frame:
                         for paragraph in shape.text_frame.paragraphs:
@@ -877,7 +1387,7 @@ class DocumentProcessor:
             if not text_content.strip():
                 raise ValueError("No text content found in PPTX file.")
             
-            return text_content
+            return text_content, tables
             
         except Exception as e:
             raise ValueError(f"Failed to extract text from PPTX: {str(e)}")
@@ -1062,36 +1572,14 @@ class DocumentProcessor:
         # 分割成段落
         paragraphs = text.split('\n\n')
         
-        # 优先保留包含关键信息的段落
-        important_keywords = [
-            # 中文关键词
-            '产品', '型号', '规格', '参数', '技术', '电压', '电流', '功率', '频率', 
-            '测试', '保护', '继电', '装置', '设备', '性能', '精度', '范围', 
-            '温度', '湿度', '环境', '认证', '标准', '质量', '保修', '服务',
-            '配置', '接口', '通信', '控制', '显示', '操作', '安装', '维护',
-            
-            # 英文关键词
-            'product', 'model', 'specification', 'parameter', 'technical', 
-            'voltage', 'current', 'power', 'frequency', 'test', 'protection',
-            'relay', 'device', 'equipment', 'performance', 'accuracy', 'range',
-            'temperature', 'humidity', 'environment', 'certification', 'standard',
-            'quality', 'warranty', 'service', 'configuration', 'interface',
-            'communication', 'control', 'display', 'operation', 'installation'
-        ]
-        
-        # 按重要性对段落排序
+        # 按重要性对段落排序：关键词得分由Aho-Corasick自动机一次扫描得出
+        keyword_matcher = self._truncation_matcher
         scored_paragraphs = []
         for para in paragraphs:
-            score = 0
-            para_lower = para.lower()
-            
-            # 计算关键词得分
-            for keyword in important_keywords:
-                score += para_lower.count(keyword.lower()) * 10
+            score = keyword_matcher.score(para.lower())
             
             # 包含数字和单位的段落更重要（技术规格）
-            import re
-            if re.search(r'\d+[A-Za-z]*[\s]*[A-Za-z/Ω%°℃]', para):
+            if TECH_UNIT_PATTERN.search(para):
                 score += 20
             
             # 包含表格结构的段落
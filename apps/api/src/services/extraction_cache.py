@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+文档提取结果缓存
+以文件内容SHA-256 + 处理器版本为键，把清洗后的文本和文档信息落盘，
+相同文件再次上传、批量提交时直接复用，避免重复解析和OCR。
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+_API_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def compute_content_hash(data: bytes) -> str:
+    """计算文件内容的SHA-256摘要"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ExtractionCache:
+    """
+    磁盘LRU缓存
+
+    条目以JSON文件保存在 cache_dir/<hash前两位>/<hash>_<version>.json，
+    多个进程共享同一目录；进程内维护按访问顺序排列的索引用于淘汰，
+    命中时更新文件mtime，重启后按mtime恢复LRU顺序。
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = None,
+                 max_entries: int = None, enabled: bool = None):
+        self.cache_dir = cache_dir or os.environ.get(
+            'EXTRACTION_CACHE_DIR', os.path.join(_API_ROOT, 'instance', 'extraction_cache'))
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            int(os.environ.get('EXTRACTION_CACHE_MAX_MB', 256)) * 1024 * 1024
+        self.max_entries = max_entries if max_entries is not None else \
+            int(os.environ.get('EXTRACTION_CACHE_MAX_ENTRIES', 2000))
+        self.enabled = enabled if enabled is not None else \
+            os.environ.get('EXTRACTION_CACHE_ENABLED', 'true').lower() == 'true'
+
+        self._lock = threading.RLock()
+        self._index: 'OrderedDict[str, int]' = OrderedDict()  # 条目路径 -> 字节数
+        self._total_bytes = 0
+        self._loaded = False
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0,
+            'errors': 0
+        }
+
+    def get(self, content_hash: str, version: str) -> Optional[Dict[str, Any]]:
+        """读取缓存条目，未命中返回None"""
+        if not self.enabled or not content_hash:
+            return None
+
+        path = self._entry_path(content_hash, version)
+        with self._lock:
+            self._ensure_loaded()
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    payload = json.load(f)
+            except FileNotFoundError:
+                self._forget(path)
+                self.stats['misses'] += 1
+                return None
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ 提取缓存条目损坏，已丢弃: {path} ({str(e)})")
+                self._remove(path)
+                self.stats['errors'] += 1
+                self.stats['misses'] += 1
+                return None
+
+            # 刷新LRU位置（其他进程写入的条目也在这里纳入索引）
+            try:
+                os.utime(path, None)
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            self._track(path, size)
+            self.stats['hits'] += 1
+            return payload
+
+    def put(self, content_hash: str, version: str, payload: Dict[str, Any]) -> bool:
+        """写入缓存条目，必要时按LRU淘汰"""
+        if not self.enabled or not content_hash:
+            return False
+
+        try:
+            data = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        except (TypeError, ValueError) as e:
+            logger.warning(f"⚠️ 提取结果无法序列化，跳过缓存: {str(e)}")
+            self.stats['errors'] += 1
+            return False
+
+        if len(data) > self.max_bytes:
+            return False
+
+        path = self._entry_path(content_hash, version)
+        with self._lock:
+            self._ensure_loaded()
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)  # 原子替换，避免其他进程读到半截文件
+            except OSError as e:
+                logger.warning(f"⚠️ 写入提取缓存失败: {str(e)}")
+                self.stats['errors'] += 1
+                return False
+
+            self._track(path, len(data))
+            self.stats['writes'] += 1
+            self._evict_if_needed()
+            return True
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._ensure_loaded()
+            for path in list(self._index.keys()):
+                self._remove(path)
+            self._index.clear()
+            self._total_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计（含命中率）"""
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else 0.0,
+                'entries': len(self._index),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'max_entries': self.max_entries,
+                'enabled': self.enabled,
+                'cache_dir': self.cache_dir
+            }
+
+    def _entry_path(self, content_hash: str, version: str) -> str:
+        safe_version = ''.join(c if c.isalnum() or c in '.-' else '_' for c in str(version))
+        return os.path.join(self.cache_dir, content_hash[:2], f"{content_hash}_{safe_version}.json")
+
+    def _ensure_loaded(self):
+        """首次使用时扫描磁盘，按mtime恢复LRU索引"""
+        if self._loaded:
+            return
+        self._loaded = True
+
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for root, _, filenames in os.walk(self.cache_dir):
+                for name in filenames:
+                    if not name.endswith('.json'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, path, st.st_size))
+
+        for _, path, size in sorted(entries):
+            self._index[path] = size
+            self._total_bytes += size
+        self._evict_if_needed()
+
+    def _track(self, path: str, size: int):
+        old_size = self._index.pop(path, 0)
+        self._total_bytes += size - old_size
+        self._index[path] = size
+
+    def _forget(self, path: str):
+        size = self._index.pop(path, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _remove(self, path: str):
+        self._forget(path)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict_if_needed(self):
+        while self._index and (len(self._index) > self.max_entries or self._total_bytes > self.max_bytes):
+            oldest_path = next(iter(self._index))
+            self._remove(oldest_path)
+            self.stats['evictions'] += 1
+
+
+# 全局提取缓存实例
+extraction_cache = ExtractionCache()
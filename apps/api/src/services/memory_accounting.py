@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+分析内存核算与准入控制
+工作进程曾被单个超大PPTX或扫描版PDF撑到OOM，且无法判断是哪个阶段占用的内存：
+
+- 采样：memory_scope() 包裹分析各阶段和文档提取器，后台线程在有活动作用域时按固定间隔采样，
+  记录每个作用域期间相对开始时的峰值增量，按 (阶段, 文件类型) 汇总到 memory_stats。
+  采样方式由 AI_MEMORY_SAMPLING 决定：
+    rss         进程常驻内存（psutil，默认）。开销很小，但包含其他并发分析，且分配器不归还的
+                内存会让后续作用域的增量偏小；
+    tracemalloc Python堆分配（含峰值，不会漏掉两次采样之间的尖峰），更精确但分配开销明显；
+    off         不采样。
+  PDF并行提取在子进程中执行，其内存不计入本进程。
+- 准入：memory_admission.admit() 按文件类型的历史（整次分析峰值 / 文件大小）预测本次分析的峰值，
+  当前进程内存 + 进行中分析的预留 + 预测值超过 AI_MEMORY_CEILING_MB 时等待（最多
+  AI_MEMORY_ADMISSION_WAIT 秒）其他分析结束；空闲进程也容纳不下的文档或等待超时直接拒绝，
+  抛出 MemoryAdmissionRejected。未配置上限时不做准入检查。
+"""
+import os
+import time
+import logging
+import itertools
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from .deadline import current_deadline
+from .cancellation import check_cancelled
+
+# Optional import for RSS sampling
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+SAMPLING_OFF = 'off'
+SAMPLING_RSS = 'rss'
+SAMPLING_TRACEMALLOC = 'tracemalloc'
+
+MEMORY_SAMPLING = os.environ.get('AI_MEMORY_SAMPLING', SAMPLING_RSS if PSUTIL_AVAILABLE else SAMPLING_OFF).lower()
+MEMORY_SAMPLE_INTERVAL = float(os.environ.get('AI_MEMORY_SAMPLE_INTERVAL', 0.02))
+# 工作进程内存上限（MB），0 表示不做准入检查
+MEMORY_CEILING_MB = float(os.environ.get('AI_MEMORY_CEILING_MB', 0))
+# 预测会超过上限时最多等待其他分析释放内存的秒数
+MEMORY_ADMISSION_WAIT = float(os.environ.get('AI_MEMORY_ADMISSION_WAIT', 30))
+
+MB = 1024 * 1024
+
+# 尚无足够历史时，每字节输入预估占用的内存字节数（解码文本、解析对象树、OCR图像缓冲等）
+DEFAULT_BYTES_PER_INPUT_BYTE = {
+    'txt': 6, 'rtf': 6, 'doc': 8, 'docx': 10, 'pdf': 12,
+    'xls': 15, 'xlsx': 25, 'ppt': 20, 'pptx': 20,
+    'png': 40, 'jpg': 40, 'jpeg': 40, 'gif': 40, 'bmp': 40, 'tiff': 40
+}
+DEFAULT_RATIO = 15
+# 预测至少需要的历史样本数；预测取最近样本比值的高分位数（偏保守）
+MIN_HISTORY_SAMPLES = 3
+HISTORY_SIZE = 50
+PREDICTION_QUANTILE = 0.9
+
+
+class MemoryAdmissionRejected(Exception):
+    """预测的分析内存会使工作进程超过内存上限"""
+
+    def __init__(self, file_type: str, predicted: int, projected: int, ceiling: int,
+                 reason: str, waited: float = 0.0, retry_after: int = 30):
+        self.file_type = file_type
+        self.predicted = predicted
+        self.projected = projected
+        self.ceiling = ceiling
+        self.reason = reason
+        self.waited = waited
+        self.retry_after = retry_after
+        super().__init__(
+            f"Memory admission rejected ({reason}): {file_type} analysis predicted "
+            f"{predicted / MB:.1f}MB, projected {projected / MB:.1f}MB exceeds ceiling {ceiling / MB:.0f}MB"
+        )
+
+
+@dataclass
+class MemoryUsage:
+    """单个作用域的内存记录（字节）；peak_bytes 为相对作用域开始时的峰值增量"""
+    stage: str
+    file_type: str
+    baseline: int = 0
+    peak: int = 0
+
+    @property
+    def peak_bytes(self) -> int:
+        return max(0, self.peak - self.baseline)
+
+
+class MemorySampler:
+    """
+    进程内存采样器（线程安全）
+
+    有活动作用域时后台线程按间隔采样，每次采样更新所有活动作用域的峰值；
+    作用域开始和结束时各补采一次，短于采样间隔的阶段也有记录。
+    """
+
+    def __init__(self, mode: str = MEMORY_SAMPLING, interval: float = MEMORY_SAMPLE_INTERVAL):
+        if mode not in (SAMPLING_OFF, SAMPLING_RSS, SAMPLING_TRACEMALLOC):
+            logger.warning(f"Unknown memory sampling mode '{mode}' - memory sampling disabled")
+            mode = SAMPLING_OFF
+        if mode == SAMPLING_RSS and not PSUTIL_AVAILABLE:
+            logger.warning("psutil not available - memory sampling falls back to tracemalloc")
+            mode = SAMPLING_TRACEMALLOC
+        self.mode = mode
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._scopes: Dict[int, MemoryUsage] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._process = psutil.Process() if PSUTIL_AVAILABLE else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != SAMPLING_OFF
+
+    def open(self, stage: str, file_type: str) -> MemoryUsage:
+        usage = MemoryUsage(stage=stage, file_type=file_type)
+        with self._lock:
+            if self.mode == SAMPLING_TRACEMALLOC and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            current = self._sample_locked()
+            usage.baseline = usage.peak = current
+            self._scopes[id(usage)] = usage
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='memory-sampler', daemon=True)
+                self._thread.start()
+        return usage
+
+    def close(self, usage: MemoryUsage) -> MemoryUsage:
+        with self._lock:
+            self._sample_locked()
+            self._scopes.pop(id(usage), None)
+        return usage
+
+    def _sample_locked(self) -> int:
+        """采样一次并更新活动作用域的峰值，返回当前值"""
+        if self.mode == SAMPLING_TRACEMALLOC:
+            current, peak = tracemalloc.get_traced_memory()
+            # 峰值由采样器独占重置：每次重置前都已记入所有活动作用域
+            tracemalloc.reset_peak()
+        else:
+            current = peak = self._process.memory_info().rss
+        for usage in self._scopes.values():
+            if peak > usage.peak:
+                usage.peak = peak
+        return current
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._scopes:
+                    self._thread = None
+                    return
+                try:
+                    self._sample_locked()
+                except Exception as e:
+                    logger.debug(f"内存采样失败: {e}")
+
+
+def process_memory() -> int:
+    """当前进程常驻内存（字节）；psutil不可用时返回0（准入只按预留计算）"""
+    if not PSUTIL_AVAILABLE:
+        return 0
+    try:
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return 0
+
+
+class MemoryStats:
+    """按文件类型和阶段汇总的峰值内存，以及按文件类型的整次分析峰值历史（用于准入预测）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def record_stage(self, stage: str, file_type: str, peak_bytes: int):
+        with self._lock:
+            entry = self._stages.setdefault(file_type or 'unknown', {}).setdefault(stage, {
+                'count': 0, 'total_peak_bytes': 0, 'max_peak_bytes': 0, 'last_peak_bytes': 0
+            })
+            entry['count'] += 1
+            entry['total_peak_bytes'] += peak_bytes
+            entry['max_peak_bytes'] = max(entry['max_peak_bytes'], peak_bytes)
+            entry['last_peak_bytes'] = peak_bytes
+
+    def record_analysis(self, file_type: str, file_size: int, peak_bytes: int):
+        """记录整次分析的峰值，作为该文件类型每字节输入占用内存的样本"""
+        if file_size <= 0:
+            return
+        with self._lock:
+            history = self._history.setdefault(file_type or 'unknown', deque(maxlen=HISTORY_SIZE))
+            history.append(peak_bytes / file_size)
+
+    def predict(self, file_type: str, file_size: int) -> int:
+        """预测分析峰值内存（字节）：历史样本足够时取比值的高分位数，否则用默认比值"""
+        with self._lock:
+            ratios = sorted(self._history.get(file_type or 'unknown', ()))
+        if len(ratios) >= MIN_HISTORY_SAMPLES:
+            ratio = ratios[min(len(ratios) - 1, int(len(ratios) * PREDICTION_QUANTILE))]
+        else:
+            ratio = DEFAULT_BYTES_PER_INPUT_BYTE.get(file_type, DEFAULT_RATIO)
+        # RSS采样下复用已保留内存的分析增量为0，至少按文件本身的大小预留
+        return int(file_size * max(ratio, 1.0))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            by_file_type = {
+                file_type: {
+                    stage: {
+                        'count': entry['count'],
+                        'avg_peak_mb': round(entry['total_peak_bytes'] / entry['count'] / MB, 2),
+                        'max_peak_mb': round(entry['max_peak_bytes'] / MB, 2),
+                        'last_peak_mb': round(entry['last_peak_bytes'] / MB, 2)
+                    }
+                    for stage, entry in stages.items()
+                }
+                for file_type, stages in self._stages.items()
+            }
+            history = {file_type: len(ratios) for file_type, ratios in self._history.items()}
+        return {
+            'by_file_type': by_file_type,
+            'prediction_samples': history
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stages: Dict[str, Dict[str, Dict[str, int]]] = {}
+            self._history: Dict[str, deque] = {}
+
+
+memory_sampler = MemorySampler()
+memory_stats = MemoryStats()
+
+
+@contextmanager
+def memory_scope(stage: str, file_type: str, sampler: MemorySampler = None, stats: MemoryStats = None):
+    """
+    记录代码块执行期间的峰值内存增量，结束时按 (阶段, 文件类型) 计入统计
+
+    Yields:
+        MemoryUsage: 作用域结束后 peak_bytes 为峰值增量（采样关闭时为0）
+    """
+    sampler = sampler or memory_sampler
+    if not sampler.enabled:
+        yield MemoryUsage(stage=stage, file_type=file_type)
+        return
+    usage = sampler.open(stage, file_type)
+    try:
+        yield usage
+    finally:
+        sampler.close(usage)
+        (stats or memory_stats).record_stage(stage, file_type, usage.peak_bytes)
+
+
+class MemoryAdmissionController:
+    """
+    按预测峰值内存控制分析准入（线程安全）
+
+    准入后为该分析预留预测值，结束时释放并唤醒等待中的分析。进程当前内存已包含进行中分析
+    的部分占用，再加上其预留会重复计算，判断偏保守。
+    """
+
+    def __init__(self, ceiling_mb: float = MEMORY_CEILING_MB, max_wait: float = MEMORY_ADMISSION_WAIT,
+                 stats: MemoryStats = None):
+        self.ceiling = int(ceiling_mb * MB)
+        self.max_wait = max_wait
+        self.stats = stats or memory_stats
+        self._condition = threading.Condition()
+        self._reserved: Dict[int, int] = {}
+        self._keys = itertools.count()
+        self._idle_usage = 0
+        self._counters = {'admitted': 0, 'deferred': 0, 'deferred_seconds': 0.0, 'rejected': {}}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ceiling > 0
+
+    def current_usage(self) -> int:
+        return process_memory()
+
+    @contextmanager
+    def admit(self, file_type: str, file_size: int):
+        """
+        准入检查，通过后在代码块执行期间预留预测的内存
+
+        Raises:
+            MemoryAdmissionRejected: 空闲进程也容纳不下，或等待其他分析释放内存超时
+        """
+        if not self.enabled:
+            yield None
+            return
+        predicted = self.stats.predict(file_type, file_size)
+        key = self._acquire(file_type, predicted)
+        try:
+            yield predicted
+        finally:
+            with self._condition:
+                self._reserved.pop(key, None)
+                self._condition.notify_all()
+
+    def _acquire(self, file_type: str, predicted: int) -> int:
+        max_wait = self.max_wait
+        deadline = current_deadline()
+        if deadline is not None:
+            max_wait = min(max_wait, deadline.remaining())
+        started = time.monotonic()
+        deferred = False
+        with self._condition:
+            while True:
+                usage = self.current_usage()
+                if not self._reserved:
+                    self._idle_usage = usage
+                if self._idle_usage + predicted > self.ceiling:
+                    self._reject(file_type, predicted, self._idle_usage + predicted, 'exceeds_ceiling', started)
+                projected = usage + sum(self._reserved.values()) + predicted
+                # 没有进行中的分析时当前内存即空闲内存，上面已确认容纳得下
+                if projected <= self.ceiling or not self._reserved:
+                    break
+                waited = time.monotonic() - started
+                if waited >= max_wait:
+                    self._reject(file_type, predicted, projected, 'deferred_timeout', started)
+                if not deferred:
+                    deferred = True
+                    self._counters['deferred'] += 1
+                    logger.warning(f"🧠 {file_type} 分析预测占用 {predicted / MB:.1f}MB，"
+                                   f"预计 {projected / MB:.0f}MB 超过上限 {self.ceiling / MB:.0f}MB，等待其他分析释放内存")
+                # 进程内存也会在预留之外下降（缓存释放等），定期重新检查
+                self._condition.wait(min(0.5, max_wait - waited))
+                check_cancelled('memory_admission')
+            key = next(self._keys)
+            self._reserved[key] = predicted
+            self._counters['admitted'] += 1
+            if deferred:
+                self._counters['deferred_seconds'] += time.monotonic() - started
+            return key
+
+    def _reject(self, file_type: str, predicted: int, projected: int, reason: str, started: float):
+        waited = time.monotonic() - started
+        rejected = self._counters['rejected']
+        rejected[reason] = rejected.get(reason, 0) + 1
+        logger.warning(f"🧠 拒绝 {file_type} 分析({reason}): 预测 {predicted / MB:.1f}MB，"
+                       f"预计 {projected / MB:.0f}MB 超过上限 {self.ceiling / MB:.0f}MB")
+        retry_after = max(1, int(self.max_wait)) if reason == 'deferred_timeout' else 300
+        raise MemoryAdmissionRejected(file_type, predicted, projected, self.ceiling, reason,
+                                      waited=waited, retry_after=retry_after)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                'enabled': self.enabled,
+                'ceiling_mb': round(self.ceiling / MB, 1),
+                'max_wait': self.max_wait,
+                'process_memory_mb': round(self.current_usage() / MB, 1),
+                'in_flight': len(self._reserved),
+                'reserved_mb': round(sum(self._reserved.values()) / MB, 1),
+                'admitted': self._counters['admitted'],
+                'deferred': self._counters['deferred'],
+                'deferred_seconds': round(self._counters['deferred_seconds'], 2),
+                'rejected': dict(self._counters['rejected'])
+            }
+
+
+memory_admission = MemoryAdmissionController()
+
+
+def get_memory_report() -> Dict[str, Any]:
+    """内存核算报告：采样方式、按文件类型和阶段的峰值、准入状态"""
+    return {
+        'sampling': memory_sampler.mode,
+        **memory_stats.snapshot(),
+        'admission': memory_admission.snapshot()
+    }
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+近重复文档索引
+对清洗后文本的行集合计算MinHash签名，用LSH分桶快速找到候选历史分析，
+再用精确的行集合Jaccard相似度确认。同一份规格书只改了日期、经销商页脚等
+少量行时，可以直接复用历史分析记录，只复核差异行，省去一次大模型调用。
+条目按用户隔离：只在同一用户自己的历史分析中查找，不会把其他用户的文档内容复用给当前用户。
+索引保存在本地SQLite文件中，多进程共享。
+"""
+import os
+import re
+import time
+import zlib
+import random
+import hashlib
+import sqlite3
+import logging
+import threading
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_API_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# MinHash参数：64个哈希函数，分16个band、每band 4行
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20250801)  # 固定种子，签名跨进程、跨重启保持一致
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(NUM_PERMUTATIONS)]
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# 索引表结构版本；旧版本的条目没有用户归属，打开时整体重建
+SCHEMA_VERSION = 2
+
+
+@dataclass
+class DocumentFingerprint:
+    """文档指纹：合并空白后的行、行哈希（与行一一对应，忽略大小写）和MinHash签名"""
+    lines: List[str]
+    line_hashes: List[int]
+    signature: List[int]
+
+    @property
+    def unique_hashes(self) -> set:
+        return set(self.line_hashes)
+
+
+def _line_hash(line: str) -> int:
+    return int.from_bytes(hashlib.blake2b(line.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def compute_fingerprint(text: str) -> DocumentFingerprint:
+    """按行规整文本（合并空白、去空行）并计算MinHash签名"""
+    lines = []
+    for raw_line in text.split('\n'):
+        line = _WHITESPACE_RE.sub(' ', raw_line).strip()
+        if line:
+            lines.append(line)
+    line_hashes = [_line_hash(line.lower()) for line in lines]
+
+    unique = [h % _MERSENNE_PRIME for h in set(line_hashes)]
+    if unique:
+        signature = [min((a * x + b) % _MERSENNE_PRIME for x in unique) for a, b in _PERMUTATIONS]
+    else:
+        signature = [_MERSENNE_PRIME] * NUM_PERMUTATIONS
+    return DocumentFingerprint(lines=lines, line_hashes=line_hashes, signature=signature)
+
+
+def _unpack_hashes(blob: bytes) -> set:
+    hashes = array('Q')
+    hashes.frombytes(blob)
+    return set(hashes)
+
+
+def _pack_lines(lines: List[str]) -> bytes:
+    return zlib.compress('\n'.join(lines).encode('utf-8'))
+
+
+def _unpack_lines(blob: bytes) -> List[str]:
+    return zlib.decompress(blob).decode('utf-8').split('\n') if blob else []
+
+
+def _band_keys(signature: List[int]) -> List[str]:
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+    keys = []
+    for band in range(LSH_BANDS):
+        chunk = signature[band * rows:(band + 1) * rows]
+        digest = hashlib.blake2b(repr(chunk).encode('ascii'), digest_size=8).hexdigest()
+        keys.append(f"{band}:{digest}")
+    return keys
+
+
+class NearDuplicateIndex:
+    """
+    近重复文档索引（SQLite持久化）
+
+    entries 表保存每条历史分析的所属用户、行文本（压缩）和行哈希集合，bands 表保存LSH分桶键；
+    查询时先按分桶取同一用户的候选，再计算精确的行集合Jaccard相似度。
+    """
+
+    def __init__(self, db_path: str = None, threshold: float = None,
+                 max_entries: int = None, enabled: bool = None):
+        self.db_path = db_path or os.environ.get(
+            'NEAR_DUP_INDEX_PATH', os.path.join(_API_ROOT, 'instance', 'near_duplicate_index.sqlite3'))
+        self.threshold = threshold if threshold is not None else \
+            float(os.environ.get('NEAR_DUP_THRESHOLD', 0.9))
+        self.max_entries = max_entries if max_entries is not None else \
+            int(os.environ.get('NEAR_DUP_MAX_ENTRIES', 20000))
+        self.enabled = enabled if enabled is not None else \
+            os.environ.get('NEAR_DUP_ENABLED', 'true').lower() == 'true'
+
+        self._lock = threading.Lock()
+        self._initialized = False
+        self.stats = {
+            'lookups': 0,
+            'hits': 0,
+            'llm_calls_avoided': 0,
+            'entries_added': 0,
+            'errors': 0
+        }
+
+    def find(self, fingerprint: DocumentFingerprint, user_id=None) -> Optional[Dict[str, Any]]:
+        """
+        在指定用户的历史分析中查找最相似的一条
+
+        Args:
+            fingerprint: 新文档指纹
+            user_id: 当前用户；为空时不查找（匿名分析不复用任何历史结果）
+
+        Returns:
+            Optional[Dict]: {'record_id', 'similarity', 'added_lines', 'removed_lines'}，
+            added_lines 为新文档中历史文档没有的行，removed_lines 为历史文档中新文档已删除的行；
+            未找到返回None
+        """
+        if not self.enabled or not fingerprint.line_hashes or user_id is None:
+            return None
+        with self._lock:
+            self.stats['lookups'] += 1
+        # 索引文件还不存在时直接返回，不为只读查询创建文件
+        if not os.path.exists(self.db_path):
+            return None
+
+        current = fingerprint.unique_hashes
+        best = None
+        try:
+            with self._connect() as conn:
+                keys = _band_keys(fingerprint.signature)
+                placeholders = ','.join('?' * len(keys))
+                candidate_ids = [row[0] for row in conn.execute(
+                    f"SELECT DISTINCT b.record_id FROM bands b JOIN entries e ON e.record_id = b.record_id "
+                    f"WHERE b.band_key IN ({placeholders}) AND e.user_id = ?", keys + [str(user_id)])]
+
+                for record_id in candidate_ids:
+                    row = conn.execute("SELECT line_hashes, lines FROM entries WHERE record_id = ?",
+                                       (record_id,)).fetchone()
+                    if not row:
+                        continue
+                    previous = _unpack_hashes(row[0])
+                    union = len(current | previous)
+                    similarity = len(current & previous) / union if union else 0.0
+                    if similarity >= self.threshold and (best is None or similarity > best[1]):
+                        best = (record_id, similarity, previous, row[1])
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 近重复索引查询失败: {str(e)}")
+            with self._lock:
+                self.stats['errors'] += 1
+            return None
+
+        if best is None:
+            return None
+
+        record_id, similarity, previous, previous_lines = best
+        added_lines = [line for line, h in zip(fingerprint.lines, fingerprint.line_hashes) if h not in previous]
+        removed_lines = [line for line in _unpack_lines(previous_lines) if _line_hash(line.lower()) not in current]
+        return {
+            'record_id': record_id,
+            'similarity': round(similarity, 4),
+            'added_lines': added_lines,
+            'removed_lines': removed_lines
+        }
+
+    def record_hit(self, llm_calls_avoided: int = 1):
+        """记录一次复用（命中且历史记录可用）"""
+        with self._lock:
+            self.stats['hits'] += 1
+            self.stats['llm_calls_avoided'] += llm_calls_avoided
+
+    def add(self, record_id: int, fingerprint: DocumentFingerprint, user_id=None) -> bool:
+        """登记一条分析记录的文档指纹（归属 user_id，为空时不登记），超过容量时淘汰最早的条目"""
+        if not self.enabled or record_id is None or not fingerprint.line_hashes or user_id is None:
+            return False
+        try:
+            with self._connect() as conn:
+                packed = array('Q', sorted(fingerprint.unique_hashes)).tobytes()
+                conn.execute("DELETE FROM bands WHERE record_id = ?", (record_id,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (record_id, user_id, created_at, line_count, line_hashes, lines) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (record_id, str(user_id), time.time(), len(fingerprint.lines), packed,
+                     _pack_lines(fingerprint.lines)))
+                conn.executemany("INSERT INTO bands (band_key, record_id) VALUES (?, ?)",
+                                 [(key, record_id) for key in _band_keys(fingerprint.signature)])
+                self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 近重复索引写入失败: {str(e)}")
+            with self._lock:
+                self.stats['errors'] += 1
+            return False
+
+        with self._lock:
+            self.stats['entries_added'] += 1
+        return True
+
+    def clear(self):
+        """清空索引"""
+        if not os.path.exists(self.db_path):
+            return
+        with self._connect() as conn:
+            conn.execute("DELETE FROM bands")
+            conn.execute("DELETE FROM entries")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计（含命中率）"""
+        entries = 0
+        if os.path.exists(self.db_path):
+            try:
+                with self._connect() as conn:
+                    entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            except sqlite3.Error:
+                pass
+        with self._lock:
+            lookups = self.stats['lookups']
+            return {
+                **self.stats,
+                'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else 0.0,
+                'entries': entries,
+                'threshold': self.threshold,
+                'max_entries': self.max_entries,
+                'enabled': self.enabled,
+                'db_path': self.db_path
+            }
+
+    @contextmanager
+    def _connect(self):
+        """打开连接；正常退出时提交事务，最后关闭连接"""
+        self._ensure_schema()
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _ensure_schema(self):
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
+                return
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                    # 旧条目没有用户归属，无法安全复用，直接丢弃（索引可由后续分析重新积累）
+                    conn.execute("DROP TABLE IF EXISTS bands")
+                    conn.execute("DROP TABLE IF EXISTS entries")
+                    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    "record_id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, created_at REAL NOT NULL, "
+                    "line_count INTEGER NOT NULL, line_hashes BLOB NOT NULL, lines BLOB NOT NULL)")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS bands (band_key TEXT NOT NULL, record_id INTEGER NOT NULL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_bands_key ON bands (band_key)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_bands_record ON bands (record_id)")
+                conn.commit()
+            finally:
+                conn.close()
+            self._initialized = True
+
+    def _evict(self, conn: sqlite3.Connection):
+        count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow <= 0:
+            return
+        stale = [row[0] for row in conn.execute(
+            "SELECT record_id FROM entries ORDER BY created_at LIMIT ?", (overflow,))]
+        conn.executemany("DELETE FROM bands WHERE record_id = ?", [(rid,) for rid in stale])
+        conn.executemany("DELETE FROM entries WHERE record_id = ?", [(rid,) for rid in stale])
+
+
+# 全局近重复索引实例
+near_duplicate_index = NearDuplicateIndex()
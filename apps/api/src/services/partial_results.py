@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+分析中间结果
+长时间运行的分析在得到可用字段时立即发布中间快照，分区包括：
+基础信息（大模型第一层识别，远早于详细提取完成）、表格规格（与大模型调用并行解析）、
+大模型完整规格和质量评分。
+AnalysisMonitor 把快照转为 partial_result 进度事件，异步任务据此更新任务的中间结果槽位，
+客户端轮询任务或订阅SSE即可在最终结果之前展示已得到的字段。
+
+发布者经 ContextVar 传递（阶段图在线程池执行时复制调用方上下文），
+大模型客户端等不持有分析上下文的组件通过 publish_partial() 即可发布。
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 中间结果分区
+PARTIAL_SECTIONS = ('basic_info', 'table_specifications', 'specifications', 'quality')
+
+PartialPublisher = Callable[[str, Any], None]
+
+_current_publisher: ContextVar[Optional[PartialPublisher]] = ContextVar('partial_result_publisher', default=None)
+
+
+def publish_partial(section: str, data: Any):
+    """
+    发布某一分区的中间结果快照（当前分析未设置发布者时忽略）
+
+    同一分区可多次发布，后发布的快照覆盖先前的内容。
+    """
+    publisher = _current_publisher.get()
+    if publisher is None:
+        return
+    try:
+        publisher(section, data)
+    except Exception as e:
+        logger.warning(f"⚠️ 发布中间结果 {section} 失败: {str(e)}")
+
+
+@contextmanager
+def partial_result_scope(publisher: Optional[PartialPublisher]):
+    """在上下文内设置当前分析的中间结果发布者（None 表示不发布）"""
+    token = _current_publisher.set(publisher)
+    try:
+        yield publisher
+    finally:
+        _current_publisher.reset(token)
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+分析流水线阶段图执行器
+按依赖关系以最大并发执行各阶段，支持单阶段超时、请求截止时间、取消、可选阶段，并计算关键路径耗时
+"""
+import os
+import time
+import logging
+import threading
+import contextvars
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .deadline import Deadline
+from .cancellation import CancellationToken
+
+logger = logging.getLogger(__name__)
+
+# 阶段状态
+STAGE_COMPLETED = 'completed'
+STAGE_FAILED = 'failed'
+STAGE_TIMEOUT = 'timeout'
+STAGE_SKIPPED = 'skipped'
+STAGE_CANCELLED = 'cancelled'
+
+
+class StageTimeoutError(TimeoutError):
+    """必需阶段执行超时"""
+
+    def __init__(self, stage: str, timeout: float):
+        self.stage = stage
+        self.timeout = timeout
+        super().__init__(f"Analysis stage '{stage}' exceeded timeout of {timeout:g}s")
+
+
+@dataclass
+class Stage:
+    """
+    流水线阶段
+
+    func 接收 {依赖阶段名: 结果} 字典并返回本阶段结果；
+    可选阶段失败或超时时以 default 作为结果，不影响下游；
+    enabled 为False的阶段直接跳过（结果为 default）。
+    """
+    name: str
+    func: Callable[[Dict[str, Any]], Any]
+    depends_on: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    optional: bool = False
+    default: Any = None
+    enabled: bool = True
+
+
+@dataclass
+class StageRecord:
+    """单个阶段的执行记录（时间为相对执行开始的秒数）"""
+    status: str = ''
+    start: float = 0.0
+    end: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return max(0.0, self.end - self.start)
+
+
+@dataclass
+class StageGraphResult:
+    results: Dict[str, Any]
+    records: Dict[str, StageRecord]
+    critical_path: List[str] = field(default_factory=list)
+    critical_path_latency: float = 0.0
+    total_duration: float = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        """可序列化的执行摘要"""
+        return {
+            'critical_path': self.critical_path,
+            'critical_path_latency': round(self.critical_path_latency, 3),
+            'total_duration': round(self.total_duration, 3),
+            'stages': {
+                name: {
+                    'status': record.status,
+                    'start': round(record.start, 3),
+                    'duration': round(record.duration, 3),
+                    **({'error': record.error} if record.error else {})
+                }
+                for name, record in self.records.items()
+            }
+        }
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_stage_executor() -> ThreadPoolExecutor:
+    """进程内共享的阶段线程池"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.environ.get('AI_STAGE_WORKERS', 32)),
+                thread_name_prefix='analysis-stage'
+            )
+        return _executor
+
+
+class StageGraph:
+    """阶段依赖图"""
+
+    def __init__(self, stages: List[Stage], executor: ThreadPoolExecutor = None,
+                 deadline: Optional[Deadline] = None, cancellation: Optional[CancellationToken] = None):
+        """
+        Args:
+            stages: 阶段列表
+            executor: 执行阶段的线程池，默认为进程内共享线程池
+            deadline: 请求截止时间；各阶段超时不超过剩余预算，预算耗尽时必需阶段抛出
+                      DeadlineExceeded，可选阶段跳过
+            cancellation: 取消令牌；取消后不再提交新阶段，取消尚未开始的阶段并抛出 OperationCancelled
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        self.executor = executor
+        self.deadline = deadline
+        self.cancellation = cancellation
+        for stage in stages:
+            for dep in stage.depends_on:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage graph has a cycle through '{name}'")
+            visiting.add(name)
+            for dep in self.stages[name].depends_on:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def run(self) -> StageGraphResult:
+        """
+        执行阶段图
+
+        依赖全部完成的阶段立即提交到线程池；必需阶段失败时抛出原异常，
+        超时时抛出 StageTimeoutError，超过请求截止时间时抛出 DeadlineExceeded，
+        被取消时抛出 OperationCancelled（已在运行的其他阶段不再等待）。
+        """
+        executor = self.executor or get_stage_executor()
+        origin = time.perf_counter()
+        results: Dict[str, Any] = {}
+        records: Dict[str, StageRecord] = {}
+        running: Dict[Future, Tuple[str, float, bool]] = {}  # future -> (阶段名, 截止时间, 是否受请求截止时间限制)
+        request_deadline = self.deadline
+        cancellation = self.cancellation
+        # 取消时完成，与各阶段一起等待，取消后立即结束等待
+        cancelled = cancellation.as_future() if cancellation is not None else None
+        pending = dict(self.stages)
+
+        def now() -> float:
+            return time.perf_counter() - origin
+
+        def settle(name: str, status: str, value: Any = None, error: str = None):
+            record = records.setdefault(name, StageRecord(start=now()))
+            record.status = status
+            record.end = now()
+            record.error = error
+            results[name] = value
+
+        def submit_ready():
+            for name in list(pending):
+                stage = pending[name]
+                if not all(dep in results for dep in stage.depends_on):
+                    continue
+                del pending[name]
+                if not stage.enabled:
+                    settle(name, STAGE_SKIPPED, stage.default)
+                    continue
+                if cancellation is not None:
+                    cancellation.check(name)
+                timeout = stage.timeout or float('inf')
+                bounded = False
+                if request_deadline is not None:
+                    if request_deadline.expired and stage.optional:
+                        logger.warning(f"⏱️ 请求预算已耗尽，跳过可选阶段 {name}")
+                        settle(name, STAGE_SKIPPED, stage.default, 'deadline exceeded')
+                        continue
+                    request_deadline.check(name, skipped=stage.timeout or 0.0)
+                    remaining = request_deadline.remaining()
+                    if remaining < timeout:
+                        timeout, bounded = remaining, True
+                inputs = {dep: results[dep] for dep in stage.depends_on}
+                records[name] = StageRecord(start=now())
+                # 每个阶段在调用方上下文的副本中执行（ContextVar，如当前追踪span），阶段之间互不影响
+                context = contextvars.copy_context()
+                future = executor.submit(context.run, self._invoke, stage, inputs, records[name], origin)
+                deadline = time.perf_counter() + timeout
+                running[future] = (name, deadline, bounded)
+
+        submit_ready()
+        while running or pending:
+            if not running:
+                # 剩余阶段的依赖无法满足（不应出现，构造时已校验无环）
+                raise RuntimeError(f"Unschedulable stages: {sorted(pending)}")
+
+            next_deadline = min(deadline for _, deadline, _ in running.values())
+            wait_for = None if next_deadline == float('inf') else max(0.0, next_deadline - time.perf_counter())
+            waiting = list(running) + ([cancelled] if cancelled is not None else [])
+            done, _ = wait(waiting, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            if cancelled is not None and cancelled.done():
+                # 尚未开始的阶段直接取消，已在运行的阶段由取消令牌打断（关闭连接、中断等待）
+                not_started = 0
+                for future, (name, _, _) in running.items():
+                    not_started += future.cancel()
+                    records[name].status = STAGE_CANCELLED
+                    records[name].end = now()
+                if not_started:
+                    cancellation.stats.record_cancelled_futures(not_started)
+                cancellation.check(next(iter(running.values()))[0] if running else 'stage_graph')
+
+            for future in done:
+                name, _, _ = running.pop(future)
+                stage = self.stages[name]
+                try:
+                    value = future.result()
+                except Exception as e:
+                    if not stage.optional:
+                        records[name].status = STAGE_FAILED
+                        records[name].end = now()
+                        records[name].error = str(e)
+                        raise
+                    logger.warning(f"⚠️ 可选阶段 {name} 失败，使用默认结果: {str(e)}")
+                    settle(name, STAGE_FAILED, stage.default, str(e))
+                else:
+                    settle(name, STAGE_COMPLETED, value)
+
+            # 处理超时阶段
+            current = time.perf_counter()
+            for future, (name, deadline, bounded) in list(running.items()):
+                if current < deadline:
+                    continue
+                stage = self.stages[name]
+                future.cancel()
+                del running[future]
+                if not stage.optional:
+                    records[name].status = STAGE_TIMEOUT
+                    records[name].end = now()
+                    if bounded:
+                        # 阶段超时被请求剩余预算截短：按截止时间中止
+                        request_deadline.abort(name)
+                    raise StageTimeoutError(name, stage.timeout)
+                reason = 'request deadline' if bounded else f"{stage.timeout}s"
+                logger.warning(f"⏱️ 可选阶段 {name} 超时({reason})，使用默认结果")
+                settle(name, STAGE_TIMEOUT, stage.default, f"timeout after {reason}")
+
+            submit_ready()
+
+        total = now()
+        path, latency = self._critical_path(records)
+        return StageGraphResult(results=results, records=records, critical_path=path,
+                                critical_path_latency=latency, total_duration=total)
+
+    @staticmethod
+    def _invoke(stage: Stage, inputs: Dict[str, Any], record: StageRecord, origin: float) -> Any:
+        # 以实际开始执行的时间为准（排队时间不计入阶段耗时）
+        record.start = time.perf_counter() - origin
+        return stage.func(inputs)
+
+    def _critical_path(self, records: Dict[str, StageRecord]) -> Tuple[List[str], float]:
+        """
+        关键路径：从最后结束的阶段出发，沿最晚结束的依赖回溯
+
+        关键路径耗时为路径上各阶段耗时之和，即并发执行下无法再压缩的部分。
+        """
+        executed = {name: record for name, record in records.items() if record.status != STAGE_SKIPPED}
+        if not executed:
+            return [], 0.0
+
+        current = max(executed, key=lambda name: executed[name].end)
+        path = [current]
+        while True:
+            deps = [dep for dep in self.stages[current].depends_on if dep in executed]
+            if not deps:
+                break
+            current = max(deps, key=lambda name: executed[name].end)
+            path.append(current)
+        path.reverse()
+        return path, sum(executed[name].duration for name in path)
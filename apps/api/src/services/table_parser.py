@@ -152,29 +152,41 @@ class TableParser:
             'scientific': r'([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)',
         }
     
-    def parse_document_tables(self, text_content: str) -> Dict[str, Any]:
+    def parse_document_tables(self, text_content: str,
+                              structured_tables: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         从文档中解析所有表格
         
         Args:
             text_content: 文档文本内容
+            structured_tables: DocumentProcessor 提取的结构化表格（可选），
+                格式为 {'tables': [{'origin', 'headers', 'rows'}, ...], 'covers_text': bool}。
+                提供时直接使用单元格结构；表格行不再做启发式行解析，
+                covers_text 为True时整个文本都跳过启发式解析
             
         Returns:
             Dict: 解析结果
         """
         try:
-            # 按行分割文本
-            lines = text_content.split('\n')
+            parsed_tables = []
             
-            # 识别表格区域
-            table_regions = self._identify_table_regions(lines)
+            if structured_tables:
+                parsed_tables.extend(self._parse_structured_tables(structured_tables.get('tables', [])))
             
-            # 解析每个表格区域
-            parsed_tables = []
-            for region in table_regions:
-                table_data = self._parse_table_region(region)
-                if table_data:
-                    parsed_tables.append(table_data)
+            if not (structured_tables and structured_tables.get('covers_text')):
+                # 按行分割文本，去掉已结构化的表格行
+                lines = text_content.split('\n')
+                if structured_tables and structured_tables.get('tables'):
+                    segments = self._split_out_table_lines(lines, structured_tables['tables'])
+                else:
+                    segments = [lines]
+                
+                # 识别表格区域并解析
+                for segment in segments:
+                    for region in self._identify_table_regions(segment):
+                        table_data = self._parse_table_region(region)
+                        if table_data:
+                            parsed_tables.append(table_data)
             
             # 提取规格信息
             specifications = self._extract_specifications(parsed_tables, text_content)
@@ -204,6 +216,52 @@ class TableParser:
                 'error': str(e)
             }
     
+    def _parse_structured_tables(self, tables: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """把结构化表格转换为解析结果格式"""
+        parsed = []
+        for table in tables:
+            headers = [str(cell) for cell in table.get('headers', [])]
+            rows = [[str(cell) for cell in row] for row in table.get('rows', [])]
+            if not headers or not rows:
+                continue
+            parsed.append({
+                'type': 'structured_table',
+                'origin': table.get('origin', ''),
+                'headers': headers,
+                'rows': rows,
+                'column_count': len(headers),
+                'row_count': len(rows)
+            })
+        return parsed
+    
+    @staticmethod
+    def _split_out_table_lines(lines: List[str], tables: List[Dict[str, Any]]) -> List[List[str]]:
+        """
+        去掉文本中属于结构化表格的行
+        
+        文本经过清洗后表格行的制表符已被规整为空格，这里按空白规整后的内容比对；
+        去掉的行处切分为多个片段，避免前后两段正文被拼成同一个表格区域。
+        """
+        table_lines = set()
+        for table in tables:
+            for row in [table.get('headers', [])] + list(table.get('rows', [])):
+                normalized = ' '.join(' '.join(str(cell) for cell in row).split())
+                if normalized:
+                    table_lines.add(normalized)
+        
+        segments = []
+        current = []
+        for line in lines:
+            if ' '.join(line.split()) in table_lines:
+                if current:
+                    segments.append(current)
+                    current = []
+            else:
+                current.append(line)
+        if current:
+            segments.append(current)
+        return segments
+    
     def _identify_table_regions(self, lines: List[str]) -> List[Dict[str, Any]]:
         """识别文本中的表格区域"""
         regions = []
@@ -444,6 +502,13 @@ class TableParser:
                     value['source'] = 'spec_table'
                     specifications[key] = value
                     
+            elif table['type'] == 'structured_table':
+                # 文档原生表格（DOCX/XLSX/PPTX单元格）
+                for param_name, param_value in self._structured_table_pairs(table):
+                    spec_info = self._parse_value_with_unit(param_value)
+                    spec_info['source'] = table['type']
+                    specifications[param_name] = spec_info
+                    
             elif table['type'] in ['pipe_table', 'tab_table', 'generic_table']:
                 # 结构化表格
                 headers = table.get('headers', [])
@@ -484,23 +549,69 @@ class TableParser:
         
         return performance_params
     
+    def _structured_table_pairs(self, table: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """
+        从结构化表格中取出 (参数名, 参数值) 对
+        
+        优先按表头识别参数列/值列（有单位列时把单位拼到值后）；
+        表头无法识别的两列表视为无表头的键值表，表头行本身也是一组参数。
+        """
+        headers = table.get('headers', [])
+        rows = table.get('rows', [])
+        param_col, value_col = self._identify_param_value_columns(headers)
+        
+        if param_col is None or value_col is None:
+            if len(headers) != 2:
+                return []
+            param_col, value_col = 0, 1
+            rows = [headers] + list(rows)
+            unit_col = None
+        else:
+            unit_col = self._identify_header_column(headers, 'unit')
+        
+        pairs = []
+        for row in rows:
+            if len(row) <= max(param_col, value_col):
+                continue
+            param_name = row[param_col].strip()
+            param_value = row[value_col].strip()
+            if not param_name or not param_value:
+                continue
+            if unit_col is not None and unit_col < len(row):
+                unit = row[unit_col].strip()
+                if unit and unit not in param_value:
+                    param_value = f"{param_value} {unit}"
+            pairs.append((param_name, param_value))
+        return pairs
+    
+    def _identify_header_column(self, headers: List[str], role: str) -> Optional[int]:
+        """按表头模式查找指定角色的列（第一个匹配）"""
+        patterns = [self.header_patterns['zh'][role], self.header_patterns['en'][role]]
+        for i, header in enumerate(headers):
+            header_lower = str(header).lower()
+            if any(re.search(pattern, header_lower) for pattern in patterns):
+                return i
+        return None
+    
     def _identify_param_value_columns(self, headers: List[str]) -> Tuple[Optional[int], Optional[int]]:
         """识别参数列和值列的位置"""
         param_col = None
         value_col = None
         
+        param_patterns = [self.header_patterns['zh']['parameter'], self.header_patterns['en']['parameter']]
+        value_patterns = [self.header_patterns['zh']['value'], self.header_patterns['en']['value']]
+        
         for i, header in enumerate(headers):
-            header_lower = header.lower()
+            header_lower = str(header).lower()
             
+            # 检查是否为值列（"参数值"同时命中两类模式，按值列处理）
+            if any(re.search(pattern, header_lower) for pattern in value_patterns):
+                if value_col is None:
+                    value_col = i
             # 检查是否为参数列
-            if any(re.search(pattern, header_lower) for pattern in 
-                   list(self.header_patterns['zh']['parameter']) + [self.header_patterns['en']['parameter']]):
-                param_col = i
-            
-            # 检查是否为值列
-            if any(re.search(pattern, header_lower) for pattern in 
-                   list(self.header_patterns['zh']['value']) + [self.header_patterns['en']['value']]):
-                value_col = i
+            elif any(re.search(pattern, header_lower) for pattern in param_patterns):
+                if param_col is None:
+                    param_col = i
         
         return param_col, value_col
     
@@ -514,7 +625,9 @@ class TableParser:
             confidence = 0.5  # 基础置信度
             
             # 根据表格类型调整置信度
-            if table['type'] in ['pipe_table', 'tab_table']:
+            if table['type'] == 'structured_table':
+                confidence += 0.4  # 文档原生表格，结构无需推断
+            elif table['type'] in ['pipe_table', 'tab_table']:
                 confidence += 0.3  # 结构化表格置信度更高
             elif table['type'] == 'colon_table':
                 confidence += 0.2
@@ -716,12 +829,28 @@ class TableParser:
         return cleaned_specs
 
     def enhance_extraction_with_tables(self, base_extraction: Dict[str, Any], 
-                                     text_content: str) -> Dict[str, Any]:
-        """用表格解析结果增强基础提取"""
+                                     text_content: str,
+                                     structured_tables: Dict[str, Any] = None) -> Dict[str, Any]:
+        """用表格解析结果增强基础提取（structured_tables 见 parse_document_tables）"""
         try:
             # 解析表格
-            table_results = self.parse_document_tables(text_content)
-            
+            table_results = self.parse_document_tables(text_content, structured_tables)
+        except Exception as e:
+            logger.error(f"Table enhancement failed: {str(e)}")
+            return base_extraction
+        return self.merge_table_results(base_extraction, table_results)
+    
+    def merge_table_results(self, base_extraction: Dict[str, Any],
+                            table_results: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        将 parse_document_tables 的结果合并到基础提取中
+        
+        表格解析只依赖文档文本，可以与大模型调用并行；合并步骤很轻，放在两者都完成之后。
+        table_results 为None（解析失败或超时）时原样返回基础提取。
+        """
+        if not table_results:
+            return base_extraction
+        try:
             # 🔧 合并规格信息 - 添加数据清理
             enhanced_specs = base_extraction.get('specifications', {}).copy()
             
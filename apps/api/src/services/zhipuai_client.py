@@ -11,6 +11,13 @@ import time
 from typing import Dict, Any, Optional
 from flask import current_app
 
+from .analysis_tracing import analysis_tracer
+from .deadline import DeadlineExceeded, current_deadline
+from .cancellation import (
+    OperationCancelled, current_cancellation, cancellable_post, cancellable_sleep, record_llm_usage
+)
+from .partial_results import publish_partial
+
 logger = logging.getLogger(__name__)
 
 class ZhipuAIClient:
@@ -25,6 +32,9 @@ class ZhipuAIClient:
         self.read_timeout = 120       # 读取超时（从90s增加到120s，适应大文档分析）
         self.max_retries = 3          # 最大重试次数
         self.retry_delay = 5          # 重试延迟
+        self.min_attempt_budget = 10  # 请求剩余预算少于此值时不再发起调用（秒）
+        # 各次尝试的（连接, 读取）超时 - 首次快速尝试，后续逐渐增加，最后使用完整超时
+        self.attempt_timeouts = [(20, 60), (30, 90), (self.connection_timeout, self.read_timeout)]
         
         # 🔧 智能Token管理配置
         self.token_limits = {
@@ -94,6 +104,9 @@ class ZhipuAIClient:
             # 第一层：基础识别
             logger.info("开始第一层分析：基础产品识别")
             basic_result = self._basic_product_identification(document_content, document_name)
+            # 基础信息远早于详细提取完成，先作为中间结果发布
+            if basic_result.get('basic_info'):
+                publish_partial('basic_info', basic_result['basic_info'])
             
             # 如果基础识别成功，进行第二层详细提取
             if basic_result.get('confidence', {}).get('overall', 0) > 0.3:
@@ -108,6 +121,8 @@ class ZhipuAIClient:
                 enhanced_result = self._enhanced_extraction_with_examples(document_content, document_name)
                 return enhanced_result
             
+        except (DeadlineExceeded, OperationCancelled):
+            raise
         except Exception as e:
             logger.error(f"智谱AI文档分析错误: {str(e)}")
             # 提供更友好的错误信息
@@ -768,6 +783,8 @@ class ZhipuAIClient:
             
             return result
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"优化分析失败: {str(e)}")
             # 提供更友好的错误信息
@@ -893,89 +910,138 @@ class ZhipuAIClient:
             
         Raises:
             Exception: 所有重试都失败后抛出异常
+            DeadlineExceeded: 当前请求剩余预算不足以再发起一次调用或等待重试
+            OperationCancelled: 当前任务已取消（进行中的调用连接被关闭，重试等待被打断）
         """
         last_exception = None
+        deadline = current_deadline()
+        cancellation = current_cancellation()
         
         for attempt in range(self.max_retries):
-            try:
-                logger.info(f"智谱AI API调用尝试 {attempt + 1}/{self.max_retries}")
-                start_time = time.time()
+            # 每次尝试记录为一个追踪span，挂在当前分析阶段下
+            with analysis_tracer.span('llm_attempt', attempt=attempt + 1, model=self.model) as span:
+                try:
+                    logger.info(f"智谱AI API调用尝试 {attempt + 1}/{self.max_retries}")
+                    start_time = time.time()
                 
-                # 动态调整超时时间 - 首次尝试较短，后续逐渐增加
-                if attempt == 0:
-                    timeout = (20, 60)  # 首次快速尝试
-                elif attempt == 1:
-                    timeout = (30, 90)  # 第二次中等超时
-                else:
-                    timeout = (self.connection_timeout, self.read_timeout)  # 最后使用完整超时
+                    # 动态调整超时时间 - 首次尝试较短，后续逐渐增加
+                    timeout = self.attempt_timeouts[min(attempt, len(self.attempt_timeouts) - 1)]
+                    
+                    # 按请求剩余预算截短本次超时，预算不足时不再调用
+                    if deadline is not None:
+                        read_timeout = deadline.timeout_for('llm_attempt', timeout[1],
+                                                            required=self.min_attempt_budget)
+                        timeout = (min(timeout[0], read_timeout), read_timeout)
+                        span.set_attribute('timeout', round(read_timeout, 1))
                 
-                response = requests.post(
-                    url, 
-                    json=data, 
-                    headers=headers, 
-                    timeout=timeout
-                )
+                    # 任务被取消时关闭本次调用的连接，不再等待大模型返回
+                    response = cancellable_post(
+                        url, 
+                        step='llm_attempt',
+                        json=data, 
+                        headers=headers, 
+                        timeout=timeout
+                    )
                 
-                duration = time.time() - start_time
-                logger.info(f"智谱AI API响应耗时: {duration:.2f}秒")
+                    duration = time.time() - start_time
+                    logger.info(f"智谱AI API响应耗时: {duration:.2f}秒")
                 
-                # 检查响应状态
-                if response.status_code == 200:
-                    logger.info(f"智谱AI API调用成功 (尝试 {attempt + 1})")
-                    return response
-                else:
-                    error_msg = f"API调用失败，状态码: {response.status_code}, 响应: {response.text[:200]}"
-                    logger.warning(error_msg)
+                    # 检查响应状态
+                    span.set_attribute('status_code', response.status_code)
+                    if response.status_code == 200:
+                        logger.info(f"智谱AI API调用成功 (尝试 {attempt + 1})")
+                        if cancellation is not None:
+                            cancellation.record_llm_call(duration, self._total_tokens(response))
+                        return response
+                    else:
+                        record_llm_usage(duration)
+                        span.fail(f"HTTP {response.status_code}")
+                        error_msg = f"API调用失败，状态码: {response.status_code}, 响应: {response.text[:200]}"
+                        logger.warning(error_msg)
                     
-                    # 对于4xx错误（客户端错误），不重试
-                    if 400 <= response.status_code < 500:
-                        # 特殊处理429（频率限制）- 可以重试
-                        if response.status_code == 429:
-                            last_exception = Exception(f"API频率限制: {response.text}")
-                            # 频率限制需要更长的等待时间
-                            if attempt < self.max_retries - 1:
-                                wait_time = min(self.retry_delay * (2 ** attempt), 30)  # 指数退避，最多30秒
-                                logger.info(f"频率限制，等待{wait_time}秒后重试...")
-                                time.sleep(wait_time)
-                                continue
-                        else:
-                            raise Exception(error_msg)
+                        # 对于4xx错误（客户端错误），不重试
+                        if 400 <= response.status_code < 500:
+                            # 特殊处理429（频率限制）- 可以重试
+                            if response.status_code == 429:
+                                last_exception = Exception(f"API频率限制: {response.text}")
+                                # 频率限制需要更长的等待时间
+                                if attempt < self.max_retries - 1:
+                                    wait_time = min(self.retry_delay * (2 ** attempt), 30)  # 指数退避，最多30秒
+                                    if deadline is not None:
+                                        deadline.check('llm_retry', required=wait_time + self.min_attempt_budget,
+                                                       skipped=wait_time + self._remaining_attempts_timeout(attempt))
+                                    logger.info(f"频率限制，等待{wait_time}秒后重试...")
+                                    cancellable_sleep(wait_time, 'llm_retry')
+                                    continue
+                            else:
+                                raise Exception(error_msg)
                     
-                    # 对于5xx错误（服务器错误），继续重试
-                    last_exception = Exception(error_msg)
+                        # 对于5xx错误（服务器错误），继续重试
+                        last_exception = Exception(error_msg)
                     
-            except requests.exceptions.Timeout as e:
-                duration = time.time() - start_time
-                error_msg = f"API调用超时 (尝试 {attempt + 1}): {duration:.2f}秒, {str(e)}"
-                logger.warning(error_msg)
-                last_exception = Exception(f"连接超时: {str(e)}")
+                except DeadlineExceeded:
+                    raise
+                
+                except OperationCancelled as e:
+                    if e.step == 'llm_attempt':
+                        # 调用进行中被取消：取消前已占用的时间仍计入用量
+                        record_llm_usage(time.time() - start_time)
+                    span.fail('cancelled')
+                    raise
                 
-            except requests.exceptions.ConnectionError as e:
-                error_msg = f"API连接错误 (尝试 {attempt + 1}): {str(e)}"
-                logger.warning(error_msg)
-                last_exception = Exception(f"连接错误: {str(e)}")
+                except requests.exceptions.Timeout as e:
+                    duration = time.time() - start_time
+                    record_llm_usage(duration)
+                    error_msg = f"API调用超时 (尝试 {attempt + 1}): {duration:.2f}秒, {str(e)}"
+                    logger.warning(error_msg)
+                    last_exception = Exception(f"连接超时: {str(e)}")
+                    span.fail(str(last_exception))
                 
-            except requests.exceptions.RequestException as e:
-                error_msg = f"API请求异常 (尝试 {attempt + 1}): {str(e)}"
-                logger.warning(error_msg)
-                last_exception = Exception(f"请求异常: {str(e)}")
+                except requests.exceptions.ConnectionError as e:
+                    error_msg = f"API连接错误 (尝试 {attempt + 1}): {str(e)}"
+                    logger.warning(error_msg)
+                    last_exception = Exception(f"连接错误: {str(e)}")
+                    span.fail(str(last_exception))
                 
-            except Exception as e:
-                error_msg = f"未知错误 (尝试 {attempt + 1}): {str(e)}"
-                logger.error(error_msg)
-                last_exception = e
+                except requests.exceptions.RequestException as e:
+                    error_msg = f"API请求异常 (尝试 {attempt + 1}): {str(e)}"
+                    logger.warning(error_msg)
+                    last_exception = Exception(f"请求异常: {str(e)}")
+                    span.fail(str(last_exception))
+                
+                except Exception as e:
+                    error_msg = f"未知错误 (尝试 {attempt + 1}): {str(e)}"
+                    logger.error(error_msg)
+                    last_exception = e
+                    span.fail(str(e))
             
             # 智能重试延迟 - 指数退避策略
             if attempt < self.max_retries - 1:
                 wait_time = min(self.retry_delay * (1.5 ** attempt), 20)  # 指数退避，最多20秒
+                if deadline is not None:
+                    deadline.check('llm_retry', required=wait_time + self.min_attempt_budget,
+                                   skipped=wait_time + self._remaining_attempts_timeout(attempt))
                 logger.info(f"等待{wait_time:.1f}秒后重试...")
-                time.sleep(wait_time)
+                cancellable_sleep(wait_time, 'llm_retry')
         
         # 所有重试都失败了
         final_error = f"智谱AI API调用失败，已尝试{self.max_retries}次: {str(last_exception)}"
         logger.error(final_error)
         raise Exception(final_error)
     
+    @staticmethod
+    def _total_tokens(response) -> int:
+        """响应中的token用量（无法解析时为0）"""
+        try:
+            return int(response.json().get('usage', {}).get('total_tokens', 0))
+        except Exception:
+            return 0
+    
+    def _remaining_attempts_timeout(self, attempt: int) -> float:
+        """第 attempt 次（从0起）尝试之后其余尝试的读取超时之和，即放弃重试时最多免去的等待"""
+        return sum(self.attempt_timeouts[min(i, len(self.attempt_timeouts) - 1)][1]
+                   for i in range(attempt + 1, self.max_retries))
+    
     def health_check(self) -> Dict[str, Any]:
         """
         健康检查
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Encoding detection utilities for text-like uploads
+Strict UTF-8 first, then chardet on a bounded head/middle/tail sample, memoized by content hash
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+try:
+    import chardet
+    CHARDET_AVAILABLE = True
+except ImportError:
+    CHARDET_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 每段采样大小（头/中/尾各一段），chardet耗时与输入长度成正比
+SAMPLE_CHUNK_SIZE = 4 * 1024
+MIN_CONFIDENCE = 0.3
+CACHE_SIZE = 1024
+
+# GB2312/GBK 检测结果统一按超集 GB18030 解码，避免生僻字导致解码失败
+_ENCODING_ALIASES = {
+    'gb2312': 'gb18030',
+    'gbk': 'gb18030',
+    'ascii': 'utf-8',
+}
+
+_cache: 'OrderedDict[str, Optional[str]]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _is_utf8(data: bytes) -> bool:
+    try:
+        data.decode('utf-8')
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def _sample(data: bytes) -> bytes:
+    """
+    取头、中、尾三段样本
+
+    切分点对齐到换行符：GBK/UTF-8等多字节编码的后续字节不会是0x0A，
+    对齐后不会把多字节字符截成两半，避免chardet因残缺字符降低置信度。
+    """
+    size = len(data)
+    if size <= SAMPLE_CHUNK_SIZE * 3:
+        return data
+
+    def aligned(start: int, end: int) -> bytes:
+        if start:
+            newline = data.find(b'\n', start, end)
+            start = newline + 1 if newline != -1 else start
+        if end < size:
+            newline = data.rfind(b'\n', start, end)
+            end = newline + 1 if newline != -1 else end
+        return data[start:end]
+
+    middle = size // 2 - SAMPLE_CHUNK_SIZE // 2
+    return b''.join((
+        aligned(0, SAMPLE_CHUNK_SIZE),
+        aligned(middle, middle + SAMPLE_CHUNK_SIZE),
+        aligned(size - SAMPLE_CHUNK_SIZE, size),
+    ))
+
+
+def detect_encoding(data: bytes, content_hash: str = None,
+                    min_confidence: float = MIN_CONFIDENCE) -> Optional[str]:
+    """
+    检测字节内容的编码
+
+    Args:
+        data: 原始字节
+        content_hash: 内容SHA-256（可选，未提供时自动计算），用于结果缓存
+        min_confidence: chardet最低置信度
+
+    Returns:
+        Optional[str]: 编码名称（小写）；无法判断时返回None
+    """
+    if not data or _is_utf8(data):
+        return 'utf-8'
+    return _detect_non_utf8(data, content_hash, min_confidence)
+
+
+def _detect_non_utf8(data: bytes, content_hash: Optional[str], min_confidence: float) -> Optional[str]:
+    """对已确认不是合法UTF-8的内容做采样检测，结果按内容哈希缓存"""
+    if not CHARDET_AVAILABLE:
+        return None
+
+    key = f"{content_hash or hashlib.sha256(data).hexdigest()}:{min_confidence}"
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    encoding = None
+    result = chardet.detect(_sample(data))
+    if result and result.get('encoding') and (result.get('confidence') or 0) >= min_confidence:
+        encoding = result['encoding'].lower()
+        encoding = _ENCODING_ALIASES.get(encoding, encoding)
+        logger.debug(f"检测到编码: {encoding} (置信度: {result['confidence']})")
+
+    with _cache_lock:
+        _cache[key] = encoding
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return encoding
+
+
+def decode_text(data: bytes, fallback_encodings: Iterable[str] = ('gb18030', 'latin1'),
+                content_hash: str = None, detect: bool = True) -> Tuple[str, str]:
+    """
+    将字节解码为文本
+
+    依次尝试：严格UTF-8 -> 检测到的编码（置信度不低于 MIN_CONFIDENCE）-> fallback_encodings
+    （均为严格模式）-> UTF-8忽略错误。单字节编码的严格解码不会失败，低置信度的猜测（短文本常见）
+    排在前面会得到乱码，因此不采用。
+
+    Args:
+        data: 原始字节
+        fallback_encodings: 检测失败或检测结果无法解码时依次尝试的编码
+        content_hash: 内容SHA-256（可选），用于检测结果缓存
+        detect: 是否运行chardet采样检测（二进制格式可关闭）
+
+    Returns:
+        Tuple[str, str]: (文本, 实际使用的编码)
+    """
+    try:
+        return data.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    candidates = []
+    if detect:
+        encoding = _detect_non_utf8(data, content_hash, MIN_CONFIDENCE)
+        if encoding and encoding != 'utf-8':
+            candidates.append(encoding)
+    candidates.extend(enc for enc in fallback_encodings if enc not in candidates)
+
+    for candidate in candidates:
+        try:
+            return data.decode(candidate), candidate
+        except (UnicodeDecodeError, LookupError):
+            continue
+
+    return data.decode('utf-8', errors='ignore'), 'utf-8'
+
+
+def clear_cache():
+    """清空检测结果缓存"""
+    with _cache_lock:
+        _cache.clear()
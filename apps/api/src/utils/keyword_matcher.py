@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Multi-keyword matcher (Aho-Corasick)
+Counts occurrences of a whole keyword lexicon in a single linear scan of the text
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Union
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick自动机
+
+    对每个关键词的计数与 str.count 一致（从左到右、不重叠），
+    但整个词表只需扫描文本一次。匹配区分大小写，调用方自行统一大小写。
+    词表较小时逐个 str.count（C实现）反而更快，此时直接使用。
+    """
+
+    # 关键词数不超过该值时使用 str.count，超过后使用自动机单次扫描
+    COUNT_FALLBACK_MAX_KEYWORDS = 80
+
+    def __init__(self, keywords: Union[Iterable[str], Dict[str, float]], default_weight: float = 1):
+        if isinstance(keywords, dict):
+            weighted = keywords.items()
+        else:
+            weighted = ((kw, default_weight) for kw in keywords)
+
+        # 重复关键词的权重累加，与逐个 count 后求和的结果一致
+        self.weights: Dict[str, float] = {}
+        for keyword, weight in weighted:
+            if not keyword:
+                raise ValueError("Keyword lexicon must not contain empty keywords")
+            self.weights[keyword] = self.weights.get(keyword, 0) + weight
+
+        self.keywords: List[str] = list(self.weights.keys())
+        self._build()
+
+    def _build(self):
+        """构建goto/fail/output表"""
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+
+        for idx, keyword in enumerate(self.keywords):
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(idx)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                # 合并后缀状态的输出，匹配时无需沿fail链回溯
+                outputs[nxt] = outputs[nxt] + outputs[fail[nxt]]
+
+        # 将fail跳转预先展开为确定性转移表（只保存非根目标），扫描时每个字符一次查表
+        delta: List[Dict[str, int]] = [dict() for _ in goto]
+        order = [0]
+        order_queue = deque(goto[0].values())
+        while order_queue:
+            state = order_queue.popleft()
+            order.append(state)
+            order_queue.extend(goto[state].values())
+        for state in order:
+            if state:
+                delta[state].update(delta[fail[state]])
+            delta[state].update(goto[state])
+
+        self._delta = delta
+        self._outputs = outputs
+        self._lengths = [len(kw) for kw in self.keywords]
+
+    def count(self, text: str) -> Dict[str, int]:
+        """统计每个关键词在文本中的出现次数（不重叠）"""
+        counts = self._scan(text)
+        return {self.keywords[i]: c for i, c in enumerate(counts) if c}
+
+    def score(self, text: str) -> float:
+        """按权重计算文本的关键词得分"""
+        counts = self._scan(text)
+        weights = self.weights
+        return sum(weights[self.keywords[i]] * c for i, c in enumerate(counts) if c)
+
+    def _scan(self, text: str) -> List[int]:
+        if len(self.keywords) <= self.COUNT_FALLBACK_MAX_KEYWORDS:
+            return [text.count(keyword) for keyword in self.keywords]
+        return self._scan_automaton(text)
+
+    def _scan_automaton(self, text: str) -> List[int]:
+        delta = self._delta
+        outputs = self._outputs
+        lengths = self._lengths
+        counts = [0] * len(self.keywords)
+        last_end = [0] * len(self.keywords)
+
+        state = 0
+        for pos, ch in enumerate(text):
+            state = delta[state].get(ch, 0)
+            if outputs[state]:
+                end = pos + 1
+                for idx in outputs[state]:
+                    # 与 str.count 一致：同一关键词的重叠匹配只计一次
+                    if end - lengths[idx] >= last_end[idx]:
+                        counts[idx] += 1
+                        last_end[idx] = end
+        return counts
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Spooled upload handling for document analysis routes
+Streams an upload once (hash + size check), then shares one read-only buffer with all stages
+"""
+
+import io
+import mmap
+import hashlib
+import tempfile
+import logging
+from typing import Optional
+from werkzeug.datastructures import FileStorage
+
+logger = logging.getLogger(__name__)
+
+# 默认内存阈值：超过后写入临时文件
+DEFAULT_MEMORY_THRESHOLD = 1024 * 1024  # 1MB
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """上传文件超过大小限制"""
+
+    def __init__(self, size: int, max_size: int):
+        self.size = size
+        self.max_size = max_size
+        super().__init__(
+            f'File size ({size / 1024 / 1024:.1f}MB) exceeds limit ({max_size / 1024 / 1024}MB)'
+        )
+
+
+class SpooledUpload:
+    """
+    单次流式读取的上传文件
+
+    读取时同步计算SHA-256和大小，超过 max_size 立即中止；
+    小文件保存在内存，大文件落到临时文件并以只读mmap共享。
+    如果Werkzeug已经把上传落盘，直接映射原文件，不再额外拷贝。
+    """
+
+    def __init__(self, filename: str, mimetype: str, size: int, content_hash: str,
+                 backing, mapped: Optional[mmap.mmap] = None):
+        self.filename = filename
+        self.mimetype = mimetype
+        self.size = size
+        self.content_hash = content_hash
+        self._backing = backing  # BytesIO 或临时文件对象
+        self._mapped = mapped
+        self._closed = False
+
+    @classmethod
+    def from_file_storage(cls, file: FileStorage, max_size: int = None,
+                          memory_threshold: int = DEFAULT_MEMORY_THRESHOLD) -> 'SpooledUpload':
+        """从Werkzeug上传对象构建，流式计算哈希并检查大小"""
+        stream = file.stream
+        hasher = hashlib.sha256()
+
+        # Werkzeug已将较大的上传落盘：直接在原文件上哈希并映射
+        fileno = cls._real_fileno(stream)
+        if fileno is not None:
+            stream.seek(0)
+            size = 0
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise UploadTooLargeError(size, max_size)
+                hasher.update(chunk)
+            stream.seek(0)
+            mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) if size else None
+            return cls(file.filename, file.mimetype, size, hasher.hexdigest(), stream, mapped)
+
+        # 其他情况：内存缓冲，超过阈值转存临时文件
+        buffer = io.BytesIO()
+        size = 0
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise UploadTooLargeError(size, max_size)
+                hasher.update(chunk)
+                if isinstance(buffer, io.BytesIO) and size > memory_threshold:
+                    spill = tempfile.TemporaryFile()
+                    spill.write(buffer.getbuffer())
+                    buffer.close()
+                    buffer = spill
+                buffer.write(chunk)
+        except Exception:
+            buffer.close()
+            raise
+
+        if not isinstance(buffer, io.BytesIO):
+            buffer.flush()
+            mapped = mmap.mmap(buffer.fileno(), 0, access=mmap.ACCESS_READ)
+            return cls(file.filename, file.mimetype, size, hasher.hexdigest(), buffer, mapped)
+
+        buffer.seek(0)
+        return cls(file.filename, file.mimetype, size, hasher.hexdigest(), buffer)
+
+    @staticmethod
+    def _real_fileno(stream) -> Optional[int]:
+        """返回磁盘文件描述符；内存流返回None"""
+        if isinstance(stream, io.BytesIO):
+            return None
+        if isinstance(stream, tempfile.SpooledTemporaryFile) and not getattr(stream, '_rolled', False):
+            return None
+        try:
+            return stream.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return None
+
+    @property
+    def on_disk(self) -> bool:
+        return self._mapped is not None
+
+    def getbuffer(self) -> memoryview:
+        """返回只读内存视图（不复制数据）"""
+        if self._mapped is not None:
+            return memoryview(self._mapped)
+        return self._backing.getbuffer().toreadonly()
+
+    def as_file_storage(self) -> FileStorage:
+        """
+        返回共享同一缓冲区的FileStorage
+
+        流为只读mmap或内存BytesIO，支持read/seek/tell，可直接交给PDF/Office解析库。
+        """
+        stream = self._mapped if self._mapped is not None else self._backing
+        stream.seek(0)
+        return FileStorage(stream=stream, filename=self.filename, content_type=self.mimetype)
+
+    def close(self):
+        """释放映射和临时文件"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._mapped is not None:
+            try:
+                self._mapped.close()
+            except (BufferError, ValueError):
+                # 仍有内存视图引用时无法立即关闭，交给GC回收
+                logger.debug(f"Deferred unmap for upload {self.filename}")
+        try:
+            self._backing.close()
+        except Exception:
+            pass
+
+    def __enter__(self) -> 'SpooledUpload':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
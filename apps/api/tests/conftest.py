@@ -20,6 +20,63 @@ os.environ['FLASK_ENV'] = 'testing'
 os.environ['TESTING'] = '1'
 
 
+@pytest.fixture(scope='session', autouse=True)
+def isolated_batch_spool(tmp_path_factory):
+    """批量内容暂存写入临时目录，测试不在工作区 instance/ 下留下文件"""
+    from src.services.content_spool import content_spool
+    spool_root = tmp_path_factory.mktemp('batch_spool')
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.setenv('BATCH_SPOOL_DIR', str(spool_root))
+    monkeypatch.setattr(content_spool, 'root_dir', str(spool_root))
+    monkeypatch.setattr(content_spool, 'spool_dir', os.path.join(str(spool_root), str(os.getpid())))
+    yield spool_root
+    monkeypatch.undo()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_near_duplicate_index(tmp_path_factory):
+    """近重复索引写入临时目录，测试之间不通过工作区 instance/ 下的索引文件互相命中"""
+    from src.services.near_duplicate_index import near_duplicate_index
+    index_path = str(tmp_path_factory.mktemp('near_dup') / 'near_duplicate_index.sqlite3')
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.setenv('NEAR_DUP_INDEX_PATH', index_path)
+    monkeypatch.setattr(near_duplicate_index, 'db_path', index_path)
+    monkeypatch.setattr(near_duplicate_index, '_initialized', False)
+    yield near_duplicate_index
+    monkeypatch.undo()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_extraction_cache(tmp_path_factory):
+    """提取缓存写入临时目录，测试不在工作区 instance/ 下留下缓存条目"""
+    from collections import OrderedDict
+    from src.services.extraction_cache import extraction_cache
+    cache_dir = str(tmp_path_factory.mktemp('extraction_cache'))
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.setenv('EXTRACTION_CACHE_DIR', cache_dir)
+    monkeypatch.setattr(extraction_cache, 'cache_dir', cache_dir)
+    monkeypatch.setattr(extraction_cache, '_index', OrderedDict())
+    monkeypatch.setattr(extraction_cache, '_total_bytes', 0)
+    monkeypatch.setattr(extraction_cache, '_loaded', False)
+    yield extraction_cache
+    monkeypatch.undo()
+
+
+@pytest.fixture
+def isolated_analysis_caches(tmp_path, monkeypatch):
+    """
+    分析器测试用：关闭提取缓存，近重复索引换成本测试独占的空索引文件
+
+    同一份测试文本不会命中其他测试留下的提取结果或历史分析，测试结束后全局实例自动恢复。
+    """
+    from src.services.extraction_cache import extraction_cache
+    from src.services.near_duplicate_index import near_duplicate_index
+    monkeypatch.setattr(extraction_cache, 'enabled', False)
+    monkeypatch.setattr(near_duplicate_index, 'db_path', str(tmp_path / 'near_duplicate_index.sqlite3'))
+    monkeypatch.setattr(near_duplicate_index, '_initialized', False)
+    return near_duplicate_index
+
+
 @pytest.fixture(scope='session')
 def app():
     """Create application for testing."""
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步分析任务吞吐基准
+
+在只有2个请求处理线程的WSGI服务器上（对应 gunicorn 同步worker、threads=2 的单进程容量）
+同时提交20个文档分析，大模型调用用固定延迟模拟，期间持续请求健康检查和产品列表（CRUD读），
+比较同步模式与异步模式（?async=true 返回202）下这些轻量接口的吞吐和延迟。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_async_jobs.py [并发分析数] [大模型延迟秒] [观测秒数]
+"""
+import io
+import os
+import sys
+import time
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+import requests
+from werkzeug.serving import BaseWSGIServer
+
+HANDLER_THREADS = 2
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """请求由固定大小的线程池处理，池满时新连接排队等待"""
+
+    def __init__(self, host, port, app, threads):
+        super().__init__(host, port, app)
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def create_server():
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app
+    from src.models.base import db
+    from src.models.user import User
+
+    app = create_app('development')
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com', first_name='Bench',
+                    last_name='User', role='engineer')
+        user.set_password('BenchPass1@9!')
+        db.session.add(user)
+        db.session.commit()
+
+    server = PooledWSGIServer('127.0.0.1', 0, app, HANDLER_THREADS)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, db_path
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def probe(base_url, headers, stop):
+    """循环请求健康检查和产品列表，记录每个请求的延迟"""
+    latencies = {'/health': [], '/api/v1/products': []}
+    while not stop.is_set():
+        for path, samples in latencies.items():
+            started = time.perf_counter()
+            response = requests.get(base_url + path, headers=headers, timeout=120)
+            if response.status_code == 200:
+                samples.append(time.perf_counter() - started)
+    return latencies
+
+
+def run_mode(base_url, headers, mode, analyses, window):
+    content = '\n'.join(f'参数{i}: {i % 400 + 1}V' for i in range(200)).encode('utf-8')
+    params = {'async': 'true'} if mode == 'async' else {}
+
+    def submit(index):
+        files = {'document': (f'spec-{mode}-{index}.txt', io.BytesIO(content), 'text/plain')}
+        response = requests.post(base_url + '/api/v1/ai-analysis/analyze-document', params=params,
+                                 files=files, headers=headers, timeout=600)
+        return response
+
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=analyses + 1) as pool:
+        submissions = [pool.submit(submit, i) for i in range(analyses)]
+        time.sleep(0.2)  # 先让分析请求占住处理线程
+        probe_future = pool.submit(probe, base_url, headers, stop)
+        time.sleep(window)
+        stop.set()
+        latencies = probe_future.result()
+        responses = [future.result() for future in submissions]
+
+    # 异步模式下等待全部任务结束，统计端到端完成情况
+    finished_ok = 0
+    for response in responses:
+        data = response.json()
+        if mode == 'async' and response.status_code == 202:
+            deadline = time.time() + 600
+            while time.time() < deadline:
+                job = requests.get(base_url + data['status_url'], params={'wait': 10},
+                                   headers=headers, timeout=60).json()['job']
+                if job['status'] in ('succeeded', 'failed'):
+                    finished_ok += job['status'] == 'succeeded'
+                    break
+        else:
+            finished_ok += response.status_code == 200
+
+    print(f"\n🔎 {mode} 模式: {analyses} 个分析进行中，观测 {window:.0f}s，"
+          f"提交响应状态 {sorted({r.status_code for r in responses})}，成功完成 {finished_ok}/{analyses}")
+    for path, samples in latencies.items():
+        print(f"   {path:<18} 吞吐 {len(samples) / window:7.1f} req/s  "
+              f"p50 {percentile(samples, 50) * 1000:8.1f}ms  p95 {percentile(samples, 95) * 1000:8.1f}ms  "
+              f"max {max(samples, default=0) * 1000:8.1f}ms")
+
+
+def main():
+    analyses = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    llm_delay = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+    window = float(sys.argv[3]) if len(sys.argv) > 3 else 10.0
+
+    server, db_path = create_server()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    login = requests.post(base_url + '/api/v1/auth/login',
+                          json={'username': 'bench', 'password': 'BenchPass1@9!'}).json()
+    headers = {'Authorization': f"Bearer {login['data']['tokens']['access_token']}"}
+
+    from src.routes.ai_analysis import ai_analyzer
+
+    def fake_llm(document_content, document_name):
+        time.sleep(llm_delay)
+        return {'basic_info': {'name': '继电保护测试仪', 'code': 'RT-3000'},
+                'specifications': {'参数1': {'value': '2V', 'unit': 'V', 'description': ''}},
+                'confidence': {'overall': 0.8}}
+
+    print(f"📊 处理线程 {HANDLER_THREADS}，并发分析 {analyses}，模拟大模型 {llm_delay}s")
+    try:
+        with patch('src.services.ai_analyzer.near_duplicate_index.find', return_value=None), \
+                patch.object(ai_analyzer.ai_client, 'analyze_product_document', side_effect=fake_llm), \
+                patch.object(ai_analyzer.document_processor.extraction_cache, 'enabled', False):
+            for mode in ('sync', 'async'):
+                run_mode(base_url, headers, mode, analyses, window)
+    finally:
+        server.shutdown()
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量任务内存基准
+
+连续处理100个批量任务（每轮5个任务同时进行，每个任务50个文件），比较两种情况下进程RSS的变化：
+- 旧行为：文件内容常驻内存，结束的任务一直留在进程中；
+- 内容暂存：提交时内容写入本地暂存目录，文件任务执行时才加载，任务结束后移入有上限的历史记录。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_batch_memory.py [任务数] [每个文件KB]
+"""
+import io
+import gc
+import os
+import sys
+import tempfile
+from collections import deque
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+import psutil
+from werkzeug.datastructures import FileStorage
+
+from src.services.batch_processor import BatchProcessor
+from src.services.content_spool import ContentSpool
+
+CONCURRENT_BATCHES = 5
+FILES_PER_BATCH = 50
+MB = 1024 * 1024
+
+
+class LegacyRetentionProcessor(BatchProcessor):
+    """旧行为：结束的任务连同文件内容留在 active_jobs 中"""
+
+    def _archive_job(self, job):
+        pass
+
+
+def make_files(batch, file_kb):
+    line = '产品型号: RT-%04d-%02d 额定电压: 220V 额定电流: 5A 工作温度: -20~60℃\n'
+    files = []
+    for i in range(FILES_PER_BATCH):
+        text = (line % (batch, i)) * (file_kb * 1024 // len((line % (batch, i)).encode('utf-8')))
+        files.append(FileStorage(stream=io.BytesIO(text.encode('utf-8')), filename=f'spec-{batch}-{i}.txt',
+                                 content_type='text/plain'))
+    return files
+
+
+def run(processor, batches, file_kb):
+    process = psutil.Process()
+    processor.business_analyzer.analyze_document = \
+        lambda document_content, analysis_type, business_context: {'analysis_type': analysis_type,
+                                                                   'summary': document_content[:200]}
+    gc.collect()
+    baseline = process.memory_info().rss
+    samples = []
+    for wave in range(0, batches, CONCURRENT_BATCHES):
+        job_ids = [
+            processor.create_batch_job(make_files(batch, file_kb), user_id=1,
+                                       settings={'analysis_type': 'product_extraction'})
+            for batch in range(wave, min(wave + CONCURRENT_BATCHES, batches))
+        ]
+        for job_id in job_ids:
+            processor.start_batch_processing(job_id)
+        for job_id in job_ids:
+            processor.wait_for_batch(job_id)
+        gc.collect()
+        samples.append((wave + len(job_ids), (process.memory_info().rss - baseline) / MB))
+    processor.executor.shutdown(wait=True)
+    return samples
+
+
+def main():
+    batches = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    file_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    print(f"📊 连续 {batches} 个批量任务，每轮 {CONCURRENT_BATCHES} 个同时进行，"
+          f"每个任务 {FILES_PER_BATCH} 个 {file_kb}KB 文件")
+
+    legacy = LegacyRetentionProcessor(max_workers=3, max_concurrent_batches=CONCURRENT_BATCHES)
+    legacy.spool = ContentSpool(enabled=False)
+    legacy.job_history = deque()
+
+    with tempfile.TemporaryDirectory() as spool_dir:
+        spooled = BatchProcessor(max_workers=3, max_concurrent_batches=CONCURRENT_BATCHES)
+        spooled.spool = ContentSpool(root_dir=spool_dir)
+
+        for label, processor in (('旧行为（内容常驻内存）', legacy), ('内容暂存 + 历史记录上限', spooled)):
+            samples = run(processor, batches, file_kb)
+            checkpoints = {n for n in (10, 25, 50, 75, batches)}
+            print(f"\n🔎 {label}:")
+            print("   " + "  ".join(f"{n}个任务后 +{rss:.0f}MB" for n, rss in samples if n in checkpoints))
+            half = next(rss for n, rss in samples if n >= batches // 2)
+            print(f"   后半程RSS增长 {samples[-1][1] - half:+.0f}MB，进程内任务 "
+                  f"{len(processor.active_jobs)} 个活跃 / {len(processor.job_history)} 个历史")
+            stats = processor.spool.get_stats()
+            if stats['enabled']:
+                print(f"   暂存写入 {stats['writes']} 次，读取 {stats['loads']} 次，剩余 {stats['entries']} 个条目")
+            del processor
+            gc.collect()
+
+
+if __name__ == '__main__':
+    main()
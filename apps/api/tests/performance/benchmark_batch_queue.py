@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化批量队列基准
+
+一个批量任务入队后，由 1/2/4 个独立工作进程（共享同一个SQLite数据库文件）租用执行，每个文件的
+模拟分析耗时固定。比较吞吐量（文件/秒）随工作进程数的变化；最后一轮在执行中强制杀死一个工作进程，
+验证其持有的文件在租约到期后被其他进程接管、任务仍然全部完成。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_batch_queue.py [文件数] [单文件耗时秒数] [每进程并发]
+"""
+import os
+import sys
+import time
+import shutil
+import signal
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+from flask import Flask
+
+from src.models.base import db
+from src.models.batch_analysis import BatchAnalysisJob, BatchAnalysisFile, BatchStatus, FileStatus
+from src.services.batch_queue import BatchQueue, BatchQueueWorker
+
+LEASE_SECONDS = 1.0
+
+
+def make_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    db.init_app(app)
+    return app
+
+
+def worker_main(db_path, content_dir, worker_id, concurrency, file_seconds, ready):
+    """独立工作进程：租用并执行文件直到被终止"""
+    app = make_app(db_path)
+
+    def process_file(batch_file, user_id, settings):
+        time.sleep(file_seconds)
+        return {'filename': batch_file.filename}
+
+    worker = BatchQueueWorker(app, BatchQueue(lease_seconds=LEASE_SECONDS, content_dir=content_dir), process_file,
+                              concurrency=concurrency, worker_id=worker_id, poll_interval=0.05)
+    worker.start()
+    ready.set()
+    worker.run_forever()
+
+
+def run(db_path, content_dir, job_id, workers, file_count, file_seconds, concurrency, kill_one=False):
+    app = make_app(db_path)
+    with app.app_context():
+        queue = BatchQueue(lease_seconds=LEASE_SECONDS, content_dir=content_dir)
+        db.session.add(BatchAnalysisJob(job_id=job_id, user_id=1, total_files=file_count, settings={}))
+        for i in range(file_count):
+            db.session.add(BatchAnalysisFile(job_id=job_id, file_id=f'{job_id}_{i}', filename=f'doc_{i}.txt',
+                                             original_filename=f'doc_{i}.txt',
+                                             content_ref=queue.contents.put(job_id, f'document {i}')))
+        db.session.commit()
+
+        ready = [multiprocessing.Event() for _ in range(workers)]
+        processes = [
+            multiprocessing.Process(target=worker_main,
+                                    args=(db_path, content_dir, f'worker-{i}', concurrency, file_seconds, ready[i]))
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for event in ready:  # 等待工作进程完成导入，计时只包含队列执行
+            event.wait()
+
+        started = time.monotonic()
+        queue.enqueue(job_id)
+        killed = False
+        while True:
+            db.session.expire_all()
+            job = BatchAnalysisJob.query.filter_by(job_id=job_id).first()
+            if job.status != BatchStatus.PROCESSING:
+                break
+            if kill_one and not killed and job.processed_files >= file_count // 4:
+                os.kill(processes[0].pid, signal.SIGKILL)
+                killed = True
+            time.sleep(0.02)
+        elapsed = time.monotonic() - started
+
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+        reclaimed = BatchAnalysisFile.query.filter(
+            BatchAnalysisFile.job_id == job_id, BatchAnalysisFile.attempts > 1).count()
+        completed = BatchAnalysisFile.query.filter_by(job_id=job_id, status=FileStatus.COMPLETED).count()
+        return elapsed, completed, reclaimed
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 80
+    file_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    print(f"📊 {file_count} 个文件，每个耗时 {file_seconds}s，每个工作进程并发 {concurrency}，租约 {LEASE_SECONDS}s")
+
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    content_dir = tempfile.mkdtemp(prefix='batch_queue_content_')
+    app = make_app(db_path)
+    with app.app_context():
+        db.create_all()
+        db.engine.dispose()
+
+    try:
+        baseline = None
+        for workers in (1, 2, 4):
+            elapsed, completed, _ = run(db_path, content_dir, f'bench_{workers}', workers, file_count, file_seconds, concurrency)
+            throughput = completed / elapsed
+            baseline = baseline or throughput
+            print(f"\n🚚 {workers} 个工作进程: 完成 {completed}/{file_count}，耗时 {elapsed:.2f}s，"
+                  f"吞吐 {throughput:.1f} 文件/秒（{throughput / baseline:.2f}x）")
+
+        elapsed, completed, reclaimed = run(db_path, content_dir, 'bench_crash', 2, file_count, file_seconds, concurrency,
+                                            kill_one=True)
+        print(f"\n💥 2 个工作进程，执行中杀死其中一个: 完成 {completed}/{file_count}，耗时 {elapsed:.2f}s，"
+              f"租约到期后被接管的文件 {reclaimed} 个")
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+        shutil.rmtree(content_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量任务取消基准
+
+本地模拟大模型服务（每次调用耗时固定，客户端断开连接时停止生成、不计费），批量任务开始后
+一段时间取消。比较只修改状态标记（原行为）与取消令牌两种情况下：取消后工作线程仍被占用的时间、
+取消后仍发起的大模型调用、取消后消耗的大模型秒数和计费token数，以及统计接口估算的节省。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_cancellation.py [文件数] [工作线程数] [大模型耗时秒] [取消时间秒]
+"""
+import os
+import sys
+import json
+import time
+import select
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+from src.services.batch_processor import BatchProcessor, BatchJob, BatchFile
+from src.services.cancellation import cancellation_stats
+
+TOKENS_PER_CALL = 2400
+
+
+def start_llm_server(delay):
+    calls = []
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            call = {'start': time.monotonic(), 'end': None, 'tokens': 0}
+            with lock:
+                calls.append(call)
+            deadline = call['start'] + delay
+            while time.monotonic() < deadline:
+                readable, _, _ = select.select([self.connection], [], [], 0.02)
+                if readable and not self.connection.recv(1, socket.MSG_PEEK):
+                    call['end'] = time.monotonic()  # 客户端已断开：停止生成
+                    return
+            body = json.dumps({
+                'choices': [{'message': {'content': '{"basic_info": {"name": "继电保护测试仪"}}'}}],
+                'usage': {'total_tokens': TOKENS_PER_CALL}
+            }).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            call['end'], call['tokens'] = time.monotonic(), TOKENS_PER_CALL
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, calls
+
+
+def make_processor(workers, url):
+    processor = BatchProcessor(max_workers=workers)
+    processor.business_analyzer.ai_client.base_url = url
+    return processor
+
+
+def make_job(job_id, count):
+    files = [BatchFile(id=f'{job_id}-{i}', filename=f'spec-{i:03d}.txt', original_filename=f'spec-{i:03d}.txt',
+                       file_size=64, file_type='txt', content=f'产品型号: RT-{i:03d}\n额定电压: 220V')
+             for i in range(count)]
+    return BatchJob(job_id=job_id, user_id=1, total_files=count, files=files,
+                    settings={'analysis_type': 'product_extraction'})
+
+
+def run_batch(processor, job, cancel_at=None):
+    """处理批量任务（cancel_at 秒后取消），返回取消时间和工作线程全部空闲的时间"""
+    processor.active_jobs[job.job_id] = job
+    processor.start_batch_processing(job.job_id)
+    cancelled_at = None
+    if cancel_at is not None:
+        time.sleep(cancel_at)
+        cancelled_at = time.monotonic()
+        processor.cancel_batch_job(job.job_id)
+    while job.end_time is None:
+        time.sleep(0.01)
+    processor.executor.shutdown(wait=True)
+    return cancelled_at, time.monotonic()
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    llm_delay = float(sys.argv[3]) if len(sys.argv) > 3 else 3.0
+    cancel_at = float(sys.argv[4]) if len(sys.argv) > 4 else 1.0
+
+    server, calls = start_llm_server(llm_delay)
+    url = f'http://127.0.0.1:{server.server_port}/v4/chat/completions'
+    print(f"📊 {files} 个文件，{workers} 个工作线程，每次大模型调用 {llm_delay}s，开始后 {cancel_at}s 取消")
+
+    # 先完整处理一个小批量，得到单个文件的平均大模型用量（估算节省的基准）
+    cancellation_stats.reset()
+    run_batch(make_processor(workers, url), make_job('warmup', 2))
+
+    try:
+        for mode in ('flag', 'token'):
+            calls.clear()
+            processor = make_processor(workers, url)
+            before = cancellation_stats.snapshot()
+            if mode == 'flag':
+                # 原行为：取消只修改状态标记，已提交的文件继续调用大模型
+                with patch('src.services.batch_processor.cancellation_registry.cancel', return_value=False):
+                    cancelled_at, idle_at = run_batch(processor, make_job('flag', files), cancel_at)
+            else:
+                cancelled_at, idle_at = run_batch(processor, make_job('token', files), cancel_at)
+            time.sleep(0.2)
+
+            started_after = sum(1 for call in calls if call['start'] >= cancelled_at)
+            seconds_after = sum(max(0.0, call['end'] - max(call['start'], cancelled_at))
+                                for call in calls if call['end'] is not None)
+            tokens_after = sum(call['tokens'] for call in calls
+                               if call['end'] is not None and call['end'] >= cancelled_at)
+            label = '只修改状态标记' if mode == 'flag' else '取消令牌'
+            print(f"\n🔎 {label}:")
+            print(f"   取消后工作线程仍被占用 {idle_at - cancelled_at:.2f}s")
+            print(f"   取消后新发起大模型调用 {started_after} 次，消耗大模型 {seconds_after:.1f}s，"
+                  f"计费 {tokens_after} tokens")
+            if mode == 'token':
+                after = cancellation_stats.snapshot()
+                print(f"   中断进行中的调用 {after['aborted_llm_calls'] - before['aborted_llm_calls']} 次，"
+                      f"取消排队中的文件 {after['cancelled_futures'] - before['cancelled_futures']} 个")
+                print(f"   统计接口估算节省: 大模型 {after['llm_seconds_saved']:.1f}s，"
+                      f"{after['llm_tokens_saved']} tokens")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DocumentContentCleaner 清洗性能基准
+
+对比逐模式 re.search 的原始实现与预编译合并模式实现的耗时，并校验输出一致。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_content_cleaner.py [行数] [轮数]
+"""
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.services.document_processor import DocumentContentCleaner  # noqa: E402
+from tests.unit.services.test_document_processor import (  # noqa: E402
+    SAMPLE_DOCUMENT, _reference_clean
+)
+
+FILLER_LINES = [
+    '本装置适用于电力系统继电保护装置的现场调试与检验',
+    'The instrument supports automatic and manual test modes',
+    '外形尺寸 450mm x 320mm x 180mm',
+    'Weight approximately 12 kg including accessories',
+    '工作环境温度 -10℃ ~ 50℃',
+    'Communication interface RS232 and Ethernet',
+]
+
+
+def build_document(line_count: int) -> str:
+    rng = random.Random(42)
+    pool = SAMPLE_DOCUMENT.split('\n') + FILLER_LINES * 3
+    return '\n'.join(rng.choice(pool) for _ in range(line_count))
+
+
+def main():
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    logging.disable(logging.INFO)
+
+    cleaner = DocumentContentCleaner()
+    document = build_document(line_count)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        expected_content, expected_stats = _reference_clean(cleaner, document)
+    reference_time = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = cleaner.clean_document_content(document)
+    compiled_time = (time.perf_counter() - start) / rounds
+
+    assert result['cleaned_content'] == expected_content, '清洗结果不一致'
+    assert result['noise_statistics'] == expected_stats, '噪声统计不一致'
+
+    print(f"📄 文档行数: {line_count}, 轮数: {rounds}")
+    print(f"🐢 逐模式实现: {reference_time * 1000:.1f} ms/次")
+    print(f"🚀 预编译实现: {compiled_time * 1000:.1f} ms/次")
+    print(f"📈 加速比: {reference_time / compiled_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据质量验证基准
+
+用典型的仪器规格参数（含.doc解析乱码、格式噪声、基本信息和通用描述条目）构造规格字典，
+测量 DataQualityValidator.validate_extracted_data 的耗时，并与记录的基准结果逐项比对，
+确保规则优化前后清洗结果完全一致。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_data_quality.py [轮数]
+    python tests/performance/benchmark_data_quality.py --record   # 用当前实现重新生成基准结果
+"""
+import os
+import sys
+import json
+import time
+import random
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+from src.services.ai_analyzer import DataQualityValidator
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), '..', 'fixtures', 'data_quality_golden.json')
+
+TECH_SPECS = [
+    ('额定电压', '220V'), ('额定电流', '5A'), ('工作温度', '-20~60℃'), ('存储温度', '-40~70℃'),
+    ('精度等级', '0.2级'), ('输出功率', '300VA'), ('频率范围', '45~65Hz'), ('相对湿度', '≤95%'),
+    ('电压输出', '6×0~125V'), ('电流输出', '6×0~30A'), ('开关量输入', '8路'), ('开关量输出', '4对'),
+    ('时间测量精度', '0.1ms'), ('外形尺寸', '450×330×180mm'), ('重量', '18kg'), ('防护等级', 'IP54'),
+    ('通信接口', 'RS232/RS485/以太网'), ('显示屏', '8.4英寸彩色液晶'), ('操作方式', '触摸屏+旋钮'),
+    ('电源', 'AC220V±10%'), ('谐波输出', '2~20次'), ('相位范围', '0~359.9°'), ('直流电压', '0~±300V'),
+    ('功率因数', '0.5~1'), ('绝缘电阻', '≥100MΩ'), ('耐压', '2kV/1min'), ('GPS同步', '支持'),
+    ('USB', '2个'), ('Output voltage', '0-300V'), ('Test mode', 'manual/auto'), ('Frequency', '50Hz'),
+    ('环境条件', '工作环境温度-10~50℃'), ('安装方式', '便携式'), ('ToC50900608', ''),
+    ('WIRE1 3RS232', '串口'), ('3RS232', ''), ('1O0V档位', '100V'), ('l0A档', '10A'),
+    ('输出路数', '12'), ('分辨率', '1mV'), ('采样率', '4kHz'), ('存储容量', '32GB'),
+    ('产品型号', 'RT-3000'), ('说明', '见附录'), ('备注', '无'), ('颜色', '灰色'),
+]
+NOISE_SPECS = [
+    'PAGE 7', 'HYPERLINK', 'EMBED Equation', 'A A AB X B', 'Ca a a a b', 'h 9 HYPERLINK toc',
+    '｜', '---+---', 'TEST', 'RS', 'D', 'I', '/λspec_table中提取', 'spec_table', 'WIRE1 3RS232',
+    '3.2 D', '5.2.14 I-t', '4.1 X', 'I - t', 'ToC509006008', 'ToC509006048', 'ToC#12', 'ToC12a-',
+]
+BASIC_INFO_SPECS = [
+    '产品名称', '产品代码', '制造商', '厂商', '产品类别', '类别', '概述', '简介', '描述',
+    '附录A：接线图', '表3：技术参数', '图2 外形', '技术规格一览表', '参数表', '主要规格表',
+    '第三章', '3.1 技术指标', '使用说明书', '操作手册', '快速指南', '产品型号',
+]
+GENERIC_SPECS = ['主要功能', '特点', '特色', '优势', '应用', '用途', '适用', '范围', '注意事项', '安全', '警告', '须知']
+
+GARBAGE_ALPHABETS = [
+    ''.join(chr(c) for c in range(0xE000, 0xE040)),           # 私用区
+    ''.join(chr(c) for c in range(0x80, 0x100)),              # Latin-1扩展
+    '潗摲楍牣獯景煅慵楴湯畱瑡潩卍潄吀瑩敬牁慩袈霡蠈袢',
+    '㸳㠴㔷㤸㜹㈰㐱㠲㌳㘴㔵㘶㠷㤸㠹',
+    '屜屝屬屭屨屪屢屣層履屦屧屩屲',
+    '▉▊▋▌▍▎▏█▄▀■□▲△▼▽◆◇○●◎☆★',
+    ''.join(chr(c) for c in range(0x2000, 0x2070)),
+    '\x01\x02\x03\x07\x0b\x0e\x1f\t',
+    '�??﻿',
+    '电压流功率频温度精量测试输出输入范围额定工作',
+    'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ',
+    '0123456789.,;:!?()/-+=% ',
+    'αβγδεζηθλμπσωΩ°±×÷≤≥≈∞√',
+    'アイウエオカキクケコ가나다라마',
+]
+
+
+def random_text(rng, length):
+    text = ''
+    for _ in range(length):
+        alphabet = rng.choice(GARBAGE_ALPHABETS)
+        text += rng.choice(alphabet)
+    return text
+
+
+def build_spec_dict(rng, size):
+    """按真实文档的大致比例混合有效规格、格式噪声、基本信息、通用描述和乱码"""
+    specs = {}
+    while len(specs) < size:
+        kind = rng.random()
+        if kind < 0.5:
+            name, value = rng.choice(TECH_SPECS)
+            name = name if rng.random() < 0.6 else f'{name}{len(specs)}'
+        elif kind < 0.62:
+            name, value = rng.choice(NOISE_SPECS), rng.choice(['', '1', 'x'])
+        elif kind < 0.72:
+            name, value = rng.choice(BASIC_INFO_SPECS), rng.choice(['', 'RT', '继电保护测试仪'])
+        elif kind < 0.78:
+            name, value = rng.choice(GENERIC_SPECS), '详见说明'
+        else:
+            name, value = random_text(rng, rng.randint(1, 12)), random_text(rng, rng.randint(0, 8))
+        if rng.random() < 0.5:
+            value = {'value': value, 'unit': '', 'description': ''}
+        specs[name] = value
+    return specs
+
+
+def build_corpus(seed=20240611):
+    rng = random.Random(seed)
+    spec_dicts = [build_spec_dict(rng, size) for size in (20, 60, 150, 400)]
+    garbage_names = [random_text(rng, rng.randint(1, 16)) for _ in range(800)]
+    garbage_names += [name for name, _ in TECH_SPECS] + NOISE_SPECS + BASIC_INFO_SPECS + GENERIC_SPECS
+    return spec_dicts, garbage_names
+
+
+def run_validator(validator, spec_dicts, garbage_names):
+    results = []
+    for specs in spec_dicts:
+        outcome = validator.validate_extracted_data({
+            'basic_info': {'name': '继电保护测试仪', 'code': 'RT-3000'},
+            'specifications': specs,
+            'confidence': {'basic_info': 0.9, 'specifications': 0.8, 'overall': 0.83}
+        })
+        outcome['cleaned_data']['specifications'] = list(outcome['cleaned_data']['specifications'].items())
+        results.append(outcome)
+    garbage = [validator._is_binary_garbage(name) for name in garbage_names]
+    return {'validations': results, 'binary_garbage': garbage}
+
+
+def main():
+    record = '--record' in sys.argv
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    rounds = int(args[0]) if args else 20
+
+    spec_dicts, garbage_names = build_corpus()
+    validator = DataQualityValidator()
+    actual = json.loads(json.dumps(run_validator(validator, spec_dicts, garbage_names), ensure_ascii=False))
+
+    if record:
+        with open(GOLDEN_PATH, 'w', encoding='utf-8') as f:
+            json.dump({'spec_dicts': spec_dicts, 'garbage_names': garbage_names, 'expected': actual},
+                      f, ensure_ascii=False, separators=(',', ':'))
+        print(f"📝 已记录基准结果: {GOLDEN_PATH}")
+        return
+
+    with open(GOLDEN_PATH, encoding='utf-8') as f:
+        golden = json.load(f)
+    identical = actual == golden['expected']
+    print(f"{'✅' if identical else '❌'} 结果与基准{'一致' if identical else '不一致'}")
+
+    total_specs = sum(len(specs) for specs in spec_dicts)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for specs in spec_dicts:
+            validator.validate_extracted_data({'specifications': specs})
+    elapsed = time.perf_counter() - started
+    print(f"📊 规格清洗: {rounds} 轮 × {total_specs} 项, 平均 {elapsed / rounds * 1000:.1f}ms/轮, "
+          f"{elapsed / rounds / total_specs * 1e6:.1f}µs/项")
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for name in garbage_names:
+            validator._is_binary_garbage(name)
+    elapsed = time.perf_counter() - started
+    print(f"📊 乱码检测: {rounds} 轮 × {len(garbage_names)} 项, {elapsed / rounds / len(garbage_names) * 1e6:.1f}µs/项")
+    sys.exit(0 if identical else 1)
+
+
+if __name__ == '__main__':
+    main()
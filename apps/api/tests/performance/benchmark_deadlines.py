@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求截止时间基准
+
+大模型服务无响应（每次调用都等到读取超时）时，客户端在预算（默认0.6s，对应线上60s按1/100缩放）
+后放弃请求。比较不传递截止时间与传递截止时间两种情况下，每个请求占用处理线程的时间、
+大模型调用实际等待的时间，以及被提前中止的请求数和按原有超时估算的回收等待时间。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_deadlines.py [请求数] [客户端预算秒]
+"""
+import io
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+import requests
+from werkzeug.datastructures import FileStorage
+
+from src.services.ai_analyzer import AIAnalyzer
+from src.services.deadline import Deadline, deadline_scope, deadline_stats
+
+SCALE = 0.01  # 线上超时（秒）按1/100缩放
+WORKERS = 2
+
+
+def build_analyzer():
+    analyzer = AIAnalyzer()
+    analyzer.document_processor.extraction_cache.enabled = False
+    client = analyzer.ai_client
+    client.attempt_timeouts = [(c * SCALE, r * SCALE) for c, r in client.attempt_timeouts]
+    client.retry_delay *= SCALE
+    client.min_attempt_budget *= SCALE
+    return analyzer
+
+
+def run(label, requests_count, budget, use_deadline):
+    analyzer = build_analyzer()
+    deadline_stats.reset()
+    upstream = {'seconds': 0.0}
+    lock = threading.Lock()
+
+    def hung_upstream(url, json=None, headers=None, timeout=None):
+        # 服务端不响应：等到读取超时
+        time.sleep(timeout[1])
+        with lock:
+            upstream['seconds'] += timeout[1]
+        raise requests.exceptions.Timeout('read timed out')
+
+    def handle(index):
+        text = f'产品型号: RT-{index:03d}\n额定电压: 220V\n额定电流: 5A\n工作温度: -20~60℃'
+        upload = FileStorage(stream=io.BytesIO(text.encode('utf-8')), filename=f'spec-{index}.txt',
+                             content_type='text/plain')
+        started = time.perf_counter()
+        with deadline_scope(Deadline(budget) if use_deadline else None):
+            result = analyzer.analyze_product_document(upload)
+        return time.perf_counter() - started, result.get('error_type')
+
+    with patch('src.services.zhipuai_client.requests.post', side_effect=hung_upstream), \
+            patch('src.services.ai_analyzer.near_duplicate_index.find', return_value=None):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+            outcomes = list(pool.map(handle, range(requests_count)))
+        wall = time.perf_counter() - started
+        time.sleep(max(t for t, _ in analyzer.ai_client.attempt_timeouts))  # 等后台大模型调用结束再统计
+
+    busy = sum(t for t, _ in outcomes)
+    abandoned = sum(1 for t, _ in outcomes if t > budget * 1.05)
+    stats = deadline_stats.snapshot()
+    print(f"\n🔎 {label}")
+    print(f"   总耗时 {wall:.2f}s，处理线程占用 {busy:.2f}s（每请求 {busy / requests_count:.2f}s），"
+          f"客户端已放弃后仍在处理的请求 {abandoned}/{requests_count}")
+    print(f"   大模型调用等待 {upstream['seconds']:.2f}s，错误类型 {sorted({e for _, e in outcomes if e})}")
+    print(f"   提前中止 {stats['cut_short_requests']} 个请求 {stats['cut_short_by_step']}，"
+          f"截短等待 {stats['clamped_waits']} 次，回收等待 {stats['reclaimed_seconds']:.2f}s"
+          f"（按线上时间 {stats['reclaimed_seconds'] / SCALE:.0f}s）")
+
+
+def main():
+    requests_count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else 0.6
+    print(f"📊 {requests_count} 个请求，{WORKERS} 个处理线程，客户端预算 {budget}s，大模型服务无响应")
+    run('不传递截止时间', requests_count, budget, use_deadline=False)
+    run('传递截止时间', requests_count, budget, use_deadline=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+编码检测耗时基准
+
+对比 chardet 全量检测与 encoding_detection（严格UTF-8优先 + 头/中/尾采样 + 按内容哈希缓存）
+在 UTF-8 / GBK 文本上的每MB检测耗时。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_encoding_detection.py [文件MB]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import chardet
+
+from src.utils.encoding_detection import detect_encoding, clear_cache
+
+LINE = '产品规格说明：额定电压220V，额定功率1500W，防护等级IP65，工作温度-20℃~60℃，重量12.5kg。\n'
+
+
+def build_payload(encoding, size_mb):
+    line = LINE.encode(encoding)
+    return line * (size_mb * 1024 * 1024 // len(line) + 1)
+
+
+def timed(func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+
+    print(f"📄 文本大小: {size_mb}MB")
+    for encoding in ('utf-8', 'gbk'):
+        data = build_payload(encoding, size_mb)
+        mb = len(data) / 1024 / 1024
+
+        full_time, full_result = timed(lambda: chardet.detect(data))
+        clear_cache()
+        cold_time, cold_result = timed(lambda: detect_encoding(data))
+        warm_time, _ = timed(lambda: detect_encoding(data), repeat=5)
+
+        print(f"🔤 {encoding}:")
+        print(f"   🐢 chardet全量      {full_time / mb * 1000:10.2f} ms/MB  -> {full_result['encoding']}")
+        print(f"   🚀 采样检测(首次)   {cold_time / mb * 1000:10.2f} ms/MB  -> {cold_result}")
+        print(f"   ⚡ 采样检测(缓存)   {warm_time / mb * 1000:10.2f} ms/MB")
+
+
+if __name__ == '__main__':
+    main()
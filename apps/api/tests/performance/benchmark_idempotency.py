@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+幂等提交基准
+
+同步分析耗时超过网关超时（默认大模型2.5s、网关1s）时，客户端超时后重试同一次提交，
+最后一次以足够长的超时等待结果。比较不带 Idempotency-Key 与带同一个键重试两种情况下
+大模型实际调用次数、新建的分析记录数和被吸收的重复提交数。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_idempotency.py [文档数] [大模型延迟秒] [网关超时秒] [重试次数]
+"""
+import io
+import os
+import sys
+import time
+import uuid
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+import requests
+from werkzeug.serving import make_server
+
+
+def create_server():
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app
+    from src.models.base import db
+    from src.models.user import User
+
+    app = create_app('development')
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com', first_name='Bench',
+                    last_name='User', role='engineer')
+        user.set_password('BenchPass1@9!')
+        db.session.add(user)
+        db.session.commit()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return app, server, db_path
+
+
+def run_mode(app, base_url, headers, use_key, documents, gateway_timeout, retries):
+    from src.models import AIAnalysisRecord
+    from src.middleware.idempotency import idempotency_store
+
+    with app.app_context():
+        records_before = AIAnalysisRecord.query.count()
+        absorbed_before = idempotency_store.get_stats()['duplicates_absorbed']
+
+    def submit(index):
+        content = f'产品型号: RT-{index:03d}\n额定电压: 220V\n额定电流: 5A'.encode('utf-8')
+        request_headers = dict(headers)
+        if use_key:
+            request_headers['Idempotency-Key'] = uuid.uuid4().hex
+        for attempt in range(retries + 1):
+            timeout = gateway_timeout if attempt < retries else 120
+            files = {'document': (f'spec-{index:03d}.txt', io.BytesIO(content), 'text/plain')}
+            try:
+                return requests.post(base_url + '/api/v1/ai-analysis/analyze-document', files=files,
+                                     headers=request_headers, timeout=timeout)
+            except requests.exceptions.Timeout:
+                continue  # 网关超时，客户端重试
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=documents) as pool:
+        responses = list(pool.map(submit, range(documents)))
+    elapsed = time.perf_counter() - started
+    time.sleep(0.5)  # 等待已被客户端放弃的请求在服务端结束
+
+    with app.app_context():
+        records = AIAnalysisRecord.query.count() - records_before
+        absorbed = idempotency_store.get_stats()['duplicates_absorbed'] - absorbed_before
+    return responses, records, absorbed, elapsed
+
+
+def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    llm_delay = float(sys.argv[2]) if len(sys.argv) > 2 else 2.5
+    gateway_timeout = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+    retries = int(sys.argv[4]) if len(sys.argv) > 4 else 2
+
+    app, server, db_path = create_server()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    login = requests.post(base_url + '/api/v1/auth/login',
+                          json={'username': 'bench', 'password': 'BenchPass1@9!'}).json()
+    headers = {'Authorization': f"Bearer {login['data']['tokens']['access_token']}"}
+
+    from src.routes.ai_analysis import ai_analyzer
+    llm_calls = {'count': 0}
+    lock = threading.Lock()
+
+    def fake_llm(document_content, document_name):
+        with lock:
+            llm_calls['count'] += 1
+        time.sleep(llm_delay)
+        return {'basic_info': {'name': '继电保护测试仪', 'code': document_name[5:8]},
+                'specifications': {'额定电压': {'value': '220V', 'unit': 'V', 'description': ''}},
+                'confidence': {'overall': 0.8}}
+
+    print(f"📊 {documents} 个文档，大模型 {llm_delay}s，网关超时 {gateway_timeout}s，超时后最多重试 {retries} 次")
+    try:
+        with patch('src.services.ai_analyzer.near_duplicate_index.find', return_value=None), \
+                patch.object(ai_analyzer.ai_client, 'analyze_product_document', side_effect=fake_llm), \
+                patch.object(ai_analyzer.document_processor.extraction_cache, 'enabled', False):
+            for use_key in (False, True):
+                llm_calls['count'] = 0
+                responses, records, absorbed, elapsed = run_mode(
+                    app, base_url, headers, use_key, documents, gateway_timeout, retries)
+                ok = sum(1 for response in responses if response is not None and response.status_code == 200)
+                label = '带 Idempotency-Key' if use_key else '不带幂等键'
+                print(f"\n🔎 {label}: 成功 {ok}/{documents}，耗时 {elapsed:.1f}s")
+                print(f"   大模型调用 {llm_calls['count']} 次，新建分析记录 {records} 条，"
+                      f"吸收的重复提交 {absorbed} 次")
+    finally:
+        server.shutdown()
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+智能截断段落评分性能基准
+
+对比逐关键词 str.count 的原始评分与 Aho-Corasick 单次扫描评分在1MB文档上的耗时，
+分别使用默认词表和扩充后的大词表，并校验两者选出的段落完全一致。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_intelligent_truncate.py [文档字符数] [大词表规模]
+"""
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.services.document_processor import DocumentProcessor  # noqa: E402
+from tests.unit.services.test_document_processor import (  # noqa: E402
+    _reference_truncate, build_long_document
+)
+
+
+def build_lexicon(size: int):
+    """在默认词表基础上补充随机中英文术语"""
+    rng = random.Random(11)
+    lexicon = list(DocumentProcessor.DEFAULT_TRUNCATION_KEYWORDS)
+    while len(lexicon) < size:
+        if len(lexicon) % 2:
+            lexicon.append(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 10))))
+        else:
+            lexicon.append(chr(rng.randint(0x4e00, 0x9fa5)) + chr(rng.randint(0x4e00, 0x9fa5)))
+    return lexicon
+
+
+def run(document, keywords, label):
+    processor = DocumentProcessor(truncation_keywords=keywords)
+
+    start = time.perf_counter()
+    expected = _reference_truncate(processor, document, keywords)
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = processor._intelligent_truncate(document)
+    matcher_time = time.perf_counter() - start
+
+    assert result == expected, f'{label}: 段落选择不一致'
+    print(f"📚 {label}（{len(keywords)}个关键词）")
+    print(f"   🐢 逐关键词 str.count: {reference_time * 1000:.1f} ms")
+    print(f"   🚀 KeywordMatcher: {matcher_time * 1000:.1f} ms")
+    print(f"   📈 加速比: {reference_time / matcher_time:.1f}x，段落选择一致 ✅")
+
+
+def main():
+    doc_chars = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    lexicon_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    logging.disable(logging.INFO)
+
+    document = build_long_document(doc_chars)
+    print(f"📄 文档长度: {len(document)} 字符, 段落数: {document.count(chr(10) * 2) + 1}")
+    run(document, list(DocumentProcessor.DEFAULT_TRUNCATION_KEYWORDS), '默认词表')
+    run(document, build_lexicon(lexicon_size), '扩充词表')
+
+
+if __name__ == '__main__':
+    main()
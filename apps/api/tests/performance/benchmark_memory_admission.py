@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析内存准入基准
+
+一批文档同时到达（若干PDF和一个大PPTX，以及一个超出单进程处理能力的扫描件），每个模拟分析按
+文件大小 × 类型比值分配内存并保持一段时间。比较不做准入与设置内存上限两种情况下：
+进程峰值RSS、是否超过上限、被等待/拒绝的文档数和总耗时，并输出按文件类型和阶段记录的峰值。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_memory_admission.py [上限(高于基线的MB)] [分析保持秒数]
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+import psutil
+
+from src.services.memory_accounting import (
+    MemoryAdmissionController, MemoryAdmissionRejected, MemorySampler, MemoryStats,
+    memory_scope, DEFAULT_BYTES_PER_INPUT_BYTE, MB
+)
+
+# (文件类型, 文件大小MB)
+DOCUMENTS = [('pdf', 4)] * 5 + [('pptx', 10), ('pdf', 30)]
+
+
+def simulated_analysis(file_type, size_mb, hold, sampler, stats):
+    """按类型比值分配内存：提取阶段占大头，大模型阶段只保留文本"""
+    with memory_scope('analysis', file_type, sampler=sampler, stats=stats) as usage:
+        with memory_scope('extract', file_type, sampler=sampler, stats=stats):
+            buffer = bytearray(size_mb * DEFAULT_BYTES_PER_INPUT_BYTE[file_type] * MB)
+            time.sleep(hold)
+            del buffer
+        with memory_scope('ai_analysis', file_type, sampler=sampler, stats=stats):
+            text = bytearray(size_mb * MB)
+            time.sleep(hold / 2)
+            del text
+    stats.record_analysis(file_type, size_mb * MB, usage.peak_bytes)
+
+
+def run(ceiling_mb, hold):
+    process = psutil.Process()
+    baseline = process.memory_info().rss
+    sampler = MemorySampler(mode='rss', interval=0.01)
+    stats = MemoryStats()
+    admission = MemoryAdmissionController(ceiling_mb=(baseline / MB + ceiling_mb) if ceiling_mb else 0,
+                                          max_wait=30, stats=stats)
+    outcome = {'rejected': []}
+    peak = [baseline]
+    done = threading.Event()
+
+    def watch():
+        while not done.is_set():
+            peak[0] = max(peak[0], process.memory_info().rss)
+            time.sleep(0.002)
+
+    def analyze(file_type, size_mb):
+        try:
+            with admission.admit(file_type, size_mb * MB):
+                simulated_analysis(file_type, size_mb, hold, sampler, stats)
+        except MemoryAdmissionRejected as e:
+            outcome['rejected'].append(f"{file_type} {size_mb}MB ({e.reason})")
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    started = time.monotonic()
+    threads = [threading.Thread(target=analyze, args=document) for document in DOCUMENTS]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    done.set()
+    watcher.join()
+    return baseline, peak[0], elapsed, outcome, admission.snapshot(), stats.snapshot()
+
+
+def main():
+    ceiling_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 300
+    hold = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    print(f"📊 {len(DOCUMENTS)} 个文档同时分析，内存上限为基线之上 {ceiling_mb:.0f}MB，每个阶段保持 {hold}s")
+
+    for label, ceiling in (('不做准入', 0), ('内存准入', ceiling_mb)):
+        baseline, peak, elapsed, outcome, admission, stats = run(ceiling, hold)
+        growth = (peak - baseline) / MB
+        print(f"\n🔎 {label}:")
+        print(f"   峰值RSS 高于基线 {growth:.0f}MB"
+              f"{'（超过上限）' if growth > ceiling_mb else ''}，总耗时 {elapsed:.2f}s")
+        if ceiling:
+            print(f"   放行 {admission['admitted']} 个，等待 {admission['deferred']} 次"
+                  f"（共 {admission['deferred_seconds']:.2f}s），拒绝: {', '.join(outcome['rejected']) or '无'}")
+        else:
+            print(f"   全部 {len(DOCUMENTS)} 个文档同时执行")
+
+    print("\n🧠 按文件类型和阶段的峰值内存（最后一轮）:")
+    for file_type, stages in stats['by_file_type'].items():
+        for stage, entry in stages.items():
+            print(f"   {file_type:5s} {stage:12s} 次数 {entry['count']}  平均 {entry['avg_peak_mb']:.0f}MB  "
+                  f"最大 {entry['max_peak_mb']:.0f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近重复检测基准
+
+模拟上传流：若干份基础规格书，每份有多个只改了日期/经销商页脚/个别参数的变体，
+再混入互不相关的文档。按上传顺序查询并登记索引，统计近重复命中率、
+可避免的大模型调用次数、误命中数以及每份文档的指纹/查询耗时。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_near_duplicate.py [基础文档数] [每份变体数] [无关文档数]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+from src.services.near_duplicate_index import NearDuplicateIndex, compute_fingerprint
+
+PARAMS = ['额定电压', '额定电流', '额定功率', '额定频率', '测量精度', '工作温度', '防护等级',
+          '绝缘电阻', '输出电压', '响应时间', '分辨率', '重量', '外形尺寸', '通信接口']
+
+
+def base_document(doc_id, rng):
+    lines = [f'产品型号 MODEL-{doc_id:04d} 技术规格书']
+    for i in range(rng.randint(60, 160)):
+        param = rng.choice(PARAMS)
+        lines.append(f'{param}{i}: {rng.randint(1, 999)}{rng.choice(["V", "A", "W", "Hz", "ms", "kg"])}')
+    lines += [f'功能说明 {doc_id}-{i}: ' + ''.join(rng.choice('保护测试装置继电电压电流') for _ in range(20))
+              for i in range(rng.randint(20, 60))]
+    return lines
+
+
+def variant(lines, rng):
+    lines = list(lines)
+    lines.insert(1, f'发布日期: 2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}')
+    lines.append(f'经销商: 第{rng.randint(1, 99)}经销处 电话 {rng.randint(10000000, 99999999)}')
+    for _ in range(rng.randint(0, 2)):
+        idx = rng.randrange(1, len(lines))
+        lines[idx] = lines[idx].split(':')[0] + f': {rng.randint(1, 999)}V'
+    return lines
+
+
+def main():
+    bases = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    variants_per_base = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    unrelated = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    rng = random.Random(42)
+
+    uploads = []
+    for doc_id in range(bases):
+        lines = base_document(doc_id, rng)
+        uploads.append((doc_id, lines))
+        uploads += [(doc_id, variant(lines, rng)) for _ in range(variants_per_base)]
+    uploads += [(bases + i, base_document(bases + i, rng)) for i in range(unrelated)]
+    rng.shuffle(uploads)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = NearDuplicateIndex(db_path=os.path.join(tmp, 'near_dup.sqlite3'), enabled=True)
+        record_family = {}
+        seen_families = set()
+        hits = false_hits = missed = 0
+        fingerprint_time = lookup_time = 0.0
+
+        for record_id, (family, lines) in enumerate(uploads, start=1):
+            start = time.perf_counter()
+            fingerprint = compute_fingerprint('\n'.join(lines))
+            fingerprint_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            match = index.find(fingerprint, user_id=1)
+            lookup_time += time.perf_counter() - start
+
+            if match:
+                hits += 1
+                if record_family[match['record_id']] != family:
+                    false_hits += 1
+            elif family in seen_families:
+                missed += 1
+
+            index.add(record_id, fingerprint, user_id=1)
+            record_family[record_id] = family
+            seen_families.add(family)
+
+        total = len(uploads)
+        reusable = total - len(seen_families)
+        print(f"📄 上传文档: {total} (基础 {bases} x {variants_per_base} 变体, 无关 {unrelated})")
+        print(f"🎯 近重复命中: {hits}/{total} (命中率 {hits / total:.1%}), 可复用上限 {reusable}")
+        print(f"🤖 避免的大模型调用: {hits - false_hits}, 漏检 {missed}, 误命中 {false_hits}")
+        print(f"⏱️ 指纹 {fingerprint_time / total * 1000:.2f} ms/文档, 查询 {lookup_time / total * 1000:.2f} ms/文档")
+
+
+if __name__ == '__main__':
+    main()
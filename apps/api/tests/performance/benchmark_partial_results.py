@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析中间结果基准
+
+模拟大模型两层调用的典型耗时（基础识别约4s、详细提取约30s，按1/20缩放），
+用进度回调记录每个中间结果分区首次可用的时间，比较“首个可用字段”时间与完整结果时间。
+不发布中间结果时，客户端只能在分析结束后拿到任何字段，即首个可用字段时间等于完成时间。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_partial_results.py [文档数]
+"""
+import io
+import os
+import sys
+import time
+import statistics
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+from werkzeug.datastructures import FileStorage
+
+from src.services.ai_analyzer import AIAnalyzer
+from src.services.partial_results import PARTIAL_SECTIONS
+
+SCALE = 0.05
+BASIC_LATENCY = 4.0 * SCALE
+DETAIL_LATENCY = 30.0 * SCALE
+
+
+def basic_identification(document_content, document_name=''):
+    time.sleep(BASIC_LATENCY)
+    return {'basic_info': {'name': '继电保护测试仪', 'code': document_name.split('.')[0]},
+            'confidence': {'basic_info': 0.9, 'overall': 0.9}}
+
+
+def detailed_extraction(document_content, document_name, basic_info):
+    time.sleep(DETAIL_LATENCY)
+    specs = {}
+    for line in document_content.split('\n'):
+        if ':' in line:
+            name, value = line.split(':', 1)
+            specs[name.strip()] = {'value': value.strip(), 'unit': '', 'description': ''}
+    return {'basic_info': basic_info['basic_info'], 'specifications': specs,
+            'confidence': {'basic_info': 0.9, 'specifications': 0.8, 'overall': 0.85}}
+
+
+def build_upload(index):
+    lines = [f'产品型号: RT-{index:03d}', '额定电压: 220V', '额定电流: 5A', '工作温度: -20~60℃',
+             '| 参数 | 数值 |', '| 输出功率 | 300VA |', '| 精度等级 | 0.2级 |']
+    return FileStorage(stream=io.BytesIO('\n'.join(lines).encode('utf-8')),
+                       filename=f'RT-{index:03d}.txt', content_type='text/plain')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    analyzer = AIAnalyzer()
+    analyzer.document_processor.extraction_cache.enabled = False
+    client = analyzer.ai_client
+
+    first_field, section_times, complete = [], {section: [] for section in PARTIAL_SECTIONS}, []
+    with patch('src.services.ai_analyzer.near_duplicate_index.find', return_value=None), \
+            patch.object(client, 'is_available', return_value=True), \
+            patch.object(client, '_basic_product_identification', side_effect=basic_identification), \
+            patch.object(client, '_detailed_information_extraction', side_effect=detailed_extraction):
+        for index in range(documents):
+            seen = {}
+            started = time.perf_counter()
+
+            def on_event(event):
+                if event['type'] == 'partial_result':
+                    seen.setdefault(event['section'], time.perf_counter() - started)
+
+            result = analyzer.analyze_product_document(build_upload(index), progress_callback=on_event)
+            complete.append(time.perf_counter() - started)
+            assert result['success'], result.get('error')
+            first_field.append(min(seen.values()))
+            for section, elapsed in seen.items():
+                section_times[section].append(elapsed)
+
+    print(f"📊 {documents} 个文档, 大模型基础识别 {BASIC_LATENCY:.2f}s + 详细提取 {DETAIL_LATENCY:.2f}s")
+    for section in PARTIAL_SECTIONS:
+        times = section_times[section]
+        if times:
+            print(f"   {section:<22} 中位 {statistics.median(times) * 1000:7.0f}ms  p95 {percentile(times, 0.95) * 1000:7.0f}ms")
+    ttff, total = statistics.median(first_field), statistics.median(complete)
+    print(f"⏱️ 首个可用字段: 中位 {ttff * 1000:.0f}ms, p95 {percentile(first_field, 0.95) * 1000:.0f}ms")
+    print(f"⏱️ 完整结果:     中位 {total * 1000:.0f}ms, p95 {percentile(complete, 0.95) * 1000:.0f}ms")
+    print(f"✅ 首个可用字段提前 {(total - ttff) * 1000:.0f}ms（完成时间的 {ttff / total:.0%}；"
+          f"不发布中间结果时为 100%）")
+
+
+if __name__ == '__main__':
+    main()
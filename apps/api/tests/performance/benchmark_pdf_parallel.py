@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PDF分页并行提取加速比基准
+
+按页数 x 工作进程数测量 _extract_text_from_pdf 的耗时，与单进程顺序提取对比。
+进程池在计时前预热（首次启动和模块导入不计入）。基准忽略 PDF_PARALLEL_MIN_CPUS，
+用于在多核机器上测量加速比、确定该阈值。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_pdf_parallel.py [页数列表] [进程数列表]
+    例如: python tests/performance/benchmark_pdf_parallel.py 20,80,320 2,4
+"""
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'unit', 'services')))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+from werkzeug.datastructures import FileStorage
+
+from src.services.document_processor import DocumentProcessor
+from test_document_processor import build_text_pdf
+
+
+def extract(processor, data):
+    file = FileStorage(stream=io.BytesIO(data), filename='manual.pdf', content_type='application/pdf')
+    start = time.perf_counter()
+    processor._extract_text_from_pdf(file)
+    return time.perf_counter() - start
+
+
+def main():
+    page_counts = [int(x) for x in (sys.argv[1] if len(sys.argv) > 1 else '20,80,320').split(',')]
+    worker_counts = [int(x) for x in (sys.argv[2] if len(sys.argv) > 2 else '2,4').split(',')]
+
+    print(f"🖥️ CPU核数: {os.cpu_count()}，启用并行的最少核数: {DocumentProcessor.PDF_PARALLEL_MIN_CPUS}")
+    header = f"{'页数':>6} {'顺序(s)':>9}" + ''.join(f" {f'{w}进程(s)':>10} {'加速比':>6}" for w in worker_counts)
+    print(header)
+
+    sequential = DocumentProcessor()
+    sequential.PDF_PARALLEL_WORKERS = 1
+
+    for pages in page_counts:
+        data = build_text_pdf(pages)
+        base = extract(sequential, data)
+        row = f"{pages:>6} {base:>9.2f}"
+        for workers in worker_counts:
+            # 进程池按类属性确定大小，切换进程数时重建
+            DocumentProcessor._reset_pdf_executor()
+            DocumentProcessor.PDF_PARALLEL_WORKERS = workers
+            processor = DocumentProcessor()
+            processor.PDF_PARALLEL_MIN_PAGES = 1
+            processor.PDF_PARALLEL_MIN_CPUS = 1
+            extract(processor, build_text_pdf(workers * 2, lines_per_page=1))  # 预热进程池
+            elapsed = extract(processor, data)
+            row += f" {elapsed:>10.2f} {base / elapsed:>5.2f}x"
+        print(row)
+    DocumentProcessor._reset_pdf_executor()
+
+
+if __name__ == '__main__':
+    main()
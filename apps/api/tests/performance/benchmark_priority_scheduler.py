@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI请求调度负载测试
+
+一个用户以超过处理能力的速率持续提交低优先级请求使队列饱和，另一个用户周期性提交
+紧急请求，比较先进先出队列与优先级公平调度队列下各优先级的排队等待分位数和被拒绝数。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_priority_scheduler.py [持续秒数] [单请求处理秒数] [工作线程数]
+"""
+import os
+import sys
+import time
+import threading
+from queue import Queue, Full
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+from src.middleware.ai_service_manager import AIServiceManager, RequestContext
+from src.middleware.request_scheduler import FairPriorityQueue
+from src.services.analysis_tracing import LatencyHistogram
+
+LOW, URGENT = 1, 10
+
+
+class FifoQueue(FairPriorityQueue):
+    """原先的先进先出有界队列（满时拒绝新请求），用于对比"""
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize=maxsize)
+        self._fifo = Queue(maxsize=maxsize)
+
+    def put(self, context):
+        try:
+            self._fifo.put(context, block=False)
+            return True, None
+        except Full:
+            priority = self.normalize_priority(context.priority)
+            self.shed_counts[priority] = self.shed_counts.get(priority, 0) + 1
+            return False, None
+
+    def get(self, timeout=None):
+        context = self._fifo.get(timeout=timeout)
+        with self._condition:
+            self._record_wait(context)
+        return context
+
+    def qsize(self):
+        return self._fifo.qsize()
+
+
+def run(queue_factory, label, duration, service_time, workers):
+    manager = AIServiceManager(max_concurrent_requests=workers, queue_size=50)
+    manager.request_queue = queue_factory()
+    manager.degradation_thresholds.update(queue_size_critical=10 ** 9, queue_size_warning=10 ** 9)
+    time.sleep(1.1)  # 等工作线程结束在原队列上的阻塞等待（超时1秒），切换到新队列
+
+    def work(ctx):
+        time.sleep(service_time)
+        return True
+
+    stop = threading.Event()
+
+    def submitter(user_id, priority, interval):
+        seq = 0
+        while not stop.is_set():
+            seq += 1
+            context = RequestContext(request_id=f'{user_id}-{seq}', user_id=user_id, priority=priority,
+                                     timeout=600.0, created_at=time.time(), file_size=0,
+                                     file_type='text/plain', callback=work)
+            manager.submit_analysis_request(context)
+            time.sleep(interval)
+
+    capacity = workers / service_time
+    threads = [
+        threading.Thread(target=submitter, args=('bulk', LOW, 1 / (capacity * 1.5))),
+        threading.Thread(target=submitter, args=('ops', URGENT, 0.25)),
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    manager.shutdown()
+
+    stats = manager.request_queue.get_wait_stats()
+    print(f"\n🔎 {label}")
+    for priority, name in ((URGENT, 'URGENT'), (LOW, 'LOW')):
+        data = stats.get(str(priority), LatencyHistogram().snapshot())
+        print(f"   {name:<6} 出队 {data['count']:5d}  拒绝/淘汰 {data.get('shed', 0):5d}  "
+              f"排队等待 p50 {data['p50'] * 1000:8.1f}ms  p95 {data['p95'] * 1000:8.1f}ms  "
+              f"p99 {data['p99'] * 1000:8.1f}ms")
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 8.0
+    service_time = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    print(f"📊 {workers} 个工作线程，单请求 {service_time * 1000:.0f}ms，低优先级以1.5倍处理能力提交，"
+          f"紧急请求每250ms一个，持续 {duration:.0f}s，队列容量50")
+    run(lambda: FifoQueue(maxsize=50), '先进先出队列', duration, service_time, workers)
+    run(lambda: FairPriorityQueue(maxsize=50), '优先级公平调度队列', duration, service_time, workers)
+
+
+if __name__ == '__main__':
+    main()
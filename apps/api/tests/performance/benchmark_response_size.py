@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析历史响应大小与序列化耗时基准
+
+构造带原始文本、质量验证报告（移除条目明细）和数十项规格的分析记录，比较一页历史记录在
+原先的完整字段 + 标准库JSON编码器 + 不压缩，与默认精简字段 + orjson + gzip/brotli 下的
+传输字节数和序列化耗时（含 to_dict）。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_response_size.py [每页条数] [轮数]
+"""
+import os
+import sys
+import gzip
+import time
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+from flask.json.provider import DefaultJSONProvider
+
+
+def build_record(AIAnalysisRecord, index):
+    specs = {f'规格参数{i}': {'value': f'{i * 10}V', 'unit': 'V', 'description': f'第{i}项技术参数说明'}
+             for i in range(60)}
+    removed = [{'name': f'PAGE {i}', 'reason': 'format_noise', 'pattern': r'^PAGE\s*\d+$'} for i in range(120)]
+    return AIAnalysisRecord(
+        document_name=f'继电保护测试仪说明书-{index}.docx', document_type='docx', document_size=850000,
+        original_text=('额定电压: 220V 额定电流: 5A 工作温度: -20~60℃ 精度等级: 0.2级。' * 600),
+        text_length=24000, word_count=3000, user_id=1, status='completed', success=True,
+        extracted_data={'basic_info': {'name': '继电保护测试仪', 'code': f'RT-{index:04d}'}, 'specifications': specs},
+        confidence_scores={'basic_info': 0.9, 'specifications': 0.82, 'overall': 0.86},
+        quality_validation_report={'original_specs_count': 180, 'noise_removed_count': 120,
+                                   'invalid_removed_count': 0, 'final_specs_count': 60, 'removed_specs': removed},
+        data_quality_score=0.78, analysis_summary=f'Product: 继电保护测试仪 | Model: RT-{index:04d}'
+    )
+
+
+def measure(app, provider, records, include, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        body = provider.dumps({'success': True, 'records': [r.to_dict(include=include) for r in records]})
+    elapsed = (time.perf_counter() - started) / rounds
+    return body.encode('utf-8'), elapsed
+
+
+def main():
+    per_page = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    from app import create_app
+    from src.models import db
+    from src.models.ai_analysis import AIAnalysisRecord
+    from src.middleware.response_encoding import FastJSONProvider, ORJSON_AVAILABLE, BROTLI_AVAILABLE
+
+    app = create_app('development')
+    try:
+        with app.app_context():
+            db.session.add_all([build_record(AIAnalysisRecord, i) for i in range(per_page)])
+            db.session.commit()
+            records = AIAnalysisRecord.query.order_by(AIAnalysisRecord.id).limit(per_page).all()
+
+            before, before_time = measure(app, DefaultJSONProvider(app), records, None, rounds)
+            after_provider = FastJSONProvider(app) if ORJSON_AVAILABLE else DefaultJSONProvider(app)
+            after, after_time = measure(app, after_provider, records, frozenset(), rounds)
+
+        print(f"📊 历史记录一页 {per_page} 条（orjson {'已' if ORJSON_AVAILABLE else '未'}安装，"
+              f"brotli {'已' if BROTLI_AVAILABLE else '未'}安装）")
+        print(f"   原先  完整字段+标准库JSON: {len(before) / 1024:8.1f} KB, 序列化 {before_time * 1000:6.1f}ms")
+        print(f"   现在  精简字段+{'orjson' if ORJSON_AVAILABLE else '标准库JSON'}: "
+              f"{len(after) / 1024:8.1f} KB, 序列化 {after_time * 1000:6.1f}ms")
+        print(f"   现在  +gzip:                {len(gzip.compress(after, 6)) / 1024:8.1f} KB")
+        if BROTLI_AVAILABLE:
+            import brotli
+            print(f"   现在  +brotli:              {len(brotli.compress(after, quality=5)) / 1024:8.1f} KB")
+        print(f"   （完整字段+gzip:             {len(gzip.compress(before, 6)) / 1024:8.1f} KB）")
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
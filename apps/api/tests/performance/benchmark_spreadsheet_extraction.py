@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+电子表格提取性能基准
+
+生成大型价格表XLSX，分别在独立子进程中运行：
+  full     - 完整加载对象模型（非只读）后拼接全部文本
+  legacy   - 原实现：只读模式但读取全部行，字符串累加
+  stream   - 流式提取：达到文本预算即停止，同时产出结构化行
+报告耗时与提取期间的峰值RSS增量（后台线程每10ms采样一次VmRSS）。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_spreadsheet_extraction.py [行数]
+"""
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+
+def build_price_list(path, rows):
+    from openpyxl import Workbook
+    # 使用常规模式写入，保证文件带有<dimension>元素（与Excel生成的文件一致）
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = '价格表'
+    sheet.append(['物料编码', '产品名称', '型号', '规格', '单位', '单价', '库存', '备注'])
+    for i in range(rows):
+        sheet.append([f'M{i:08d}', '继电保护测试仪', f'A{i % 500}-{i % 7}', '220V/50Hz 0.2级',
+                      '台', 1000 + i % 9000, i % 300, None if i % 3 else '含税价'])
+    workbook.save(path)
+
+
+def run_full(path):
+    from openpyxl import load_workbook
+    workbook = load_workbook(path)
+    text = ""
+    for sheet in workbook.worksheets:
+        for row in sheet.iter_rows(values_only=True):
+            cells = [str(c) for c in row if c is not None]
+            if cells:
+                text += "\t".join(cells) + "\n"
+    return len(text)
+
+
+def run_legacy(path):
+    from openpyxl import load_workbook
+    with open(path, 'rb') as f:
+        workbook = load_workbook(io.BytesIO(f.read()), read_only=True, data_only=True)
+    text = ""
+    for name in workbook.sheetnames:
+        text += f"=== Sheet: {name} ===\n"
+        for row in workbook[name].iter_rows(values_only=True):
+            cells = [str(c) for c in row if c is not None]
+            if cells:
+                text += "\t".join(cells) + "\n"
+        text += "\n"
+    workbook.close()
+    return len(text)
+
+
+def run_stream(path):
+    from werkzeug.datastructures import FileStorage
+    from src.services.document_processor import DocumentProcessor
+    processor = DocumentProcessor()
+    with open(path, 'rb') as f:
+        upload = FileStorage(stream=f, filename='prices.xlsx')
+        text, sheets = processor._extract_spreadsheet(upload, 'xlsx')
+    return len(text)
+
+
+def current_rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def run_mode(mode, path):
+    runner = {'full': run_full, 'legacy': run_legacy, 'stream': run_stream}[mode]
+    # 预先导入，只统计提取本身
+    import openpyxl  # noqa: F401
+    from werkzeug.datastructures import FileStorage  # noqa: F401
+    from src.services.document_processor import DocumentProcessor  # noqa: F401
+    baseline = current_rss_kb()
+    peak = [baseline]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.01):
+            peak[0] = max(peak[0], current_rss_kb())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    chars = runner(path)
+    elapsed = time.perf_counter() - start
+    peak[0] = max(peak[0], current_rss_kb())
+    done.set()
+    sampler.join()
+    print(f"{elapsed:.2f} {(peak[0] - baseline) / 1024:.1f} {chars}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--mode':
+        run_mode(sys.argv[2], sys.argv[3])
+        return
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as f:
+        path = f.name
+    try:
+        build_price_list(path, rows)
+        print(f"📊 价格表: {rows}行, 文件大小 {os.path.getsize(path) / 1024 / 1024:.1f}MB")
+        labels = {'full': '完整对象模型', 'legacy': '原实现(只读全量)', 'stream': '流式+预算停止'}
+        for mode in ('full', 'legacy', 'stream'):
+            output = subprocess.run([sys.executable, __file__, '--mode', mode, path],
+                                    capture_output=True, text=True, check=True).stdout.split()
+            elapsed, rss, chars = output[-3:]
+            print(f"   {labels[mode]:<14} 耗时 {elapsed}s, 峰值RSS增量 {rss}MB, 文本 {chars} 字符")
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
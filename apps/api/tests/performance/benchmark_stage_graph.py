@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析阶段图基准
+
+用带规格表的文本文档跑完整的 AIAnalyzer 流水线，大模型调用和个性化提示用固定延迟模拟，
+比较阶段图执行的端到端耗时与各阶段耗时之和（即原先严格顺序执行的耗时），并输出关键路径。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_stage_graph.py [大模型延迟秒] [个性化延迟秒] [规格行数] [轮数]
+"""
+import io
+import os
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+from werkzeug.datastructures import FileStorage
+from src.services.ai_analyzer import AIAnalyzer
+
+
+def build_document(rows):
+    lines = [f'参数{i}: {i % 400 + 1}V' for i in range(rows)]
+    lines += [f'功能说明{i}: 支持过流、速断、零序、距离保护测试' for i in range(rows // 4)]
+    return '\n'.join(lines).encode('utf-8')
+
+
+def main():
+    llm_delay = float(sys.argv[1]) if len(sys.argv) > 1 else 1.5
+    hints_delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.4
+    rows = int(sys.argv[3]) if len(sys.argv) > 3 else 3000
+    rounds = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+
+    content = build_document(rows)
+    analyzer = AIAnalyzer()
+    analyzer.document_processor.extraction_cache.enabled = False
+
+    def fake_llm(document_content, document_name):
+        time.sleep(llm_delay)
+        return {'basic_info': {'name': '继电保护测试仪', 'code': 'RT-3000'},
+                'specifications': {'参数1': {'value': '2V', 'unit': 'V', 'description': ''}},
+                'confidence': {'overall': 0.8}}
+
+    def fake_hints(**kwargs):
+        time.sleep(hints_delay)
+        return {'personalized_hints': [], 'pattern_context': None}
+
+    print(f"📊 文档 {len(content) / 1024:.0f}KB, 模拟大模型 {llm_delay}s, 个性化 {hints_delay}s, {rounds} 轮")
+    with patch('src.services.ai_analyzer.near_duplicate_index.find', return_value=None), \
+            patch.object(analyzer.ai_client, 'analyze_product_document', side_effect=fake_llm), \
+            patch.object(analyzer.learning_engine, 'get_personalized_hints', side_effect=fake_hints):
+        for round_no in range(1, rounds + 1):
+            upload = FileStorage(stream=io.BytesIO(content), filename='spec.txt', content_type='text/plain')
+            started = time.perf_counter()
+            result = analyzer.analyze_product_document(upload, user_id=1)
+            wall = time.perf_counter() - started
+            assert result['success'], result.get('error')
+
+            graph = result['debug_info']['stage_graph']
+            sequential = sum(stage['duration'] for stage in graph['stages'].values())
+            print(f"   第{round_no}轮 端到端 {wall:.2f}s | 阶段耗时之和(顺序执行) {sequential:.2f}s | "
+                  f"节省 {sequential - wall:.2f}s")
+            print(f"      关键路径 {' -> '.join(graph['critical_path'])} ({graph['critical_path_latency']:.2f}s)")
+            for name, stage in graph['stages'].items():
+                print(f"      {name:<26} 开始 {stage['start']:.2f}s  耗时 {stage['duration']:.2f}s  {stage['status']}")
+
+
+if __name__ == '__main__':
+    main()
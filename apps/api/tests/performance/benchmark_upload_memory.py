@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上传处理峰值内存基准
+
+对比旧流程（路由、分析器、文档处理器各自 read() 一份完整副本）与
+SpooledUpload 共享只读缓冲区流程在并发请求下的峰值RSS。
+每种模式在独立子进程中运行，避免相互影响。
+用法（在 apps/api 目录下）:
+    python tests/performance/benchmark_upload_memory.py [文件MB] [并发数]
+"""
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+
+def _disk_upload(path):
+    """模拟Werkzeug对大文件的处理：上传内容已落到临时文件"""
+    from werkzeug.datastructures import FileStorage
+    stream = open(path, 'rb')
+    return FileStorage(stream=stream, filename='large.pdf', content_type='application/pdf')
+
+
+def _consume(stream):
+    """模拟解析库分块读取"""
+    while stream.read(64 * 1024):
+        pass
+
+
+def legacy_request(path, max_size):
+    import hashlib
+    file = _disk_upload(path)
+    data = file.read()                       # 路由：读取获取大小
+    file_size = len(data)
+    content_hash = hashlib.sha256(data).hexdigest()
+    file.seek(0)
+    analyzer_copy = file.read()              # 分析器：再次读取获取大小
+    file.seek(0)
+    parser_input = io.BytesIO(file.read())   # 文档处理器：第三份副本交给解析库
+    _consume(parser_input)
+    file.close()
+    return file_size, content_hash, len(analyzer_copy)
+
+
+def spooled_request(path, max_size):
+    from src.utils.spooled_upload import SpooledUpload
+    from src.services.document_processor import DocumentProcessor
+    processor = DocumentProcessor()
+    with SpooledUpload.from_file_storage(_disk_upload(path), max_size=max_size) as upload:
+        shared = upload.as_file_storage()
+        processor._get_file_size(shared)
+        _consume(processor._binary_stream(shared))
+        return upload.size, upload.content_hash
+
+
+def run_mode(mode, path, concurrency):
+    worker = legacy_request if mode == 'legacy' else spooled_request
+    max_size = 16 * 1024 * 1024
+    # 先完成模块导入，只统计请求处理本身的内存
+    import hashlib  # noqa: F401
+    from src.utils.spooled_upload import SpooledUpload  # noqa: F401
+    from src.services.document_processor import DocumentProcessor  # noqa: F401
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    threads = [threading.Thread(target=worker, args=(path, max_size)) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{(peak - baseline) / 1024:.1f}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--mode':
+        run_mode(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        return
+
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as f:
+        f.write(os.urandom(size_mb * 1024 * 1024))
+        path = f.name
+
+    try:
+        print(f"📄 文件大小: {size_mb}MB, 并发请求: {concurrency}")
+        results = {}
+        for mode in ('legacy', 'spooled'):
+            output = subprocess.run(
+                [sys.executable, __file__, '--mode', mode, path, str(concurrency)],
+                capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1]
+            results[mode] = float(output)
+        print(f"🐢 旧流程峰值RSS增量: {results['legacy']:.1f} MB ({results['legacy'] / concurrency:.1f} MB/请求)")
+        print(f"🚀 共享缓冲峰值RSS增量: {results['spooled']:.1f} MB ({results['spooled'] / concurrency:.1f} MB/请求)")
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+提交接口幂等键单元测试（Idempotency-Key）
+"""
+import io
+import time
+import uuid
+import threading
+import pytest
+from unittest.mock import patch
+
+from src.models import AIAnalysisRecord
+from src.middleware.idempotency import idempotency_store
+
+
+def fake_analyze(file, user_id=None, content_hash=None, progress_callback=None):
+    time.sleep(0.3)
+    return {
+        'success': True,
+        'document_info': {'filename': file.filename, 'type': 'txt', 'size': 64},
+        'extracted_data': {'basic_info': {'name': '智能电表', 'code': 'DDS-1'}, 'specifications': {}},
+        'confidence_scores': {'overall': 0.8}
+    }
+
+
+def upload_data(text='额定电压: 220V'):
+    return {'document': (io.BytesIO(text.encode('utf-8')), 'spec.txt')}
+
+
+def post_analysis(client, headers, key, text='额定电压: 220V', query=''):
+    return client.post(f'/api/v1/ai-analysis/analyze-document{query}', data=upload_data(text),
+                       headers={**headers, 'Idempotency-Key': key}, content_type='multipart/form-data')
+
+
+@pytest.fixture
+def no_queue_simulation():
+    """同步分析在请求线程中执行；不让AI服务管理器的工作线程模拟处理这些请求（模拟处理会随机失败）"""
+    with patch('src.routes.ai_analysis.ai_service_manager.submit_analysis_request', return_value=True):
+        yield
+
+
+class TestIdempotencyKeys:
+    """测试分析提交的幂等重放、并发合并和键冲突"""
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    def test_retry_replays_without_rerunning(self, app, client, engineer_auth_headers, no_queue_simulation):
+        """测试同一个键的重试直接返回原结果，不再分析、不创建重复记录"""
+        key = uuid.uuid4().hex
+        with patch('src.routes.ai_analysis.ai_analyzer.analyze_product_document',
+                   side_effect=fake_analyze) as analyze:
+            with app.app_context():
+                records_before = AIAnalysisRecord.query.count()
+            first = post_analysis(client, engineer_auth_headers, key)
+            retry = post_analysis(client, engineer_auth_headers, key)
+
+        assert first.status_code == retry.status_code == 200
+        assert analyze.call_count == 1
+        assert retry.headers['Idempotent-Replayed'] == 'true'
+        assert 'Idempotent-Replayed' not in first.headers
+        assert retry.get_json()['analysis_id'] == first.get_json()['analysis_id']
+        with app.app_context():
+            assert AIAnalysisRecord.query.count() == records_before + 1
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    def test_concurrent_repeats_coalesce(self, app, engineer_auth_headers, no_queue_simulation):
+        """测试原请求执行中到达的重复提交等待同一次执行，而不是再分析一次"""
+        key = uuid.uuid4().hex
+        responses, errors = [], []
+        idempotency_store.reset_stats()
+
+        def submit():
+            try:
+                responses.append(post_analysis(app.test_client(), engineer_auth_headers, key))
+            except Exception as e:
+                errors.append(repr(e))
+
+        with patch('src.routes.ai_analysis.ai_analyzer.analyze_product_document',
+                   side_effect=fake_analyze) as analyze:
+            threads = [threading.Thread(target=submit) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+                time.sleep(0.02)
+            for thread in threads:
+                thread.join(10)
+
+        assert not errors, errors
+        assert analyze.call_count == 1
+        assert [response.status_code for response in responses] == [200] * 4
+        assert len({response.get_json()['analysis_id'] for response in responses}) == 1
+        assert sum('Idempotent-Replayed' in response.headers for response in responses) == 3
+        assert idempotency_store.stats['coalesced'] + idempotency_store.stats['replayed'] == 3
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    def test_key_reused_with_different_body_rejected(self, client, engineer_auth_headers, no_queue_simulation):
+        """测试同一个键携带不同的文件内容返回422"""
+        key = uuid.uuid4().hex
+        with patch('src.routes.ai_analysis.ai_analyzer.analyze_product_document', side_effect=fake_analyze):
+            assert post_analysis(client, engineer_auth_headers, key).status_code == 200
+            response = post_analysis(client, engineer_auth_headers, key, text='额定电压: 380V')
+        assert response.status_code == 422
+        assert response.get_json()['error_code'] == 'IDEMPOTENCY_KEY_REUSED'
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    def test_failed_execution_releases_key(self, client, engineer_auth_headers, no_queue_simulation):
+        """测试原请求以5xx结束时释放键，重试重新执行"""
+        key = uuid.uuid4().hex
+        calls = []
+
+        def flaky_analyze(file, **kwargs):
+            calls.append(file.filename)
+            if len(calls) == 1:
+                raise RuntimeError('zhipu down')
+            return fake_analyze(file, **kwargs)
+
+        with patch('src.routes.ai_analysis.ai_analyzer.analyze_product_document', side_effect=flaky_analyze):
+            assert post_analysis(client, engineer_auth_headers, key).status_code == 500
+            retry = post_analysis(client, engineer_auth_headers, key)
+        assert retry.status_code == 200
+        assert 'Idempotent-Replayed' not in retry.headers
+        assert len(calls) == 2
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    def test_async_submission_replays_job(self, app, client, engineer_auth_headers):
+        """测试异步提交的重试返回同一个任务，并计入被吸收的重复提交"""
+        key = uuid.uuid4().hex
+        with patch('src.routes.ai_analysis.ai_analyzer.analyze_product_document', side_effect=fake_analyze):
+            first = post_analysis(client, engineer_auth_headers, key, query='?async=true')
+            retry = post_analysis(client, engineer_auth_headers, key, query='?async=true')
+
+        assert first.status_code == retry.status_code == 202
+        assert retry.get_json()['job_id'] == first.get_json()['job_id']
+        assert retry.headers['Location'] == first.headers['Location']
+
+        with app.app_context():
+            stats = idempotency_store.get_stats()
+        scope = stats['by_scope']['ai_analysis.analyze_document']
+        assert scope['duplicates_absorbed'] >= 1
+        assert stats['duplicates_absorbed'] >= scope['duplicates_absorbed']
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI请求调度队列单元测试
+"""
+import time
+import threading
+import pytest
+from queue import Empty
+
+from src.middleware.request_scheduler import FairPriorityQueue
+from src.middleware.ai_service_manager import AIServiceManager, RequestContext
+
+
+def make_context(request_id, user_id='alice', priority=5, created_at=None, file_size=0, **kwargs):
+    return RequestContext(request_id=request_id, user_id=user_id, priority=priority, timeout=60.0,
+                          created_at=created_at if created_at is not None else time.time(),
+                          file_size=file_size, file_type='text/plain', **kwargs)
+
+
+def drain(queue):
+    order = []
+    while True:
+        try:
+            order.append(queue.get(timeout=0).request_id)
+        except Empty:
+            return order
+
+
+class TestFairPriorityQueue:
+    """测试FairPriorityQueue"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_higher_priority_served_first(self):
+        """测试高优先级请求排在已排队的低优先级请求之前"""
+        queue = FairPriorityQueue(maxsize=10)
+        now = time.time()
+        for i in range(3):
+            queue.put(make_context(f'low-{i}', user_id='bulk', priority=1, created_at=now))
+        queue.put(make_context('urgent', user_id='ops', priority=10, created_at=now + 1))
+
+        assert drain(queue)[0] == 'urgent'
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_users_interleaved_by_weight(self):
+        """测试同优先级下不同用户的请求交替出队，权重大的用户获得更多份额"""
+        queue = FairPriorityQueue(maxsize=20, default_service_time=1.0)
+        queue.set_user_weight('vip', 2.0)
+        now = time.time()
+        for i in range(4):
+            queue.put(make_context(f'bulk-{i}', user_id='bulk', created_at=now))
+        for i in range(4):
+            queue.put(make_context(f'vip-{i}', user_id='vip', created_at=now))
+        queue.put(make_context('other-0', user_id='other', created_at=now))
+
+        order = drain(queue)
+        assert order.index('other-0') <= 2
+        assert [r for r in order[:7] if r.startswith('vip')] == ['vip-0', 'vip-1', 'vip-2', 'vip-3']
+        assert order[-1] == 'bulk-3'
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_aging_prevents_starvation(self):
+        """测试等待足够久的低优先级请求排在新到达的高优先级请求之前"""
+        queue = FairPriorityQueue(maxsize=10, aging_interval=1.0)
+        now = time.time()
+        queue.put(make_context('old-low', user_id='a', priority=1, created_at=now - 10))
+        queue.put(make_context('new-high', user_id='b', priority=5, created_at=now))
+
+        assert drain(queue) == ['old-low', 'new-high']
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_full_queue_sheds_lowest_priority_oldest(self):
+        """测试队列已满时淘汰优先级最低中排队最久的请求，无可淘汰时拒绝新请求"""
+        queue = FairPriorityQueue(maxsize=3)
+        now = time.time()
+        queue.put(make_context('low-old', priority=2, created_at=now - 5))
+        queue.put(make_context('low-new', priority=2, created_at=now))
+        queue.put(make_context('mid', priority=5, created_at=now))
+
+        accepted, shed = queue.put(make_context('urgent', priority=9))
+        assert accepted and shed.request_id == 'low-old'
+
+        accepted, shed = queue.put(make_context('another-low', priority=2))
+        assert not accepted and shed is None
+        assert queue.qsize() == 3
+
+        stats = queue.get_wait_stats()
+        assert stats['2']['shed'] == 1 and stats['2']['rejected'] == 1 and stats['2']['queued'] == 1
+        assert stats['9']['rejected'] == 0
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_wait_histograms_per_priority(self):
+        """测试出队时按优先级记录排队等待时间"""
+        queue = FairPriorityQueue(maxsize=10)
+        queue.put(make_context('a', priority=8, created_at=time.time() - 2))
+        queue.put(make_context('b', priority=3, created_at=time.time() - 4))
+        drain(queue)
+
+        stats = queue.get_wait_stats()
+        assert stats['8']['count'] == 1 and 1.5 < stats['8']['p50'] < 2.5
+        assert stats['3']['count'] == 1 and stats['3']['p50'] > 3
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_get_blocks_until_put(self):
+        """测试空队列上 get 阻塞到有请求入队"""
+        queue = FairPriorityQueue(maxsize=2)
+        threading.Timer(0.05, lambda: queue.put(make_context('late'))).start()
+
+        assert queue.get(timeout=2).request_id == 'late'
+        with pytest.raises(Empty):
+            queue.get(timeout=0.01)
+
+
+class TestAIServiceManagerScheduling:
+    """测试AIServiceManager使用调度队列"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_shed_request_notified_and_urgent_runs(self):
+        """测试被淘汰的请求收到丢弃回调，紧急请求得到执行"""
+        manager = AIServiceManager(max_concurrent_requests=1, queue_size=2)
+        try:
+            gate = threading.Event()
+            executed, dropped = [], []
+
+            def run(ctx):
+                gate.wait(2)
+                executed.append(ctx.request_id)
+                return True
+
+            blocker = make_context('blocker', priority=5, callback=run)
+            assert manager.submit_analysis_request(blocker)
+            deadline = time.time() + 2
+            while manager.request_queue.qsize() and time.time() < deadline:
+                time.sleep(0.01)
+
+            for i in range(2):
+                assert manager.submit_analysis_request(make_context(
+                    f'low-{i}', priority=1, callback=run,
+                    on_expired=lambda ctx: dropped.append((ctx.request_id, ctx.drop_reason))))
+            assert manager.submit_analysis_request(make_context('urgent', priority=10, callback=run))
+            assert dropped == [('low-0', 'shed')]
+
+            gate.set()
+            deadline = time.time() + 3
+            while len(executed) < 3 and time.time() < deadline:
+                time.sleep(0.01)
+            assert executed == ['blocker', 'urgent', 'low-1']
+            assert '10' in manager.get_queue_status()['queue_wait_by_priority']
+        finally:
+            manager.shutdown()
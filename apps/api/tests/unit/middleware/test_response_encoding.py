@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响应编码（JSON序列化、压缩协商）单元测试
+"""
+import gzip
+import json
+import uuid
+import pytest
+from datetime import datetime, timezone
+from decimal import Decimal
+from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+from src.middleware.response_encoding import (
+    FastJSONProvider, init_response_encoding, ORJSON_AVAILABLE, BROTLI_AVAILABLE
+)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['RESPONSE_COMPRESSION_MIN_SIZE'] = 256
+    init_response_encoding(app)
+
+    @app.route('/big')
+    def big():
+        return jsonify({'records': [{'name': '继电保护测试仪', 'index': i} for i in range(100)]})
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    return app
+
+
+class TestResponseCompression:
+    """测试按 Accept-Encoding 协商压缩"""
+
+    @pytest.mark.unit
+    def test_gzip_negotiated_for_large_json(self, app):
+        """测试客户端接受gzip时压缩较大的JSON响应，内容不变"""
+        client = app.test_client()
+        plain = client.get('/big')
+        compressed = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+
+        assert 'Content-Encoding' not in plain.headers
+        assert compressed.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in compressed.headers['Vary']
+        assert int(compressed.headers['Content-Length']) < len(plain.data) / 3
+        assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
+
+    @pytest.mark.unit
+    def test_small_or_refused_not_compressed(self, app):
+        """测试小响应和客户端拒绝的编码不压缩"""
+        client = app.test_client()
+        assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+        refused = client.get('/big', headers={'Accept-Encoding': 'gzip;q=0, identity'})
+        assert 'Content-Encoding' not in refused.headers
+
+    @pytest.mark.unit
+    @pytest.mark.skipif(not BROTLI_AVAILABLE, reason='brotli 未安装')
+    def test_brotli_preferred(self, app):
+        """测试同时接受时优先使用brotli"""
+        response = app.test_client().get('/big', headers={'Accept-Encoding': 'gzip, br'})
+        assert response.headers['Content-Encoding'] == 'br'
+
+
+class TestFastJSONProvider:
+    """测试JSON序列化与默认编码器结果一致"""
+
+    @pytest.mark.unit
+    @pytest.mark.skipif(not ORJSON_AVAILABLE, reason='orjson 未安装')
+    def test_matches_default_provider(self):
+        """测试日期、Decimal、UUID、非字符串键和超大整数的序列化结果与默认编码器一致"""
+        app = Flask(__name__)
+        payload = {
+            'b': datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+            'a': Decimal('1.50'),
+            'id': uuid.UUID(int=7),
+            'codes': {2: '规格', 1: '型号'},
+            'huge': 2 ** 70,
+            'nested': [{'z': 1, 'y': None}]
+        }
+        fast, default = FastJSONProvider(app), DefaultJSONProvider(app)
+
+        assert json.loads(fast.dumps(payload)) == json.loads(default.dumps(payload))
+        assert fast.dumps({'b': 1, 'a': 2}) == '{"a":2,"b":1}'
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI分析同步请求截止时间路由单元测试
+"""
+import io
+import pytest
+from unittest.mock import patch
+
+from src.services.deadline import check_deadline
+from src.services.document_processor import DocumentProcessor
+
+
+class TestAnalyzeDocumentDeadline:
+    """测试同步分析超过请求截止时间时返回504"""
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    @pytest.mark.ai
+    def test_extractor_abort_returns_504(self, client, engineer_auth_headers, isolated_analysis_caches):
+        """测试提取器内部按截止时间中止时响应504 deadline_exceeded，而不是400"""
+        def ocr_extractor(self, file):
+            check_deadline('ocr_pass', required=5)
+            return '额定电压: 220V'
+
+        with patch.object(DocumentProcessor, '_extract_text_from_txt', ocr_extractor), \
+                patch('src.routes.ai_analysis.ai_analyzer.ai_client.analyze_product_document') as mock_llm:
+            response = client.post('/api/v1/ai-analysis/analyze-document',
+                                   data={'document': (io.BytesIO('额定电压: 220V'.encode('utf-8')), 'spec.txt')},
+                                   headers={**engineer_auth_headers, 'X-Request-Timeout': '2'},
+                                   content_type='multipart/form-data')
+
+        mock_llm.assert_not_called()
+        assert response.status_code == 504
+        data = response.get_json()
+        assert data['success'] is False
+        assert data['error_type'] == 'deadline_exceeded'
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI分析异步任务路由单元测试
+"""
+import io
+import time
+import threading
+import pytest
+from unittest.mock import patch
+
+STAGES = ('document_processing', 'ai_analysis', 'table_parsing',
+          'data_quality_validation', 'quality_assessment', 'data_postprocessing')
+
+
+def fake_analyze(file, user_id=None, content_hash=None, progress_callback=None):
+    """模拟分析器：按阶段发出进度事件后返回成功结果"""
+    events = [{'type': 'analysis_start', 'filename': file.filename}]
+    for stage in STAGES:
+        events.append({'type': 'stage_start', 'stage': stage})
+        events.append({'type': 'stage_end', 'stage': stage, 'duration': 0.01})
+    events.append({'type': 'analysis_end', 'success': True})
+    for event in events:
+        if progress_callback:
+            progress_callback(event)
+    return {
+        'success': True,
+        'document_info': {'filename': file.filename, 'type': 'txt', 'size': 64},
+        'extracted_data': {'basic_info': {'name': '智能电表', 'code': 'DDS-1'}, 'specifications': {}},
+        'confidence_scores': {'overall': 0.8},
+        'analysis_timestamp': '2026-01-01T00:00:00'
+    }
+
+
+def upload_data():
+    return {'document': (io.BytesIO('额定电压: 220V\n额定电流: 5A'.encode('utf-8')), 'spec.txt')}
+
+
+def wait_until_finished(client, job_id, headers, timeout=10):
+    deadline = time.time() + timeout
+    job = None
+    while time.time() < deadline:
+        response = client.get(f'/api/v1/ai-analysis/jobs/{job_id}?wait=2', headers=headers)
+        assert response.status_code == 200
+        job = response.get_json()['job']
+        if job['status'] in ('succeeded', 'failed'):
+            return job
+    return job
+
+
+class TestAsyncAnalysisJobs:
+    """测试异步分析任务：202提交、长轮询和SSE进度流"""
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    @pytest.mark.ai
+    def test_async_submit_returns_202_and_job_completes(self, client, engineer_auth_headers):
+        """测试异步模式立即返回202，任务结束后结果与同步响应一致"""
+        with patch('src.routes.ai_analysis.ai_analyzer.analyze_product_document', side_effect=fake_analyze):
+            response = client.post('/api/v1/ai-analysis/analyze-document?async=true',
+                                   data=upload_data(), headers=engineer_auth_headers,
+                                   content_type='multipart/form-data')
+            assert response.status_code == 202
+            data = response.get_json()
+            assert data['status'] == 'queued'
+            assert response.headers['Location'].endswith(f"/jobs/{data['job_id']}")
+            assert data['events_url'] == data['status_url'] + '/events'
+
+            job = wait_until_finished(client, data['job_id'], engineer_auth_headers)
+
+        assert job['status'] == 'succeeded'
+        assert job['progress'] == 100.0
+        assert job['status_code'] == 200
+        assert job['result']['analysis_id'] == job['analysis_id']
+        assert job['result']['extracted_data']['basic_info']['name'] == '智能电表'
+        types = [event['type'] for event in job['events']]
+        assert types[:2] == ['queued', 'running']
+        assert types[-1] == 'finished'
+        assert types.count('stage_end') == len(STAGES)
+        assert [event['seq'] for event in job['events']] == list(range(1, len(types) + 1))
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    @pytest.mark.ai
+    def test_async_jobs_use_dedicated_workers(self, client, engineer_auth_headers):
+        """测试异步任务在专用调度器中执行，不进入同步请求使用的AI服务管理器队列"""
+        from src.middleware.ai_service_manager import ai_service_manager, analysis_job_scheduler
+        with patch('src.routes.ai_analysis.ai_analyzer.analyze_product_document', side_effect=fake_analyze), \
+                patch.object(ai_service_manager, 'submit_analysis_request') as shared_submit:
+            response = client.post('/api/v1/ai-analysis/analyze-document?async=true',
+                                   data=upload_data(), headers=engineer_auth_headers,
+                                   content_type='multipart/form-data')
+            assert response.status_code == 202
+            data = response.get_json()
+            job = wait_until_finished(client, data['job_id'], engineer_auth_headers)
+
+        assert job['status'] == 'succeeded'
+        shared_submit.assert_not_called()
+        deadline = time.time() + 5  # 任务结束后工作线程才记录完成历史
+        completed = []
+        while not completed and time.time() < deadline:
+            completed = [entry for entry in list(analysis_job_scheduler.completed_requests)
+                         if entry['request_id'] == data['request_id']]
+            time.sleep(0.01)
+        assert len(completed) == 1 and completed[0]['success']
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    @pytest.mark.ai
+    def test_event_stream_resumes_from_last_event_id(self, client, engineer_auth_headers):
+        """测试SSE按序号推送事件、以done结束，并支持Last-Event-ID续传"""
+        with patch('src.routes.ai_analysis.ai_analyzer.analyze_product_document', side_effect=fake_analyze):
+            response = client.post('/api/v1/ai-analysis/analyze-document', query_string={'async': 'true'},
+                                   data=upload_data(), headers=engineer_auth_headers,
+                                   content_type='multipart/form-data')
+            job_id = response.get_json()['job_id']
+            wait_until_finished(client, job_id, engineer_auth_headers)
+
+        response = client.get(f'/api/v1/ai-analysis/jobs/{job_id}/events', headers=engineer_auth_headers)
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        body = response.get_data(as_text=True)
+        assert body.startswith('id: 1\nevent: queued\n')
+        assert body.count('event: stage_end') == len(STAGES)
+        assert body.rstrip().split('\n\n')[-1].startswith('event: done\ndata: ')
+
+        resumed = client.get(f'/api/v1/ai-analysis/jobs/{job_id}/events',
+                             headers={**engineer_auth_headers, 'Last-Event-ID': '3'})
+        resumed_body = resumed.get_data(as_text=True)
+        assert resumed_body.startswith('id: 4\n')
+        assert 'event: queued' not in resumed_body
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    @pytest.mark.ai
+    def test_unknown_job_returns_404(self, client, admin_auth_headers):
+        """测试不存在的任务返回404"""
+        response = client.get('/api/v1/ai-analysis/jobs/missing', headers=admin_auth_headers)
+        assert response.status_code == 404
+        response = client.get('/api/v1/ai-analysis/jobs/missing/events', headers=admin_auth_headers)
+        assert response.status_code == 404
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    @pytest.mark.ai
+    def test_partial_results_visible_before_completion(self, client, engineer_auth_headers):
+        """测试任务结束前即可轮询到中间结果，SSE的partial_result事件附带快照"""
+        release = threading.Event()
+
+        def slow_analyze(file, user_id=None, content_hash=None, progress_callback=None):
+            progress_callback({'type': 'partial_result', 'section': 'basic_info', 'elapsed': 0.5,
+                               'data': {'name': '智能电表', 'code': 'DDS-1'}})
+            release.wait(10)
+            progress_callback({'type': 'partial_result', 'section': 'specifications', 'elapsed': 4.0,
+                               'data': {'额定电压': {'value': '220V', 'unit': 'V', 'description': ''}}})
+            return fake_analyze(file, user_id, content_hash, progress_callback)
+
+        with patch('src.routes.ai_analysis.ai_analyzer.analyze_product_document', side_effect=slow_analyze):
+            response = client.post('/api/v1/ai-analysis/analyze-document?async=true',
+                                   data=upload_data(), headers=engineer_auth_headers,
+                                   content_type='multipart/form-data')
+            job_id = response.get_json()['job_id']
+            try:
+                job, since = None, 0
+                deadline = time.time() + 10
+                while time.time() < deadline:
+                    job = client.get(f'/api/v1/ai-analysis/jobs/{job_id}?wait=2',
+                                     headers=engineer_auth_headers).get_json()['job']
+                    if job['partial_result']:
+                        break
+                assert job['status'] == 'running'
+                assert job['partial_result'] == {'basic_info': {'name': '智能电表', 'code': 'DDS-1'}}
+                partial_event = [event for event in job['events'] if event['type'] == 'partial_result'][0]
+                assert 'data' not in partial_event and partial_event['section'] == 'basic_info'
+            finally:
+                release.set()
+            job = wait_until_finished(client, job_id, engineer_auth_headers)
+
+        assert job['status'] == 'succeeded'
+        assert 'partial_result' not in job
+
+        body = client.get(f'/api/v1/ai-analysis/jobs/{job_id}/events',
+                          headers=engineer_auth_headers).get_data(as_text=True)
+        assert body.count('event: partial_result') == 2
+        assert '"data": {"name": "智能电表", "code": "DDS-1"}' in body
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    @pytest.mark.ai
+    def test_cancel_stops_running_analysis(self, app, client, engineer_auth_headers, isolated_analysis_caches):
+        """测试取消执行中的任务：大模型调用立即结束，后续阶段不再执行，不保存分析记录"""
+        from src.models import AIAnalysisRecord
+        from src.routes.ai_analysis import ai_analyzer
+        from src.services.cancellation import cancellable_sleep
+        llm_started, llm_stopped = threading.Event(), threading.Event()
+
+        def slow_llm(document_content, document_name=''):
+            llm_started.set()
+            try:
+                cancellable_sleep(10, 'llm_attempt')
+            finally:
+                llm_stopped.set()
+
+        with app.app_context():
+            records_before = AIAnalysisRecord.query.count()
+        with patch.object(ai_analyzer.ai_client, 'analyze_product_document', side_effect=slow_llm):
+            spec = '产品型号: RT-3000\n额定电压: 220V\n额定电流: 5A\n工作温度: -20~60℃\n输出功率: 300VA'
+            response = client.post('/api/v1/ai-analysis/analyze-document?async=true',
+                                   data={'document': (io.BytesIO(spec.encode('utf-8')), 'rt3000.txt')},
+                                   headers=engineer_auth_headers, content_type='multipart/form-data')
+            job_id = response.get_json()['job_id']
+            assert llm_started.wait(10)
+
+            cancelled_at = time.monotonic()
+            response = client.post(f'/api/v1/ai-analysis/jobs/{job_id}/cancel',
+                                   json={'reason': '提交错了文件'}, headers=engineer_auth_headers)
+            assert response.status_code == 200
+            assert response.get_json()['job']['status'] == 'cancelled'
+            assert llm_stopped.wait(2)
+            assert time.monotonic() - cancelled_at < 2
+
+            time.sleep(0.3)  # 等待任务线程结束
+            job = client.get(f'/api/v1/ai-analysis/jobs/{job_id}', headers=engineer_auth_headers).get_json()['job']
+            again = client.post(f'/api/v1/ai-analysis/jobs/{job_id}/cancel', headers=engineer_auth_headers)
+
+        assert job['status'] == 'cancelled'
+        assert job['error_message'] == '提交错了文件'
+        types = [event['type'] for event in job['events']]
+        assert 'cancelled' in types and 'finished' not in types
+        assert not any(event.get('stage') == 'data_quality_validation' for event in job['events'])
+        assert again.status_code == 409
+        with app.app_context():
+            assert AIAnalysisRecord.query.count() == records_before
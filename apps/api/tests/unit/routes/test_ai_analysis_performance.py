@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI分析性能观测路由单元测试
+"""
+import pytest
+
+from src.services.analysis_tracing import analysis_tracer
+
+
+class TestStageLatencyEndpoint:
+    """测试分阶段延迟分位数接口"""
+
+    @pytest.fixture(autouse=True)
+    def clean_tracer(self):
+        analysis_tracer.reset()
+        yield
+        analysis_tracer.reset()
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    @pytest.mark.ai
+    def test_latency_by_stage_and_file_type(self, client, admin_auth_headers):
+        """测试按阶段、文件类型过滤返回p50/p95/p99"""
+        for file_type in ('pdf', 'pdf', 'docx'):
+            with analysis_tracer.span('analysis', file_type=file_type):
+                with analysis_tracer.span('ai_analysis'):
+                    pass
+
+        response = client.get('/api/v1/ai-analysis/performance/latency?stage=ai_analysis',
+                              headers=admin_auth_headers)
+        assert response.status_code == 200
+        latency = response.get_json()['latency']
+        assert set(latency) == {'ai_analysis'}
+        assert latency['ai_analysis']['pdf']['count'] == 2
+        assert latency['ai_analysis']['*']['count'] == 3
+        assert {'p50', 'p95', 'p99'} <= set(latency['ai_analysis']['docx'])
+
+        response = client.get('/api/v1/ai-analysis/performance/latency?file_type=docx&buckets=true',
+                              headers=admin_auth_headers)
+        latency = response.get_json()['latency']
+        assert set(latency['analysis']) == {'docx'}
+        assert latency['analysis']['docx']['buckets'][0]['count'] == 1
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    @pytest.mark.ai
+    def test_latency_requires_admin_or_manager(self, client, engineer_auth_headers):
+        """测试工程师角色无权查看"""
+        response = client.get('/api/v1/ai-analysis/performance/latency', headers=engineer_auth_headers)
+        assert response.status_code == 403
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI分析结果响应裁剪单元测试（?include=debug,text）
+"""
+import io
+import pytest
+from unittest.mock import patch
+
+from src.models import db
+from src.models.ai_analysis import AIAnalysisRecord
+
+
+def fake_analyze(file, user_id=None, content_hash=None, progress_callback=None):
+    return {
+        'success': True,
+        'document_info': {'filename': file.filename, 'type': 'txt', 'size': 64},
+        'extracted_data': {'basic_info': {'name': '智能电表', 'code': 'DDS-1'}, 'specifications': {}},
+        'confidence_scores': {'overall': 0.8},
+        'text_preview': '额定电压: 220V',
+        'validation_report': {'removed_specs': [{'name': 'PAGE 7', 'reason': 'format_noise'}]},
+        'debug_info': {'stage_breakdown': {'ai_analysis': 0.1}}
+    }
+
+
+def upload_data():
+    return {'document': (io.BytesIO('额定电压: 220V'.encode('utf-8')), 'spec.txt')}
+
+
+@pytest.fixture
+def history_record(app):
+    with app.app_context():
+        record = AIAnalysisRecord(document_name='spec.doc', document_type='doc', original_text='原文' * 2000,
+                                  quality_validation_report={'removed_specs': [{'name': 'PAGE 7'}] * 50})
+        record.save()
+        yield record.id
+        db.session.delete(db.session.get(AIAnalysisRecord, record.id))
+        db.session.commit()
+
+
+class TestAnalysisResponseProjection:
+    """测试分析结果默认精简、按需附带调试信息和文本"""
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    @pytest.mark.ai
+    def test_analyze_document_lean_by_default(self, client, engineer_auth_headers):
+        """测试分析响应默认不含调试信息和文本预览，include 后按分组返回"""
+        with patch('src.routes.ai_analysis.ai_analyzer.analyze_product_document', side_effect=fake_analyze):
+            lean = client.post('/api/v1/ai-analysis/analyze-document', data=upload_data(),
+                               headers=engineer_auth_headers, content_type='multipart/form-data').get_json()
+            full = client.post('/api/v1/ai-analysis/analyze-document?include=debug,text', data=upload_data(),
+                               headers=engineer_auth_headers, content_type='multipart/form-data').get_json()
+
+        assert lean['success'] and lean['extracted_data']['basic_info']['code'] == 'DDS-1'
+        assert not {'debug_info', 'validation_report', 'text_preview'} & set(lean)
+        assert full['text_preview'] == '额定电压: 220V'
+        assert full['debug_info']['stage_breakdown'] == {'ai_analysis': 0.1}
+        assert full['validation_report']['removed_specs'][0]['name'] == 'PAGE 7'
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    @pytest.mark.ai
+    def test_history_projection(self, client, admin_auth_headers, history_record):
+        """测试历史记录默认不含原始文本和质量验证报告"""
+        def find(query):
+            response = client.get(f'/api/v1/ai-analysis/history?per_page=50{query}', headers=admin_auth_headers)
+            assert response.status_code == 200
+            return next(r for r in response.get_json()['records'] if r['id'] == history_record)
+
+        lean = find('')
+        assert 'original_text' not in lean and 'quality_validation_report' not in lean
+        assert lean['data_quality_summary']['quality_level'] == 'very_poor'
+
+        text_only = find('&include=text')
+        assert text_only['original_text'].startswith('原文') and 'quality_validation_report' not in text_only
+
+        everything = find('&include=all')
+        assert len(everything['quality_validation_report']['removed_specs']) == 50
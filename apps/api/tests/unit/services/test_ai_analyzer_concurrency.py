@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI分析器并发压力测试
+同一个 AIAnalyzer 实例被多个线程同时使用时，各次分析的结果、监控数据和追踪互不串扰
+"""
+import io
+import time
+import random
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from werkzeug.datastructures import FileStorage
+
+from src.services.ai_analyzer import AIAnalyzer
+
+PARALLEL = 32
+LLM_DELAY = 0.3
+STAGES = {'document_processing', 'ai_analysis', 'table_parsing',
+          'data_quality_validation', 'quality_assessment', 'data_postprocessing'}
+
+
+def build_upload(index):
+    text = f'产品型号: RT-{index:03d}\n额定电压: {index + 100}V\n额定电流: 5A\n工作温度: -20~60℃'
+    return FileStorage(stream=io.BytesIO(text.encode('utf-8')), filename=f'spec-{index:03d}.txt',
+                       content_type='text/plain')
+
+
+def fake_llm(document_content, document_name):
+    """模拟大模型：延迟随机抖动，返回内容取自文档本身，便于检查串扰"""
+    time.sleep(LLM_DELAY * random.uniform(0.8, 1.2))
+    index = int(document_name[5:8])
+    assert f'RT-{index:03d}' in document_content
+    return {
+        'basic_info': {'name': f'测试仪{index:03d}', 'code': f'RT-{index:03d}'},
+        'specifications': {'额定电压': {'value': f'{index + 100}V', 'unit': 'V', 'description': ''}},
+        'confidence': {'overall': 0.8}
+    }
+
+
+class TestAnalyzerConcurrency:
+    """测试共享AIAnalyzer实例的并发分析"""
+
+    @pytest.fixture
+    def analyzer(self, isolated_analysis_caches):
+        analyzer = AIAnalyzer()
+        with patch.object(analyzer.ai_client, 'analyze_product_document', side_effect=fake_llm):
+            yield analyzer
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.ai
+    def test_parallel_analyses_do_not_bleed_state(self, analyzer):
+        """测试32个并行分析各自的结果、阶段耗时和追踪ID都属于自己的文档"""
+        start_barrier = threading.Barrier(PARALLEL)
+
+        def analyze(index):
+            start_barrier.wait()
+            started = time.perf_counter()
+            result = analyzer.analyze_product_document(build_upload(index), content_hash=f'hash-{index}')
+            return index, result, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=PARALLEL) as pool:
+            outcomes = list(pool.map(analyze, range(PARALLEL)))
+        wall = time.perf_counter() - started
+
+        trace_ids = set()
+        for index, result, elapsed in outcomes:
+            assert result['success'] is True, result.get('error')
+            assert result['document_info']['filename'] == f'spec-{index:03d}.txt'
+            assert result['extracted_data']['basic_info']['code'] == f'RT-{index:03d}'
+            assert f'RT-{index:03d}' in result['text_preview']
+
+            summary = result['debug_info']['monitor_summary']
+            assert summary['metrics']['document_info']['filename'] == f'spec-{index:03d}.txt'
+            assert set(summary['stages']) == STAGES
+            # 每次分析的阶段耗时只计入自己的阶段，不会被其他分析的开始/结束覆盖
+            assert summary['stages']['ai_analysis'] >= LLM_DELAY * 0.8 - 0.01
+            assert summary['total_duration'] <= round(elapsed, 2) + 0.01
+            trace_ids.add(summary['trace_id'])
+        assert len(trace_ids) == PARALLEL
+
+        # 吞吐随并发扩展：总耗时远小于串行执行的大模型等待时间之和
+        assert wall < PARALLEL * LLM_DELAY / 4
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.ai
+    def test_failure_isolated_to_its_own_analysis(self, analyzer):
+        """测试并发分析中某一个大模型调用失败只影响该次分析"""
+        def flaky_llm(document_content, document_name):
+            if document_name == 'spec-007.txt':
+                raise RuntimeError('zhipu down')
+            return fake_llm(document_content, document_name)
+
+        with patch.object(analyzer.ai_client, 'analyze_product_document', side_effect=flaky_llm):
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(lambda i: analyzer.analyze_product_document(build_upload(i)), range(8)))
+
+        assert [r['success'] for r in results] == [i != 7 for i in range(8)]
+        failed_stages = results[7]['debug_info']['error_monitor_summary']['stages']
+        assert failed_stages['ai_analysis'] == 0  # 未完成
+        assert all(r['debug_info']['monitor_summary']['stages']['ai_analysis'] > 0
+                   for i, r in enumerate(results) if i != 7)
+        assert results[7]['document_info']['filename'] == 'spec-007.txt'
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析流水线追踪单元测试
+"""
+import io
+import json
+import random
+import pytest
+from unittest.mock import Mock, patch
+from werkzeug.datastructures import FileStorage
+
+from src.services.analysis_tracing import AnalysisTracer, LatencyHistogram, analysis_tracer, ALL_FILE_TYPES
+from src.services.stage_graph import Stage, StageGraph
+from src.services.zhipuai_client import ZhipuAIClient
+from src.services.ai_analyzer import AIAnalyzer
+
+
+class TestLatencyHistogram:
+    """测试LatencyHistogram"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_percentiles_within_bucket_error(self):
+        """测试分位数估计误差在一个桶宽以内"""
+        rng = random.Random(7)
+        samples = sorted(rng.uniform(0.05, 30) for _ in range(5000))
+        histogram = LatencyHistogram()
+        for value in samples:
+            histogram.observe(value)
+
+        for q in (50, 95, 99):
+            exact = samples[int(q / 100 * len(samples)) - 1]
+            assert abs(histogram.percentile(q) - exact) / exact < 0.25
+        assert histogram.snapshot()['count'] == 5000
+        assert histogram.percentile(100) <= max(samples)
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_single_observation(self):
+        """测试单个样本的分位数等于该样本"""
+        histogram = LatencyHistogram()
+        histogram.observe(1.5)
+
+        assert histogram.percentile(50) == pytest.approx(1.5)
+        assert histogram.percentile(99) == pytest.approx(1.5)
+
+
+class TestAnalysisTracer:
+    """测试AnalysisTracer"""
+
+    @pytest.fixture(autouse=True)
+    def clean_tracer(self):
+        analysis_tracer.reset()
+        yield
+        analysis_tracer.reset()
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_llm_attempt_spans_nest_under_stage_in_worker_thread(self):
+        """测试阶段图线程中的每次大模型调用尝试都挂在所属阶段span下"""
+        client = ZhipuAIClient()
+        client.retry_delay = 0
+        responses = [Mock(status_code=503, text='busy'), Mock(status_code=200, text='{}')]
+
+        def stage(inputs):
+            with analysis_tracer.span('ai_analysis') as span:
+                client._make_request_with_retry('http://llm.invalid', {}, {})
+                return span
+
+        with analysis_tracer.span('analysis', file_type='pdf') as root, \
+                patch('src.services.zhipuai_client.requests.post', side_effect=responses):
+            stage_span = StageGraph([Stage('ai', stage)]).run().results['ai']
+
+        trace = analysis_tracer.get_recent_traces(1)[0]
+        attempts = [span for span in trace if span['name'] == 'llm_attempt']
+        assert stage_span.parent_id == root.span_id
+        assert [span['parent_id'] for span in attempts] == [stage_span.span_id] * 2
+        assert [span['status'] for span in attempts] == ['error', 'ok']
+        assert [span['attributes']['attempt'] for span in attempts] == [1, 2]
+        assert all(span['file_type'] == 'pdf' for span in trace)
+
+        report = analysis_tracer.get_latency_report(stage='llm_attempt')
+        assert report['llm_attempt']['pdf']['count'] == 2
+        assert report['llm_attempt'][ALL_FILE_TYPES]['count'] == 2
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_analyzer_stages_recorded_as_child_spans(self, isolated_analysis_caches):
+        """测试一次完整分析的各阶段记录为analysis的子span并进入直方图"""
+        analyzer = AIAnalyzer()
+        upload = FileStorage(stream=io.BytesIO('额定电压: 220V\n额定电流: 5A\n工作温度: -20~60℃'.encode('utf-8')),
+                             filename='spec.txt', content_type='text/plain')
+        llm_result = {'basic_info': {'name': '智能电表'}, 'specifications': {}, 'confidence': {'overall': 0.7}}
+
+        with patch.object(analyzer.ai_client, 'analyze_product_document', return_value=llm_result):
+            result = analyzer.analyze_product_document(upload)
+
+        assert result['success'] is True
+        trace = analysis_tracer.get_recent_traces(1)[0]
+        root = next(span for span in trace if span['parent_id'] is None)
+        children = {span['name'] for span in trace if span['parent_id'] == root['span_id']}
+        assert root['name'] == 'analysis'
+        assert root['trace_id'] == result['debug_info']['monitor_summary']['trace_id']
+        assert {'document_processing', 'ai_analysis', 'table_parsing', 'data_quality_validation',
+                'quality_assessment', 'data_postprocessing'} <= children
+
+        report = analysis_tracer.get_latency_report(file_type='txt')
+        assert report['ai_analysis']['txt']['count'] == 1
+        assert set(report['analysis']['txt']) >= {'p50', 'p95', 'p99'}
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_failed_stage_span_marked_error(self, isolated_analysis_caches):
+        """测试必需阶段失败时阶段span和根span都标记为失败"""
+        analyzer = AIAnalyzer()
+        upload = FileStorage(stream=io.BytesIO('额定电压: 220V\n额定电流: 5A\n工作温度: -20~60℃'.encode('utf-8')),
+                             filename='spec.txt', content_type='text/plain')
+
+        with patch.object(analyzer.ai_client, 'analyze_product_document', side_effect=RuntimeError('zhipu down')):
+            result = analyzer.analyze_product_document(upload)
+
+        assert result['success'] is False
+        spans = {span['name']: span for span in analysis_tracer.get_recent_traces(1)[0]}
+        assert spans['ai_analysis']['status'] == 'error'
+        assert spans['analysis']['status'] == 'error'
+        assert spans['document_processing']['status'] == 'ok'
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_trace_file_and_dump_are_chrome_trace_format(self, tmp_path):
+        """测试追加写入的追踪文件和导出文件都是Chrome Trace Event格式"""
+        tracer = AnalysisTracer(trace_file=str(tmp_path / 'live.json'))
+        for _ in range(2):
+            with tracer.span('analysis', file_type='docx'):
+                with tracer.span('db_write', target='ai_analysis_records'):
+                    pass
+
+        # 持续追加的文件省略结尾的 ']'，按格式规范补齐后即为合法JSON
+        live = (tmp_path / 'live.json').read_text(encoding='utf-8')
+        events = json.loads(live.rstrip().rstrip(',') + ']')
+        assert [event['name'] for event in events] == ['db_write', 'analysis'] * 2
+        assert all(event['ph'] == 'X' and event['dur'] >= 0 for event in events)
+
+        dumped = tracer.dump_traces(str(tmp_path / 'dump.json'))
+        data = json.loads((tmp_path / 'dump.json').read_text(encoding='utf-8'))
+        assert dumped['traces'] == 2
+        assert len(data['traceEvents']) == 4
+        assert data['traceEvents'][0]['args']['target'] == 'ai_analysis_records'
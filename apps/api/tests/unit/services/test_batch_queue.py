@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+持久化批量任务队列单元测试
+"""
+import os
+import time
+import tempfile
+import pytest
+from datetime import datetime, timedelta
+from flask import Flask
+from sqlalchemy import create_engine, inspect, text
+
+from src.models.base import db
+from src.models.batch_analysis import (
+    BatchAnalysisJob, BatchAnalysisFile, BatchStatus, FileStatus, ensure_batch_queue_columns
+)
+from src.services import batch_queue
+from src.services.batch_queue import BatchQueue, BatchQueueWorker
+
+
+@pytest.fixture
+def queue_app(tmp_path, monkeypatch):
+    """独立的文件数据库应用：队列工作线程各自持有连接（共享的内存数据库只有一个连接）；队列内容写入临时目录"""
+    monkeypatch.setattr(batch_queue, 'BATCH_QUEUE_CONTENT_DIR', str(tmp_path / 'queue_content'))
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    app = Flask(__name__)
+    app.config.update({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}'})
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+
+def create_job(queue, job_id, file_count, settings=None):
+    """保存待处理的批量任务、文件记录和队列内容"""
+    db.session.add(BatchAnalysisJob(job_id=job_id, user_id=1, total_files=file_count,
+                                    settings=settings or {}, status=BatchStatus.PENDING))
+    for i in range(file_count):
+        db.session.add(BatchAnalysisFile(job_id=job_id, file_id=f'{job_id}_file_{i}', filename=f'doc_{i}.txt',
+                                         original_filename=f'doc_{i}.txt', file_type='txt',
+                                         content_ref=queue.contents.put(job_id, f'document {i}'),
+                                         status=FileStatus.QUEUED))
+    db.session.commit()
+
+
+def content_dir(queue, job_id):
+    return os.path.join(queue.contents.root_dir, job_id)
+
+
+def expire_leases():
+    """模拟持有租约的工作进程失联：租约到期"""
+    BatchAnalysisFile.query.filter(BatchAnalysisFile.lease_token.isnot(None)).update(
+        {'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)}, synchronize_session=False)
+    db.session.commit()
+
+
+def load_job(job_id):
+    db.session.expire_all()
+    return BatchAnalysisJob.query.filter_by(job_id=job_id).first()
+
+
+class TestBatchQueueLeases:
+    """测试租约的互斥、过期接管和确认"""
+
+    @pytest.mark.unit
+    @pytest.mark.batch
+    def test_lease_exclusive_and_reclaimed_after_expiry(self, queue_app):
+        """测试同一文件只能被一个工作进程租用，租约过期后被接管，原持有者的确认被丢弃"""
+        queue = BatchQueue(lease_seconds=30, max_attempts=3)
+        create_job(queue, 'job_lease', 1)
+        queue.enqueue('job_lease')
+
+        first = queue.lease('worker-a')
+        assert first is not None and queue.load_content(first) == 'document 0'
+        assert queue.lease('worker-b') is None
+
+        expire_leases()
+        second = queue.lease('worker-b')
+        assert second.file_pk == first.file_pk and second.attempts == 2
+        assert not queue.heartbeat(first)
+        assert queue.heartbeat(second)
+
+        assert not queue.complete(first, {'stale': True})
+        assert queue.complete(second, {'product': 'RT-3000', 'confidence_scores': {'overall': 0.9}})
+
+        job = load_job('job_lease')
+        assert (job.status, job.processed_files, job.successful_files) == (BatchStatus.COMPLETED, 1, 1)
+        stored = BatchAnalysisFile.query.filter_by(job_id='job_lease').one()
+        assert stored.analysis_result == {'product': 'RT-3000', 'confidence_scores': {'overall': 0.9}}
+        assert stored.confidence_score == 0.9 and stored.lease_token is None
+        assert queue.stats['reclaimed'] == 1 and queue.stats['lost_acks'] == 1
+        assert not os.path.exists(content_dir(queue, 'job_lease'))
+
+    @pytest.mark.unit
+    @pytest.mark.batch
+    def test_unsuccessful_result_recorded_as_failure(self, queue_app):
+        """测试 success 为 False 的分析结果按失败确认，不计入成功文件"""
+        queue = BatchQueue(lease_seconds=30)
+        create_job(queue, 'job_unsuccessful', 1)
+        queue.enqueue('job_unsuccessful')
+
+        lease = queue.lease('worker-a')
+        assert queue.complete(lease, {'success': False, 'error': 'Document contains no readable text content'})
+
+        job = load_job('job_unsuccessful')
+        assert (job.status, job.successful_files, job.failed_files) == (BatchStatus.COMPLETED, 0, 1)
+        stored = BatchAnalysisFile.query.filter_by(job_id='job_unsuccessful').one()
+        assert stored.status == FileStatus.FAILED
+        assert stored.error_message == 'Document contains no readable text content'
+        assert queue.stats['failed'] == 1 and queue.stats['completed'] == 0
+
+    @pytest.mark.unit
+    @pytest.mark.batch
+    def test_cancel_skips_queued_files_and_fails_heartbeat(self, queue_app):
+        """测试取消后排队中的文件被跳过，执行中文件的心跳失败"""
+        queue = BatchQueue(lease_seconds=30)
+        create_job(queue, 'job_cancel', 3)
+        queue.enqueue('job_cancel')
+        lease = queue.lease('worker-a')
+
+        assert queue.cancel('job_cancel')
+        assert not queue.heartbeat(lease)
+        assert queue.lease('worker-b') is None
+        assert queue.load_content(lease) == 'document 0'  # 执行中的文件确认前内容保留
+        assert queue.skip(lease, 'Batch job cancelled')
+        assert not os.path.exists(content_dir(queue, 'job_cancel'))
+
+        job = load_job('job_cancel')
+        assert (job.status, job.processed_files) == (BatchStatus.CANCELLED, 3)
+        statuses = {f.status for f in BatchAnalysisFile.query.filter_by(job_id='job_cancel')}
+        assert statuses == {FileStatus.SKIPPED}
+        assert not queue.cancel('job_cancel')
+
+    @pytest.mark.unit
+    @pytest.mark.batch
+    def test_file_failed_after_max_attempts(self, queue_app):
+        """测试租约多次过期（反复拖垮工作进程）的文件不再租用并标记为失败"""
+        queue = BatchQueue(lease_seconds=30, max_attempts=2)
+        create_job(queue, 'job_poison', 1)
+        queue.enqueue('job_poison')
+
+        for _ in range(2):
+            assert queue.lease('worker-a') is not None
+            expire_leases()
+        queue._last_reap = 0.0
+        assert queue.lease('worker-b') is None
+
+        job = load_job('job_poison')
+        assert (job.status, job.failed_files) == (BatchStatus.COMPLETED, 1)
+        stored = BatchAnalysisFile.query.filter_by(job_id='job_poison').one()
+        assert stored.status == FileStatus.FAILED and stored.attempts == 2
+        assert queue.stats['exhausted'] == 1
+
+
+class TestBatchQueueWorker:
+    """测试工作进程执行队列任务"""
+
+    @pytest.mark.unit
+    @pytest.mark.batch
+    def test_worker_finishes_job_left_by_crashed_worker(self, queue_app):
+        """测试工作进程执行排队文件，并在租约到期后接管崩溃进程遗留的文件"""
+        queue = BatchQueue(lease_seconds=0.3)
+        create_job(queue, 'job_worker', 4, settings={'analysis_type': 'product_extraction'})
+        queue.enqueue('job_worker')
+        orphan = queue.lease('crashed-worker')  # 持有租约后进程退出，不再心跳和确认
+
+        processed = []
+
+        def process_file(batch_file, user_id, settings):
+            processed.append(batch_file.id)
+            time.sleep(0.05)
+            return {'filename': batch_file.filename, 'analysis_type': settings['analysis_type']}
+
+        worker = BatchQueueWorker(queue_app, queue, process_file, concurrency=2,
+                                  worker_id='worker-a', poll_interval=0.05)
+        worker.start()
+        try:
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline and load_job('job_worker').status == BatchStatus.PROCESSING:
+                time.sleep(0.05)
+        finally:
+            worker.stop(timeout=5)
+
+        job = load_job('job_worker')
+        assert (job.status, job.successful_files) == (BatchStatus.COMPLETED, 4)
+        assert sorted(processed) == sorted(f'job_worker_file_{i}' for i in range(4))
+        assert orphan.file_id in processed
+        status = queue.get_job_status('job_worker')
+        assert status['progress_percentage'] == 100.0
+        assert {f['status'] for f in status['files_status']} == {'completed'}
+
+    @pytest.mark.unit
+    @pytest.mark.batch
+    def test_missing_content_fails_file(self, queue_app):
+        """测试内容引用无法读取（内容目录不可访问）的文件标记为失败，其余文件正常执行"""
+        queue = BatchQueue(lease_seconds=30)
+        create_job(queue, 'job_missing', 2)
+        missing = BatchAnalysisFile.query.filter_by(file_id='job_missing_file_0').one()
+        os.remove(os.path.join(content_dir(queue, 'job_missing'), f'{missing.content_ref}.txt'))
+        queue.enqueue('job_missing')
+
+        worker = BatchQueueWorker(queue_app, queue, lambda batch_file, user_id, settings: {'text': batch_file.content},
+                                  concurrency=1, worker_id='worker-a', poll_interval=0.05)
+        worker.start()
+        try:
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline and load_job('job_missing').status == BatchStatus.PROCESSING:
+                time.sleep(0.05)
+        finally:
+            worker.stop(timeout=5)
+
+        job = load_job('job_missing')
+        assert (job.status, job.successful_files, job.failed_files) == (BatchStatus.COMPLETED, 1, 1)
+        stored = {f.file_id: f for f in BatchAnalysisFile.query.filter_by(job_id='job_missing')}
+        assert stored['job_missing_file_0'].status == FileStatus.FAILED
+        assert stored['job_missing_file_1'].analysis_result == {'text': 'document 1'}
+
+
+class TestBatchQueueSchema:
+    """测试为已有数据库补齐队列字段"""
+
+    @pytest.mark.unit
+    @pytest.mark.batch
+    def test_queue_columns_added_to_existing_table(self, tmp_path):
+        """测试队列字段加入之前创建的文件表被补齐字段和索引，重复执行不做修改"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE batch_analysis_files (id INTEGER PRIMARY KEY, job_id VARCHAR(50))"))
+            conn.execute(text("INSERT INTO batch_analysis_files (id, job_id) VALUES (1, 'job_legacy')"))
+
+        assert ensure_batch_queue_columns(engine) == ['content_ref', 'attempts', 'lease_owner', 'lease_token',
+                                                      'lease_expires_at']
+        assert ensure_batch_queue_columns(engine) == []
+
+        inspector = inspect(engine)
+        assert {'content_ref', 'lease_expires_at'} <= {c['name'] for c in inspector.get_columns('batch_analysis_files')}
+        assert 'ix_batch_analysis_files_lease_expires_at' in {i['name'] for i in inspector.get_indexes('batch_analysis_files')}
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT attempts FROM batch_analysis_files")).scalar() == 0
+        engine.dispose()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量文件任务池与并发批量任务调度单元测试
+"""
+import time
+import threading
+import pytest
+from unittest.mock import patch
+
+from src.services.batch_scheduler import FairTaskPool
+from src.services.batch_processor import BatchProcessor, BatchJob, BatchFile, BatchStatus, FileStatus
+
+
+class TestFairTaskPool:
+    """测试分组之间的轮转调度"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.batch
+    def test_groups_served_round_robin(self):
+        """测试先提交的大分组不会阻塞后提交的分组，各分组轮流执行"""
+        pool = FairTaskPool(max_workers=1)
+        gate = threading.Event()
+        order = []
+        pool.submit('warmup', gate.wait, 5)
+        futures = [pool.submit(group, order.append, f'{group}{i}')
+                   for group, count in (('a', 3), ('b', 3), ('c', 1)) for i in range(count)]
+        futures[1].cancel()
+        gate.set()
+        pool.shutdown(wait=True)
+
+        assert order == ['a0', 'b0', 'c0', 'b1', 'a2', 'b2']
+        snapshot = pool.snapshot()
+        assert (snapshot['completed'], snapshot['cancelled']) == (7, 1)
+        assert snapshot['queued'] == {} and snapshot['running'] == {}
+        with pytest.raises(RuntimeError):
+            pool.submit('a', order.append, 'late')
+
+
+class TestConcurrentBatches:
+    """测试多个批量任务同时处理时不再饿死"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.batch
+    def test_five_concurrent_batches_progress_and_finish(self):
+        """测试5个批量任务同时启动：协调不占用文件线程，每个任务都持续有进展，总耗时接近理想值"""
+        file_seconds, files_per_job, workers = 0.1, 4, 3
+        processor = BatchProcessor(max_workers=workers, max_concurrent_batches=5)
+
+        def analysis(document_content, analysis_type, business_context):
+            time.sleep(file_seconds)
+            return {'analysis_type': analysis_type}
+
+        jobs = []
+        for j in range(5):
+            files = [BatchFile(id=f'b{j}_f{i}', filename=f'spec-{j}-{i}.txt', original_filename=f'spec-{j}-{i}.txt',
+                               file_size=64, file_type='txt', content=f'额定电压: {i}V') for i in range(files_per_job)]
+            job = BatchJob(job_id=f'batch_fair_{j}', user_id=1, total_files=files_per_job, files=files,
+                           settings={'analysis_type': 'product_extraction'})
+            processor.active_jobs[job.job_id] = job
+            jobs.append(job)
+
+        with patch.object(processor.business_analyzer, 'analyze_document', side_effect=analysis):
+            started = time.monotonic()
+            for job in jobs:
+                assert processor.start_batch_processing(job.job_id)
+
+            # 轮转调度：最先启动的任务抢先占满第一轮，此后各任务轮流执行，三轮内每个任务都已处理文件
+            time.sleep(file_seconds * 3 + 0.1)
+            assert all(job.processed_files >= 1 for job in jobs), [job.processed_files for job in jobs]
+
+            for job in jobs:
+                assert processor.wait_for_batch(job.job_id, timeout=10)
+            makespan = time.monotonic() - started
+            processor.executor.shutdown(wait=True)
+
+        assert all(job.status == BatchStatus.COMPLETED for job in jobs)
+        assert all(f.status == FileStatus.COMPLETED for job in jobs for f in job.files)
+        ideal = len(jobs) * files_per_job * file_seconds / workers
+        assert makespan < ideal * 2 + 0.5
+        pool = processor.get_processing_statistics()['file_pool']
+        assert pool['completed'] == len(jobs) * files_per_job
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.batch
+    def test_unsuccessful_results_counted_as_failures(self):
+        """测试分析结果 success 为 False 的文件记为失败"""
+        processor = BatchProcessor(max_workers=2)
+        files = [BatchFile(id=f'u_f{i}', filename=f'spec-{i}.txt', original_filename=f'spec-{i}.txt',
+                           file_size=64, file_type='txt', content=f'额定电压: {i}V') for i in range(2)]
+        job = BatchJob(job_id='batch_unsuccessful', user_id=1, total_files=2, files=files,
+                       settings={'analysis_type': 'product_extraction'})
+        processor.active_jobs[job.job_id] = job
+
+        def analysis(document_content, analysis_type, business_context):
+            if document_content.endswith('1V'):
+                return {'success': False, 'error': 'zhipu down', 'analysis_type': analysis_type}
+            return {'success': True, 'analysis_type': analysis_type}
+
+        with patch.object(processor.business_analyzer, 'analyze_document', side_effect=analysis):
+            assert processor.start_batch_processing(job.job_id)
+            assert processor.wait_for_batch(job.job_id, timeout=10)
+            processor.executor.shutdown(wait=True)
+
+        assert (job.successful_files, job.failed_files) == (1, 1)
+        assert files[0].status == FileStatus.COMPLETED
+        assert files[1].status == FileStatus.FAILED and files[1].error_message == 'zhipu down'
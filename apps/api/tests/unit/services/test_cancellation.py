@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+协作式取消单元测试
+"""
+import json
+import time
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from src.services.cancellation import (
+    CancellationToken, CancellationStats, OperationCancelled, cancellation_scope,
+    cancellation_stats, cancellable_sleep, record_llm_usage
+)
+from src.services.zhipuai_client import ZhipuAIClient
+from src.services.batch_processor import BatchProcessor, BatchJob, BatchFile, BatchStatus, FileStatus
+
+
+@pytest.fixture
+def llm_server():
+    """本地大模型服务：/slow 5秒后才返回，/busy 立即返回503"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.path == '/busy':
+                status, body = 503, b'busy'
+            else:
+                time.sleep(5)
+                status, body = 200, json.dumps({'usage': {'total_tokens': 1200}}).encode()
+            try:
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except OSError:
+                pass  # 客户端已关闭连接
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+
+def cancel_after(token, seconds):
+    timer = threading.Timer(seconds, token.cancel, args=('user cancelled',))
+    timer.start()
+    return timer
+
+
+class TestCancellationToken:
+    """测试取消令牌的等待打断、级联和待执行任务取消"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_cancel_interrupts_wait_cascades_and_cancels_pending(self):
+        """测试取消打断等待、级联到子令牌并取消尚未开始的任务"""
+        stats = CancellationStats()
+        token = CancellationToken('batch', stats=stats)
+        child = token.child('batch_file')
+        executor = ThreadPoolExecutor(max_workers=1)
+        release = threading.Event()
+        futures = [executor.submit(release.wait, 5) for _ in range(3)]
+        token.bind_futures(futures)
+
+        cancel_after(token, 0.1)
+        started = time.monotonic()
+        with cancellation_scope(child):
+            with pytest.raises(OperationCancelled) as exc_info:
+                cancellable_sleep(5, 'llm_retry')
+        release.set()
+        executor.shutdown()
+
+        assert time.monotonic() - started < 1
+        assert exc_info.value.step == 'llm_retry'
+        assert child.cancelled and child.reason == 'user cancelled'
+        assert [future.cancelled() for future in futures] == [False, True, True]
+        snapshot = stats.snapshot()
+        assert snapshot['cancelled_requests'] == {'batch': 1}  # 级联取消的子令牌不重复计数
+        assert snapshot['cancelled_futures'] == 2
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_savings_estimated_from_completed_units(self):
+        """测试被取消的单元按同类已完成单元的平均用量估算节省"""
+        stats = CancellationStats()
+        for seconds, tokens in ((4.0, 1000), (6.0, 3000)):
+            with cancellation_scope(CancellationToken('analysis', stats=stats)):
+                record_llm_usage(seconds, tokens)
+        token = CancellationToken('analysis', stats=stats)
+        with cancellation_scope(token):
+            record_llm_usage(1.5, 0)
+            token.cancel()
+
+        unit = stats.snapshot()['by_kind']['analysis']
+        assert (unit['completed'], unit['cancelled']) == (2, 1)
+        assert unit['llm_seconds_spent_before_cancel'] == 1.5
+        assert unit['llm_seconds_saved'] == 3.5
+        assert unit['llm_tokens_saved'] == 2000
+        assert stats.snapshot()['llm_tokens_saved'] == 2000
+
+
+class TestCancellableLLMCall:
+    """测试取消时关闭进行中的大模型调用连接、打断重试等待"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.ai
+    def test_inflight_call_connection_closed(self, llm_server):
+        """测试进行中的调用在取消后立即结束，不再重试"""
+        client = ZhipuAIClient()
+        token = CancellationToken('analysis', stats=CancellationStats())
+        cancel_after(token, 0.3)
+        started = time.monotonic()
+        with cancellation_scope(token):
+            with pytest.raises(OperationCancelled) as exc_info:
+                client._make_request_with_retry(llm_server + '/slow', {}, {})
+
+        assert time.monotonic() - started < 2
+        assert exc_info.value.step == 'llm_attempt'
+        snapshot = token.stats.snapshot()
+        assert snapshot['aborted_llm_calls'] == 1
+        assert snapshot['closed_connections'] == 1
+        assert 0.2 < token.llm_seconds < 2
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.ai
+    def test_retry_backoff_interrupted(self, llm_server):
+        """测试重试退避等待期间取消立即结束"""
+        client = ZhipuAIClient()
+        client.retry_delay = 30
+        token = CancellationToken('analysis', stats=CancellationStats())
+        cancel_after(token, 0.3)
+        started = time.monotonic()
+        with cancellation_scope(token):
+            with pytest.raises(OperationCancelled) as exc_info:
+                client._make_request_with_retry(llm_server + '/busy', {}, {})
+
+        assert time.monotonic() - started < 2
+        assert exc_info.value.step == 'llm_retry'
+
+
+class TestBatchCancellation:
+    """测试取消批量任务时中断正在处理的文件并取消排队中的文件"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.batch
+    def test_cancel_stops_running_and_queued_files(self):
+        """测试取消后工作线程立即空闲，排队中的文件不再分析，并估算节省的大模型用量"""
+        cancellation_stats.reset()
+        cancellation_stats.record_outcome('batch_file', False, 5.0, 2000)
+        processor = BatchProcessor(max_workers=3)
+        calls = []
+
+        def slow_analysis(document_content, analysis_type, business_context):
+            calls.append(document_content)
+            record_llm_usage(0.5, 0)
+            cancellable_sleep(5, 'llm_attempt')
+            return {'success': True}
+
+        files = [BatchFile(id=f'f{i}', filename=f'spec-{i}.txt', original_filename=f'spec-{i}.txt',
+                           file_size=64, file_type='txt', content=f'额定电压: {i}V') for i in range(5)]
+        job = BatchJob(job_id='batch_cancel_test', user_id=1, total_files=len(files), files=files,
+                       settings={'analysis_type': 'product_extraction'})
+        processor.active_jobs[job.job_id] = job
+
+        with patch.object(processor.business_analyzer, 'analyze_document', side_effect=slow_analysis):
+            assert processor.start_batch_processing(job.job_id)
+            time.sleep(0.3)
+            started = time.monotonic()
+            assert processor.cancel_batch_job(job.job_id)
+            processor.executor.shutdown(wait=True)
+            idle_after = time.monotonic() - started
+            assert processor.wait_for_batch(job.job_id, timeout=5)
+
+        assert idle_after < 2
+        assert len(calls) == 3  # 协调不占用文件任务池，3个工作线程都在分析文件
+        assert job.status == BatchStatus.CANCELLED
+        assert [f.status for f in files] == [FileStatus.SKIPPED] * 5
+        snapshot = cancellation_stats.snapshot()
+        assert snapshot['cancelled_requests'] == {'batch': 1}
+        assert snapshot['cancelled_futures'] == 2
+        unit = snapshot['by_kind']['batch_file']
+        assert unit['cancelled'] == 5
+        assert unit['llm_seconds_saved'] == pytest.approx(3 * 4.5 + 2 * 5.0)
+        assert unit['llm_tokens_saved'] == 5 * 2000
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量文件内容暂存单元测试
+"""
+import io
+import os
+import pytest
+import threading
+from collections import deque
+from unittest.mock import patch
+from werkzeug.datastructures import FileStorage
+
+from src.services.content_spool import ContentSpool
+from src.services.batch_processor import BatchProcessor, BatchStatus, FileStatus
+from src.services.batch_queue import BatchQueue
+
+SPEC = '产品型号: RT-3000\n额定电压: 220V\n额定电流: 5A\n'
+
+
+def spool_files(spool):
+    return [os.path.join(root, name) for root, _, names in os.walk(spool.spool_dir) for name in names]
+
+
+class TestContentSpool:
+    """测试按内容寻址的暂存和引用计数"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_identical_content_stored_once_and_deleted_with_last_reference(self, tmp_path):
+        """测试相同内容只保存一份，最后一个引用释放时删除文件"""
+        spool = ContentSpool(root_dir=str(tmp_path))
+        first = spool.put(SPEC)
+        second = spool.put(SPEC)
+        other = spool.put('额定功率: 300VA')
+
+        assert first == second != other
+        assert spool.load(first) == SPEC
+        assert len(spool_files(spool)) == 2
+        spool.release(first)
+        assert spool.load(second) == SPEC
+        spool.release(second)
+        spool.release(other)
+        assert spool_files(spool) == []
+        stats = spool.get_stats()
+        assert (stats['writes'], stats['dedup_hits'], stats['deletes'], stats['entries']) == (2, 1, 2, 0)
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_disabled_or_unwritable_spool_keeps_content_in_memory(self, tmp_path):
+        """测试未启用或无法写入时返回None，由调用方保留内容"""
+        assert ContentSpool(root_dir=str(tmp_path), enabled=False).put(SPEC) is None
+        blocker = tmp_path / 'not_a_dir'
+        blocker.write_text('x')
+        spool = ContentSpool(root_dir=str(blocker))
+        assert spool.put(SPEC) is None
+        assert spool.get_stats()['errors'] == 1
+
+
+class TestBatchContentLifecycle:
+    """测试批量任务中内容的按需加载、释放和历史记录上限"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.batch
+    def test_content_loaded_per_file_and_released_after_job(self, tmp_path):
+        """测试提交后内存中只有引用，文件任务开始时加载内容，任务结束后暂存文件删除、任务移入有上限的历史记录"""
+        processor = BatchProcessor(max_workers=2)
+        processor.spool = ContentSpool(root_dir=str(tmp_path))
+        processor.job_history = deque(maxlen=1)
+        seen = []
+
+        def analysis(document_content, analysis_type, business_context):
+            seen.append(document_content)
+            return {'analysis_type': analysis_type}
+
+        job_ids = []
+        with patch.object(processor.business_analyzer, 'analyze_document', side_effect=analysis):
+            for round_ in range(2):
+                files = [FileStorage(stream=io.BytesIO(f'{SPEC}序号: {i}'.encode('utf-8')), filename=f'spec-{i}.txt',
+                                     content_type='text/plain') for i in range(3)]
+                job_id = processor.create_batch_job(files, user_id=1,
+                                                    settings={'analysis_type': 'product_extraction'})
+                job = processor.active_jobs[job_id]
+                assert all(f.content is None and f.content_ref for f in job.files)
+                assert len(spool_files(processor.spool)) == 3
+                assert processor.spool.load(job.files[0].content_ref) == f'{SPEC}序号: 0'
+
+                assert processor.start_batch_processing(job_id)
+                assert processor.wait_for_batch(job_id, timeout=10)
+                job_ids.append(job_id)
+
+                assert job_id not in processor.active_jobs
+                assert job.status == BatchStatus.COMPLETED
+                assert all(f.content is None and f.content_ref is None for f in job.files)
+                assert spool_files(processor.spool) == []
+            processor.executor.shutdown(wait=True)
+
+        assert sorted(seen) == sorted([f'{SPEC}序号: {i}' for i in range(3)] * 2)
+        assert processor.get_batch_status(job_ids[1])['status'] == 'completed'
+        with pytest.raises(ValueError):
+            processor.get_batch_status(job_ids[0])  # 超出历史记录上限，只能从数据库读取
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.batch
+    def test_cancel_keeps_contents_until_running_files_finish(self, tmp_path):
+        """测试取消后先结束的文件不会让协调线程提前释放暂存内容，仍在执行的文件结束后才删除"""
+        processor = BatchProcessor(max_workers=2)
+        processor.spool = ContentSpool(root_dir=str(tmp_path))
+        started = threading.Semaphore(0)
+        gates = {i: threading.Event() for i in range(3)}
+
+        def blocking_analysis(document_content, analysis_type, business_context):
+            started.release()
+            gates[int(document_content[-1])].wait(5)  # 已越过取消检查、不响应取消的文件
+            return {'analysis_type': analysis_type}
+
+        files = [FileStorage(stream=io.BytesIO(f'{SPEC}序号: {i}'.encode('utf-8')), filename=f'spec-{i}.txt',
+                             content_type='text/plain') for i in range(3)]
+        with patch.object(processor.business_analyzer, 'analyze_document', side_effect=blocking_analysis):
+            job_id = processor.create_batch_job(files, user_id=1, settings={'analysis_type': 'product_extraction'})
+            job = processor.active_jobs[job_id]
+            assert processor.start_batch_processing(job_id)
+            assert started.acquire(timeout=5) and started.acquire(timeout=5)
+            assert processor.cancel_batch_job(job_id)
+
+            gates[0].set()
+            assert not processor.wait_for_batch(job_id, timeout=0.3)
+            assert len(spool_files(processor.spool)) == 3
+            gates[1].set()
+            assert processor.wait_for_batch(job_id, timeout=5)
+            processor.executor.shutdown(wait=True)
+
+        assert processor.spool.get_stats()['loads'] == 2
+        assert spool_files(processor.spool) == []
+        assert job.status == BatchStatus.CANCELLED
+        assert job.files[2].status == FileStatus.SKIPPED
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.batch
+    def test_queue_contents_copied_from_spool_by_reference(self, tmp_path):
+        """测试提交到持久化队列时按暂存文件复制内容，返回的引用与暂存引用一致，相同内容只保存一份"""
+        processor = BatchProcessor(max_workers=1, queue=BatchQueue(content_dir=str(tmp_path / 'queue')))
+        processor.spool = ContentSpool(root_dir=str(tmp_path / 'spool'))
+        texts = [f'{SPEC}序号: 0', f'{SPEC}序号: 1', f'{SPEC}序号: 0']
+        files = [FileStorage(stream=io.BytesIO(text.encode('utf-8')), filename=f'spec-{i}.txt',
+                             content_type='text/plain') for i, text in enumerate(texts)]
+        job_id = processor.create_batch_job(files, user_id=1, settings={'analysis_type': 'product_extraction'})
+        job = processor.active_jobs[job_id]
+
+        with patch.object(processor.spool, 'load') as mock_load:
+            refs = processor.store_queue_contents(job_id)
+        processor.executor.shutdown(wait=True)
+
+        mock_load.assert_not_called()
+        assert [refs[f.id] for f in job.files] == [f.content_ref for f in job.files]
+        assert [processor.queue.contents.load(job_id, refs[f.id]) for f in job.files] == texts
+        assert len(os.listdir(tmp_path / 'queue' / job_id)) == 2
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据质量验证器单元测试
+用记录的基准规格字典逐项比对清洗结果和乱码检测结果，保证规则优化不改变行为
+（基准数据由 tests/performance/benchmark_data_quality.py --record 生成）
+"""
+import os
+import json
+import pytest
+
+from src.services.ai_analyzer import DataQualityValidator, PatternRules
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'fixtures', 'data_quality_golden.json')
+
+
+@pytest.fixture(scope='module')
+def golden():
+    with open(GOLDEN_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class TestDataQualityValidator:
+    """测试DataQualityValidator"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.ai
+    def test_cleaning_matches_golden(self, golden):
+        """测试规格清洗结果（保留项顺序、移除原因和命中模式）与基准一致"""
+        validator = DataQualityValidator()
+        for specs, expected in zip(golden['spec_dicts'], golden['expected']['validations']):
+            outcome = validator.validate_extracted_data({
+                'basic_info': {'name': '继电保护测试仪', 'code': 'RT-3000'},
+                'specifications': specs,
+                'confidence': {'basic_info': 0.9, 'specifications': 0.8, 'overall': 0.83}
+            })
+            outcome['cleaned_data']['specifications'] = list(outcome['cleaned_data']['specifications'].items())
+            assert json.loads(json.dumps(outcome, ensure_ascii=False)) == expected
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.ai
+    def test_binary_garbage_matches_golden(self, golden):
+        """测试乱码检测结果与基准一致"""
+        validator = DataQualityValidator()
+        actual = [validator._is_binary_garbage(name) for name in golden['garbage_names']]
+        assert actual == golden['expected']['binary_garbage']
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_pattern_rules_first_match_in_order(self):
+        """测试合并规则集返回按顺序第一个命中的模式"""
+        rules = PatternRules([r'^表\d+', r'参数表', r'表'])
+        assert rules.first_match('表3 参数表') == r'^表\d+'
+        assert rules.first_match('主要参数表') == r'参数表'
+        assert rules.first_match('额定电压') is None
+        assert not rules.search('额定电压')
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求截止时间传递单元测试
+"""
+import io
+import time
+import pytest
+import requests
+from unittest.mock import patch, MagicMock
+from werkzeug.datastructures import FileStorage
+
+from src.services.deadline import (
+    Deadline, DeadlineExceeded, DeadlineStats, deadline_scope, bounded_timeout, check_deadline
+)
+from src.services.stage_graph import Stage, StageGraph, STAGE_SKIPPED
+from src.services.zhipuai_client import ZhipuAIClient
+from src.services.ai_analyzer import AIAnalyzer
+from src.services.document_processor import DocumentProcessor
+
+
+class TestDeadline:
+    """测试Deadline预算计算与统计"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_timeout_clamped_and_cut_counted_once(self):
+        """测试超时按剩余预算截短，同一请求多次中止只计一次"""
+        stats = DeadlineStats()
+        deadline = Deadline(10, started_at=time.time() - 4, stats=stats)
+
+        assert 5.5 < deadline.timeout_for('llm_attempt', 60) <= 6
+        assert deadline.timeout_for('ocr_pass', 2) == 2
+        for step in ('llm_retry', 'ocr_pass'):
+            with pytest.raises(DeadlineExceeded) as exc_info:
+                deadline.check(step, required=30, skipped=20)
+            assert exc_info.value.step == step
+
+        snapshot = stats.snapshot()
+        assert snapshot['cut_short_requests'] == 1
+        assert snapshot['cut_short_by_step'] == {'llm_retry': 1}
+        assert snapshot['clamped_waits'] == 1
+        assert 93.5 < snapshot['reclaimed_seconds'] <= 94.5  # 截短54s + 两次中止各免去20s
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_no_deadline_means_unbounded(self):
+        """测试未设置截止时间时使用原有超时"""
+        assert bounded_timeout('ocr_pass', 60) == 60
+        with deadline_scope(Deadline(1, stats=DeadlineStats())):
+            assert bounded_timeout('ocr_pass', 60) <= 1
+        assert bounded_timeout('ocr_pass', 60) == 60
+
+
+class TestStageGraphDeadline:
+    """测试阶段图遵守请求截止时间"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_required_stage_aborted_at_deadline(self):
+        """测试必需阶段超时被剩余预算截短，到期即中止而不是等满阶段超时"""
+        graph = StageGraph([
+            Stage('slow', lambda inputs: time.sleep(2), timeout=60),
+        ], deadline=Deadline(0.2, stats=DeadlineStats()))
+
+        started = time.perf_counter()
+        with pytest.raises(DeadlineExceeded) as exc_info:
+            graph.run()
+        assert time.perf_counter() - started < 1
+        assert exc_info.value.step == 'slow'
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_optional_stage_skipped_when_budget_spent(self):
+        """测试预算耗尽后可选阶段跳过，必需阶段中止"""
+        deadline = Deadline(0.1, stats=DeadlineStats())
+        graph = StageGraph([
+            Stage('first', lambda inputs: time.sleep(0.15) or 'done', optional=True, default='fallback'),
+            Stage('hint', lambda inputs: 'hint', ('first',), optional=True, default={}),
+        ], deadline=deadline)
+
+        result = graph.run()
+        assert result.results == {'first': 'fallback', 'hint': {}}
+        assert result.records['hint'].status == STAGE_SKIPPED
+
+
+class TestLLMDeadline:
+    """测试大模型调用按剩余预算确定超时和是否重试"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.ai
+    def test_attempt_timeout_bounded_and_retry_skipped(self):
+        """测试调用超时不超过剩余预算，剩余预算不够等待重试时直接中止"""
+        client = ZhipuAIClient()
+        stats = DeadlineStats()
+        with patch('src.services.zhipuai_client.requests.post',
+                   side_effect=requests.exceptions.Timeout('read timed out')) as post, \
+                patch('src.services.zhipuai_client.time.sleep') as sleep, \
+                deadline_scope(Deadline(12, stats=stats)):
+            with pytest.raises(DeadlineExceeded) as exc_info:
+                client._make_request_with_retry('http://llm.invalid', {}, {})
+
+        assert post.call_count == 1
+        connect_timeout, read_timeout = post.call_args.kwargs['timeout']
+        assert read_timeout <= 12 and connect_timeout <= 12
+        sleep.assert_not_called()
+        assert exc_info.value.step == 'llm_retry'
+        assert stats.snapshot()['cut_short_by_step'] == {'llm_retry': 1}
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.ai
+    def test_no_call_when_budget_too_small(self):
+        """测试剩余预算少于单次调用最低预算时不发起调用"""
+        client = ZhipuAIClient()
+        with patch('src.services.zhipuai_client.requests.post') as post, \
+                deadline_scope(Deadline(client.min_attempt_budget - 1, stats=DeadlineStats())):
+            with pytest.raises(DeadlineExceeded):
+                client.analyze_product_document('额定电压: 220V', 'spec.txt')
+        post.assert_not_called()
+
+
+class TestAnalyzerDeadline:
+    """测试分析器在截止时间到达时提前结束"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.ai
+    def test_analysis_cut_short(self, isolated_analysis_caches):
+        """测试大模型阶段超出剩余预算时分析立即以 deadline_exceeded 失败"""
+        analyzer = AIAnalyzer()
+        text = '产品型号: RT-001\n额定电压: 220V\n额定电流: 5A\n工作温度: -20~60℃'
+        upload = FileStorage(stream=io.BytesIO(text.encode('utf-8')),
+                             filename='spec.txt', content_type='text/plain')
+
+        def slow_llm(document_content, document_name):
+            time.sleep(2)
+            return {}
+
+        started = time.perf_counter()
+        with patch.object(analyzer.ai_client, 'analyze_product_document', side_effect=slow_llm), \
+                deadline_scope(Deadline(0.5, stats=DeadlineStats())):
+            result = analyzer.analyze_product_document(upload)
+
+        assert time.perf_counter() - started < 1.5
+        assert result['success'] is False
+        assert result['error_type'] == 'deadline_exceeded'
+        assert result['debug_info']['failed_stage'] == 'ai_analysis'
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.ai
+    def test_extractor_abort_reported_as_deadline(self, isolated_analysis_caches):
+        """测试提取器内部按截止时间中止时不被包装为文档处理错误，分析以 deadline_exceeded 失败"""
+        analyzer = AIAnalyzer()
+        upload = FileStorage(stream=io.BytesIO('额定电压: 220V'.encode('utf-8')),
+                             filename='spec.txt', content_type='text/plain')
+
+        def ocr_extractor(self, file):
+            check_deadline('ocr_pass', required=5)
+            return '额定电压: 220V'
+
+        with patch.object(DocumentProcessor, '_extract_text_from_txt', ocr_extractor), \
+                patch.object(analyzer.ai_client, 'analyze_product_document') as mock_llm, \
+                deadline_scope(Deadline(2, stats=DeadlineStats())):
+            result = analyzer.analyze_product_document(upload)
+
+        mock_llm.assert_not_called()
+        assert result['success'] is False
+        assert result['error_type'] == 'deadline_exceeded'
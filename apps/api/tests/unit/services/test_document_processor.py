@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文档处理器服务单元测试
+"""
+import io
+import re
+import random
+import threading
+import pytest
+from unittest.mock import patch
+from werkzeug.datastructures import FileStorage
+from src.services.document_processor import DocumentContentCleaner, DocumentProcessor
+from src.utils.keyword_matcher import KeywordMatcher
+
+
+def _reference_clean(cleaner, content):
+    """逐模式匹配的原始清洗实现，用于比对预编译版本的输出"""
+    def matches(text, patterns):
+        return any(re.search(p, text, re.IGNORECASE) for p in patterns)
+
+    lines = content.split('\n')
+    kept = []
+    stats = {'word_noise': 0, 'page_nav': 0, 'table_noise': 0, 'meaningless': 0}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if matches(line, cleaner.protect_patterns):
+            kept.append(line)
+            continue
+        for family, patterns in (('word_noise', cleaner.word_noise_patterns),
+                                 ('page_nav', cleaner.page_nav_patterns),
+                                 ('table_noise', cleaner.table_noise_patterns),
+                                 ('meaningless', cleaner.meaningless_patterns)):
+            if matches(line, patterns):
+                stats[family] += 1
+                break
+        else:
+            cleaned = line
+            for p in cleaner.word_noise_patterns:
+                cleaned = re.sub(p, '', cleaned, flags=re.IGNORECASE)
+            cleaned = re.sub(r'\s+', ' ', cleaned).strip()
+            if cleaned and len(cleaned.strip()) > 1:
+                kept.append(cleaned)
+    stats['total_removed'] = len(lines) - len(kept)
+    stats['total_lines'] = len(lines)
+    return '\n'.join(kept), stats
+
+
+def _reference_truncate(processor, text, keywords=None):
+    """逐关键词 str.count 的原始段落评分实现，用于比对截断结果"""
+    if len(text) <= processor.max_text_length:
+        return text
+    keywords = keywords or processor.DEFAULT_TRUNCATION_KEYWORDS
+    scored = []
+    for para in text.split('\n\n'):
+        para_lower = para.lower()
+        score = sum(para_lower.count(k.lower()) * 10 for k in keywords)
+        if re.search(r'\d+[A-Za-z]*[\s]*[A-Za-z/Ω%°℃]', para):
+            score += 20
+        if '\t' in para or para.count('|') > 2:
+            score += 15
+        if 50 <= len(para) <= 500:
+            score += 5
+        scored.append((score, para))
+    scored.sort(key=lambda x: x[0], reverse=True)
+
+    result = []
+    current_length = 0
+    target_length = int(processor.max_text_length * 0.95)
+    for score, para in scored:
+        if current_length + len(para) + 2 <= target_length:
+            result.append(para)
+            current_length += len(para) + 2
+        elif current_length < target_length * 0.7:
+            remaining = target_length - current_length - 2
+            if remaining > 100:
+                result.append(para[:remaining] + "...")
+                break
+        else:
+            break
+    final_text = '\n\n'.join(result)
+    if len(final_text) < target_length * 0.5:
+        remaining_space = target_length - len(final_text)
+        if remaining_space > 100:
+            final_text = text[:remaining_space - len(final_text) - 20] + "...\n\n" + final_text
+    return final_text
+
+
+def build_long_document(target_chars, seed=7):
+    """生成超过截断阈值的中英混合技术文档"""
+    rng = random.Random(seed)
+    words = ['产品', '型号', '额定', '电压', '220V', '的', '装置', '用于', '系统', '测试',
+             'Product', 'MODEL', 'voltage', 'the', 'of', 'relay', 'input\toutput', '精度',
+             '0.2级', '继电保护', 'Frequency', 'range', '数据', '|', '。', 'testtest']
+    paragraphs = []
+    total = 0
+    while total < target_chars:
+        para = ' '.join(rng.choice(words) for _ in range(rng.randint(3, 150)))
+        paragraphs.append(para)
+        total += len(para) + 2
+    return '\n\n'.join(paragraphs)
+
+
+SAMPLE_DOCUMENT = '\n'.join([
+    '产品名称：继电保护测试仪',
+    'HYPERLINK "http://example.com/manual"',
+    '额定电压 220V',
+    'PAGE 7',
+    '第 3 页',
+    '|----+----+----|',
+    'A A AB X B',
+    'h 9 HYPERLINK',
+    '..........',
+    'aaaaaaa',
+    'AAAAaaa',
+    '______',
+    'CONTENTS',
+    'Table of contents',
+    'title of the report',
+    'TEST REPORT',
+    '  输出范围  0-120V  ',
+    'x',
+    '',
+    '   ',
+    'Output   accuracy    class',
+    '_Toc123456',
+    'See _GoBack here',
+    '｜',
+    '--',
+    '精度等级 0.2级',
+])
+
+
+class TestDocumentContentCleaner:
+    """测试DocumentContentCleaner"""
+
+    @pytest.fixture
+    def cleaner(self):
+        return DocumentContentCleaner()
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_compiled_cleaner_matches_reference(self, cleaner):
+        """测试预编译清洗结果与逐模式实现逐字节一致"""
+        result = cleaner.clean_document_content(SAMPLE_DOCUMENT)
+        expected_content, expected_stats = _reference_clean(cleaner, SAMPLE_DOCUMENT)
+
+        assert result['cleaned_content'] == expected_content
+        assert result['noise_statistics'] == expected_stats
+        assert result['original_content'] == SAMPLE_DOCUMENT
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_family_priority_is_preserved(self, cleaner):
+        """测试同时命中多个噪声族时按原有顺序计入统计"""
+        result = cleaner.clean_document_content('PAGE 1 HYPERLINK foo\nPAGE 2')
+        stats = result['noise_statistics']
+
+        assert stats['word_noise'] == 1
+        assert stats['page_nav'] == 1
+        assert result['cleaned_content'] == ''
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_clean_line_noise_removes_word_markers(self, cleaner):
+        """测试行内Word标记清理"""
+        assert cleaner._clean_line_noise('abc MERGEFORMAT  def') == 'abc def'
+        assert cleaner._clean_line_noise('plain   text') == 'plain text'
+
+
+class TestIntelligentTruncate:
+    """测试智能截断的关键词评分"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_keyword_matcher_matches_str_count(self):
+        """测试自动机计数与 str.count 一致（含自重叠和互相包含的关键词）"""
+        keywords = ['aa', 'aba', 'b', 'ab', 'test', 'testtest', '产品', '品']
+        matcher = KeywordMatcher(keywords)
+        rng = random.Random(3)
+        for _ in range(500):
+            text = ''.join(rng.choice('abt es产品') for _ in range(rng.randint(0, 60)))
+            expected = [text.count(k) for k in keywords]
+            assert matcher._scan_automaton(text) == expected
+            assert matcher._scan(text) == expected
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_truncation_selection_unchanged(self):
+        """测试截断选出的段落与逐关键词实现完全一致"""
+        processor = DocumentProcessor()
+        processor.max_text_length = 20000
+        text = build_long_document(120000)
+
+        assert processor._intelligent_truncate(text) == _reference_truncate(processor, text)
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_custom_keyword_lexicon(self):
+        """测试可配置关键词词表及权重"""
+        processor = DocumentProcessor(truncation_keywords={'Widget': 50})
+        processor.max_text_length = 100
+        text = '\n\n'.join(['产品 型号 电压 ' * 8, 'widget WIDGET ' * 5])
+
+        result = processor._intelligent_truncate(text)
+        assert result.startswith('widget')
+
+
+class TestDocStrategyRace:
+    """测试DOC提取策略并发竞速"""
+
+    @pytest.fixture
+    def processor(self):
+        DocumentProcessor._doc_strategy_winners.clear()
+        DocumentProcessor._doc_strategy_stats.clear()
+        yield DocumentProcessor()
+        DocumentProcessor._doc_strategy_winners.clear()
+        DocumentProcessor._doc_strategy_stats.clear()
+
+    @staticmethod
+    def _upload(data):
+        return FileStorage(stream=io.BytesIO(data), filename='legacy.doc', content_type='application/msword')
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_first_good_strategy_wins_and_cancels_others(self, processor):
+        """测试达标策略胜出后慢策略收到取消信号"""
+        slow_cancelled = threading.Event()
+
+        def fast(content, cancel_event):
+            return [('fast', '额定电压 220V 技术参数', 0.95)]
+
+        def slow(content, cancel_event):
+            cancel_event.wait(5)
+            if cancel_event.is_set():
+                slow_cancelled.set()
+            return []
+
+        with patch.object(processor, '_available_doc_strategies', return_value={'slow': slow, 'fast': fast}):
+            text = processor._extract_text_from_doc(self._upload(b'doc-bytes'))
+
+        assert text == '额定电压 220V 技术参数'
+        assert slow_cancelled.wait(2)
+        stats = DocumentProcessor.get_doc_strategy_stats()
+        assert stats['fast']['wins'] == 1
+        assert stats['fast']['win_rate'] == 1.0
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_best_candidate_used_when_gate_not_reached(self, processor):
+        """测试没有策略达标时使用最高分结果"""
+        strategies = {
+            'a': lambda content, cancel_event: [('a', 'low', 0.3)],
+            'b': lambda content, cancel_event: [('b', 'better', 0.5)],
+        }
+        with patch.object(processor, '_available_doc_strategies', return_value=strategies):
+            assert processor._extract_text_from_doc(self._upload(b'doc-bytes')) == 'better'
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_winner_cached_per_signature(self, processor):
+        """测试同特征文件优先单独尝试上次胜出的策略"""
+        calls = []
+
+        def good(content, cancel_event):
+            calls.append('good')
+            return [('good', 'text', 0.9)]
+
+        def other(content, cancel_event):
+            calls.append('other')
+            return []
+
+        with patch.object(processor, '_available_doc_strategies', side_effect=lambda: {'other': other, 'good': good}):
+            processor._extract_text_from_doc(self._upload(b'same-header-1'))
+            calls.clear()
+            processor._extract_text_from_doc(self._upload(b'same-header-2'))
+
+        assert calls == ['good']
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_plain_bytes_fall_back_to_encoding_strategy(self, processor):
+        """测试非OLE文件通过编码探测策略提取"""
+        data = ('产品型号：ABC-100\n额定电压：220V\n测量精度：0.2级\n' * 5).encode('gbk')
+        text = processor._extract_text_from_doc(self._upload(data))
+
+        assert '额定电压' in text
+
+
+class TestSpreadsheetExtraction:
+    """测试电子表格流式提取"""
+
+    @staticmethod
+    def _xlsx_upload(sheets):
+        openpyxl = pytest.importorskip('openpyxl')
+        workbook = openpyxl.Workbook()
+        workbook.remove(workbook.active)
+        for name, rows in sheets.items():
+            sheet = workbook.create_sheet(name)
+            for row in rows:
+                sheet.append(row)
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        buffer.seek(0)
+        return FileStorage(stream=buffer, filename='prices.xlsx',
+                           content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_text_and_structured_rows(self):
+        """测试文本格式不变，结构化行保留列位置并去除空列"""
+        upload = self._xlsx_upload({
+            '价格表': [
+                ['型号', None, '价格', '备注'],
+                [None, None, None, None],
+                ['A-100', None, 1200, None],
+                ['B-200', None, 0, '含税'],
+            ],
+            '空表': [],
+        })
+        text, sheets = DocumentProcessor()._extract_spreadsheet(upload, 'xlsx')
+
+        assert text == ("=== Sheet: 价格表 ===\n型号\t价格\t备注\nA-100\t1200\nB-200\t0\t含税\n\n"
+                        "=== Sheet: 空表 ===\n\n")
+        assert sheets[0]['rows'] == [('型号', '价格', '备注'), ('A-100', 1200), ('B-200', 0, '含税')]
+        assert sheets[0]['truncated'] is False
+        assert sheets[1]['rows'] == []
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_stops_at_text_budget(self):
+        """测试达到文本预算后停止读取"""
+        rows = [[f'P-{i:05d}', '继电保护测试仪', i * 10] for i in range(2000)]
+        upload = self._xlsx_upload({'Sheet1': rows, 'Sheet2': rows})
+        text, sheets = DocumentProcessor()._extract_spreadsheet(upload, 'xlsx', text_budget=1000)
+
+        assert len(text) < 1100
+        assert len(sheets) == 1
+        assert sheets[0]['truncated'] is True
+        assert 0 < len(sheets[0]['rows']) < 100
+
+
+class TestStructuredTables:
+    """测试Office文档的结构化表格输出"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_docx_tables(self):
+        """测试DOCX表格按单元格输出，文本格式不变"""
+        docx = pytest.importorskip('docx')
+        document = docx.Document()
+        document.add_paragraph('继电保护测试仪技术规格')
+        table = document.add_table(rows=3, cols=2)
+        for row, cells in zip(table.rows, [('参数', '数值'), ('额定电压', '220V'), ('测量精度', '0.2级')]):
+            for cell, value in zip(row.cells, cells):
+                cell.text = value
+        buffer = io.BytesIO()
+        document.save(buffer)
+        buffer.seek(0)
+        upload = FileStorage(stream=buffer, filename='spec.docx',
+                             content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+
+        text, structured = DocumentProcessor()._extract_content(upload, 'docx')
+
+        assert '额定电压\t220V\t\n' in text
+        assert structured['covers_text'] is False
+        assert structured['tables'] == [{
+            'origin': 'docx:table1',
+            'headers': ['参数', '数值'],
+            'rows': [['额定电压', '220V'], ['测量精度', '0.2级']]
+        }]
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_pptx_tables(self):
+        """测试PPTX表格既进入文本，也输出结构化单元格"""
+        pptx = pytest.importorskip('pptx')
+        from pptx.util import Inches
+        presentation = pptx.Presentation()
+        slide = presentation.slides.add_slide(presentation.slide_layouts[5])
+        shape = slide.shapes.add_table(2, 2, Inches(1), Inches(1), Inches(4), Inches(1))
+        for r, cells in enumerate([('额定功率', '1500W'), ('防护等级', 'IP65')]):
+            for c, value in enumerate(cells):
+                shape.table.cell(r, c).text = value
+        buffer = io.BytesIO()
+        presentation.save(buffer)
+        buffer.seek(0)
+        upload = FileStorage(stream=buffer, filename='spec.pptx',
+                             content_type='application/vnd.openxmlformats-officedocument.presentationml.presentation')
+
+        text, structured = DocumentProcessor()._extract_content(upload, 'pptx')
+
+        assert '额定功率\t1500W' in text
+        assert structured['tables'][0]['origin'] == 'pptx:slide1:table1'
+        assert structured['tables'][0]['headers'] == ['额定功率', '1500W']
+        assert structured['tables'][0]['rows'] == [['防护等级', 'IP65']]
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_spreadsheet_tables_cover_text(self):
+        """测试电子表格的每个工作表输出为一个结构化表格"""
+        upload = TestSpreadsheetExtraction._xlsx_upload({
+            '参数表': [['参数', '数值', '单位'], ['额定电压', 220, 'V'], [None, None, None]],
+            '说明': [['仅一行']],
+        })
+        _, structured = DocumentProcessor()._extract_content(upload, 'xlsx')
+
+        assert structured['covers_text'] is True
+        assert structured['tables'] == [{
+            'origin': 'xlsx:参数表',
+            'headers': ['参数', '数值', '单位'],
+            'rows': [['额定电压', '220', 'V']]
+        }]
+
+
+def build_text_pdf(page_count, lines_per_page=40):
+    """生成每页若干行文本的PDF（Helvetica，无外部依赖）"""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None,
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_ids = []
+    for page in range(page_count):
+        lines = [f'Page {page + 1} line {line}: rated voltage {220 + line}V accuracy 0.{line % 9 + 1}%'
+                 for line in range(lines_per_page)]
+        stream = 'BT /F1 10 Tf 40 800 Td 12 TL ' + ' '.join(f'({text}) Tj T*' for text in lines) + ' ET'
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream'.encode('latin-1'))
+        content_id = len(objects)
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>'.encode('latin-1'))
+        page_ids.append(len(objects))
+    kids = ' '.join(f'{page_id} 0 R' for page_id in page_ids)
+    objects[1] = f'<< /Type /Pages /Kids [{kids}] /Count {page_count} >>'.encode('latin-1')
+
+    output = io.BytesIO()
+    output.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(f'{number} 0 obj\n'.encode('latin-1') + body + b'\nendobj\n')
+    xref = output.tell()
+    output.write(f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1'))
+    for offset in offsets:
+        output.write(f'{offset:010d} 00000 n \n'.encode('latin-1'))
+    output.write(f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1'))
+    return output.getvalue()
+
+
+class TestPdfPageParallel:
+    """测试PDF分页并行提取"""
+
+    @staticmethod
+    def _upload(data):
+        return FileStorage(stream=io.BytesIO(data), filename='manual.pdf', content_type='application/pdf')
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_parallel_matches_sequential(self):
+        """测试并行提取按页序重组，结果与顺序提取一致"""
+        pytest.importorskip('PyPDF2')
+        data = build_text_pdf(12, lines_per_page=5)
+
+        sequential = DocumentProcessor()
+        sequential.PDF_PARALLEL_WORKERS = 1
+        parallel = DocumentProcessor()
+        parallel.PDF_PARALLEL_WORKERS = 2
+        parallel.PDF_PARALLEL_MIN_PAGES = 4
+        parallel.PDF_PARALLEL_MIN_CPUS = 1
+
+        expected = sequential._extract_text_from_pdf(self._upload(data))
+        try:
+            assert parallel._extract_text_from_pdf(self._upload(data)) == expected
+        finally:
+            DocumentProcessor._reset_pdf_executor()
+        assert expected.index('Page 2 line 0') < expected.index('Page 12 line 0')
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_small_pdf_stays_sequential(self):
+        """测试页数低于阈值时不使用进程池"""
+        pytest.importorskip('PyPDF2')
+        processor = DocumentProcessor()
+        processor.PDF_PARALLEL_WORKERS = 4
+        processor.PDF_PARALLEL_MIN_PAGES = 50
+        with patch.object(DocumentProcessor, '_get_pdf_executor') as mock_executor:
+            text = processor._extract_text_from_pdf(self._upload(build_text_pdf(3, lines_per_page=2)))
+        mock_executor.assert_not_called()
+        assert 'Page 3 line 1' in text
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_few_cpus_stay_sequential(self):
+        """测试可用CPU核数低于阈值时即使配置了多个工作进程也顺序提取"""
+        pytest.importorskip('PyPDF2')
+        processor = DocumentProcessor()
+        processor.PDF_PARALLEL_WORKERS = 4
+        processor.PDF_PARALLEL_MIN_PAGES = 2
+        processor.PDF_PARALLEL_MIN_CPUS = 4
+        with patch('src.services.document_processor._available_cpus', return_value=2), \
+                patch.object(DocumentProcessor, '_get_pdf_executor') as mock_executor:
+            text = processor._extract_text_from_pdf(self._upload(build_text_pdf(4, lines_per_page=2)))
+        mock_executor.assert_not_called()
+        assert 'Page 4 line 1' in text
+        with patch('src.services.document_processor._available_cpus', return_value=8):
+            assert processor._use_parallel_pdf(4)
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_pool_failure_falls_back(self):
+        """测试进程池不可用时回退顺序提取"""
+        pytest.importorskip('PyPDF2')
+        processor = DocumentProcessor()
+        processor.PDF_PARALLEL_WORKERS = 2
+        processor.PDF_PARALLEL_MIN_PAGES = 2
+        processor.PDF_PARALLEL_MIN_CPUS = 1
+        with patch.object(DocumentProcessor, '_get_pdf_executor', side_effect=OSError('no processes')):
+            text = processor._extract_text_from_pdf(self._upload(build_text_pdf(4, lines_per_page=2)))
+        assert 'Page 4 line 1' in text
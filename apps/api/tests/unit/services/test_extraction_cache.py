@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文档提取缓存单元测试
+"""
+import io
+import pytest
+from unittest.mock import patch
+from werkzeug.datastructures import FileStorage
+
+from src.services.extraction_cache import ExtractionCache, compute_content_hash
+from src.services.document_processor import DocumentProcessor
+
+
+class TestExtractionCache:
+    """测试ExtractionCache"""
+
+    @pytest.fixture
+    def cache(self, tmp_path):
+        return ExtractionCache(cache_dir=str(tmp_path), max_bytes=10 * 1024, max_entries=3, enabled=True)
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_put_and_get(self, cache):
+        """测试写入后可按哈希和版本读取"""
+        content_hash = compute_content_hash(b'hello')
+        assert cache.get(content_hash, 'v1') is None
+        assert cache.put(content_hash, 'v1', {'text': '你好', 'doc_info': {'type': 'txt'}})
+
+        assert cache.get(content_hash, 'v1') == {'text': '你好', 'doc_info': {'type': 'txt'}}
+        assert cache.get(content_hash, 'v2') is None
+
+        stats = cache.get_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 2
+        assert stats['hit_rate'] == pytest.approx(1 / 3, abs=1e-3)
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_lru_eviction_by_entries(self, cache):
+        """测试超过条目上限时淘汰最久未使用的条目"""
+        hashes = [compute_content_hash(str(i).encode()) for i in range(4)]
+        for h in hashes[:3]:
+            cache.put(h, 'v1', {'text': h})
+        cache.get(hashes[0], 'v1')  # 第0条变为最近使用
+        cache.put(hashes[3], 'v1', {'text': hashes[3]})
+
+        assert cache.get(hashes[1], 'v1') is None
+        assert cache.get(hashes[0], 'v1') is not None
+        assert cache.get_stats()['evictions'] == 1
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_size_limit_and_reload(self, tmp_path):
+        """测试容量上限以及重启后从磁盘恢复索引"""
+        cache = ExtractionCache(cache_dir=str(tmp_path), max_bytes=300, max_entries=100, enabled=True)
+        for i in range(5):
+            cache.put(compute_content_hash(str(i).encode()), 'v1', {'text': 'x' * 100})
+        assert cache.get_stats()['total_bytes'] <= 300
+
+        reloaded = ExtractionCache(cache_dir=str(tmp_path), max_bytes=300, max_entries=100, enabled=True)
+        assert reloaded.get(compute_content_hash(b'4'), 'v1') == {'text': 'x' * 100}
+        assert reloaded.get_stats()['entries'] == cache.get_stats()['entries']
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_processor_short_circuits_on_hit(self, cache):
+        """测试DocumentProcessor命中缓存时跳过文本提取"""
+        processor = DocumentProcessor()
+        processor.extraction_cache = cache
+        data = '产品型号：ABC-100\n额定电压：220V\n'.encode('utf-8')
+        content_hash = compute_content_hash(data)
+
+        def upload():
+            return FileStorage(stream=io.BytesIO(data), filename='spec.txt', content_type='text/plain')
+
+        text, info = processor.process_document(upload(), content_hash=content_hash)
+        assert info['cache_hit'] is False
+
+        with patch.object(processor, '_extract_text', side_effect=AssertionError('should not extract')):
+            cached_text, cached_info = processor.process_document(upload(), content_hash=content_hash)
+
+        assert cached_text == text
+        assert cached_info['cache_hit'] is True
+        assert cached_info['content_hash'] == content_hash
+        assert cached_info['text_length'] == info['text_length']
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析内存核算与准入控制单元测试
+"""
+import io
+import time
+import threading
+import tracemalloc
+import pytest
+from unittest.mock import patch
+from werkzeug.datastructures import FileStorage
+
+from src.services.memory_accounting import (
+    MemoryAdmissionController, MemoryAdmissionRejected, MemorySampler, MemoryStats,
+    memory_scope, MB, DEFAULT_BYTES_PER_INPUT_BYTE
+)
+from src.services.ai_analyzer import AIAnalyzer
+
+SPEC = '产品型号: RT-3000\n额定电压: 220V\n额定电流: 5A\n工作温度: -20~60℃\n输出功率: 300VA'
+
+
+@pytest.fixture(autouse=True)
+def stop_tracemalloc():
+    """tracemalloc 采样开启后一直追踪分配，测试结束后关闭，避免拖慢其他测试"""
+    tracing = tracemalloc.is_tracing()
+    yield
+    if not tracing:
+        tracemalloc.stop()
+
+
+class FixedUsageAdmission(MemoryAdmissionController):
+    """进程内存固定为 usage_mb 的准入控制器"""
+
+    def __init__(self, usage_mb, **kwargs):
+        super().__init__(**kwargs)
+        self.usage = int(usage_mb * MB)
+
+    def current_usage(self):
+        return self.usage
+
+
+class TestMemorySampling:
+    """测试作用域峰值采样和按阶段、文件类型汇总"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_transient_peak_recorded_per_stage_and_type(self):
+        """测试作用域内分配后立即释放的内存也计入峰值（tracemalloc不漏掉采样间隔之间的尖峰）"""
+        sampler = MemorySampler(mode='tracemalloc', interval=10)
+        stats = MemoryStats()
+        with memory_scope('extract', 'pptx', sampler=sampler, stats=stats) as outer:
+            with memory_scope('ocr', 'pptx', sampler=sampler, stats=stats) as inner:
+                buffer = bytearray(24 * MB)
+                del buffer
+            small = bytearray(1 * MB)
+            del small
+
+        assert inner.peak_bytes >= 24 * MB
+        assert outer.peak_bytes >= inner.peak_bytes
+        stages = stats.snapshot()['by_file_type']['pptx']
+        assert stages['ocr']['count'] == 1
+        assert stages['ocr']['max_peak_mb'] >= 24
+        assert set(stages) == {'extract', 'ocr'}
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_prediction_uses_type_history(self):
+        """测试样本不足时使用默认比值，足够后取历史比值的高分位数"""
+        stats = MemoryStats()
+        assert stats.predict('pdf', MB) == DEFAULT_BYTES_PER_INPUT_BYTE['pdf'] * MB
+        for ratio in (30, 40, 50, 60, 80):
+            stats.record_analysis('pdf', MB, ratio * MB)
+        assert stats.predict('pdf', 2 * MB) == 2 * 80 * MB
+        assert stats.predict('txt', MB) == DEFAULT_BYTES_PER_INPUT_BYTE['txt'] * MB
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.ai
+    def test_analysis_stages_recorded(self, isolated_analysis_caches):
+        """测试分析各阶段和文档提取器的峰值内存按文件类型记录，并作为准入预测的样本"""
+        analyzer = AIAnalyzer()
+        sampler = MemorySampler(mode='tracemalloc', interval=0.01)
+        stats = MemoryStats()
+
+        def heavy_llm(document_content, document_name=''):
+            buffer = bytearray(16 * MB)
+            del buffer
+            return {'basic_info': {'name': '继电保护测试仪', 'code': 'RT-3000'}, 'specifications': {}}
+
+        with patch('src.services.memory_accounting.memory_sampler', sampler), \
+                patch('src.services.memory_accounting.memory_stats', stats), \
+                patch('src.services.ai_analyzer.memory_sampler', sampler), \
+                patch('src.services.ai_analyzer.memory_stats', stats), \
+                patch('src.services.document_processor.memory_sampler', sampler), \
+                patch.object(analyzer.ai_client, 'analyze_product_document', side_effect=heavy_llm):
+            file = FileStorage(stream=io.BytesIO(SPEC.encode('utf-8')), filename='rt3000.txt',
+                               content_type='text/plain')
+            result = analyzer.analyze_product_document(file)
+
+        assert result['success'], result.get('error')
+        stages = stats.snapshot()['by_file_type']['txt']
+        assert {'analysis', 'extract', 'document_processing', 'ai_analysis', 'data_postprocessing'} <= set(stages)
+        assert stages['ai_analysis']['max_peak_mb'] >= 16
+        assert stages['analysis']['max_peak_mb'] >= stages['ai_analysis']['max_peak_mb']
+        memory = result['debug_info']['performance_metrics']['memory']
+        assert memory['ai_analysis_peak_mb'] >= 16
+        assert stats.snapshot()['prediction_samples'] == {'txt': 1}
+
+
+class TestMemoryAdmission:
+    """测试按预测内存拒绝、等待和放行分析"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_document_larger_than_idle_worker_rejected(self):
+        """测试空闲进程也容纳不下的文档立即拒绝"""
+        admission = FixedUsageAdmission(200, ceiling_mb=400, max_wait=5)
+        started = time.monotonic()
+        with pytest.raises(MemoryAdmissionRejected) as exc_info:
+            with admission.admit('pptx', 15 * MB):  # 默认比值预测 300MB
+                pass
+        assert time.monotonic() - started < 0.5
+        assert exc_info.value.reason == 'exceeds_ceiling'
+        assert admission.snapshot()['rejected'] == {'exceeds_ceiling': 1}
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_deferred_until_other_analysis_releases(self):
+        """测试与进行中的分析合计超过上限时等待其释放，等待超时则拒绝"""
+        admission = FixedUsageAdmission(100, ceiling_mb=400, max_wait=2)
+        release = threading.Event()
+        admitted_at = []
+
+        def running_analysis():
+            with admission.admit('pdf', 20 * MB):  # 预测 240MB
+                release.wait(5)
+
+        def waiting_analysis():
+            with admission.admit('pdf', 10 * MB):  # 预测 120MB，100 + 240 + 120 > 400
+                admitted_at.append(time.monotonic())
+
+        first = threading.Thread(target=running_analysis)
+        first.start()
+        time.sleep(0.1)
+        second = threading.Thread(target=waiting_analysis)
+        second.start()
+        time.sleep(0.3)
+        assert not admitted_at
+        released_at = time.monotonic()
+        release.set()
+        first.join(5)
+        second.join(5)
+        assert admitted_at and admitted_at[0] - released_at < 0.5
+
+        release.clear()
+        first = threading.Thread(target=running_analysis)
+        first.start()
+        time.sleep(0.1)
+        with pytest.raises(MemoryAdmissionRejected) as exc_info:
+            with admission.admit('pdf', 10 * MB):
+                pass
+        release.set()
+        first.join(5)
+
+        assert exc_info.value.reason == 'deferred_timeout'
+        assert 1.9 < exc_info.value.waited < 3
+        snapshot = admission.snapshot()
+        assert (snapshot['admitted'], snapshot['deferred']) == (3, 2)
+        assert snapshot['rejected'] == {'deferred_timeout': 1}
+        assert snapshot['in_flight'] == 0
+
+    @pytest.mark.unit
+    @pytest.mark.api
+    def test_rejected_analysis_returns_503(self, app, client, engineer_auth_headers):
+        """测试内存准入拒绝的同步分析返回503和Retry-After，不保存分析记录"""
+        from src.models import AIAnalysisRecord
+        admission = FixedUsageAdmission(0, ceiling_mb=0.01, max_wait=1)
+        from src.routes.ai_analysis import ai_service_manager
+        queue_status = ai_service_manager.get_queue_status
+        with app.app_context():
+            records_before = AIAnalysisRecord.query.count()
+        # 服务健康状态是全局的，可能已被前面的测试标记为不可用
+        with patch('src.services.ai_analyzer.memory_admission', admission), \
+                patch.object(ai_service_manager, 'get_queue_status',
+                             side_effect=lambda: {**queue_status(), 'service_status': 'healthy'}), \
+                patch.object(ai_service_manager, 'submit_analysis_request', return_value=True):
+            response = client.post('/api/v1/ai-analysis/analyze-document',
+                                   data={'document': (io.BytesIO(SPEC.encode('utf-8') * 20), 'rt3000.txt')},
+                                   headers=engineer_auth_headers, content_type='multipart/form-data')
+
+        assert response.status_code == 503
+        body = response.get_json()
+        assert body['error_type'] == 'memory_limit'
+        assert response.headers['Retry-After'] == str(body['retry_after'])
+        with app.app_context():
+            assert AIAnalysisRecord.query.count() == records_before
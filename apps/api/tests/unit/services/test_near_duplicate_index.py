@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近重复文档索引单元测试
+"""
+import io
+import sqlite3
+import pytest
+from unittest.mock import Mock, patch
+from werkzeug.datastructures import FileStorage
+
+from src.services.near_duplicate_index import NearDuplicateIndex, compute_fingerprint
+from src.services.ai_analyzer import AIAnalyzer
+
+
+def datasheet(date='2025-06-01', distributor='华东经销商', voltage='220V'):
+    lines = [f'继电保护测试仪 RT-3000 技术规格书 发布日期 {date}',
+             f'额定电压: {voltage}',
+             '额定功率: 1500W',
+             '测量精度: 0.2级',
+             '工作温度: -20~60℃']
+    lines += [f'第{i}项 保护功能说明 过流 速断 零序 距离 差动 编号{i}' for i in range(40)]
+    lines.append(f'经销商: {distributor}')
+    return '\n'.join(lines)
+
+
+class TestNearDuplicateIndex:
+    """测试NearDuplicateIndex"""
+
+    @pytest.fixture
+    def index(self, tmp_path):
+        return NearDuplicateIndex(db_path=str(tmp_path / 'near_dup.sqlite3'), threshold=0.85,
+                                  max_entries=3, enabled=True)
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_near_duplicate_found_with_added_lines(self, index):
+        """测试只改日期和页脚的文档命中，并返回差异行"""
+        assert index.add(1, compute_fingerprint(datasheet()), user_id=1)
+
+        match = index.find(compute_fingerprint(datasheet(date='2025-08-01', distributor='华南经销商')), user_id=1)
+
+        assert match['record_id'] == 1
+        assert 0.85 <= match['similarity'] < 1.0
+        assert match['added_lines'] == ['继电保护测试仪 RT-3000 技术规格书 发布日期 2025-08-01',
+                                        '经销商: 华南经销商']
+        assert match['removed_lines'] == ['继电保护测试仪 RT-3000 技术规格书 发布日期 2025-06-01',
+                                          '经销商: 华东经销商']
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_matches_scoped_to_user(self, index):
+        """测试只在同一用户的历史分析中查找，其他用户或匿名请求不会命中"""
+        index.add(1, compute_fingerprint(datasheet()), user_id='alice')
+        assert not index.add(2, compute_fingerprint(datasheet()))
+
+        fingerprint = compute_fingerprint(datasheet(date='2025-08-01'))
+        assert index.find(fingerprint, user_id='bob') is None
+        assert index.find(fingerprint) is None
+        assert index.find(fingerprint, user_id='alice')['record_id'] == 1
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_different_document_not_matched(self, index):
+        """测试不相关文档不命中"""
+        index.add(1, compute_fingerprint(datasheet()), user_id=1)
+        other = '\n'.join(f'报价单 第{i}行 合计金额 {i * 100} 元' for i in range(40))
+
+        assert index.find(compute_fingerprint(other), user_id=1) is None
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_persisted_across_instances(self, index):
+        """测试索引持久化到磁盘，新实例可以查询"""
+        index.add(5, compute_fingerprint(datasheet()), user_id=1)
+        reopened = NearDuplicateIndex(db_path=index.db_path, threshold=0.85, enabled=True)
+
+        assert reopened.find(compute_fingerprint(datasheet()), user_id=1)['record_id'] == 5
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_unscoped_legacy_index_rebuilt(self, tmp_path):
+        """测试没有用户归属的旧版索引文件打开时被重建，旧条目不再参与匹配"""
+        path = tmp_path / 'legacy.sqlite3'
+        conn = sqlite3.connect(str(path))
+        conn.execute("CREATE TABLE entries (record_id INTEGER PRIMARY KEY, created_at REAL NOT NULL, "
+                     "line_count INTEGER NOT NULL, line_hashes BLOB NOT NULL)")
+        conn.execute("INSERT INTO entries VALUES (1, 0, 1, x'00')")
+        conn.commit()
+        conn.close()
+
+        index = NearDuplicateIndex(db_path=str(path), threshold=0.85, enabled=True)
+        assert index.get_stats()['entries'] == 0
+        assert index.add(2, compute_fingerprint(datasheet()), user_id=1)
+        assert index.find(compute_fingerprint(datasheet()), user_id=1)['record_id'] == 2
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_eviction_keeps_max_entries(self, index):
+        """测试超过容量时淘汰最早的条目"""
+        for record_id in range(1, 6):
+            index.add(record_id, compute_fingerprint(datasheet(date=f'2025-0{record_id}-01') + f'\n批次{record_id}' * 30),
+                      user_id=1)
+
+        assert index.get_stats()['entries'] == 3
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_missing_index_file_not_created_by_lookup(self, tmp_path):
+        """测试只读查询不会创建索引文件"""
+        index = NearDuplicateIndex(db_path=str(tmp_path / 'absent.sqlite3'), enabled=True)
+
+        assert index.find(compute_fingerprint(datasheet()), user_id=1) is None
+        assert not (tmp_path / 'absent.sqlite3').exists()
+        assert index.get_stats()['lookups'] == 1
+
+
+class TestNearDuplicateReuse:
+    """测试AIAnalyzer复用近重复文档的分析结果"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_reuse_skips_llm_and_rechecks_changed_lines(self, tmp_path, isolated_analysis_caches):
+        """测试命中后不调用大模型，差异行中的规格覆盖旧值"""
+        index = NearDuplicateIndex(db_path=str(tmp_path / 'near_dup.sqlite3'), threshold=0.85, enabled=True)
+        index.add(7, compute_fingerprint(datasheet()), user_id=1)
+
+        prior = Mock(success=True, user_id=1)
+        prior.get_extracted_data.return_value = {
+            'basic_info': {'name': '继电保护测试仪', 'code': 'RT-3000'},
+            'specifications': {'额定电压': {'value': '220V', 'unit': 'V', 'description': ''},
+                               '额定功率': {'value': '1500W', 'unit': 'W', 'description': ''}}
+        }
+
+        analyzer = AIAnalyzer()
+        upload = FileStorage(stream=io.BytesIO(datasheet(date='2025-08-01', voltage='380V').encode('utf-8')),
+                             filename='RT-3000.txt', content_type='text/plain')
+
+        with patch('src.services.ai_analyzer.near_duplicate_index', index), \
+                patch.object(AIAnalyzer, '_load_analysis_record', return_value=prior) as mock_load, \
+                patch.object(analyzer.ai_client, 'analyze_product_document') as mock_llm:
+            result = analyzer.analyze_product_document(upload, user_id=1)
+
+        mock_llm.assert_not_called()
+        mock_load.assert_called_once_with(7)
+        assert result['success'] is True
+        assert result['near_duplicate']['matched_record_id'] == 7
+        assert result['near_duplicate']['rechecked_lines'] == 2
+        assert result['extracted_data']['specifications']['额定电压']['value'] == '380V'
+        assert result['extracted_data']['basic_info']['name'] == '继电保护测试仪'
+        assert index.get_stats()['llm_calls_avoided'] == 1
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_fields_from_removed_lines_dropped(self, tmp_path, isolated_analysis_caches):
+        """测试新文档删除的行中解析出的参数、取值只出现在删除行中的字段不再沿用"""
+        index = NearDuplicateIndex(db_path=str(tmp_path / 'near_dup.sqlite3'), threshold=0.85, enabled=True)
+        index.add(7, compute_fingerprint(datasheet() + '\n外壳防护 IP54'), user_id=1)
+
+        prior = Mock(success=True, user_id=1)
+        prior.get_extracted_data.return_value = {
+            'basic_info': {'name': '继电保护测试仪', 'code': 'RT-3000', 'brand': '华东经销商'},
+            'specifications': {'额定功率': {'value': '1500W', 'unit': 'W', 'description': ''},
+                               '测量精度': {'value': '0.2级', 'unit': '', 'description': ''},
+                               '防护等级': {'value': 'IP54', 'unit': '', 'description': ''}}
+        }
+
+        analyzer = AIAnalyzer()
+        text = datasheet(date='2025-08-01', distributor='华南经销商').replace('测量精度: 0.2级\n', '')
+        upload = FileStorage(stream=io.BytesIO(text.encode('utf-8')), filename='RT-3000.txt',
+                             content_type='text/plain')
+
+        with patch('src.services.ai_analyzer.near_duplicate_index', index), \
+                patch.object(AIAnalyzer, '_load_analysis_record', return_value=prior), \
+                patch.object(analyzer.ai_client, 'analyze_product_document') as mock_llm:
+            result = analyzer.analyze_product_document(upload, user_id=1)
+
+        mock_llm.assert_not_called()
+        specifications = result['extracted_data']['specifications']
+        assert '测量精度' not in specifications and '防护等级' not in specifications
+        assert specifications['额定功率']['value'] == '1500W'
+        basic_info = result['extracted_data']['basic_info']
+        assert basic_info['code'] == 'RT-3000' and not basic_info.get('brand')
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_other_users_analysis_not_reused(self, tmp_path, isolated_analysis_caches):
+        """测试其他用户的历史分析不会被复用"""
+        index = NearDuplicateIndex(db_path=str(tmp_path / 'near_dup.sqlite3'), threshold=0.85, enabled=True)
+        index.add(7, compute_fingerprint(datasheet()), user_id=1)
+
+        analyzer = AIAnalyzer()
+        upload = FileStorage(stream=io.BytesIO(datasheet(date='2025-08-01').encode('utf-8')),
+                             filename='RT-3000.txt', content_type='text/plain')
+
+        with patch('src.services.ai_analyzer.near_duplicate_index', index), \
+                patch.object(AIAnalyzer, '_load_analysis_record') as mock_load, \
+                patch.object(analyzer.ai_client, 'analyze_product_document',
+                             return_value={'basic_info': {}, 'specifications': {}}) as mock_llm:
+            result = analyzer.analyze_product_document(upload, user_id=2)
+
+        mock_load.assert_not_called()
+        mock_llm.assert_called_once()
+        assert result['near_duplicate']['matched_record_id'] is None
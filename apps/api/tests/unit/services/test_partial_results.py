@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析中间结果单元测试
+"""
+import io
+import time
+import pytest
+from unittest.mock import patch
+from werkzeug.datastructures import FileStorage
+
+from src.services.ai_analyzer import AIAnalyzer
+from src.services.partial_results import PARTIAL_SECTIONS, publish_partial, partial_result_scope
+
+DETAIL_DELAY = 0.3
+SPEC_TEXT = '产品型号: RT-3000\n额定电压: 220V\n额定电流: 5A\n工作温度: -20~60℃\n| 参数 | 数值 |\n| 输出功率 | 300VA |'
+
+
+def basic_identification(document_content, document_name=''):
+    return {'basic_info': {'name': '继电保护测试仪', 'code': 'RT-3000'},
+            'confidence': {'basic_info': 0.9, 'overall': 0.9}}
+
+
+def detailed_extraction(document_content, document_name, basic_info):
+    time.sleep(DETAIL_DELAY)
+    return {
+        'basic_info': {**basic_info['basic_info'], 'category': '测量仪表'},
+        'specifications': {'额定电压': {'value': '220V', 'unit': 'V', 'description': ''},
+                           '额定电流': {'value': '5A', 'unit': 'A', 'description': ''}},
+        'confidence': {'basic_info': 0.9, 'specifications': 0.8, 'overall': 0.85}
+    }
+
+
+class TestPartialResults:
+    """测试分析过程中按阶段发布中间结果"""
+
+    @pytest.fixture
+    def analyzer(self, isolated_analysis_caches):
+        analyzer = AIAnalyzer()
+        client = analyzer.ai_client
+        with patch.object(client, 'is_available', return_value=True), \
+                patch.object(client, '_basic_product_identification', side_effect=basic_identification), \
+                patch.object(client, '_detailed_information_extraction', side_effect=detailed_extraction):
+            yield analyzer
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    @pytest.mark.ai
+    def test_basic_info_published_before_detailed_extraction(self, analyzer):
+        """测试基础信息在详细提取完成前发布，各分区都有快照且先于分析结束"""
+        events = []
+        upload = FileStorage(stream=io.BytesIO(SPEC_TEXT.encode('utf-8')), filename='rt3000.txt',
+                             content_type='text/plain')
+        result = analyzer.analyze_product_document(upload, progress_callback=events.append)
+
+        assert result['success'] is True, result.get('error')
+        partials = [event for event in events if event['type'] == 'partial_result']
+        assert {event['section'] for event in partials} == set(PARTIAL_SECTIONS)
+        assert events[-1]['type'] == 'analysis_end'
+
+        # 第一层识别的基础信息先于大模型阶段结束发布，之后被完整结果中的基础信息覆盖
+        basic = [event for event in partials if event['section'] == 'basic_info']
+        assert basic[0]['data'] == {'name': '继电保护测试仪', 'code': 'RT-3000'}
+        assert basic[-1]['data']['category'] == '测量仪表'
+        ai_end = next(i for i, event in enumerate(events)
+                      if event['type'] == 'stage_end' and event['stage'] == 'ai_analysis')
+        assert events.index(basic[0]) < ai_end
+        total = result['debug_info']['monitor_summary']['total_duration']
+        assert basic[0]['elapsed'] < DETAIL_DELAY <= total
+
+        metrics = result['debug_info']['monitor_summary']['metrics']
+        assert metrics['overall']['time_to_first_partial'] <= basic[0]['elapsed']
+        assert set(metrics['partial_results']) == set(PARTIAL_SECTIONS)
+        quality = next(event['data'] for event in partials if event['section'] == 'quality')
+        assert quality['confidence_scores'] == result['confidence_scores']
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_publish_outside_scope_is_ignored(self):
+        """测试未设置发布者时忽略，发布者异常不影响调用方"""
+        publish_partial('basic_info', {'name': 'x'})
+
+        received = []
+        with partial_result_scope(lambda section, data: received.append((section, data))):
+            publish_partial('basic_info', {'name': 'x'})
+        with partial_result_scope(lambda section, data: 1 / 0):
+            publish_partial('basic_info', {'name': 'y'})
+        publish_partial('basic_info', {'name': 'z'})
+        assert received == [('basic_info', {'name': 'x'})]
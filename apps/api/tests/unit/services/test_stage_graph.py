@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析阶段图执行器单元测试
+"""
+import io
+import time
+import threading
+import pytest
+from unittest.mock import patch
+from werkzeug.datastructures import FileStorage
+
+from src.services.stage_graph import (
+    Stage, StageGraph, StageTimeoutError, STAGE_COMPLETED, STAGE_TIMEOUT, STAGE_FAILED, STAGE_SKIPPED
+)
+from src.services.ai_analyzer import AIAnalyzer
+
+
+def sleeper(seconds, value=None):
+    def run(inputs):
+        time.sleep(seconds)
+        return value
+    return run
+
+
+class TestStageGraph:
+    """测试StageGraph"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_dependencies_receive_upstream_results(self):
+        """测试下游阶段按依赖拿到上游结果"""
+        graph = StageGraph([
+            Stage('a', lambda inputs: 2),
+            Stage('b', lambda inputs: inputs['a'] * 10, ('a',)),
+            Stage('c', lambda inputs: inputs['a'] + 1, ('a',)),
+            Stage('d', lambda inputs: inputs['b'] + inputs['c'], ('b', 'c')),
+        ])
+        run = graph.run()
+
+        assert run.results == {'a': 2, 'b': 20, 'c': 3, 'd': 23}
+        assert all(record.status == STAGE_COMPLETED for record in run.records.values())
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_independent_stages_overlap(self):
+        """测试互不依赖的阶段并行执行"""
+        graph = StageGraph([
+            Stage('root', lambda inputs: None),
+            Stage('slow_a', sleeper(0.3), ('root',)),
+            Stage('slow_b', sleeper(0.3), ('root',)),
+            Stage('join', lambda inputs: None, ('slow_a', 'slow_b')),
+        ])
+        run = graph.run()
+
+        assert run.total_duration < 0.5
+        a, b = run.records['slow_a'], run.records['slow_b']
+        assert a.start < b.end and b.start < a.end
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_critical_path_follows_slowest_branch(self):
+        """测试关键路径沿最慢的分支回溯"""
+        graph = StageGraph([
+            Stage('root', sleeper(0.05)),
+            Stage('fast', sleeper(0.05), ('root',)),
+            Stage('slow', sleeper(0.3), ('root',)),
+            Stage('join', sleeper(0.05), ('fast', 'slow')),
+        ])
+        run = graph.run()
+
+        assert run.critical_path == ['root', 'slow', 'join']
+        assert 0.38 <= run.critical_path_latency <= run.total_duration + 0.01
+        assert run.summary()['critical_path'] == ['root', 'slow', 'join']
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_optional_stage_timeout_uses_default(self):
+        """测试可选阶段超时后以默认结果继续，不等待其完成"""
+        graph = StageGraph([
+            Stage('hints', sleeper(2, {'late': True}), timeout=0.1, optional=True, default={}),
+            Stage('main', lambda inputs: inputs['hints'], ('hints',)),
+        ])
+        started = time.perf_counter()
+        run = graph.run()
+
+        assert time.perf_counter() - started < 1
+        assert run.results['main'] == {}
+        assert run.records['hints'].status == STAGE_TIMEOUT
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_optional_failure_and_disabled_stage(self):
+        """测试可选阶段异常和未启用阶段都以默认结果继续"""
+        def boom(inputs):
+            raise RuntimeError('boom')
+
+        run = StageGraph([
+            Stage('flaky', boom, optional=True, default='fallback'),
+            Stage('off', lambda inputs: 'never', enabled=False, default='skipped'),
+            Stage('main', lambda inputs: (inputs['flaky'], inputs['off']), ('flaky', 'off')),
+        ]).run()
+
+        assert run.results['main'] == ('fallback', 'skipped')
+        assert run.records['flaky'].status == STAGE_FAILED
+        assert run.records['off'].status == STAGE_SKIPPED
+        assert 'off' not in run.critical_path
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_required_stage_errors_propagate(self):
+        """测试必需阶段的异常和超时向调用方抛出"""
+        def boom(inputs):
+            raise ValueError('Document contains no readable text content')
+
+        with pytest.raises(ValueError, match='no readable text'):
+            StageGraph([Stage('doc', boom)]).run()
+
+        with pytest.raises(StageTimeoutError) as exc_info:
+            StageGraph([Stage('llm', sleeper(2), timeout=0.1)]).run()
+        assert exc_info.value.stage == 'llm'
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_rejects_unknown_dependency_and_cycle(self):
+        """测试未知依赖和环在构造时报错"""
+        with pytest.raises(ValueError):
+            StageGraph([Stage('a', lambda inputs: None, ('missing',))])
+        with pytest.raises(ValueError):
+            StageGraph([Stage('a', lambda inputs: None, ('b',)),
+                        Stage('b', lambda inputs: None, ('a',))])
+
+
+class TestAnalyzerStageGraph:
+    """测试AIAnalyzer按阶段图执行"""
+
+    SPEC_TEXT = '额定电压: 220V\n额定电流: 5A\n工作温度: -20~60℃\n精度等级: 1.0级'
+
+    def _upload(self):
+        return FileStorage(stream=io.BytesIO(self.SPEC_TEXT.encode('utf-8')),
+                           filename='DTZ-100.txt', content_type='text/plain')
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_table_parsing_and_personalization_overlap_llm_call(self, isolated_analysis_caches):
+        """测试表格解析和个性化提示与大模型调用重叠执行，并报告关键路径"""
+        analyzer = AIAnalyzer()
+        llm_running = threading.Event()
+        overlapped = []
+
+        def slow_llm(document_content, document_name):
+            llm_running.set()
+            time.sleep(0.3)
+            return {'basic_info': {'name': '智能电表', 'code': 'DTZ-100'},
+                    'specifications': {'额定电压': {'value': '220V', 'unit': 'V', 'description': ''}},
+                    'confidence': {'overall': 0.8}}
+
+        original_parse = analyzer.table_parser.parse_document_tables
+
+        def parse_tables(text, structured_tables=None):
+            overlapped.append(llm_running.wait(1))
+            return original_parse(text, structured_tables)
+
+        def hints(**kwargs):
+            overlapped.append(llm_running.wait(1))
+            return {'personalized_hints': ['hint']}
+
+        with patch.object(analyzer.ai_client, 'analyze_product_document', side_effect=slow_llm), \
+                patch.object(analyzer.table_parser, 'parse_document_tables', side_effect=parse_tables), \
+                patch.object(analyzer.learning_engine, 'get_personalized_hints', side_effect=hints):
+            result = analyzer.analyze_product_document(self._upload(), user_id=1)
+
+        assert result['success'] is True
+        assert overlapped == [True, True]
+        assert result['personalized_hints'] == ['hint']
+        assert '额定电流' in result['extracted_data']['specifications']
+
+        graph = result['debug_info']['stage_graph']
+        assert graph['critical_path'][0] == 'document_processing'
+        assert 'ai_analysis' in graph['critical_path']
+        assert graph['critical_path_latency'] > 0
+        assert result['debug_info']['performance_metrics']['overall']['critical_path'] == graph['critical_path']
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_personalization_timeout_does_not_fail_analysis(self, isolated_analysis_caches):
+        """测试个性化阶段超时后分析仍然成功"""
+        analyzer = AIAnalyzer()
+
+        def stuck_hints(**kwargs):
+            time.sleep(0.4)
+            return {'personalized_hints': ['late']}
+
+        llm_result = {'basic_info': {'name': '智能电表'}, 'specifications': {}, 'confidence': {'overall': 0.7}}
+        with patch.dict(AIAnalyzer.STAGE_TIMEOUTS, {'personalization': 0.1}), \
+                patch.object(analyzer.ai_client, 'analyze_product_document', return_value=llm_result), \
+                patch.object(analyzer.learning_engine, 'get_personalized_hints', side_effect=stuck_hints):
+            result = analyzer.analyze_product_document(self._upload(), user_id=1)
+
+        assert result['success'] is True
+        assert result['personalized_hints'] == []
+        assert result['debug_info']['stage_graph']['stages']['personalization']['status'] == STAGE_TIMEOUT
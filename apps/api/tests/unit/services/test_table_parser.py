@@ -0,0 +1,78 @@
+"""
+Tests for TableParser
+"""
+
+import pytest
+from unittest.mock import patch
+
+from src.services.table_parser import TableParser
+
+
+def structured(tables, covers_text=False):
+    return {'tables': tables, 'covers_text': covers_text}
+
+
+class TestStructuredTableParsing:
+    """测试直接使用结构化表格解析规格"""
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_header_identified_columns_with_unit(self):
+        """测试按表头识别参数列/值列，并拼接单位列"""
+        parser = TableParser()
+        tables = [{
+            'origin': 'xlsx:参数表',
+            'headers': ['序号', '参数名称', '数值', '单位'],
+            'rows': [['1', '额定电压', '220', 'V'], ['2', '额定频率', '50Hz', 'Hz']]
+        }]
+        result = parser.parse_document_tables('', structured(tables, covers_text=True))
+
+        assert result['tables_found'] == 1
+        specs = result['specifications']
+        assert specs['额定电压']['raw_value'] == '220 V'
+        assert specs['额定电压']['numeric_value'] == 220.0
+        assert specs['额定频率']['raw_value'] == '50Hz'
+        assert specs['额定电压']['source'] == 'structured_table'
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_headerless_two_column_table(self):
+        """测试无可识别表头的两列表按键值表处理，首行也计入"""
+        parser = TableParser()
+        tables = [{'origin': 'docx:table1', 'headers': ['额定功率', '1500W'], 'rows': [['防护等级', 'IP65']]}]
+        specs = parser.parse_document_tables('', structured(tables))['specifications']
+
+        assert set(specs) == {'额定功率', '防护等级'}
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_covers_text_skips_line_heuristics(self):
+        """测试电子表格跳过启发式行解析"""
+        parser = TableParser()
+        tables = [{'origin': 'xlsx:Sheet1', 'headers': ['参数', '数值'], 'rows': [['额定电压', '220V']]}]
+        with patch.object(parser, '_identify_table_regions') as mock_regions:
+            parser.parse_document_tables('参数 数值\n额定电压 220V', structured(tables, covers_text=True))
+        mock_regions.assert_not_called()
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_table_rows_removed_from_prose(self):
+        """测试DOCX正文仍做启发式解析，但已结构化的表格行不重复解析"""
+        parser = TableParser()
+        tables = [{'origin': 'docx:table1', 'headers': ['参数', '数值'],
+                   'rows': [['额定电压', '220V'], ['测量精度', '0.2级']]}]
+        text = '产品型号: ABC-100\n工作温度: -20~60℃\n参数 数值\n额定电压 220V\n测量精度 0.2级'
+        result = parser.parse_document_tables(text, structured(tables))
+
+        types = [table['type'] for table in result['raw_tables']]
+        assert types == ['structured_table', 'colon_table']
+        assert '产品型号' in result['specifications']
+        assert result['specifications']['额定电压']['source'] == 'structured_table'
+
+    @pytest.mark.unit
+    @pytest.mark.services
+    def test_value_header_preferred_over_parameter(self):
+        """测试“参数值”表头识别为值列"""
+        parser = TableParser()
+        assert parser._identify_param_value_columns(['参数名称', '参数值', '备注']) == (0, 1)
+        assert parser._identify_param_value_columns(['Item', 'Value']) == (0, 1)
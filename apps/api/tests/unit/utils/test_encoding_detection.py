@@ -0,0 +1,111 @@
+"""
+Tests for sampled, cached encoding detection
+"""
+
+import io
+import pytest
+from unittest.mock import patch
+from werkzeug.datastructures import FileStorage
+
+from src.utils import encoding_detection
+from src.utils.encoding_detection import detect_encoding, decode_text, clear_cache
+from src.services.document_processor import DocumentProcessor
+
+
+CHINESE_SPEC = '产品规格说明：额定电压220V，额定功率1500W，防护等级IP65，工作温度-20℃~60℃。\n'
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    clear_cache()
+    yield
+    clear_cache()
+
+
+class TestEncodingDetection:
+    """Test detect_encoding / decode_text"""
+
+    def test_utf8_short_circuits_chardet(self):
+        """Test valid UTF-8 never reaches chardet"""
+        data = (CHINESE_SPEC * 100).encode('utf-8')
+        with patch.object(encoding_detection.chardet, 'detect') as mock_detect:
+            assert detect_encoding(data) == 'utf-8'
+            assert decode_text(data) == (CHINESE_SPEC * 100, 'utf-8')
+        mock_detect.assert_not_called()
+
+    def test_gbk_content_decodes(self):
+        """Test GBK content is detected and decoded"""
+        text = CHINESE_SPEC * 200
+        decoded, encoding = decode_text(text.encode('gbk'))
+        assert decoded == text
+        assert encoding == 'gb18030'
+
+    def test_chardet_sees_bounded_sample(self):
+        """Test chardet only receives head/middle/tail samples"""
+        data = (CHINESE_SPEC * 20000).encode('gbk')
+        seen = []
+        real_detect = encoding_detection.chardet.detect
+
+        def spy(sample):
+            seen.append(len(sample))
+            return real_detect(sample)
+
+        with patch.object(encoding_detection.chardet, 'detect', side_effect=spy):
+            detect_encoding(data)
+        assert len(seen) == 1
+        assert seen[0] <= encoding_detection.SAMPLE_CHUNK_SIZE * 3
+
+    def test_sample_cuts_on_line_boundaries(self):
+        """Test samples never split a multi-byte character"""
+        data = (CHINESE_SPEC * 20000).encode('gbk')
+        sample = encoding_detection._sample(data)
+        assert sample.decode('gbk').count('\n') > 0
+
+    def test_result_memoized_by_content_hash(self):
+        """Test repeated detection of the same content runs chardet once"""
+        data = (CHINESE_SPEC * 50).encode('gbk')
+        real_detect = encoding_detection.chardet.detect
+        with patch.object(encoding_detection.chardet, 'detect', side_effect=real_detect) as mock_detect:
+            first = detect_encoding(data, content_hash='abc')
+            second = detect_encoding(data, content_hash='abc')
+        assert first == second
+        assert mock_detect.call_count == 1
+
+    def test_wrong_detection_falls_back(self):
+        """Test a detected encoding that cannot decode falls back to the candidate list"""
+        data = (CHINESE_SPEC * 10).encode('gbk')
+        with patch.object(encoding_detection.chardet, 'detect',
+                          return_value={'encoding': 'ascii', 'confidence': 0.99}):
+            decoded, encoding = decode_text(data, fallback_encodings=('gbk',))
+        assert encoding == 'gbk'
+        assert decoded == CHINESE_SPEC * 10
+
+    def test_short_gbk_not_decoded_as_low_confidence_guess(self):
+        """Test short GBK text uses the multibyte fallbacks instead of a low-confidence single-byte guess"""
+        text = '电流 5A\n频率 50Hz'
+        assert decode_text(text.encode('gbk'), fallback_encodings=('gbk', 'gb2312', 'latin1')) == (text, 'gbk')
+        assert decode_text(text.encode('gbk')) == (text, 'gb18030')
+        file = FileStorage(stream=io.BytesIO(text.encode('gbk')), filename='spec.txt', content_type='text/plain')
+        assert DocumentProcessor()._extract_text_from_txt(file) == text
+
+    def test_low_confidence_detection_ignored(self):
+        """Test a detected encoding below MIN_CONFIDENCE is not tried before the fallbacks"""
+        data = CHINESE_SPEC.encode('gbk')
+        with patch.object(encoding_detection.chardet, 'detect',
+                          return_value={'encoding': 'MacGreek', 'confidence': 0.05}):
+            assert decode_text(data, fallback_encodings=('gbk', 'latin1')) == (CHINESE_SPEC, 'gbk')
+
+    def test_detection_can_be_disabled(self):
+        """Test detect=False only tries the fixed candidates"""
+        data = b'\x89PNG\r\n\x1a\n\xff\xfe\x00binary'
+        with patch.object(encoding_detection.chardet, 'detect') as mock_detect:
+            decoded, encoding = decode_text(data, fallback_encodings=(), detect=False)
+        mock_detect.assert_not_called()
+        assert encoding == 'utf-8'
+        assert 'binary' in decoded
+
+    def test_txt_extraction_uses_detection(self):
+        """Test TXT extraction decodes GBK files"""
+        text = CHINESE_SPEC * 30
+        file = FileStorage(stream=io.BytesIO(text.encode('gbk')), filename='spec.txt', content_type='text/plain')
+        assert DocumentProcessor()._extract_text_from_txt(file) == text
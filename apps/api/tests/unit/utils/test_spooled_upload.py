@@ -0,0 +1,65 @@
+"""
+Tests for spooled upload handling
+"""
+
+import io
+import hashlib
+import tempfile
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from src.utils.spooled_upload import SpooledUpload, UploadTooLargeError
+from src.services.document_processor import DocumentProcessor
+
+
+def make_upload(data, stream=None, filename='spec.txt', content_type='text/plain'):
+    return FileStorage(stream=stream or io.BytesIO(data), filename=filename, content_type=content_type)
+
+
+class TestSpooledUpload:
+    """Test SpooledUpload class"""
+
+    def test_small_upload_stays_in_memory(self):
+        """Test small uploads are hashed and kept in memory"""
+        data = b'rated voltage 220V\n' * 10
+        with SpooledUpload.from_file_storage(make_upload(data), memory_threshold=1024) as upload:
+            assert upload.size == len(data)
+            assert upload.content_hash == hashlib.sha256(data).hexdigest()
+            assert not upload.on_disk
+            assert bytes(upload.getbuffer()) == data
+            assert upload.as_file_storage().read() == data
+
+    def test_large_upload_spills_to_mmap(self):
+        """Test uploads past the threshold are spooled to disk and memory-mapped"""
+        data = b'x' * 5000
+        with SpooledUpload.from_file_storage(make_upload(data), memory_threshold=1024) as upload:
+            assert upload.on_disk
+            assert upload.content_hash == hashlib.sha256(data).hexdigest()
+            shared = upload.as_file_storage()
+            assert shared.read() == data
+            shared.seek(0)
+            assert shared.read(10) == b'x' * 10
+
+    def test_disk_backed_stream_is_mapped_without_copy(self):
+        """Test an already on-disk upload stream is mapped directly"""
+        data = b'y' * 4096
+        backing = tempfile.TemporaryFile()
+        backing.write(data)
+        backing.seek(0)
+        with SpooledUpload.from_file_storage(make_upload(data, stream=backing)) as upload:
+            assert upload.on_disk
+            assert upload._backing is backing
+            assert upload.as_file_storage().read() == data
+
+    def test_size_limit_aborts_streaming(self):
+        """Test oversized uploads are rejected while streaming"""
+        with pytest.raises(UploadTooLargeError):
+            SpooledUpload.from_file_storage(make_upload(b'z' * 2048), max_size=1024)
+
+    def test_document_processor_reads_shared_buffer(self):
+        """Test DocumentProcessor can process the shared read-only stream"""
+        data = '产品型号：ABC-100\n额定电压：220V\n'.encode('utf-8') * 200
+        with SpooledUpload.from_file_storage(make_upload(data), memory_threshold=256) as upload:
+            text, info = DocumentProcessor().process_document(upload.as_file_storage())
+            assert info['size'] == len(data)
+            assert 'ABC-100' in text
@@ -1,6 +1,7 @@
 // AI分析相关API接口
 
 import http from './http'
+import { createIdempotencyKey } from '@/utils/idempotency'
 import type {
   SupportedFormatsResponse,
   AIAnalysisResult,
@@ -31,8 +32,12 @@ export const analyzeDocument = (file: File): Promise<AIAnalysisResult> => {
   
   return http.post(`${BASE_URL}/analyze-document`, formData, {
     headers: {
-      'Content-Type': 'multipart/form-data'
+      'Content-Type': 'multipart/form-data',
+      // 同一次提交的重试使用相同的幂等键，服务端返回原分析结果而不是重新分析
+      'Idempotency-Key': createIdempotencyKey()
     },
+    // 结果预览需要文本预览；调试信息默认不返回
+    params: { include: 'text' },
     timeout: 180000, // 增加到3分钟超时，确保AI分析有足够时间
     // 添加重试机制
     'axios-retry': {
@@ -1,6 +1,7 @@
 // 批量分析API接口
 
 import http from './http'
+import { createIdempotencyKey } from '@/utils/idempotency'
 import type {
   BatchAnalysisRequest,
   BatchAnalysisResponse,
@@ -40,7 +41,9 @@ export const submitBatchAnalysis = (
   
   return http.post(`${BASE_URL}/submit`, formData, {
     headers: {
-      'Content-Type': 'multipart/form-data'
+      'Content-Type': 'multipart/form-data',
+      // 超时后重试不会创建重复的批量任务
+      'Idempotency-Key': createIdempotencyKey()
     },
     timeout: 60000 // 1分钟超时（仅提交任务）
   })
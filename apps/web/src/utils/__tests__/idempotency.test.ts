@@ -0,0 +1,41 @@
+/**
+ * 幂等键生成测试
+ * 覆盖非安全上下文（HTTP访问）下没有 crypto.randomUUID 的情况
+ */
+
+import { describe, it, expect, afterEach, vi } from 'vitest'
+import { createIdempotencyKey } from '../idempotency'
+
+const UUID_V4 = /^[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$/
+
+describe('createIdempotencyKey', () => {
+  afterEach(() => {
+    vi.unstubAllGlobals()
+  })
+
+  it('安全上下文中使用 crypto.randomUUID', () => {
+    const randomUUID = vi.fn(() => '3b241101-e2bb-4255-8caf-4136c566a962')
+    vi.stubGlobal('crypto', { randomUUID, getRandomValues: vi.fn() })
+
+    expect(createIdempotencyKey()).toBe('3b241101-e2bb-4255-8caf-4136c566a962')
+    expect(randomUUID).toHaveBeenCalledTimes(1)
+  })
+
+  it('没有 randomUUID 时用 getRandomValues 生成 UUID v4', () => {
+    const getRandomValues = vi.fn((bytes: Uint8Array) => bytes.fill(0xff))
+    vi.stubGlobal('crypto', { getRandomValues })
+
+    const key = createIdempotencyKey()
+    expect(key).toMatch(UUID_V4)
+    expect(getRandomValues).toHaveBeenCalledTimes(1)
+  })
+
+  it('每次生成不同的键', () => {
+    vi.stubGlobal('crypto', { getRandomValues: (bytes: Uint8Array) => {
+      for (let i = 0; i < bytes.length; i++) bytes[i] = Math.floor(Math.random() * 256)
+      return bytes
+    } })
+
+    expect(createIdempotencyKey()).not.toBe(createIdempotencyKey())
+  })
+})
@@ -0,0 +1,28 @@
+// 请求幂等键生成工具
+
+/**
+ * 生成幂等键（UUID v4）
+ *
+ * crypto.randomUUID 只在安全上下文（HTTPS 或 localhost）中可用，
+ * 通过 HTTP 访问时改用 crypto.getRandomValues 生成同样格式的随机 UUID
+ */
+export const createIdempotencyKey = (): string => {
+  const cryptoApi = globalThis.crypto
+  if (typeof cryptoApi?.randomUUID === 'function') {
+    return cryptoApi.randomUUID()
+  }
+
+  const bytes = new Uint8Array(16)
+  if (typeof cryptoApi?.getRandomValues === 'function') {
+    cryptoApi.getRandomValues(bytes)
+  } else {
+    for (let i = 0; i < bytes.length; i++) {
+      bytes[i] = Math.floor(Math.random() * 256)
+    }
+  }
+  bytes[6] = (bytes[6] & 0x0f) | 0x40 // 版本 4
+  bytes[8] = (bytes[8] & 0x3f) | 0x80 // RFC 4122 变体
+
+  const hex = Array.from(bytes, (byte) => byte.toString(16).padStart(2, '0')).join('')
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`
+}